@@ -1,15 +1,17 @@
 # admin_routes.py - Rutas para el panel de administración
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
-from db_manager import DatabaseManager
+from markupsafe import escape
+from db_manager import get_db, TIPOS_BUSQUEDA, MARCA_INICIO, MARCA_FIN, MAX_CANDIDATOS_BUSQUEDA
 import os
 import re  # Import necesario para las funciones de calendario
 from functools import wraps
 from datetime import datetime, timedelta
 import json
+import base64
+import pickle
 import logging
 
-import sqlite3
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -18,7 +20,58 @@ logger = logging.getLogger(__name__)
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 # Inicializar el gestor de base de datos
-db = DatabaseManager()
+db = get_db()
+
+# Expedientes por página en el listado
+PROYECTOS_POR_PAGINA = 25
+
+# Elementos por página de los listados JSON paginados (/admin/api/...)
+LIMITE_API_DEFECTO = 50
+LIMITE_API_MAXIMO = 200
+
+def _codificar_cursor(clave):
+    """Convierte la clave de la siguiente página de un listado en un cursor opaco."""
+    if clave is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(clave)).encode('utf-8')).decode('ascii')
+
+def _parametros_pagina(longitud_clave, limite_defecto=LIMITE_API_DEFECTO):
+    """
+    Lee 'limite' y 'cursor' de la petición.
+    
+    Returns:
+        Tupla (limite, clave de la página anterior o None)
+        
+    Raises:
+        ValueError si el límite o el cursor no son válidos
+    """
+    limite = request.args.get('limite', limite_defecto, type=int)
+    if limite < 1:
+        raise ValueError("El límite debe ser al menos 1")
+    limite = min(limite, LIMITE_API_MAXIMO)
+    
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return limite, None
+    clave = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    # Las claves solo tienen textos y enteros (no booleanos, listas ni objetos)
+    if (not isinstance(clave, list) or len(clave) != longitud_clave
+            or any(type(valor) not in (str, int) for valor in clave)):
+        raise ValueError("Cursor no válido")
+    return limite, tuple(clave)
+
+def _respuesta_pagina(nombre, elementos, siguiente):
+    return jsonify({
+        'success': True,
+        nombre: elementos,
+        'siguiente': _codificar_cursor(siguiente)
+    })
+
+def _error_parametros(e):
+    return jsonify({
+        'success': False,
+        'error': f'Parámetros no válidos: {str(e)}'
+    }), 400
 
 # Ubicar al inicio del archivo, antes de las rutas
 def login_required(f):
@@ -93,40 +146,19 @@ def logout():
 @admin_bp.route('/')
 @login_required
 def dashboard():
-    # Obtener estadísticas para el dashboard
-    clientes = db.get_all_clientes()
-    
-    # Obtener consultas sin expediente
-    consultas_pendientes = db.get_consultas_sin_expediante()
+    # Contadores calculados en la base de datos (con caché de pocos segundos)
+    stats = db.get_dashboard_stats()
     
-    stats = {
-        'total_clientes': len(clientes),
-        'citas_proximas': 0,
-        'eventos_proximos': 0,
-        'proyectos_activos': 0,
-        'consultas_pendientes': len(consultas_pendientes)
-    }
-    
-    # Obtener eventos del calendario próximos (7 días)
+    # Próximos eventos del calendario (7 días)
     hoy = datetime.now().strftime("%Y-%m-%d")
     proxima_semana = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
-    eventos = db.get_all_calendar_events(hoy, proxima_semana)
-    
-    # Contar citas y eventos críticos
-    for evento in eventos:
-        if evento['type'] == 'appointment':
-            stats['citas_proximas'] += 1
-        elif evento['type'] == 'critical':
-            stats['eventos_proximos'] += 1
+    proximos_eventos = db.get_all_calendar_events(hoy, proxima_semana, limite=10)
     
     # Los últimos 5 clientes agregados
-    ultimos_clientes = sorted(clientes, key=lambda x: x.get('fecha_registro', ''), reverse=True)[:5]
-    
-    # Próximos eventos del calendario
-    proximos_eventos = sorted(eventos, key=lambda x: x['start'])[:10]
+    ultimos_clientes = db.get_ultimos_clientes(5)
     
     # Últimas consultas sin expediente (top 5)
-    ultimas_consultas = consultas_pendientes[:5]
+    ultimas_consultas = db.get_consultas_sin_expediante(limite=5)
     
     return render_template('admin/dashboard.html', 
                           stats=stats, 
@@ -139,8 +171,25 @@ def dashboard():
 @role_required(['admin', 'gestor', 'recepcion'])
 def clientes():
     # Solo admin, gestor y recepción pueden ver clientes
-    clientes = db.get_all_clientes()
-    return render_template('admin/clientes.html', clientes=clientes)
+    # Las filas se cargan por páginas desde /admin/api/clientes
+    return render_template('admin/clientes.html')
+
+@admin_bp.route('/api/clientes', methods=['GET'])
+@role_required(['admin', 'gestor', 'recepcion'])
+def api_clientes():
+    """API paginada de clientes ordenados por nombre (parámetros: limite, cursor, q)."""
+    try:
+        limite, despues = _parametros_pagina(2)
+    except ValueError as e:
+        return _error_parametros(e)
+    try:
+        clientes, siguiente = db.get_clientes_pagina(limite, despues, request.args.get('q', '').strip() or None)
+        return _respuesta_pagina('clientes', clientes, siguiente)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
 @admin_bp.route('/clientes/nuevo', methods=['GET', 'POST'])
 @role_required(['admin', 'gestor', 'recepcion'])
@@ -221,31 +270,24 @@ def editar_cliente(cliente_id):
 @admin_bp.route('/proyectos')
 @role_required(['admin', 'gestor', 'abogado'])
 def proyectos():
-    """Vista para mostrar todos los expedientes."""
+    """Vista para mostrar los expedientes, paginados y ordenados en la base de datos."""
     try:
         # Admin, gestor y abogado pueden ver expedientes
-        # Obtener todos los expedientes con información del cliente
-        proyectos = []
-        clientes = db.get_all_clientes()
-        
-        # Crear un diccionario para acceso rápido a clientes por ID
-        clientes_dict = {cliente['id']: cliente for cliente in clientes}
-        
-        # Para cada cliente, obtener sus expedientes
-        for cliente in clientes:
-            proyectos_cliente = db.get_proyectos_by_cliente(cliente['id'])
-            
-            # Añadir el nombre del cliente a cada expediente
-            for proyecto in proyectos_cliente:
-                proyecto['cliente_nombre'] = cliente['nombre']
-                proyecto['cliente_email'] = cliente['email']
-            
-            proyectos.extend(proyectos_cliente)
-        
-        # Ordenar por actualización más reciente
-        proyectos = sorted(proyectos, key=lambda p: p.get('ultima_actualizacion', ''), reverse=True)
-        
-        return render_template('admin/proyectos.html', proyectos=proyectos)
+        pagina = max(request.args.get('pagina', 1, type=int), 1)
+        orden = request.args.get('orden', 'ultima_actualizacion')
+        if orden not in db.ORDENES_PROYECTOS:
+            orden = 'ultima_actualizacion'
+        direccion = 'asc' if request.args.get('dir') == 'asc' else 'desc'
+        buscar = request.args.get('q', '').strip()
+        
+        proyectos, total = db.get_proyectos_pagina(pagina, PROYECTOS_POR_PAGINA, orden,
+                                                   direccion == 'desc', buscar or None)
+        paginas = max((total + PROYECTOS_POR_PAGINA - 1) // PROYECTOS_POR_PAGINA, 1)
+        if pagina > paginas:
+            return redirect(url_for('admin.proyectos', pagina=paginas, orden=orden, dir=direccion, q=buscar or None))
+        
+        return render_template('admin/proyectos.html', proyectos=proyectos, total=total, pagina=pagina,
+                               paginas=paginas, orden=orden, direccion=direccion, buscar=buscar)
     except Exception as e:
         flash(f'Error al cargar expedientes: {str(e)}', 'error')
         return redirect(url_for('admin.dashboard'))
@@ -458,7 +500,7 @@ def api_eventos():
                 # Si no viene en el evento, intentar obtenerlo
                 try:
                     evento_id = evento['id'].replace('evento_', '')
-                    conn = sqlite3.connect(db.db_file)
+                    conn = db.conectar()
                     cursor = conn.cursor()
                     cursor.execute("""
                     SELECT proyecto_id, p.titulo 
@@ -490,29 +532,53 @@ def api_eventos():
     
     return jsonify(calendar_events)
 
+@admin_bp.route('/api/disponibilidad', methods=['GET'])
+@login_required
+def api_disponibilidad():
+    """
+    Horarios libres entre start y end (formato de FullCalendar, end exclusivo) para
+    el tipo de reunión indicado, como eventos de fondo del calendario.
+    """
+    from handlers.calendar_service import obtener_grids_rango, horarios_libres
+    from config import TIPOS_REUNION
+
+    tipo_reunion = request.args.get('tipo', 'presencial')
+    if tipo_reunion not in TIPOS_REUNION:
+        return jsonify({'error': f'Tipo de reunión no válido: {tipo_reunion}'}), 400
+
+    try:
+        inicio = datetime.strptime(request.args.get('start', '')[:10], "%Y-%m-%d")
+        fin = datetime.strptime(request.args.get('end', '')[:10], "%Y-%m-%d") - timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'Parámetros start y end no válidos'}), 400
+
+    # Limitar el rango a lo que muestra una vista mensual
+    fin = min(fin, inicio + timedelta(days=42))
+
+    duracion = TIPOS_REUNION[tipo_reunion]["duracion_real"]
+    ahora = datetime.now()
+    disponibles = []
+    for fecha_str, grid in obtener_grids_rango(inicio, fin, ahora).items():
+        for hora in horarios_libres(grid, tipo_reunion, ahora):
+            hora_inicio = datetime.strptime(f"{fecha_str} {hora}", "%Y-%m-%d %H:%M")
+            disponibles.append({
+                'start': hora_inicio.strftime("%Y-%m-%dT%H:%M:%S"),
+                'end': (hora_inicio + timedelta(minutes=duracion)).strftime("%Y-%m-%dT%H:%M:%S"),
+                'display': 'background',
+                'backgroundColor': '#d4edda',
+                'extendedProps': {'type': 'disponible', 'tipo': tipo_reunion}
+            })
+
+    return jsonify(disponibles)
+
 
 # Gestión de citas
 @admin_bp.route('/citas')
 @role_required(['admin', 'gestor', 'recepcion', 'abogado'])
 def citas():
-    """Vista para mostrar todas las citas."""
-    try:
-        # Todos los roles pueden ver citas
-        # Obtener todas las citas con información completa de clientes
-        todas_citas = db.get_all_citas()
-        
-        # Si la función get_all_citas no incluye el nombre del cliente, lo añadimos aquí
-        for cita in todas_citas:
-            if 'cliente_nombre' not in cita and 'cliente' in cita and 'nombre' in cita['cliente']:
-                cita['cliente_nombre'] = cita['cliente']['nombre']
-        
-        # Ordenar por fecha y hora
-        todas_citas = sorted(todas_citas, key=lambda c: (c.get('fecha', ''), c.get('hora', '')))
-        
-        return render_template('admin/citas.html', citas=todas_citas)
-    except Exception as e:
-        flash(f'Error al cargar citas: {str(e)}', 'error')
-        return redirect(url_for('admin.dashboard'))
+    """Vista para mostrar las citas (las filas se cargan por páginas desde /admin/api/citas)."""
+    # Todos los roles pueden ver citas
+    return render_template('admin/citas.html')
 
 @admin_bp.route('/citas/nueva', methods=['GET', 'POST'])
 @role_required(['admin', 'gestor', 'recepcion'])
@@ -1167,16 +1233,27 @@ def api_proyecto(proyecto_id):
 @admin_bp.route('/api/citas', methods=['GET'])
 @login_required
 def api_citas():
-    """API para obtener todas las citas"""
+    """
+    API paginada de citas, de la más reciente a la más antigua. Parámetros:
+    limite, cursor (el campo 'siguiente' de la respuesta anterior), desde, hasta,
+    estado, tipo, cliente_id y q (texto en el nombre del cliente o el tema).
+    """
     try:
-        # Obtener todas las citas con sus respectivos clientes
-        citas = db.get_all_citas()
-        
-        return jsonify({
-            'success': True,
-            'citas': citas
-        })
-    
+        limite, despues = _parametros_pagina(3)
+        cliente_id = request.args.get('cliente_id', type=int)
+    except ValueError as e:
+        return _error_parametros(e)
+    try:
+        citas, siguiente = db.get_citas_pagina(
+            limite, despues,
+            fecha_desde=request.args.get('desde') or None,
+            fecha_hasta=request.args.get('hasta') or None,
+            estado=request.args.get('estado') or None,
+            tipo=request.args.get('tipo') or None,
+            cliente_id=cliente_id,
+            buscar=request.args.get('q', '').strip() or None
+        )
+        return _respuesta_pagina('citas', citas, siguiente)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1313,7 +1390,7 @@ def editar_evento(evento_id):
     """Edición de un evento crítico."""
     try:
         # Obtener evento de la base de datos
-        conn = sqlite3.connect(db.db_file)
+        conn = db.conectar()
         cursor = conn.cursor()
         
         # Obtener información del evento con datos del proyecto y cliente
@@ -1393,15 +1470,28 @@ def configuracion():
         # Verificar si existe credentials.json y token.pickle
         google_calendar_connected = os.path.exists('credentials.json') and os.path.exists('token.pickle')
         
-        # Obtener configuración de sincronización automática
-        # Aquí deberías obtener los valores de una base de datos o archivo de configuración
-        sync_auto_enabled = False  # Valor por defecto
-        sync_interval = 15  # Valor por defecto en minutos
+        # Obtener configuración de sincronización automática y última ejecución
+        from handlers.sincronizacion_automatica import (
+            obtener_configuracion_sync, obtener_ultima_sincronizacion, sincronizacion_en_curso
+        )
+        configuracion_sync = obtener_configuracion_sync(db)
+        ultima_sincronizacion = obtener_ultima_sincronizacion(db)
+        
+        # Si la última sincronización falló por autenticación, ofrecer volver a autenticar
+        sync_requiere_reautenticacion = bool(
+            ultima_sincronizacion and not ultima_sincronizacion['exito'] and
+            ("invalid_grant" in ultima_sincronizacion['mensaje'] or
+             "autenticación" in ultima_sincronizacion['mensaje'].lower() or
+             "credenciales" in ultima_sincronizacion['mensaje'].lower())
+        )
         
         return render_template('admin/configuracion.html', 
                              google_calendar_connected=google_calendar_connected,
-                             sync_auto_enabled=sync_auto_enabled,
-                             sync_interval=sync_interval,
+                             sync_auto_enabled=configuracion_sync['activa'],
+                             sync_interval=configuracion_sync['intervalo'],
+                             ultima_sincronizacion=ultima_sincronizacion,
+                             sync_requiere_reautenticacion=sync_requiere_reautenticacion,
+                             sincronizacion_en_curso=sincronizacion_en_curso(db),
                              os=os)
     except Exception as e:
         flash(f'Error al cargar configuración: {str(e)}', 'danger')
@@ -1415,11 +1505,13 @@ def configuracion():
 def configurar_sync_auto():
     """Configurar sincronización automática."""
     try:
+        from handlers.sincronizacion_automatica import guardar_configuracion_sync
+        
         sync_auto = request.form.get('sync_auto') == 'on'
         sync_interval = int(request.form.get('sync_interval', 15))
         
-        # Aquí deberías guardar esta configuración en la base de datos o archivo de configuración
-        # Por simplicidad, solo mostraremos un mensaje
+        # Se guarda en la base de datos; el planificador de cada proceso la aplica
+        guardar_configuracion_sync(sync_auto, sync_interval, db)
         
         if sync_auto:
             flash(f'Sincronización automática activada cada {sync_interval} minutos', 'success')
@@ -1436,27 +1528,18 @@ def configurar_sync_auto():
 def sincronizar_calendario():
     """Sincroniza manualmente el calendario con Google."""
     try:
-        from handlers.calendar_service import sincronizar_calendario_bd
+        from handlers.sincronizacion_automatica import solicitar_sincronizacion
         
         # Verificar si tenemos credenciales
         if not os.path.exists('credentials.json'):
             flash('No se han configurado las credenciales de Google Calendar. Por favor, configúralas primero.', 'warning')
             return redirect(url_for('admin.configuracion'))
         
-        # Si no existe token.pickle, esto iniciará el flujo de autenticación de Google
-        exito, mensaje = sincronizar_calendario_bd()
-        
-        if exito:
-            flash(mensaje, 'success')
+        # La sincronización se hace en segundo plano; su resultado aparece en Configuración
+        if solicitar_sincronizacion(db):
+            flash('Sincronización con Google Calendar iniciada. El resultado aparecerá en Configuración.', 'info')
         else:
-            flash(mensaje, 'danger')
-            # Si el error es por autenticación, ofrecer volver a autenticar
-            if "invalid_grant" in mensaje or "autenticación" in mensaje.lower():
-                flash('Las credenciales han expirado. Necesitas volver a autenticar.', 'warning')
-                # Eliminar token.pickle para forzar reautenticación
-                if os.path.exists('token.pickle'):
-                    os.remove('token.pickle')
-                return redirect(url_for('admin.configuracion'))
+            flash('Ya hay una sincronización en curso.', 'warning')
         
         return redirect(url_for('admin.calendario'))
     except Exception as e:
@@ -1471,6 +1554,10 @@ def google_login():
     """Inicia el proceso de autenticación con Google desde la web."""
     try:
         from google_auth_oauthlib.flow import Flow
+        from handlers.calendar_service import invalidar_servicio_google
+        
+        # El administrador va a reconectar: descartar el servicio en caché
+        invalidar_servicio_google()
         
         # Verificar que existen las credenciales
         if not os.path.exists('credentials.json'):
@@ -1526,6 +1613,9 @@ def google_callback():
         with open('token.pickle', 'wb') as token:
             pickle.dump(credentials, token)
         
+        from handlers.calendar_service import invalidar_servicio_google
+        invalidar_servicio_google()
+        
         flash('¡Autenticación con Google Calendar completada exitosamente!', 'success')
         return redirect(url_for('admin.configuracion'))
     except Exception as e:
@@ -1566,6 +1656,8 @@ def upload_google_credentials():
                 # Eliminar token.pickle existente para forzar nueva autenticación
                 if os.path.exists('token.pickle'):
                     os.remove('token.pickle')
+                from handlers.calendar_service import invalidar_servicio_google
+                invalidar_servicio_google()
                 
                 flash('Credenciales de Google subidas correctamente. Ahora haz clic en "Conectar con Google Calendar" para completar la configuración.', 'success')
                 return redirect(url_for('admin.configuracion'))
@@ -1587,9 +1679,12 @@ def upload_google_credentials():
 def desconectar_google_calendar():
     """Desconecta la integración con Google Calendar."""
     try:
+        from handlers.calendar_service import invalidar_servicio_google
+        
         # Eliminar token.pickle
         if os.path.exists('token.pickle'):
             os.remove('token.pickle')
+            invalidar_servicio_google()
             flash('Google Calendar desconectado correctamente', 'success')
         else:
             flash('No hay conexión activa con Google Calendar', 'warning')
@@ -1603,58 +1698,92 @@ def desconectar_google_calendar():
 @admin_bp.route('/documentos')
 @role_required(['admin', 'gestor', 'abogado'])
 def documentos():
-    """Vista para listar todos los documentos."""
+    """Vista para listar los documentos (las filas se cargan por páginas desde /admin/api/documentos)."""
+    return render_template('admin/documentos.html')
+
+@admin_bp.route('/api/documentos', methods=['GET'])
+@role_required(['admin', 'gestor', 'abogado'])
+def api_documentos():
+    """API paginada de documentos, los más recientes primero (parámetros: limite, cursor, cliente_id, q)."""
     try:
-        # Implementar consulta para obtener todos los documentos
-        conn = sqlite3.connect(db.db_file)
-        conn.row_factory = sqlite3.Row  # Para acceder a las columnas por nombre
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-        SELECT d.*, 
-               GROUP_CONCAT(DISTINCT c.nombre) as clientes,
-               GROUP_CONCAT(DISTINCT p.titulo) as proyectos,
-               GROUP_CONCAT(DISTINCT ct.fecha || ' ' || ct.hora) as citas
-        FROM documentos d
-        LEFT JOIN documento_cliente dc ON d.id = dc.documento_id
-        LEFT JOIN clientes c ON dc.cliente_id = c.id
-        LEFT JOIN documento_proyecto dp ON d.id = dp.documento_id
-        LEFT JOIN proyectos p ON dp.proyecto_id = p.id
-        LEFT JOIN documento_cita dct ON d.id = dct.documento_id
-        LEFT JOIN citas ct ON dct.cita_id = ct.id
-        GROUP BY d.id
-        ORDER BY d.fecha_subida DESC
-        """)
-        
-        documentos_raw = cursor.fetchall()
-        conn.close()
-        
-        documentos = []
-        for doc in documentos_raw:
-            clientes = doc['clientes'].split(',') if doc['clientes'] else []
-            proyectos = doc['proyectos'].split(',') if doc['proyectos'] else []
-            citas = doc['citas'].split(',') if doc['citas'] else []
-            
-            tamano_mb = round(doc['tamano'] / (1024 * 1024), 2) if doc['tamano'] else 0
-            
-            documentos.append({
-                'id': doc['id'],
-                'nombre': doc['nombre'],
-                'tipo': doc['tipo'],
-                'tamano': tamano_mb,
-                'fecha_subida': doc['fecha_subida'],
-                'clientes': clientes,
-                'proyectos': proyectos,
-                'citas': citas,
-                'ruta_archivo': doc['ruta_archivo']
-            })
-        
-        return render_template('admin/documentos.html', documentos=documentos)
+        limite, despues = _parametros_pagina(2)
+        cliente_id = request.args.get('cliente_id', type=int)
+    except ValueError as e:
+        return _error_parametros(e)
+    try:
+        documentos, siguiente = db.get_documentos_pagina(limite, despues, cliente_id,
+                                                         request.args.get('q', '').strip() or None)
+        return _respuesta_pagina('documentos', documentos, siguiente)
     except Exception as e:
-        flash(f'Error al cargar documentos: {str(e)}', 'danger')
-        return redirect(url_for('admin.dashboard'))
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
     
     
+# Búsqueda de texto completo
+# Roles que pueden ver cada tipo de resultado (los mismos que la vista a la que enlaza)
+ROLES_BUSQUEDA = {
+    'cliente': ['admin', 'gestor', 'recepcion', 'abogado'],
+    'proyecto': ['admin', 'gestor', 'abogado'],
+    'nota': ['admin', 'gestor', 'abogado'],
+    'documento': ['admin', 'gestor', 'abogado'],
+}
+RESULTADOS_BUSQUEDA_DEFECTO = 20
+
+def _url_resultado(resultado):
+    if resultado['tipo'] == 'cliente':
+        return url_for('admin.ver_cliente', cliente_id=resultado['id'])
+    if resultado['tipo'] == 'documento':
+        return url_for('admin.download_documento_admin', documento_id=resultado['id'])
+    # Expedientes y notas de expedientes
+    return url_for('admin.ver_proyecto', proyecto_id=resultado['enlace_id'])
+
+def _resaltar(fragmento):
+    """Escapa el fragmento y marca los términos encontrados con <mark>."""
+    return str(escape(fragmento or '')).replace(MARCA_INICIO, '<mark>').replace(MARCA_FIN, '</mark>')
+
+@admin_bp.route('/buscar')
+@login_required
+def buscar():
+    """Vista de búsqueda en clientes, expedientes, notas y documentos."""
+    return render_template('admin/buscar.html', q=request.args.get('q', ''))
+
+@admin_bp.route('/api/buscar', methods=['GET'])
+@login_required
+def api_buscar():
+    """
+    API de búsqueda de texto completo, de más a menos relevante. Parámetros: q,
+    tipo (se puede repetir: cliente, proyecto, nota, documento), limite y cursor.
+    Solo se devuelven los tipos que el rol del usuario puede ver.
+    """
+    rol = session.get('admin_role')
+    permitidos = [t for t in TIPOS_BUSQUEDA if rol == 'admin' or rol in ROLES_BUSQUEDA[t]]
+    try:
+        limite, despues = _parametros_pagina(1, RESULTADOS_BUSQUEDA_DEFECTO)
+        desplazamiento = despues[0] if despues else 0
+        # buscar() no pagina más allá de MAX_CANDIDATOS_BUSQUEDA resultados
+        if type(desplazamiento) is not int or not 0 <= desplazamiento < MAX_CANDIDATOS_BUSQUEDA:
+            raise ValueError("Cursor no válido")
+        tipos = request.args.getlist('tipo') or permitidos
+        desconocidos = set(tipos) - set(TIPOS_BUSQUEDA)
+        if desconocidos:
+            raise ValueError(f"Tipos desconocidos: {', '.join(sorted(desconocidos))}")
+    except ValueError as e:
+        return _error_parametros(e)
+    try:
+        resultados, siguiente = db.buscar(request.args.get('q', ''), limite, desplazamiento,
+                                          [t for t in tipos if t in permitidos])
+        for resultado in resultados:
+            resultado['fragmento'] = _resaltar(resultado['fragmento'])
+            resultado['url'] = _url_resultado(resultado)
+        return _respuesta_pagina('resultados', resultados, (siguiente,) if siguiente is not None else None)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @admin_bp.route('/documentos/cliente/<int:cliente_id>')
 @login_required
 def documentos_cliente(cliente_id):
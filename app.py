@@ -2,12 +2,14 @@ from flask import Flask, request, jsonify, send_from_directory, session, render_
 import os
 import logging
 from handlers.conversation import generar_respuesta, reset_conversacion
-from db_manager import DatabaseManager
+from db_manager import get_db
 from datetime import timedelta
 from document_manager import DocumentManager
 from flask import send_file
 import sqlite3
 import token_manager
+from config import PALABRAS_DESPEDIDA
+from utils.palabras_clave import AutomataPalabras
 
 from dotenv import load_dotenv
 
@@ -58,8 +60,14 @@ app.get_base_url = get_base_url
 # Inicializar estado de usuarios
 app.user_states = {}
 
+# Precargar los modelos de NLP antes de hacer fork de los workers
+# (p. ej. gunicorn --preload) en lugar de en el primer mensaje de cada worker
+if os.environ.get('PRELOAD_NLP_MODELS', 'false').lower() == 'true':
+    from models.intent_model import warmup
+    warmup()
+
 # Inicializar gestor de base de datos
-db_manager = DatabaseManager()
+db_manager = get_db()
 
 # Inicializar gestor de documentos
 upload_dir = os.environ.get('UPLOAD_DIR', 'uploads')
@@ -113,10 +121,25 @@ def initialize_database():
     database_initialized = True
 
 
+# Detector de despedidas compilado una sola vez para todos los mensajes
+AUTOMATA_DESPEDIDA = AutomataPalabras({"despedida": PALABRAS_DESPEDIDA})
+
 # Registrar las rutas del panel de administración
 from admin_routes import admin_bp
 app.register_blueprint(admin_bp)
 
+# Sincronización automática del calendario en segundo plano (la configuración
+# se guarda desde el panel). El planificador arranca con la primera petición de
+# cada proceso, no al importar: así no corre en scripts ni pruebas, y con
+# gunicorn --preload lo tiene cada worker y no el proceso padre.
+# Se puede desactivar en este proceso con SYNC_AUTOMATICA=false
+if os.environ.get('SYNC_AUTOMATICA', 'true').lower() == 'true':
+    from handlers.sincronizacion_automatica import iniciar_planificador
+
+    @app.before_request
+    def arrancar_planificador():
+        iniciar_planificador(db_manager)
+
 # Ruta de prueba simple
 @app.route('/hola')
 def hola():
@@ -372,10 +395,7 @@ def chat():
         
         # Detectar despedidas o cierres de conversación
         mensaje_lower = mensaje.lower().strip()
-        palabras_despedida = ["no gracias", "adiós", "adios", "hasta luego", "terminar", 
-                            "finalizar", "cerrar", "no quiero", "no deseo", "eso es todo"]
-        
-        if any(palabra in mensaje_lower for palabra in palabras_despedida):
+        if "despedida" in AUTOMATA_DESPEDIDA.buscar(mensaje_lower):
             reset_conversacion(user_id, app.user_states)
             return jsonify({'respuesta': 'Gracias por usar nuestro servicio de asistencia para citas legales. ¡Hasta pronto!'})
         
@@ -0,0 +1 @@
+# Este archivo permite que Python trate el directorio 'benchmarks' como un paquete
@@ -0,0 +1,136 @@
+"""
+Benchmark de la búsqueda de texto completo (DatabaseManager.buscar).
+
+Crea una base de datos SQLite temporal con un corpus sintético (por defecto
+1.000.000 de filas indexadas entre clientes, expedientes, notas y documentos),
+que se indexa mediante los triggers al insertar, y mide la latencia de la
+primera página y de una página posterior para consultas típicas: apellidos sin
+acento, prefijos cortos, nombre y apellido, teléfono, temas y palabras
+frecuentes de las notas.
+
+Falla (código de salida 1) si la mediana de alguna consulta en la primera
+página supera el presupuesto.
+
+Uso:
+    python -m benchmarks.bench_busqueda [--filas 1000000] [--presupuesto-ms 50]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_manager import DatabaseManager
+
+NOMBRES = ["José", "María", "Ana", "Luis", "Carmen", "Javier", "Lucía", "Íñigo", "Sofía", "Raúl", "Pilar", "Andrés"]
+APELLIDOS = ["García", "López", "Martínez", "Sánchez", "Pérez", "Gómez", "Fernández", "Núñez", "Muñoz",
+             "Álvarez", "Ibáñez", "Castaño", "Rodríguez", "Jiménez", "Ortiz", "Peña"]
+TEMAS = ["divorcio", "herencia", "despido", "alquiler", "accidente", "deuda", "custodia", "testamento",
+         "desahucio", "indemnización", "contrato", "sucesión"]
+SILABAS = ["ca", "de", "mi", "lo", "ra", "sen", "to", "pa", "tri", "ción", "ble", "cu", "men", "al", "es", "gu"]
+
+CONSULTAS = ["garcia", "nunez", "ga", "mar", "maria lopez", "600 12", "custodia", "indemnizacion",
+             "sentencia plazo", "testamento herencia"]
+
+# Reparto de las filas del corpus entre las tablas indexadas
+PROPORCIONES = {"clientes": 0.2, "proyectos": 0.2, "notas_proyecto": 0.5, "documentos": 0.1}
+
+def _vocabulario(rng, tamano=5000):
+    palabras = {"".join(rng.choices(SILABAS, k=rng.randint(2, 4))) for _ in range(tamano * 2)}
+    palabras = sorted(palabras)[:tamano] + ["sentencia", "plazo", "cliente", "juzgado", "recurso", "audiencia"]
+    rng.shuffle(palabras)
+    # Frecuencias de tipo Zipf: unas pocas palabras muy frecuentes y muchas raras
+    pesos = [1 / (rango + 1) for rango in range(len(palabras))]
+    return palabras, pesos
+
+def preparar_datos(ruta_bd, filas=1000000, semilla=0):
+    """Crea el corpus sintético; los triggers lo indexan a medida que se inserta."""
+    DatabaseManager(ruta_bd).cerrar_conexion()
+
+    rng = random.Random(semilla)
+    palabras, pesos = _vocabulario(rng)
+    def texto(n):
+        return " ".join(rng.choices(palabras, pesos, k=n))
+
+    num = {tabla: max(1, int(filas * proporcion)) for tabla, proporcion in PROPORCIONES.items()}
+    conn = sqlite3.connect(ruta_bd)
+    conn.executemany(
+        "INSERT INTO clientes (nombre, email, telefono) VALUES (?, ?, ?)",
+        ((f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}", f"cliente{i}@example.com",
+          f"6{rng.randint(0, 99):02d} {rng.randint(0, 999):03d} {rng.randint(0, 999):03d}")
+         for i in range(num["clientes"])))
+    conn.executemany(
+        "INSERT INTO proyectos (cliente_id, titulo, descripcion, fecha_inicio) VALUES (?, ?, ?, '2030-01-01')",
+        ((rng.randint(1, num["clientes"]), f"{rng.choice(TEMAS).capitalize()} {rng.choice(APELLIDOS)}", texto(12))
+         for _ in range(num["proyectos"])))
+    conn.executemany(
+        "INSERT INTO notas_proyecto (proyecto_id, fecha, texto) VALUES (?, '2030-01-01', ?)",
+        ((rng.randint(1, num["proyectos"]), texto(rng.randint(10, 40))) for _ in range(num["notas_proyecto"])))
+    conn.executemany(
+        "INSERT INTO documentos (nombre, tipo, tamano, fecha_subida, ruta_archivo, notas) "
+        "VALUES (?, 'pdf', 1024, '2030-01-01', '/tmp/documento.pdf', ?)",
+        ((f"{rng.choice(TEMAS)}_{rng.choice(APELLIDOS)}_{i}.pdf", texto(6)) for i in range(num["documentos"])))
+    conn.commit()
+    indexadas = conn.execute("SELECT COUNT(*) FROM busqueda").fetchone()[0]
+    conn.close()
+    return indexadas
+
+def medir_consulta(db, texto, repeticiones=5, pagina=0, limite=20):
+    """Mediana en ms de buscar() para la página indicada, y número de resultados obtenidos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultados, _ = db.buscar(texto, limite, pagina * limite)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), len(resultados)
+
+def ejecutar(filas=1000000, repeticiones=5, consultas=CONSULTAS):
+    """Prepara el corpus y mide cada consulta en la primera página y en la quinta."""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "botia.db")
+        inicio = time.perf_counter()
+        indexadas = preparar_datos(ruta, filas)
+        preparacion = time.perf_counter() - inicio
+
+        db = DatabaseManager(ruta)
+        try:
+            resultados = {}
+            for texto in consultas:
+                primera, encontrados = medir_consulta(db, texto, repeticiones)
+                quinta, _ = medir_consulta(db, texto, repeticiones, pagina=4)
+                coincidencias = db.conectar().execute(
+                    "SELECT COUNT(*) FROM busqueda WHERE busqueda MATCH ?",
+                    (" ".join(f'"{t}"*' for t in texto.split()),)).fetchone()[0]
+                resultados[texto] = {"primera_ms": primera, "quinta_ms": quinta,
+                                     "resultados": encontrados, "coincidencias": coincidencias}
+        finally:
+            db.cerrar_conexion()
+    return {"filas": indexadas, "preparacion_s": preparacion, "consultas": resultados}
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de la búsqueda de texto completo")
+    parser.add_argument("--filas", type=int, default=1000000, help="Filas indexadas del corpus sintético")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Ejecuciones por consulta")
+    parser.add_argument("--presupuesto-ms", type=float, default=50.0,
+                        help="Mediana máxima admitida para la primera página de cada consulta")
+    args = parser.parse_args()
+
+    r = ejecutar(args.filas, args.repeticiones)
+    print(f"{r['filas']} filas indexadas (creadas e indexadas en {r['preparacion_s']:.0f} s)\n")
+    print(f"{'Consulta':<22} {'Coincidencias':>14} {'1ª página (ms)':>15} {'5ª página (ms)':>15}")
+    for texto, c in r["consultas"].items():
+        print(f"{texto:<22} {c['coincidencias']:>14} {c['primera_ms']:>15.1f} {c['quinta_ms']:>15.1f}")
+
+    lentas = [texto for texto, c in r["consultas"].items() if c["primera_ms"] > args.presupuesto_ms]
+    if lentas:
+        print(f"\nSuperan el presupuesto de {args.presupuesto_ms:.0f} ms: {', '.join(lentas)}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark de la consulta de las consultas (citas) sin expediente.
+
+Sobre la base de datos sintética de bench_dashboard (por defecto 100.000 citas)
+compara dos criterios para decidir si una consulta ya tiene expediente:
+
+    tema    Criterio anterior: algún expediente del mismo cliente con el tema de
+            la cita en el título (LIKE) e iniciado después (DATE()), con el
+            índice de cobertura que tenía (cliente_id, fecha_inicio, titulo)
+    enlace  Anti-join por proyectos.cita_id (idx_proyectos_cita)
+
+y para cada uno mide contar las consultas pendientes (dashboard), obtener las 5
+más recientes (dashboard) y listarlas todas.
+
+Antes de medir 'enlace' los expedientes se enlazan con su consulta como en la
+migración que añadió proyectos.cita_id (también se mide cuánto tarda). Si un
+expediente encajaba con varias citas del mismo tema, solo queda enlazado con la
+más reciente, así que 'enlace' puede devolver algunas consultas más que 'tema'.
+
+Uso:
+    python -m benchmarks.bench_consultas_sin_expediente [--citas 100000] [--repeticiones 5]
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.bench_dashboard import preparar_datos
+from db_manager import DatabaseManager, _SQL_ENLAZAR_EXPEDIENTES, _CONDICION_CONSULTA_SIN_EXPEDIENTE
+
+_CONDICION_POR_TEMA = """
+    c.estado IN ('completada', 'confirmada') AND c.fecha < ?
+    AND NOT EXISTS (
+        SELECT 1 FROM proyectos p
+        WHERE p.cliente_id = c.cliente_id
+          AND p.titulo LIKE '%' || c.tema || '%'
+          AND DATE(p.fecha_inicio) >= DATE(c.fecha)
+    )
+"""
+
+CRITERIOS = {"tema": _CONDICION_POR_TEMA, "enlace": _CONDICION_CONSULTA_SIN_EXPEDIENTE}
+
+OPERACIONES = {
+    "contar": "SELECT COUNT(*) FROM citas c WHERE {condicion}",
+    "ultimas_5": """
+        SELECT c.id, c.tipo, c.fecha, c.hora, c.tema, c.estado, c.fecha_creacion,
+               cl.id, cl.nombre, cl.email, cl.telefono
+        FROM citas c JOIN clientes cl ON c.cliente_id = cl.id
+        WHERE {condicion} ORDER BY c.fecha DESC LIMIT 5""",
+    "listar": """
+        SELECT c.id, c.tipo, c.fecha, c.hora, c.tema, c.estado, c.fecha_creacion,
+               cl.id, cl.nombre, cl.email, cl.telefono
+        FROM citas c JOIN clientes cl ON c.cliente_id = cl.id
+        WHERE {condicion} ORDER BY c.fecha DESC""",
+}
+
+def medir_criterio(conn, criterio, repeticiones=5):
+    """
+    Ejecuta cada operación `repeticiones` veces con el criterio indicado.
+
+    Returns:
+        (diccionario operación -> mediana en ms, ids de las consultas pendientes)
+    """
+    hoy = datetime.date.today().isoformat()
+    medianas = {}
+    for operacion, consulta in OPERACIONES.items():
+        sql = consulta.format(condicion=CRITERIOS[criterio])
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            filas = conn.execute(sql, (hoy,)).fetchall()
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        medianas[operacion] = statistics.median(tiempos)
+    return medianas, {fila[0] for fila in filas}
+
+def ejecutar(citas=100000, repeticiones=5):
+    """Prepara los datos sin enlazar, mide el criterio por tema, enlaza y mide el anti-join."""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "botia.db")
+        preparar_datos(ruta, citas, enlazar=False)
+        db = DatabaseManager(ruta)
+        try:
+            conn = db.conectar()
+            conn.execute("CREATE INDEX idx_proyectos_cliente_inicio ON proyectos (cliente_id, fecha_inicio, titulo)")
+            tema, ids_tema = medir_criterio(conn, "tema", repeticiones)
+            conn.execute("DROP INDEX idx_proyectos_cliente_inicio")
+
+            inicio = time.perf_counter()
+            conn.execute(_SQL_ENLAZAR_EXPEDIENTES)
+            conn.commit()
+            enlace_ms = (time.perf_counter() - inicio) * 1000
+            enlazados = conn.execute("SELECT COUNT(*) FROM proyectos WHERE cita_id IS NOT NULL").fetchone()[0]
+
+            enlace, ids_enlace = medir_criterio(conn, "enlace", repeticiones)
+            conn.close()
+        finally:
+            db.cerrar_conexion()
+    return {
+        "citas": citas,
+        "enlace_inicial_ms": enlace_ms,
+        "expedientes_enlazados": enlazados,
+        "criterios": {
+            "tema": dict(tema, consultas=len(ids_tema)),
+            "enlace": dict(enlace, consultas=len(ids_enlace)),
+        },
+        "solo_en_enlace": len(ids_enlace - ids_tema),
+        "solo_en_tema": len(ids_tema - ids_enlace),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas sin expediente: criterio por tema frente a enlace explícito")
+    parser.add_argument("--citas", type=int, default=100000, help="Citas de la base de datos sintética")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Ejecuciones por operación")
+    args = parser.parse_args()
+
+    r = ejecutar(args.citas, args.repeticiones)
+    print(f"{r['citas']} citas; enlace inicial de {r['expedientes_enlazados']} expedientes en {r['enlace_inicial_ms']:.0f} ms\n")
+    print(f"{'Criterio':<8} " + " ".join(f"{op + ' (ms)':>16}" for op in OPERACIONES) + f" {'Pendientes':>11}")
+    for criterio, v in r["criterios"].items():
+        print(f"{criterio:<8} " + " ".join(f"{v[op]:>16.1f}" for op in OPERACIONES) + f" {v['consultas']:>11}")
+    print(f"\nSolo pendientes con el enlace: {r['solo_en_enlace']}; solo con el criterio por tema: {r['solo_en_tema']}")
+
+if __name__ == '__main__':
+    main()
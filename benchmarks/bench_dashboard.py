@@ -0,0 +1,184 @@
+"""
+Benchmark de latencia de los datos del dashboard del panel de administración.
+
+Crea una base de datos SQLite temporal con datos sintéticos (por defecto 100.000
+citas repartidas en dos años alrededor de hoy) y compara:
+
+    anterior   Enfoque anterior: todos los clientes, todas las consultas sin
+               expediente y todos los eventos de la semana, contados en Python
+    agregados  get_dashboard_stats() sin caché y consultas acotadas para las listas
+    cache      get_dashboard_stats() con su caché de pocos segundos
+
+Los contadores de las variantes deben coincidir (salvo consultas_pendientes: la
+variante anterior usa el criterio por tema anterior al enlace proyectos.cita_id);
+el benchmark lo comprueba y falla (código de salida 1) si la mediana de
+'agregados' supera el presupuesto.
+
+Uso:
+    python -m benchmarks.bench_dashboard [--citas 100000] [--presupuesto-ms 150]
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_manager import DatabaseManager, _SQL_ENLAZAR_EXPEDIENTES
+
+VARIANTES = ["anterior", "agregados", "cache"]
+ESTADOS_CITA = ["pendiente", "confirmada", "completada", "cancelada"]
+ESTADOS_PROYECTO = ["nuevo", "pendiente_documentacion", "en_proceso", "en_espera", "finalizado"]
+TEMAS = ["Divorcio", "Herencia", "Despido", "Contrato de alquiler", "Accidente de tráfico", "Reclamación de deuda"]
+
+def preparar_datos(ruta_bd, citas=100000, semilla=0, enlazar=True):
+    """
+    Crea la base de datos con clientes, citas, expedientes y eventos sintéticos.
+    Con enlazar, los expedientes se enlazan con su consulta como en la migración
+    que añadió proyectos.cita_id.
+    """
+    db = DatabaseManager(ruta_bd)
+    db.cerrar_conexion()
+
+    rng = random.Random(semilla)
+    hoy = datetime.date.today()
+    num_clientes = max(1, citas // 10)
+    num_proyectos = max(1, citas // 5)
+
+    def fecha_aleatoria():
+        return (hoy + datetime.timedelta(days=rng.randint(-365, 365))).isoformat()
+
+    conn = sqlite3.connect(ruta_bd)
+    conn.executemany(
+        "INSERT INTO clientes (nombre, email, telefono, fecha_registro) VALUES (?, ?, ?, ?)",
+        ((f"Cliente {i}", f"cliente{i}@example.com", f"6{i:08d}", fecha_aleatoria()) for i in range(num_clientes)))
+    conn.executemany(
+        "INSERT INTO citas (cliente_id, tipo, fecha, hora, tema, estado) VALUES (?, ?, ?, ?, ?, ?)",
+        ((rng.randint(1, num_clientes), rng.choice(["presencial", "videoconferencia", "telefonica"]),
+          fecha_aleatoria(), f"{rng.randint(9, 18):02d}:{rng.choice([0, 30]):02d}",
+          rng.choice(TEMAS), rng.choice(ESTADOS_CITA)) for _ in range(citas)))
+    conn.executemany(
+        "INSERT INTO proyectos (cliente_id, titulo, estado, abogado, fecha_inicio, ultima_actualizacion) "
+        "VALUES (?, ?, ?, 'Abogado', ?, ?)",
+        ((rng.randint(1, num_clientes), f"Expediente {rng.choice(TEMAS)}", rng.choice(ESTADOS_PROYECTO),
+          fecha, fecha) for fecha in (fecha_aleatoria() for _ in range(num_proyectos))))
+    conn.executemany(
+        "INSERT INTO eventos_proyecto (proyecto_id, fecha, titulo) VALUES (?, ?, 'Plazo')",
+        ((rng.randint(1, num_proyectos), fecha_aleatoria()) for _ in range(num_proyectos)))
+    if enlazar:
+        conn.execute(_SQL_ENLAZAR_EXPEDIENTES)
+    conn.commit()
+    conn.close()
+
+def consultas_sin_expediente_anterior(db):
+    """Consulta anterior (LEFT JOIN con GROUP BY ... HAVING) de las consultas sin expediente."""
+    conn = db.conectar()
+    filas = conn.execute("""
+    SELECT c.id, CASE WHEN COUNT(p.id) > 0 THEN 1 ELSE 0 END as tiene_expediente
+    FROM citas c
+    JOIN clientes cl ON c.cliente_id = cl.id
+    LEFT JOIN proyectos p ON (
+        p.cliente_id = cl.id AND
+        p.titulo LIKE '%' || c.tema || '%' AND
+        DATE(p.fecha_inicio) >= DATE(c.fecha)
+    )
+    WHERE (c.estado = 'completada' OR c.estado = 'confirmada') AND DATE(c.fecha) < ?
+    GROUP BY c.id
+    HAVING tiene_expediente = 0
+    ORDER BY c.fecha DESC
+    """, (datetime.date.today().isoformat(),)).fetchall()
+    conn.close()
+    return filas
+
+def _dashboard_anterior(db):
+    clientes = db.get_all_clientes()
+    consultas = consultas_sin_expediente_anterior(db)
+    hoy = datetime.date.today()
+    eventos = db.get_all_calendar_events(hoy.isoformat(), (hoy + datetime.timedelta(days=7)).isoformat())
+    sorted(clientes, key=lambda x: x.get('fecha_registro') or '', reverse=True)[:5]
+    sorted(eventos, key=lambda x: x['start'])[:10]
+    return {
+        'total_clientes': len(clientes),
+        'citas_proximas': sum(1 for e in eventos if e['type'] == 'appointment'),
+        'eventos_proximos': sum(1 for e in eventos if e['type'] == 'critical'),
+        'consultas_pendientes': len(consultas)
+    }
+
+def _dashboard_actual(db, usar_cache):
+    stats = db.get_dashboard_stats(usar_cache=usar_cache)
+    hoy = datetime.date.today()
+    db.get_all_calendar_events(hoy.isoformat(), (hoy + datetime.timedelta(days=7)).isoformat(), limite=10)
+    db.get_ultimos_clientes(5)
+    db.get_consultas_sin_expediante(limite=5)
+    return stats
+
+def medir_variante(variante, db, repeticiones=5):
+    """
+    Obtiene los datos del dashboard `repeticiones` veces con la variante indicada.
+
+    Returns:
+        (diccionario con la mediana y el máximo en ms, contadores)
+    """
+    tiempos = []
+    if variante == "cache":
+        db.get_dashboard_stats()  # La primera visita llena la caché
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        if variante == "anterior":
+            stats = _dashboard_anterior(db)
+        else:
+            stats = _dashboard_actual(db, usar_cache=variante == "cache")
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {"mediana_ms": statistics.median(tiempos), "max_ms": max(tiempos)}, stats
+
+def ejecutar(citas=100000, repeticiones=5, variantes=VARIANTES):
+    """Prepara los datos, mide las variantes y comprueba que coinciden sus contadores."""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "botia.db")
+        inicio = time.perf_counter()
+        preparar_datos(ruta, citas)
+        preparacion = time.perf_counter() - inicio
+
+        db = DatabaseManager(ruta)
+        try:
+            resultados = {}
+            referencia = None
+            for variante in variantes:
+                resultados[variante], stats = medir_variante(variante, db, repeticiones)
+                if referencia is None:
+                    referencia = stats
+                resultados[variante]["coincide"] = all(stats[k] == v for k, v in referencia.items()
+                                                       if k in stats and k != 'consultas_pendientes')
+            resultados_stats = stats
+        finally:
+            db.cerrar_conexion()
+    return {"citas": citas, "preparacion_s": preparacion, "stats": resultados_stats, "variantes": resultados}
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de los datos del dashboard del panel")
+    parser.add_argument("--citas", type=int, default=100000, help="Citas de la base de datos sintética")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Ejecuciones por variante")
+    parser.add_argument("--variantes", nargs="+", choices=VARIANTES, default=VARIANTES, help="Variantes a medir")
+    parser.add_argument("--presupuesto-ms", type=float, default=150.0,
+                        help="Mediana máxima admitida para la variante 'agregados'")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.citas, args.repeticiones, args.variantes)
+    print(f"{resultados['citas']} citas (datos creados en {resultados['preparacion_s']:.1f} s): {resultados['stats']}\n")
+    print(f"{'Variante':<11} {'Mediana (ms)':>13} {'Máximo (ms)':>12} {'Mismos contadores':>18}")
+    for variante, r in resultados["variantes"].items():
+        print(f"{variante:<11} {r['mediana_ms']:>13.1f} {r['max_ms']:>12.1f} {'sí' if r['coincide'] else 'NO':>18}")
+
+    agregados = resultados["variantes"].get("agregados")
+    if agregados and agregados["mediana_ms"] > args.presupuesto_ms:
+        print(f"\nLa variante 'agregados' supera el presupuesto de {args.presupuesto_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark de latencia del cálculo de disponibilidad de un mes.
+
+Usa el servidor local que imita Google Calendar
+(utils.servidor_calendario_falso) con una latencia fija por petición para
+simular la red, y una base de datos SQLite temporal con citas. Compara:
+
+    eventos_por_dia  Enfoque anterior: una consulta a BD y un events().list por día laborable
+    eventos_mes      Un events().list paginado para todo el mes
+    freebusy_mes     Una consulta FreeBusy para todo el mes (todos los calendarios)
+
+Todas las variantes deben devolver los mismos horarios; el benchmark lo comprueba.
+
+Uso:
+    python -m benchmarks.bench_disponibilidad [--latencia-ms 30] [--repeticiones 5]
+"""
+import argparse
+import calendar
+import datetime
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import config
+import handlers.calendar_service as calendar_service
+from utils import cache_disponibilidad
+from utils.servidor_calendario_falso import ServidorCalendarioFalso
+
+VARIANTES = ["eventos_por_dia", "eventos_mes", "freebusy_mes"]
+
+def _mes_siguiente():
+    hoy = datetime.date.today()
+    return (hoy.year + 1, 1) if hoy.month == 12 else (hoy.year, hoy.month + 1)
+
+def preparar_datos(servidor, anio, mes, ruta_bd, semilla=0):
+    """Crea citas en la base de datos y eventos en el calendario falso para el mes."""
+    from db_manager import DatabaseManager
+    DatabaseManager(ruta_bd)
+
+    rng = random.Random(semilla)
+    conn = sqlite3.connect(ruta_bd)
+    conn.execute("INSERT INTO clientes (nombre, email, telefono) VALUES ('Cliente', 'cliente@example.com', '600000000')")
+    _, num_dias = calendar.monthrange(anio, mes)
+    for dia in range(1, num_dias + 1):
+        fecha = datetime.date(anio, mes, dia)
+        if fecha.weekday() >= 5:
+            continue
+        for _ in range(rng.randint(1, 4)):
+            hora = f"{rng.choice([9, 10, 11, 12, 15, 16, 17, 18]):02d}:{rng.choice([0, 30]):02d}"
+            conn.execute("INSERT INTO citas (cliente_id, tipo, fecha, hora, tema) VALUES (1, ?, ?, ?, '')",
+                         (rng.choice(list(config.TIPOS_REUNION)), fecha.isoformat(), hora))
+        for _ in range(rng.randint(1, 4)):
+            inicio = datetime.datetime(anio, mes, dia, rng.randint(8, 18), rng.choice([0, 15, 30, 45]))
+            servidor.agregar_evento("primary", inicio, inicio + datetime.timedelta(minutes=rng.choice([30, 60, 90])))
+    conn.commit()
+    conn.close()
+
+def _disponibilidad_por_dia(anio, mes, tipo_reunion):
+    """Enfoque anterior: una llamada completa por cada día del mes."""
+    _, num_dias = calendar.monthrange(anio, mes)
+    resultado = {}
+    for dia in range(1, num_dias + 1):
+        fecha = datetime.datetime(anio, mes, dia)
+        resultado[fecha.strftime("%Y-%m-%d")] = calendar_service.obtener_horarios_disponibles(fecha, tipo_reunion)
+    return resultado
+
+def _disponibilidad_mes(anio, mes, tipo_reunion):
+    _, num_dias = calendar.monthrange(anio, mes)
+    return calendar_service.obtener_disponibilidad_rango(
+        datetime.datetime(anio, mes, 1), datetime.datetime(anio, mes, num_dias), tipo_reunion)
+
+def medir_variante(variante, servidor, anio, mes, tipo_reunion="presencial", repeticiones=5):
+    """
+    Calcula la disponibilidad del mes `repeticiones` veces con la variante indicada.
+
+    Returns:
+        (diccionario con la mediana en ms y las peticiones HTTP por ejecución, disponibilidad)
+    """
+    backend_original = config.BACKEND_DISPONIBILIDAD
+    config.BACKEND_DISPONIBILIDAD = "freebusy" if variante == "freebusy_mes" else "eventos"
+    calcular = _disponibilidad_por_dia if variante == "eventos_por_dia" else _disponibilidad_mes
+    try:
+        tiempos = []
+        for _ in range(repeticiones):
+            # Se mide el cálculo completo, sin la caché de disponibilidad
+            cache_disponibilidad.invalidar_todo()
+            peticiones_antes = len(servidor.peticiones)
+            inicio = time.perf_counter()
+            disponibilidad = calcular(anio, mes, tipo_reunion)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            peticiones = len(servidor.peticiones) - peticiones_antes
+    finally:
+        config.BACKEND_DISPONIBILIDAD = backend_original
+    return {"mediana_ms": statistics.median(tiempos), "peticiones_http": peticiones}, disponibilidad
+
+def ejecutar(latencia_ms=30.0, repeticiones=5, variantes=VARIANTES):
+    """Prepara los datos, mide las variantes y comprueba que coinciden sus resultados."""
+    anio, mes = _mes_siguiente()
+    directorio_original = os.getcwd()
+    get_service_original = calendar_service.get_google_calendar_service
+    with tempfile.TemporaryDirectory() as directorio, \
+            ServidorCalendarioFalso(latencia=latencia_ms / 1000) as servidor:
+        # DatabaseManager() usa botia.db en el directorio actual
+        os.chdir(directorio)
+        try:
+            preparar_datos(servidor, anio, mes, os.path.join(directorio, "botia.db"))
+            servicio = servidor.servicio()
+            calendar_service.get_google_calendar_service = lambda: servicio
+
+            resultados = {}
+            referencia = None
+            for variante in variantes:
+                resultados[variante], disponibilidad = medir_variante(variante, servidor, anio, mes,
+                                                                      repeticiones=repeticiones)
+                if referencia is None:
+                    referencia = disponibilidad
+                resultados[variante]["coincide"] = disponibilidad == referencia
+        finally:
+            calendar_service.get_google_calendar_service = get_service_original
+            os.chdir(directorio_original)
+    return {"mes": f"{anio}-{mes:02d}", "latencia_ms": latencia_ms, "variantes": resultados}
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia del cálculo de disponibilidad de un mes")
+    parser.add_argument("--latencia-ms", type=float, default=30.0, help="Latencia simulada por petición HTTP")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Ejecuciones por variante")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.latencia_ms, args.repeticiones)
+    print(f"Mes {resultados['mes']}, latencia simulada {resultados['latencia_ms']:.0f} ms por petición\n")
+    print(f"{'Variante':<16} {'Mediana (ms)':>13} {'Peticiones':>11} {'Mismo resultado':>16}")
+    for variante, r in resultados["variantes"].items():
+        print(f"{variante:<16} {r['mediana_ms']:>13.1f} {r['peticiones_http']:>11} {'sí' if r['coincide'] else 'NO':>16}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Benchmark y pruebas de regresión de la identificación de intenciones.
+
+Clasifica un corpus etiquetado en español (los ejemplos de config.INTENCIONES
+más las paráfrasis de parafrasis_intenciones.json) con cada variante del
+clasificador y muestra latencia p50/p95/p99, mensajes por segundo, exactitud y
+matriz de confusión.
+
+La exactitud se calcula por separado para los mensajes de entrenamiento (los
+ejemplos de INTENCIONES y FRASES_INTENCIONES, con los que se entrena el
+clasificador rápido y se calculan los vectores de spaCy) y para las paráfrasis
+no vistas. La exactitud de referencia, la de la matriz de confusión y la que se
+compara con la línea base es la de las paráfrasis no vistas.
+
+Variantes:
+    spacy          Solo reglas directas y similitud con spaCy (sin clasificador rápido ni caché)
+    cascada        Reglas, clasificador rápido y spaCy, sin caché
+    cascada_cache  Configuración de producción: cascada con la caché de intenciones
+    rapido         Solo el clasificador rápido, sin umbral
+
+Uso:
+    python -m benchmarks.bench_intenciones [--variantes spacy cascada] [--repeticiones 5]
+    python -m benchmarks.bench_intenciones --guardar benchmarks/linea_base_intenciones.json
+    python -m benchmarks.bench_intenciones --comparar benchmarks/linea_base_intenciones.json
+
+En modo comparación el proceso termina con código 1 si alguna variante empeora
+su latencia o su exactitud más allá de la tolerancia guardada en la línea base
+(o la indicada con --tolerancia-latencia / --tolerancia-exactitud).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import config
+import models.intent_model as intent_model
+from benchmarks.bench_modo_nlp import percentil
+
+RUTA_PARAFRASIS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parafrasis_intenciones.json")
+
+# Tolerancias por defecto al comparar con una línea base: aumento relativo de la
+# latencia (0.25 = 25 %), con un margen absoluto para latencias muy pequeñas, y
+# pérdida absoluta de exactitud (0.02 = 2 puntos)
+TOLERANCIA_LATENCIA = 0.25
+MARGEN_LATENCIA_MS = 0.05
+TOLERANCIA_EXACTITUD = 0.02
+
+VARIANTES = ["spacy", "cascada", "cascada_cache", "rapido"]
+
+def cargar_corpus(ruta_parafrasis=RUTA_PARAFRASIS):
+    """
+    Devuelve la lista de tuplas (texto, intención esperada, visto) del corpus,
+    donde visto indica si el texto forma parte de los datos de entrenamiento.
+    """
+    corpus = [(ejemplo, intencion, True) for intencion, ejemplos in config.INTENCIONES.items() for ejemplo in ejemplos]
+    entrenamiento = {texto.lower().strip() for texto, _, _ in corpus}
+    entrenamiento.update(frase.lower().strip() for frase in config.FRASES_INTENCIONES)
+    with open(ruta_parafrasis, encoding="utf-8") as f:
+        parafrasis = json.load(f)
+    corpus += [(texto, intencion, texto.lower().strip() in entrenamiento)
+               for intencion, textos in parafrasis.items() for texto in textos]
+    return corpus
+
+def _clasificador(variante):
+    """Devuelve (función que clasifica un texto, si se vacía la caché antes de cada mensaje)."""
+    if variante == "rapido":
+        clasificador = intent_model.registro_modelos.get_clasificador_rapido()
+        if clasificador is None:
+            raise RuntimeError("scikit-learn no está instalado: la variante 'rapido' no está disponible")
+        return (lambda texto: clasificador.predecir(texto.lower().strip(), 0.0)), False
+    if variante not in VARIANTES:
+        raise ValueError(f"Variante desconocida: '{variante}'")
+    config.CLASIFICADOR_RAPIDO_ACTIVO = variante != "spacy"
+    return intent_model.identificar_intencion, variante != "cascada_cache"
+
+def medir_variante(variante, corpus, repeticiones=5):
+    """
+    Clasifica el corpus `repeticiones` veces con la variante indicada.
+
+    Returns:
+        Diccionario con latencias (ms), mensajes por segundo, exactitud (paráfrasis
+        no vistas), exactitud de entrenamiento y matriz de confusión (no vistas)
+    """
+    activo_original = config.CLASIFICADOR_RAPIDO_ACTIVO
+    try:
+        clasificar, sin_cache = _clasificador(variante)
+        intent_model.limpiar_cache_intenciones()
+
+        latencias = []
+        predicciones = []
+        for repeticion in range(repeticiones):
+            for texto, _, _ in corpus:
+                if sin_cache:
+                    intent_model.limpiar_cache_intenciones()
+                inicio = time.perf_counter()
+                prediccion = clasificar(texto)
+                latencias.append(time.perf_counter() - inicio)
+                if repeticion == 0:
+                    predicciones.append(prediccion or "desconocido")
+    finally:
+        config.CLASIFICADOR_RAPIDO_ACTIVO = activo_original
+        intent_model.limpiar_cache_intenciones()
+
+    confusion = {}
+    aciertos = {True: 0, False: 0}
+    mensajes = {True: 0, False: 0}
+    for (_, esperada, visto), prediccion in zip(corpus, predicciones):
+        aciertos[visto] += prediccion == esperada
+        mensajes[visto] += 1
+        if not visto:
+            fila = confusion.setdefault(esperada, {})
+            fila[prediccion] = fila.get(prediccion, 0) + 1
+
+    latencias_ms = [latencia * 1000 for latencia in latencias]
+    return {
+        "mensajes": len(latencias),
+        "p50_ms": percentil(latencias_ms, 50),
+        "p95_ms": percentil(latencias_ms, 95),
+        "p99_ms": percentil(latencias_ms, 99),
+        "media_ms": sum(latencias_ms) / len(latencias_ms),
+        "mensajes_por_segundo": len(latencias) / sum(latencias) if sum(latencias) else 0.0,
+        "exactitud": aciertos[False] / mensajes[False] if mensajes[False] else 0.0,
+        "exactitud_entrenamiento": aciertos[True] / mensajes[True] if mensajes[True] else 0.0,
+        "matriz_confusion": confusion
+    }
+
+def ejecutar(variantes, repeticiones=5, ruta_parafrasis=RUTA_PARAFRASIS):
+    """Carga los modelos y mide todas las variantes; devuelve el informe completo."""
+    corpus = cargar_corpus(ruta_parafrasis)
+    info = intent_model.warmup()
+    return {
+        "modelo_spacy": info["modelo_spacy"],
+        "modo": info["modo"],
+        "corpus": len(corpus),
+        "corpus_no_visto": sum(not visto for _, _, visto in corpus),
+        "repeticiones": repeticiones,
+        "variantes": {variante: medir_variante(variante, corpus, repeticiones) for variante in variantes}
+    }
+
+def comparar(resultados, linea_base, tolerancia_latencia=None, tolerancia_exactitud=None):
+    """
+    Compara los resultados con una línea base guardada.
+
+    Args:
+        resultados: Informe devuelto por ejecutar()
+        linea_base: Informe guardado previamente (puede incluir "tolerancias")
+        tolerancia_latencia: Aumento relativo máximo de p50/p95 (None = el de la línea base)
+        tolerancia_exactitud: Pérdida absoluta máxima de exactitud en las paráfrasis
+            no vistas (None = la de la línea base)
+
+    Returns:
+        Lista de regresiones encontradas (vacía si no hay ninguna)
+    """
+    tolerancias = linea_base.get("tolerancias", {})
+    if tolerancia_latencia is None:
+        tolerancia_latencia = tolerancias.get("latencia", TOLERANCIA_LATENCIA)
+    if tolerancia_exactitud is None:
+        tolerancia_exactitud = tolerancias.get("exactitud", TOLERANCIA_EXACTITUD)
+    margen_ms = tolerancias.get("margen_latencia_ms", MARGEN_LATENCIA_MS)
+
+    regresiones = []
+    for variante, actual in resultados["variantes"].items():
+        base = linea_base.get("variantes", {}).get(variante)
+        if base is None:
+            continue
+        for metrica in ["p50_ms", "p95_ms"]:
+            limite = base[metrica] * (1 + tolerancia_latencia) + margen_ms
+            if actual[metrica] > limite:
+                regresiones.append(f"{variante}: {metrica} {actual[metrica]:.3f} ms > {limite:.3f} ms "
+                                   f"(línea base {base[metrica]:.3f} ms)")
+        if actual["exactitud"] < base["exactitud"] - tolerancia_exactitud:
+            regresiones.append(f"{variante}: exactitud {actual['exactitud']:.3f} < "
+                               f"{base['exactitud'] - tolerancia_exactitud:.3f} (línea base {base['exactitud']:.3f})")
+    return regresiones
+
+def imprimir_informe(resultados):
+    """Muestra la tabla de latencias y exactitud y los errores de la matriz de confusión."""
+    print(f"Modelo: {resultados['modelo_spacy']} ({resultados['modo']}) - corpus de {resultados['corpus']} mensajes "
+          f"({resultados['corpus_no_visto']} no vistos en el entrenamiento), {resultados['repeticiones']} repeticiones\n")
+    print(f"{'Variante':<14} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'Mensajes/s':>11} "
+          f"{'Exact. no vistos':>17} {'Exact. entren.':>15}")
+    for variante, r in resultados["variantes"].items():
+        print(f"{variante:<14} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} "
+              f"{r['mensajes_por_segundo']:>11.0f} {r['exactitud']:>17.3f} {r['exactitud_entrenamiento']:>15.3f}")
+
+    for variante, r in resultados["variantes"].items():
+        print(f"\nConfusiones de '{variante}' en mensajes no vistos (esperada -> obtenida: mensajes):")
+        errores = [(esperada, obtenida, n) for esperada, fila in sorted(r["matriz_confusion"].items())
+                   for obtenida, n in sorted(fila.items()) if obtenida != esperada]
+        if not errores:
+            print("  ninguna")
+        for esperada, obtenida, n in errores:
+            print(f"  {esperada} -> {obtenida}: {n}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de latencia y exactitud de la identificación de intenciones")
+    parser.add_argument("--variantes", nargs="+", choices=VARIANTES, default=VARIANTES, help="Variantes a medir")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Veces que se clasifica el corpus")
+    parser.add_argument("--guardar", help="Guarda los resultados como línea base en este fichero JSON")
+    parser.add_argument("--comparar", help="Compara con la línea base de este fichero JSON y falla si hay regresiones")
+    parser.add_argument("--tolerancia-latencia", type=float, default=None,
+                        help=f"Aumento relativo máximo de latencia (por defecto {TOLERANCIA_LATENCIA})")
+    parser.add_argument("--tolerancia-exactitud", type=float, default=None,
+                        help=f"Pérdida absoluta máxima de exactitud en mensajes no vistos (por defecto {TOLERANCIA_EXACTITUD})")
+    args = parser.parse_args()
+
+    resultados = ejecutar(args.variantes, args.repeticiones)
+    imprimir_informe(resultados)
+
+    if args.guardar:
+        resultados["tolerancias"] = {
+            "latencia": TOLERANCIA_LATENCIA if args.tolerancia_latencia is None else args.tolerancia_latencia,
+            "exactitud": TOLERANCIA_EXACTITUD if args.tolerancia_exactitud is None else args.tolerancia_exactitud,
+            "margen_latencia_ms": MARGEN_LATENCIA_MS
+        }
+        with open(args.guardar, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2)
+        print(f"\nLínea base guardada en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            linea_base = json.load(f)
+        regresiones = comparar(resultados, linea_base, args.tolerancia_latencia, args.tolerancia_exactitud)
+        if regresiones:
+            print("\nREGRESIONES respecto a la línea base:")
+            for regresion in regresiones:
+                print(f"  {regresion}")
+            sys.exit(1)
+        print("\nSin regresiones respecto a la línea base")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark del modo de carga de spaCy para la identificación de intenciones.
+
+Compara el pipeline completo ("completo") con el modo solo vectores ("vectores")
+midiendo la latencia por mensaje de identificar_intencion y la memoria residente
+del proceso. Cada modo se ejecuta en un subproceso propio para que la memoria
+de uno no contamine la medida del otro. Durante la medida se desactiva el
+clasificador rápido y se vacía la caché de intenciones antes de cada mensaje,
+para que la latencia sea la del cálculo con spaCy.
+
+Uso:
+    python -m benchmarks.bench_modo_nlp [--modelo es_core_news_md] [--repeticiones 20]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(RAIZ)
+
+# Mensajes que no coinciden exactamente con ningún ejemplo, para que todos
+# pasen por el cálculo de similitud con spaCy
+MENSAJES = [
+    "quiero una cita", "necesito agendar una visita", "quisiera programar una reunión",
+    "reservar un horario para consulta", "quiero que sea en persona", "prefiero una videoconferencia",
+    "cuanto antes mejor", "para la semana próxima", "sí, confirmo", "no, quiero otra fecha",
+    "cómo va mi caso", "quiero verificar el estado de mi expediente", "buenas tardes a todos",
+    "hola, ¿cómo estás?", "me gustaría una llamada por teléfono", "qué precios tienen",
+    "puedo ir a la oficina el lunes", "mejor por video", "tengo un problema con mi contrato",
+    "xyz abc 123"
+]
+
+def memoria_residente_mb():
+    """Devuelve la memoria residente actual del proceso en MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentil(valores, p):
+    """Percentil p (0-100) de una lista de valores por el método del vecino más cercano."""
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados) + 0.5)) - 1))
+    return ordenados[indice]
+
+def medir_modo(modo, modelo, repeticiones):
+    """Carga el modelo en el modo indicado y mide latencia y memoria en este proceso."""
+    import config
+    import models.intent_model as intent_model
+    
+    if modelo:
+        intent_model.MODELO_SPACY = modelo
+        intent_model.MODELOS_SPACY_ALTERNATIVOS = []
+    intent_model.registro_modelos = intent_model.RegistroModelos(modo=modo)
+    
+    memoria_inicial = memoria_residente_mb()
+    inicio = time.perf_counter()
+    intent_model.get_nlp()
+    intent_model.obtener_indice_intenciones()
+    tiempo_carga = time.perf_counter() - inicio
+    
+    # Sin clasificador rápido ni caché, cada mensaje llega a spaCy en todas las repeticiones
+    activo_original = config.CLASIFICADOR_RAPIDO_ACTIVO
+    config.CLASIFICADOR_RAPIDO_ACTIVO = False
+    latencias = []
+    try:
+        for _ in range(repeticiones):
+            for mensaje in MENSAJES:
+                intent_model.limpiar_cache_intenciones()
+                t0 = time.perf_counter()
+                intent_model.identificar_intencion(mensaje)
+                latencias.append((time.perf_counter() - t0) * 1000)
+    finally:
+        config.CLASIFICADOR_RAPIDO_ACTIVO = activo_original
+        intent_model.limpiar_cache_intenciones()
+    
+    return {
+        "modo": modo,
+        "modelo": intent_model.registro_modelos.modelo_cargado,
+        "componentes": intent_model.get_nlp().pipe_names,
+        "carga_s": tiempo_carga,
+        "latencia_media_ms": sum(latencias) / len(latencias),
+        "latencia_p50_ms": percentil(latencias, 50),
+        "latencia_p95_ms": percentil(latencias, 95),
+        "memoria_modelo_mb": memoria_residente_mb() - memoria_inicial,
+        "memoria_total_mb": memoria_residente_mb()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara los modos de carga de spaCy")
+    parser.add_argument("--modelo", default=None, help="Nombre o ruta del modelo spaCy (por defecto el configurado)")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Veces que se clasifica cada mensaje")
+    parser.add_argument("--modo", choices=["vectores", "completo"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.modo:
+        # Ejecución en subproceso: medir un único modo y devolver JSON
+        print(json.dumps(medir_modo(args.modo, args.modelo, args.repeticiones)))
+        return
+    
+    resultados = []
+    for modo in ["completo", "vectores"]:
+        comando = [sys.executable, "-m", "benchmarks.bench_modo_nlp", "--modo", modo,
+                   "--repeticiones", str(args.repeticiones)]
+        if args.modelo:
+            comando += ["--modelo", args.modelo]
+        salida = subprocess.run(comando, cwd=RAIZ, capture_output=True, text=True, check=True).stdout
+        resultados.append(json.loads(salida.strip().splitlines()[-1]))
+    
+    print(f"Modelo: {resultados[0]['modelo']} - {len(MENSAJES) * args.repeticiones} mensajes por modo\n")
+    print(f"{'Modo':<10} {'Carga (s)':>10} {'Media (ms)':>11} {'p50 (ms)':>9} {'p95 (ms)':>9} {'RSS modelo (MB)':>16} {'RSS total (MB)':>15}")
+    for r in resultados:
+        print(f"{r['modo']:<10} {r['carga_s']:>10.2f} {r['latencia_media_ms']:>11.3f} {r['latencia_p50_ms']:>9.3f} "
+              f"{r['latencia_p95_ms']:>9.3f} {r['memoria_modelo_mb']:>16.1f} {r['memoria_total_mb']:>15.1f}")
+    for r in resultados:
+        print(f"  {r['modo']}: componentes {r['componentes']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Microbenchmark de la detección de palabras clave.
+
+Compara, para cada punto del bot que busca expresiones dentro del mensaje, los
+bucles `any(palabra in texto for palabra in lista)` originales con una única
+pasada del autómata compilado (utils.palabras_clave.AutomataPalabras). Se miden
+mensajes cortos típicos del chat y mensajes largos, donde el coste de recorrer
+el texto una vez por patrón es mayor.
+
+Uso:
+    python -m benchmarks.bench_palabras_clave [--repeticiones 2000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import PALABRAS_DESPEDIDA, PALABRAS_DESPEDIDA_CONVERSACION
+from models.intent_model import PALABRAS_CLAVES, AUTOMATA_INTENCIONES
+from models.data_extraction import PATRONES_TIPO_REUNION, AUTOMATA_TIPO_REUNION
+from handlers.conversation import AUTOMATA_DESPEDIDA
+from benchmarks.bench_modo_nlp import MENSAJES
+
+MENSAJES_LARGOS = [
+    " ".join(MENSAJES[i:i + 8]) * 3 for i in range(0, len(MENSAJES), 8)
+]
+
+def bucles_intenciones(texto):
+    """Búsquedas que hacía identificar_intencion con un bucle por lista."""
+    encontrados = [intencion for intencion, palabras in PALABRAS_CLAVES.items()
+                   if any(palabra in texto for palabra in palabras)]
+    return (any(palabra in texto for palabra in PALABRAS_DESPEDIDA),
+            encontrados,
+            "necesito agendar" in texto or "quiero agendar" in texto,
+            "buenas tardes" in texto or "buenos días" in texto or "buenas noches" in texto,
+            any(palabra in texto for palabra in ["presencial", "persona", "cara", "video", "telefonica"]),
+            "para la semana próxima" in texto or "para la próxima semana" in texto)
+
+def bucles_despedida(texto):
+    """Búsqueda de despedidas que hacía generar_respuesta."""
+    return any(palabra in texto for palabra in PALABRAS_DESPEDIDA_CONVERSACION), "cambiar" in texto
+
+def bucles_tipo_reunion(texto):
+    """Búsquedas que hacía identificar_tipo_reunion."""
+    for patrones in PATRONES_TIPO_REUNION.values():
+        for patron in patrones:
+            if patron in texto:
+                return patron
+    return ("por teléfono" in texto or "por telefono" in texto or "teléfono mejor" in texto
+            or "telefono mejor" in texto or " no " in " " + texto + " " or "pero no" in texto)
+
+CASOS = [
+    ("intenciones", bucles_intenciones, AUTOMATA_INTENCIONES),
+    ("despedida", bucles_despedida, AUTOMATA_DESPEDIDA),
+    ("tipo_reunion", bucles_tipo_reunion, AUTOMATA_TIPO_REUNION)
+]
+
+def medir(funcion, mensajes, repeticiones):
+    """Microsegundos por mensaje de aplicar la función a todos los mensajes."""
+    textos = [mensaje.lower() for mensaje in mensajes]
+    total = min(timeit.repeat(lambda: [funcion(texto) for texto in textos], number=repeticiones, repeat=3))
+    return total / (repeticiones * len(textos)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara bucles de subcadenas con el autómata de palabras clave")
+    parser.add_argument("--repeticiones", type=int, default=2000, help="Veces que se procesa cada lote de mensajes")
+    args = parser.parse_args()
+
+    print(f"{'Búsqueda':<14} {'Mensajes':<8} {'Patrones':>8} {'Bucles (µs)':>12} {'Autómata (µs)':>14} {'Aceleración':>12}")
+    for nombre, bucles, automata in CASOS:
+        patrones = sum(len(lista) for lista in automata.grupos.values())
+        for etiqueta, mensajes in [("cortos", MENSAJES), ("largos", MENSAJES_LARGOS)]:
+            repeticiones = args.repeticiones if etiqueta == "cortos" else max(1, args.repeticiones // 10)
+            t_bucles = medir(bucles, mensajes, repeticiones)
+            t_automata = medir(automata.buscar, mensajes, repeticiones)
+            print(f"{nombre:<14} {etiqueta:<8} {patrones:>8} {t_bucles:>12.2f} {t_automata:>14.2f} {t_bucles / t_automata:>11.2f}x")
+
+if __name__ == '__main__':
+    main()
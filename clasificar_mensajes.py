@@ -0,0 +1,100 @@
+# clasificar_mensajes.py - Clasificación de intenciones en lote desde la línea de comandos
+"""
+Lee mensajes en formato JSONL y escribe el mismo JSONL con la intención identificada.
+
+Cada línea de entrada puede ser un objeto JSON con el texto en el campo indicado
+(por defecto "mensaje", como en /api/bot) o directamente una cadena JSON.
+Cada línea de salida es el objeto de entrada con el campo "intencion" añadido.
+
+Uso:
+    python clasificar_mensajes.py --entrada mensajes.jsonl --salida etiquetados.jsonl
+    cat mensajes.jsonl | python clasificar_mensajes.py --batch-size 512 --n-process 4
+"""
+import argparse
+import json
+import logging
+import sys
+
+from models.intent_model import identificar_intenciones
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+def _leer_bloques(entrada, campo, tamano_bloque):
+    """Agrupa las líneas válidas de la entrada en bloques de (registro, texto)."""
+    bloque = []
+    for numero_linea, linea in enumerate(entrada, 1):
+        linea = linea.strip()
+        if not linea:
+            continue
+        try:
+            registro = json.loads(linea)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Línea {numero_linea} ignorada: JSON no válido ({str(e)})")
+            continue
+        
+        if isinstance(registro, str):
+            registro = {campo: registro}
+        if not isinstance(registro, dict) or not isinstance(registro.get(campo), str):
+            logger.warning(f"Línea {numero_linea} ignorada: falta el campo de texto '{campo}'")
+            continue
+        
+        bloque.append((registro, registro[campo]))
+        if len(bloque) >= tamano_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+def clasificar_jsonl(entrada, salida, campo="mensaje", batch_size=256, n_process=1, tamano_bloque=10000):
+    """
+    Clasifica los mensajes de un fichero JSONL y escribe el resultado etiquetado.
+    Procesa la entrada por bloques para no cargar todo el fichero en memoria.
+    
+    Args:
+        entrada: Fichero de texto abierto con una línea JSON por mensaje
+        salida: Fichero de texto abierto donde escribir el JSONL etiquetado
+        campo: Nombre del campo con el texto del mensaje
+        batch_size: Tamaño de lote para nlp.pipe
+        n_process: Número de procesos para nlp.pipe
+        tamano_bloque: Número de líneas que se leen antes de clasificar
+        
+    Returns:
+        Número de mensajes clasificados
+    """
+    total = 0
+    for bloque in _leer_bloques(entrada, campo, tamano_bloque):
+        intenciones = identificar_intenciones([texto for _, texto in bloque],
+                                              batch_size=batch_size, n_process=n_process)
+        for (registro, _), intencion in zip(bloque, intenciones):
+            registro["intencion"] = intencion
+            salida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        total += len(bloque)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Clasifica intenciones de mensajes en formato JSONL")
+    parser.add_argument("--entrada", help="Fichero JSONL de entrada (por defecto, entrada estándar)")
+    parser.add_argument("--salida", help="Fichero JSONL de salida (por defecto, salida estándar)")
+    parser.add_argument("--campo", default="mensaje", help="Campo con el texto del mensaje (por defecto: mensaje)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Tamaño de lote para spaCy")
+    parser.add_argument("--n-process", type=int, default=1, help="Número de procesos para spaCy")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    entrada = open(args.entrada, encoding="utf-8") if args.entrada else sys.stdin
+    salida = open(args.salida, "w", encoding="utf-8") if args.salida else sys.stdout
+    try:
+        total = clasificar_jsonl(entrada, salida, campo=args.campo,
+                                 batch_size=args.batch_size, n_process=args.n_process)
+    finally:
+        if args.entrada:
+            entrada.close()
+        if args.salida:
+            salida.close()
+    
+    logger.info(f"{total} mensajes clasificados")
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,54 @@ TIPOS_REUNION = {
     "telefonica": {"duracion_real": 15, "duracion_cliente": 10}
 }
 
+# Origen de la ocupación de Google Calendar al calcular la disponibilidad:
+# - "freebusy": consulta FreeBusy, solo intervalos ocupados de todos los
+#   calendarios de CALENDARIOS_DISPONIBILIDAD en una única petición
+# - "eventos": events().list con los eventos completos del calendario principal
+BACKEND_DISPONIBILIDAD = "freebusy"
+
+# Calendarios (por ejemplo, uno por abogado) cuya ocupación bloquea horarios con
+# el backend "freebusy"
+CALENDARIOS_DISPONIBILIDAD = ["primary"]
+
+# Zona horaria en la que se interpretan las horas de Google Calendar
+ZONA_HORARIA_CALENDARIO = "Europe/Madrid"
+
+# Modo de carga del modelo spaCy para identificar intenciones:
+# - "vectores": solo tokenizador y vectores de palabras (sin tagger, parser, NER
+#   ni lematizador), suficiente para Doc.similarity y mucho más rápido
+# - "completo": pipeline completo del modelo
+NLP_MODO = "vectores"
+
+# Número máximo de mensajes normalizados cuya intención se guarda en caché
+CACHE_INTENCIONES_TAMANO = 2048
+
+# Caché de horarios disponibles por (día, tipo de reunión). Las citas creadas,
+# modificadas o borradas desde este proceso invalidan su día al momento; el TTL
+# (segundos) acota cuánto tarda en verse un cambio hecho en Google Calendar o
+# desde otro worker
+CACHE_DISPONIBILIDAD_TAMANO = 512
+CACHE_DISPONIBILIDAD_TTL = 120
+
+# Conexiones SQLite de DatabaseManager (una por hilo y fichero, reutilizada):
+# segundos que se espera a que otra conexión libere la base de datos antes de
+# fallar con "database is locked" y sentencias preparadas que guarda cada conexión
+DB_TIMEOUT_OCUPADA = 5.0
+DB_CACHE_SENTENCIAS = 256
+
+# Días (desde hoy) en los que se busca la próxima fecha disponible ("lo antes posible")
+DIAS_BUSQUEDA_DISPONIBILIDAD = 14
+
+# Segundos durante los que se reutilizan los contadores del dashboard del panel
+# (DatabaseManager.get_dashboard_stats); 0 para calcularlos en cada visita
+CACHE_DASHBOARD_TTL = 30
+
+# Clasificador rápido de intenciones (TF-IDF de n-gramas de caracteres y regresión
+# logística, entrenado con FRASES_INTENCIONES y los ejemplos de INTENCIONES). Si la
+# probabilidad de su mejor intención alcanza el umbral, responde sin pasar por spaCy
+CLASIFICADOR_RAPIDO_ACTIVO = True
+UMBRAL_CLASIFICADOR_RAPIDO = 0.8
+
 # Definir intenciones y sus ejemplos
 INTENCIONES = {
     "saludo": ["hola", "buenos días", "buenas tardes", "buenas noches", "saludos", "qué tal"],
@@ -90,6 +138,14 @@ ETIQUETAS_INTENCIONES = [
     "negacion", "negacion", "negacion", "negacion", "negacion", "negacion"
 ]
 
+# Expresiones que indican que el usuario quiere terminar la conversación
+PALABRAS_DESPEDIDA = ["no gracias", "adiós", "adios", "hasta luego", "terminar",
+                      "finalizar", "cerrar", "no quiero", "no deseo", "eso es todo"]
+
+# Dentro del flujo de conversación también se consideran despedida estas expresiones
+PALABRAS_DESPEDIDA_CONVERSACION = PALABRAS_DESPEDIDA + ["nada más", "no necesito", "gracias",
+                                                        "ya está", "ya terminé"]
+
 # Información de email
 EMAIL_CONFIG = {
     "smtp_server": "smtp.example.com",
@@ -2,20 +2,314 @@
 
 import sqlite3
 import os
+import re
 import json
 import datetime
+import threading
+
+import config
+from utils import cache_disponibilidad
+from utils.cache import CacheLRU
+
+# Enlaza los expedientes sin cita_id con la consulta de la que probablemente se
+# crearon, con el criterio que se usaba antes de guardar el enlace: la cita más
+# reciente del mismo cliente, anterior al expediente y con su tema en el título
+_SQL_ENLAZAR_EXPEDIENTES = """
+UPDATE proyectos SET cita_id = (
+    SELECT c.id FROM citas c
+    WHERE c.cliente_id = proyectos.cliente_id
+      AND c.estado IN ('completada', 'confirmada')
+      AND c.tema IS NOT NULL AND c.tema != ''
+      AND proyectos.titulo LIKE '%' || c.tema || '%'
+      AND DATE(proyectos.fecha_inicio) >= DATE(c.fecha)
+    ORDER BY c.fecha DESC, c.hora DESC, c.id DESC
+    LIMIT 1
+)
+WHERE cita_id IS NULL
+"""
+
+# Índice de búsqueda de texto completo (tabla FTS5 "busqueda"). Cada fila de las
+# tablas indexadas tiene en el índice el rowid id * 4 + código, lo que permite a
+# los triggers actualizarla sin recorrer el índice. Por tabla:
+# (tabla, código, tipo, id enlazado, título, contenido, columnas que lo cambian).
+# Para las notas el id enlazado es el expediente, y su título se toma de él al buscar.
+# El teléfono se indexa también sin espacios, para encontrarlo se escriba como se escriba.
+TABLAS_BUSQUEDA = [
+    ('clientes', 0, 'cliente', '{f}.id', '{f}.nombre',
+     "COALESCE({f}.email, '') || ' ' || COALESCE({f}.telefono, '') || ' ' || REPLACE(COALESCE({f}.telefono, ''), ' ', '')",
+     'nombre, email, telefono'),
+    ('proyectos', 1, 'proyecto', '{f}.id', '{f}.titulo', '{f}.descripcion', 'titulo, descripcion'),
+    ('notas_proyecto', 2, 'nota', '{f}.proyecto_id', 'NULL', '{f}.texto', 'proyecto_id, texto'),
+    ('documentos', 3, 'documento', '{f}.id', '{f}.nombre', '{f}.notas', 'nombre, notas'),
+]
+TIPOS_BUSQUEDA = tuple(t[2] for t in TABLAS_BUSQUEDA)
+
+# Marcas con las que se delimitan los términos encontrados en los fragmentos
+MARCA_INICIO = '\x02'
+MARCA_FIN = '\x03'
+
+# Coincidencias más recientes (por rowid) que se ordenan por relevancia. Ordenar
+# todas las de una palabra frecuente cuesta cientos de ms con un millón de filas;
+# limitándolas, la búsqueda pagina como mucho hasta este número de resultados.
+MAX_CANDIDATOS_BUSQUEDA = 2000
+
+def _sentencias_indice_busqueda():
+    """Sentencias que crean el índice de búsqueda, sus triggers y lo llenan."""
+    # Se rehace desde cero si ya existía, para poder repetir la migración
+    sentencias = ["DROP TABLE IF EXISTS busqueda"] + [
+        f"DROP TRIGGER IF EXISTS busqueda_{t[0]}_{sufijo}" for t in TABLAS_BUSQUEDA for sufijo in ('ai', 'au', 'ad')
+    ] + [
+        # remove_diacritics: "garcia" encuentra "García"; prefix: índices para
+        # las búsquedas por prefijo de 2 y 3 letras
+        """
+        CREATE VIRTUAL TABLE busqueda USING fts5(
+            tipo UNINDEXED, enlace_id UNINDEXED, titulo, contenido,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+        """,
+        # Las coincidencias en el título pesan más que en el contenido
+        "INSERT INTO busqueda (busqueda, rank) VALUES ('rank', 'bm25(0.0, 0.0, 10.0, 1.0)')",
+    ]
+    for tabla, codigo, tipo, enlace, titulo, contenido, columnas in TABLAS_BUSQUEDA:
+        def fila(f):
+            return (f"{f}.id * 4 + {codigo}, '{tipo}', {enlace.format(f=f)}, "
+                    f"{titulo.format(f=f)}, {contenido.format(f=f)}")
+        insertar = f"INSERT INTO busqueda (rowid, tipo, enlace_id, titulo, contenido) VALUES ({fila('NEW')});"
+        borrar = f"DELETE FROM busqueda WHERE rowid = OLD.id * 4 + {codigo};"
+        sentencias += [
+            f"CREATE TRIGGER busqueda_{tabla}_ai AFTER INSERT ON {tabla} BEGIN {insertar} END",
+            f"CREATE TRIGGER busqueda_{tabla}_au AFTER UPDATE OF {columnas} ON {tabla} BEGIN {borrar} {insertar} END",
+            f"CREATE TRIGGER busqueda_{tabla}_ad AFTER DELETE ON {tabla} BEGIN {borrar} END",
+            f"INSERT INTO busqueda (rowid, tipo, enlace_id, titulo, contenido) SELECT {fila(tabla)} FROM {tabla}",
+        ]
+    return sentencias
+
+def _consulta_fts(texto, max_terminos=8):
+    """
+    Convierte el texto buscado en una consulta FTS5: todas las palabras deben
+    aparecer, y las de dos o más letras también como prefijo. Devuelve None si
+    no hay palabras que buscar.
+    """
+    terminos = re.findall(r'\w+', texto or '')[:max_terminos]
+    if not terminos:
+        return None
+    return ' '.join(f'"{t}"*' if len(t) > 1 else f'"{t}"' for t in terminos)
+
+# Migraciones del esquema, en orden. Cada una es (versión, descripción, sentencias)
+# y se aplica una sola vez por base de datos, en una transacción; la última
+# versión aplicada se guarda en schema_version. Las sentencias deben poder
+# ejecutarse sobre cualquier base de datos creada por initialize_*.
+MIGRACIONES = [
+    (1, "Índices de las consultas por fecha y claves ajenas", [
+        "CREATE INDEX IF NOT EXISTS idx_citas_fecha ON citas (fecha, hora)",
+        "CREATE INDEX IF NOT EXISTS idx_citas_cliente ON citas (cliente_id, fecha, hora)",
+        "CREATE INDEX IF NOT EXISTS idx_clientes_telefono ON clientes (telefono)",
+        "CREATE INDEX IF NOT EXISTS idx_proyectos_cliente ON proyectos (cliente_id, ultima_actualizacion)",
+        "CREATE INDEX IF NOT EXISTS idx_eventos_proyecto_proyecto ON eventos_proyecto (proyecto_id, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_eventos_proyecto_fecha ON eventos_proyecto (fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_notas_proyecto_proyecto ON notas_proyecto (proyecto_id, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_documento_cliente_cliente ON documento_cliente (cliente_id)",
+        "CREATE INDEX IF NOT EXISTS idx_documento_proyecto_proyecto ON documento_proyecto (proyecto_id)",
+        "CREATE INDEX IF NOT EXISTS idx_documento_cita_cita ON documento_cita (cita_id)",
+    ]),
+    (2, "Índice del listado de expedientes por última actualización", [
+        "CREATE INDEX IF NOT EXISTS idx_proyectos_actualizacion ON proyectos (ultima_actualizacion, id)",
+    ]),
+    (3, "Índices de los listados paginados de clientes y documentos", [
+        "CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes (nombre)",
+        "CREATE INDEX IF NOT EXISTS idx_clientes_registro ON clientes (fecha_registro)",
+        "CREATE INDEX IF NOT EXISTS idx_documentos_subida ON documentos (fecha_subida)",
+    ]),
+    (4, "Índices de cobertura para contar las consultas sin expediente", [
+        "CREATE INDEX IF NOT EXISTS idx_citas_consultas ON citas (fecha, estado, cliente_id, tema)",
+        "CREATE INDEX IF NOT EXISTS idx_proyectos_cliente_inicio ON proyectos (cliente_id, fecha_inicio, titulo)",
+    ]),
+    (5, "Enlace de cada expediente con la consulta de la que se creó", [
+        "ALTER TABLE proyectos ADD COLUMN cita_id INTEGER REFERENCES citas (id)",
+        _SQL_ENLAZAR_EXPEDIENTES,
+        "CREATE INDEX IF NOT EXISTS idx_proyectos_cita ON proyectos (cita_id)",
+        "DROP INDEX IF EXISTS idx_proyectos_cliente_inicio",
+    ]),
+    (6, "Índice de búsqueda de texto completo", _sentencias_indice_busqueda()),
+]
+
+# Citas completadas o confirmadas con fecha anterior al parámetro de las que no
+# se ha creado un expediente (proyectos.cita_id). Se usa para listarlas y para
+# contarlas. c.fecha se compara sin DATE() (siempre es "YYYY-MM-DD") para que
+# pueda usar idx_citas_consultas; la comprobación del expediente usa idx_proyectos_cita.
+_CONDICION_CONSULTA_SIN_EXPEDIENTE = """
+    c.estado IN ('completada', 'confirmada') AND c.fecha < ?
+    AND NOT EXISTS (SELECT 1 FROM proyectos p WHERE p.cita_id = c.id)
+"""
+
+# Contadores del dashboard por (fichero, día), durante config.CACHE_DASHBOARD_TTL segundos
+_cache_dashboard = CacheLRU(16, ttl=config.CACHE_DASHBOARD_TTL) if config.CACHE_DASHBOARD_TTL else None
+
+# Separador de GROUP_CONCAT (no aparece en nombres ni títulos, a diferencia de la coma)
+SEPARADOR_LISTAS = '\x1f'
+
+def _patron_like(texto):
+    """Patrón LIKE (con ESCAPE '\\') que busca el texto literal en cualquier posición."""
+    return "%" + re.sub(r"([\\%_])", r"\\\1", texto) + "%"
+
+class _ConexionHilo:
+    """Conexión SQLite de un hilo, con el proceso que la abrió y cuántos usos suyos hay abiertos."""
+    
+    def __init__(self, conn, generacion):
+        self.conn = conn
+        self.generacion = generacion
+        self.pid = os.getpid()
+        self.usos = 0
+
+class _UsoConexion:
+    """
+    Lo que devuelve conectar(): se usa igual que una conexión de sqlite3.connect,
+    pero close() no la cierra. Cuando se cierra (o se descarta) el último uso
+    abierto en el hilo se deshace lo que haya quedado sin confirmar, como al
+    cerrar una conexión propia; si un método llama a otro en medio de una
+    transacción, el close() del segundo no la toca.
+    """
+    
+    def __init__(self, conexion):
+        self._conn = conexion.conn
+        self._conexion = conexion
+        conexion.usos += 1
+    
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+    
+    def close(self):
+        conexion = self.__dict__.pop('_conexion', None)
+        if conexion is None:
+            return
+        conexion.usos -= 1
+        if conexion.usos == 0:
+            try:
+                if conexion.conn.in_transaction:
+                    conexion.conn.rollback()
+            except sqlite3.ProgrammingError:
+                # Ya cerrada con cerrar_conexion(), o descartada desde otro hilo:
+                # la transacción se deshace al volver a pedirla
+                pass
+    
+    __del__ = close
 
 class DatabaseManager:
+    # Generación del esquema de cada fichero (por ruta absoluta) inicializado en
+    # este proceso; cambia si el fichero se vuelve a crear, y entonces los hilos
+    # abren una conexión nueva
+    _esquemas = {}
+    _lock_esquemas = threading.Lock()
+    # Conexiones de cada hilo: {ruta: _ConexionHilo}
+    _local = threading.local()
+    # Conexiones heredadas del proceso padre al hacer fork (p. ej. gunicorn
+    # --preload): no se usan, pero tampoco se cierran, para no tocar sus ficheros
+    _heredadas = []
+    
     def __init__(self, db_file='botia.db'):
-        """Inicializa el gestor de base de datos."""
+        """Inicializa el gestor de base de datos (el esquema, una vez por proceso)."""
         self.db_file = db_file
-        self.initialize_db()
-        self.initialize_user_tables()
-        self.initialize_document_tables()
+        self._ruta = os.path.abspath(db_file)
+        with DatabaseManager._lock_esquemas:
+            if self._ruta not in DatabaseManager._esquemas or not os.path.exists(self._ruta):
+                DatabaseManager._esquemas[self._ruta] = DatabaseManager._esquemas.get(self._ruta, 0) + 1
+                self.initialize_db()
+                self.initialize_user_tables()
+                self.initialize_document_tables()
+                self.initialize_sync_tables()
+                self.aplicar_migraciones()
+    
+    def conectar(self):
+        """
+        Devuelve la conexión de este hilo a la base de datos, abriéndola la primera
+        vez en cada proceso (en modo WAL, con synchronous=NORMAL, espera si está
+        bloqueada y caché de sentencias preparadas).
+        
+        Los métodos la liberan con close() al terminar. Si al pedirla no hay
+        ningún uso abierto pero sí una transacción pendiente (una operación
+        anterior falló antes de confirmar), se descarta.
+        """
+        conexiones = getattr(DatabaseManager._local, 'conexiones', None)
+        if conexiones is None:
+            conexiones = DatabaseManager._local.conexiones = {}
+        
+        generacion = DatabaseManager._esquemas.get(self._ruta)
+        conexion = conexiones.get(self._ruta)
+        if conexion is not None and conexion.pid != os.getpid():
+            DatabaseManager._heredadas.append(conexion.conn)
+            conexion = None
+        if conexion is not None and conexion.generacion != generacion:
+            conexion.conn.close()
+            conexion = None
+        
+        if conexion is None:
+            conn = sqlite3.connect(self._ruta, timeout=config.DB_TIMEOUT_OCUPADA,
+                                   cached_statements=config.DB_CACHE_SENTENCIAS)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conexion = conexiones[self._ruta] = _ConexionHilo(conn, generacion)
+        elif conexion.usos == 0 and conexion.conn.in_transaction:
+            conexion.conn.rollback()
+        return _UsoConexion(conexion)
+    
+    def cerrar_conexion(self):
+        """Cierra la conexión de este hilo, si la tiene (p. ej. al terminar un hilo de trabajo)."""
+        conexiones = getattr(DatabaseManager._local, 'conexiones', {})
+        conexion = conexiones.pop(self._ruta, None)
+        if conexion is not None and conexion.pid == os.getpid():
+            conexion.conn.close()
+    
+    def version_esquema(self):
+        """Última migración aplicada a la base de datos (0 si ninguna)."""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, descripcion TEXT, fecha_aplicacion TEXT)")
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        version = cursor.fetchone()[0]
+        conn.close()
+        return version
+    
+    def aplicar_migraciones(self, migraciones=None):
+        """
+        Aplica las migraciones pendientes (por defecto MIGRACIONES). Toma el bloqueo
+        de escritura antes de leer la versión, así que si varios procesos arrancan
+        a la vez cada migración se aplica una sola vez.
+        
+        Returns:
+            Lista de versiones aplicadas
+        """
+        if migraciones is None:
+            migraciones = MIGRACIONES
+        self.version_esquema()  # Crea schema_version si no existe
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        aplicadas = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            version_actual = cursor.fetchone()[0]
+            for version, descripcion, sentencias in migraciones:
+                if version <= version_actual:
+                    continue
+                for sentencia in sentencias:
+                    cursor.execute(sentencia)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, descripcion, fecha_aplicacion) VALUES (?, ?, ?)",
+                    (version, descripcion, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+                )
+                aplicadas.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return aplicadas
     
     def initialize_db(self):
         """Crea las tablas si no existen."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         # Tabla de clientes
@@ -91,7 +385,7 @@ class DatabaseManager:
 
     def initialize_document_tables(self):
         """Crea las tablas para gestión de documentos si no existen."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Tabla de documentos
@@ -144,6 +438,44 @@ class DatabaseManager:
         conn.commit()
         conn.close()
 
+    def initialize_sync_tables(self):
+        """Crea las tablas de configuración, sincronización con Google Calendar y bloqueos si no existen."""
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        # Valores de configuración persistentes (clave-valor)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS configuracion (
+            clave TEXT PRIMARY KEY,
+            valor TEXT
+        )
+        ''')
+    
+        # Evento de Google Calendar de cada cita, firma de los datos de la cita y
+        # estado del evento ("cancelled" o "YYYY-MM-DDTHH:MM") en la última sincronización
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sincronizacion_citas (
+            cita_id INTEGER PRIMARY KEY,
+            evento_id TEXT NOT NULL,
+            firma TEXT,
+            estado_evento TEXT,
+            fecha_sincronizacion TEXT,
+            FOREIGN KEY (cita_id) REFERENCES citas (id)
+        )
+        ''')
+    
+        # Bloqueos con caducidad compartidos entre procesos (p. ej. workers de gunicorn)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bloqueos (
+            nombre TEXT PRIMARY KEY,
+            propietario TEXT NOT NULL,
+            expira REAL NOT NULL
+        )
+        ''')
+    
+        conn.commit()
+        conn.close()
+
     # Métodos para gestión de documentos
     def add_documento(self, nombre, tipo, tamano, ruta_archivo, hash_md5=None, notas=None):
         """
@@ -160,7 +492,7 @@ class DatabaseManager:
         Returns:
             ID del documento creado
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
 
         # Usar datetime directamente, sin llamar a datetime.datetime
@@ -181,7 +513,7 @@ class DatabaseManager:
 
     def relacionar_documento_cliente(self, documento_id, cliente_id):
         """Relaciona un documento con un cliente."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute(
@@ -194,7 +526,7 @@ class DatabaseManager:
 
     def relacionar_documento_proyecto(self, documento_id, proyecto_id):
         """Relaciona un documento con un proyecto."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute(
@@ -207,7 +539,7 @@ class DatabaseManager:
 
     def relacionar_documento_cita(self, documento_id, cita_id):
         """Relaciona un documento con una cita."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute(
@@ -220,7 +552,7 @@ class DatabaseManager:
 
     def get_documentos_cliente(self, cliente_id):
         """Obtiene todos los documentos asociados a un cliente."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("""
@@ -250,7 +582,7 @@ class DatabaseManager:
 
     def get_documentos_proyecto(self, proyecto_id):
         """Obtiene todos los documentos asociados a un proyecto."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("""
@@ -280,7 +612,7 @@ class DatabaseManager:
 
     def get_documentos_cita(self, cita_id):
         """Obtiene todos los documentos asociados a una cita."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("""
@@ -310,7 +642,7 @@ class DatabaseManager:
 
     def get_documento(self, documento_id):
         """Obtiene información detallada de un documento."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
 
         cursor.execute("SELECT * FROM documentos WHERE id = ?", (documento_id,))
@@ -383,7 +715,7 @@ class DatabaseManager:
 
     def delete_documento(self, documento_id):
         """Elimina un documento y sus relaciones."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Primero obtenemos la ruta del archivo para eliminarlo del sistema de archivos
@@ -417,7 +749,7 @@ class DatabaseManager:
         # Tablas para gestión de usuarios
     def initialize_user_tables(self):
         """Crea las tablas de usuarios si no existen."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Tabla de usuarios
@@ -492,7 +824,7 @@ class DatabaseManager:
     # Métodos para gestión de usuarios
     def add_usuario(self, username, password, nombre, email, role='user'):
         """Añade un nuevo usuario al sistema."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         import bcrypt
@@ -518,7 +850,7 @@ class DatabaseManager:
 
     def authenticate_user(self, username, password):
         """Autentica un usuario con su username y password."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         import bcrypt
@@ -544,7 +876,7 @@ class DatabaseManager:
 
     def get_all_usuarios(self):
         """Obtiene todos los usuarios del sistema."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("SELECT id, username, nombre, email, role, activo, fecha_creacion, ultimo_acceso FROM usuarios")
@@ -569,7 +901,7 @@ class DatabaseManager:
 
     def update_usuario(self, usuario_id, **kwargs):
         """Actualiza un usuario existente."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Actualizar solo los campos proporcionados
@@ -602,7 +934,7 @@ class DatabaseManager:
 
     def get_usuario_by_id(self, usuario_id):
         """Obtiene un usuario por su ID."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("SELECT id, username, nombre, email, role, activo, fecha_creacion, ultimo_acceso FROM usuarios WHERE id=?", (usuario_id,))
@@ -625,7 +957,7 @@ class DatabaseManager:
 
     def delete_usuario(self, usuario_id):
         """Elimina un usuario del sistema."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Por seguridad, verificar que no es el último administrador
@@ -654,10 +986,10 @@ class DatabaseManager:
     # Métodos para clientes
     def add_cliente(self, nombre, email, telefono, notas=""):
         """Añade un nuevo cliente a la base de datos."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
-        fecha_registro = datetime.now().strftime("%Y-%m-%d")
+        fecha_registro = datetime.datetime.now().strftime("%Y-%m-%d")
         
         try:
             cursor.execute(
@@ -682,7 +1014,7 @@ class DatabaseManager:
     
     def get_cliente_by_email(self, email):
         """Obtiene un cliente por su email."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM clientes WHERE email=?", (email,))
@@ -703,7 +1035,7 @@ class DatabaseManager:
     
     def get_cliente_by_telefono(self, telefono):
         """Obtiene un cliente por su teléfono."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM clientes WHERE telefono=?", (telefono,))
@@ -724,7 +1056,7 @@ class DatabaseManager:
     
     def get_all_clientes(self):
         """Obtiene todos los clientes."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM clientes ORDER BY nombre")
@@ -748,10 +1080,10 @@ class DatabaseManager:
     # Métodos para citas
     def add_cita(self, cliente_id, tipo, fecha, hora, tema=""):
         """Añade una nueva cita."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
-        fecha_creacion = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        fecha_creacion = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         cursor.execute(
             "INSERT INTO citas (cliente_id, tipo, fecha, hora, tema, fecha_creacion) VALUES (?, ?, ?, ?, ?, ?)",
@@ -762,11 +1094,13 @@ class DatabaseManager:
         cita_id = cursor.lastrowid
         conn.close()
         
+        cache_disponibilidad.invalidar_fechas(fecha)
+        
         return cita_id
     
     def get_citas_by_cliente(self, cliente_id):
         """Obtiene las citas de un cliente."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM citas WHERE cliente_id=? ORDER BY fecha, hora", (cliente_id,))
@@ -792,10 +1126,10 @@ class DatabaseManager:
     # Métodos para proyectos
     def add_proyecto(self, cliente_id, titulo, descripcion="", abogado="", estado="nuevo"):
         """Añade un nuevo proyecto o caso legal."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
-        fecha_inicio = datetime.now().strftime("%Y-%m-%d")
+        fecha_inicio = datetime.datetime.now().strftime("%Y-%m-%d")
         ultima_actualizacion = fecha_inicio
         
         cursor.execute(
@@ -811,7 +1145,7 @@ class DatabaseManager:
     
     def update_proyecto(self, proyecto_id, **kwargs):
         """Actualiza un proyecto existente."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         # Actualizar solo los campos proporcionados
@@ -824,7 +1158,7 @@ class DatabaseManager:
         
         # Añadir fecha de actualización
         set_clause.append("ultima_actualizacion=?")
-        values.append(datetime.now().strftime("%Y-%m-%d"))
+        values.append(datetime.datetime.now().strftime("%Y-%m-%d"))
         
         # Añadir ID del proyecto
         values.append(proyecto_id)
@@ -837,7 +1171,7 @@ class DatabaseManager:
     
     def get_proyecto(self, proyecto_id):
         """Obtiene un proyecto por su ID."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         cursor.execute("SELECT * FROM proyectos WHERE id=?", (proyecto_id,))
@@ -856,6 +1190,7 @@ class DatabaseManager:
             'abogado': proyecto[5],
             'fecha_inicio': proyecto[6],
             'ultima_actualizacion': proyecto[7],
+            'cita_id': proyecto[8],
             'notas': [],
             'eventos': []
         }
@@ -889,7 +1224,7 @@ class DatabaseManager:
     
     def get_proyectos_by_cliente(self, cliente_id):
         """Obtiene los proyectos de un cliente."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("SELECT * FROM proyectos WHERE cliente_id=? ORDER BY ultima_actualizacion DESC", (cliente_id,))
@@ -934,10 +1269,95 @@ class DatabaseManager:
         conn.close()
         return proyectos
     
+    # Columnas por las que se puede ordenar el listado de expedientes
+    ORDENES_PROYECTOS = ('id', 'titulo', 'cliente_nombre', 'estado', 'abogado', 'fecha_inicio', 'ultima_actualizacion')
+    
+    def get_proyectos_pagina(self, pagina=1, por_pagina=25, orden='ultima_actualizacion', descendente=True,
+                             buscar=None, notas_por_proyecto=2):
+        """
+        Obtiene una página del listado de expedientes con el nombre y email del
+        cliente y sus últimas notas, con una consulta para el total y otra para
+        la página (las notas se eligen con ROW_NUMBER por expediente).
+        
+        Args:
+            pagina: Número de página, desde 1
+            por_pagina: Expedientes por página
+            orden: Una de ORDENES_PROYECTOS
+            descendente: Sentido del orden (a igualdad, se ordena por ID)
+            buscar: Texto a buscar en título, cliente, estado o abogado
+            notas_por_proyecto: Número de notas más recientes de cada expediente
+            
+        Returns:
+            Tupla (lista de expedientes, número total de expedientes que cumplen el filtro)
+        """
+        if orden not in self.ORDENES_PROYECTOS:
+            raise ValueError(f"Orden no válido: {orden}")
+        sentido = "DESC" if descendente else "ASC"
+        
+        filtro = ""
+        parametros = []
+        if buscar:
+            patron = _patron_like(buscar)
+            filtro = ("WHERE p.titulo LIKE ? ESCAPE '\\' OR cl.nombre LIKE ? ESCAPE '\\' "
+                      "OR p.estado LIKE ? ESCAPE '\\' OR p.abogado LIKE ? ESCAPE '\\'")
+            parametros = [patron] * 4
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"SELECT COUNT(*) FROM proyectos p JOIN clientes cl ON p.cliente_id = cl.id {filtro}", parametros)
+        total = cursor.fetchone()[0]
+        
+        cursor.execute(f"""
+        WITH pagina AS (
+            SELECT p.id, p.cliente_id, p.titulo, p.descripcion, p.estado, p.abogado,
+                   p.fecha_inicio, p.ultima_actualizacion,
+                   cl.nombre AS cliente_nombre, cl.email AS cliente_email
+            FROM proyectos p
+            JOIN clientes cl ON p.cliente_id = cl.id
+            {filtro}
+            ORDER BY {orden} {sentido}, p.id {sentido}
+            LIMIT ? OFFSET ?
+        ),
+        ultimas_notas AS (
+            SELECT n.proyecto_id, n.id, n.fecha, n.texto,
+                   ROW_NUMBER() OVER (PARTITION BY n.proyecto_id ORDER BY n.fecha DESC, n.id DESC) AS posicion
+            FROM notas_proyecto n
+            WHERE n.proyecto_id IN (SELECT id FROM pagina)
+        )
+        SELECT pagina.*, ultimas_notas.id, ultimas_notas.fecha, ultimas_notas.texto
+        FROM pagina
+        LEFT JOIN ultimas_notas ON ultimas_notas.proyecto_id = pagina.id AND ultimas_notas.posicion <= ?
+        ORDER BY pagina.{orden} {sentido}, pagina.id {sentido}, ultimas_notas.posicion
+        """, parametros + [por_pagina, (max(pagina, 1) - 1) * por_pagina, notas_por_proyecto])
+        filas = cursor.fetchall()
+        conn.close()
+        
+        proyectos = []
+        for fila in filas:
+            if not proyectos or proyectos[-1]['id'] != fila[0]:
+                proyectos.append({
+                    'id': fila[0],
+                    'cliente_id': fila[1],
+                    'titulo': fila[2],
+                    'descripcion': fila[3],
+                    'estado': fila[4],
+                    'abogado': fila[5],
+                    'fecha_inicio': fila[6],
+                    'ultima_actualizacion': fila[7],
+                    'cliente_nombre': fila[8],
+                    'cliente_email': fila[9],
+                    'notas': []
+                })
+            if fila[10] is not None:
+                proyectos[-1]['notas'].append({'id': fila[10], 'fecha': fila[11], 'texto': fila[12]})
+        
+        return proyectos, total
+    
     # Métodos para eventos de proyectos
     def add_evento_proyecto(self, proyecto_id, titulo, fecha, descripcion=""):
         """Añade un evento crítico a un proyecto."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         cursor.execute(
@@ -948,7 +1368,7 @@ class DatabaseManager:
         # Actualizar última fecha de actualización del proyecto
         cursor.execute(
             "UPDATE proyectos SET ultima_actualizacion=? WHERE id=?",
-            (datetime.now().strftime("%Y-%m-%d"), proyecto_id)
+            (datetime.datetime.now().strftime("%Y-%m-%d"), proyecto_id)
         )
         
         conn.commit()
@@ -959,7 +1379,7 @@ class DatabaseManager:
     
     def update_evento_proyecto(self, evento_id, completado=None, **kwargs):
         """Actualiza un evento crítico de proyecto."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
         # Obtener proyecto_id para actualizarlo después
@@ -993,7 +1413,7 @@ class DatabaseManager:
         # Actualizar última fecha de actualización del proyecto
         cursor.execute(
             "UPDATE proyectos SET ultima_actualizacion=? WHERE id=?",
-            (datetime.now().strftime("%Y-%m-%d"), proyecto_id)
+            (datetime.datetime.now().strftime("%Y-%m-%d"), proyecto_id)
         )
         
         conn.commit()
@@ -1003,10 +1423,10 @@ class DatabaseManager:
     # Métodos para notas de proyectos
     def add_nota_proyecto(self, proyecto_id, texto):
         """Añade una nota a un proyecto."""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
         
-        fecha = datetime.now().strftime("%Y-%m-%d")
+        fecha = datetime.datetime.now().strftime("%Y-%m-%d")
         
         cursor.execute(
             "INSERT INTO notas_proyecto (proyecto_id, fecha, texto) VALUES (?, ?, ?)",
@@ -1075,9 +1495,9 @@ class DatabaseManager:
     # Métodos para exportar datos a formato JSON
     def export_to_json(self, filename='botia_export.json'):
         """Exporta todos los datos de la base de datos a un archivo JSON."""
-        conn = sqlite3.connect(self.db_file)
-        conn.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
+        conn = self.conectar()
         cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
         
         export_data = {
             'clientes': [],
@@ -1124,12 +1544,14 @@ class DatabaseManager:
 
     # Actualizar el método get_all_calendar_events en db_manager.py
 
-    def get_all_calendar_events(self, start_date=None, end_date=None):
+    def get_all_calendar_events(self, start_date=None, end_date=None, limite=None):
         """
         Obtiene todos los eventos para el calendario en un rango de fechas.
         Incluye citas y eventos críticos de proyectos.
+        
+        Con limite, devuelve solo los `limite` primeros por fecha y hora.
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         events = []
@@ -1154,9 +1576,10 @@ class DatabaseManager:
         JOIN clientes cl ON c.cliente_id = cl.id
         WHERE 1=1 {date_condition}
         ORDER BY c.fecha, c.hora
+        LIMIT ?
         """
     
-        cursor.execute(query, params)
+        cursor.execute(query, params + [-1 if limite is None else limite])
         citas = cursor.fetchall()
     
         for cita in citas:
@@ -1184,9 +1607,10 @@ class DatabaseManager:
         JOIN clientes cl ON p.cliente_id = cl.id
         WHERE 1=1 {date_condition}
         ORDER BY e.fecha
+        LIMIT ?
         """
     
-        cursor.execute(query, params)
+        cursor.execute(query, params + [-1 if limite is None else limite])
         eventos = cursor.fetchall()
     
         for evento in eventos:
@@ -1208,6 +1632,8 @@ class DatabaseManager:
             })
     
         conn.close()
+        if limite is not None:
+            events = sorted(events, key=lambda x: x['start'])[:limite]
         return events
     
     # Métodos adicionales a agregar en la clase DatabaseManager en db_manager.py
@@ -1222,7 +1648,7 @@ class DatabaseManager:
         Returns:
             Diccionario con los datos del cliente o None si no se encuentra
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("SELECT * FROM clientes WHERE id=?", (cliente_id,))
@@ -1248,7 +1674,7 @@ class DatabaseManager:
         Args:
             proyecto_id: ID del proyecto a eliminar
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Eliminar notas relacionadas
@@ -1270,7 +1696,7 @@ class DatabaseManager:
         Args:
             nota_id: ID de la nota a eliminar
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Obtener proyecto_id para actualizarlo después
@@ -1283,10 +1709,9 @@ class DatabaseManager:
             cursor.execute("DELETE FROM notas_proyecto WHERE id=?", (nota_id,))
         
             # Actualizar última fecha de actualización del proyecto
-            from datetime import datetime
             cursor.execute(
                 "UPDATE proyectos SET ultima_actualizacion=? WHERE id=?",
-                (datetime.now().strftime("%Y-%m-%d"), proyecto_id)
+                (datetime.datetime.now().strftime("%Y-%m-%d"), proyecto_id)
             )
     
         conn.commit()
@@ -1299,7 +1724,7 @@ class DatabaseManager:
         Args:
             evento_id: ID del evento a eliminar
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Obtener proyecto_id para actualizarlo después
@@ -1312,10 +1737,9 @@ class DatabaseManager:
             cursor.execute("DELETE FROM eventos_proyecto WHERE id=?", (evento_id,))
         
             # Actualizar última fecha de actualización del proyecto
-            from datetime import datetime
             cursor.execute(
                 "UPDATE proyectos SET ultima_actualizacion=? WHERE id=?",
-                (datetime.now().strftime("%Y-%m-%d"), proyecto_id)
+                (datetime.datetime.now().strftime("%Y-%m-%d"), proyecto_id)
             )
     
         conn.commit()
@@ -1328,7 +1752,7 @@ class DatabaseManager:
         Returns:
             Lista de diccionarios con información de las citas
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("""
@@ -1363,6 +1787,213 @@ class DatabaseManager:
     
         return citas
 
+    # Listados paginados por clave (keyset): cada página empieza justo después
+    # de la clave de orden de la última fila de la anterior, así que su coste no
+    # depende de cuántas filas haya antes (a diferencia de OFFSET). Devuelven la
+    # clave de la siguiente página, o None si no hay más.
+    
+    def get_citas_pagina(self, limite=50, despues=None, fecha_desde=None, fecha_hasta=None,
+                         estado=None, tipo=None, cliente_id=None, buscar=None):
+        """
+        Obtiene una página de citas de la más reciente a la más antigua (por
+        fecha, hora e ID), con los datos del cliente (mismo formato que get_all_citas).
+        
+        Args:
+            limite: Número máximo de citas
+            despues: Clave (fecha, hora, id) devuelta con la página anterior
+            fecha_desde, fecha_hasta: Rango de fechas "YYYY-MM-DD" (inclusive)
+            estado, tipo, cliente_id: Filtros opcionales
+            buscar: Texto a buscar en el nombre del cliente o el tema de la cita
+            
+        Returns:
+            Tupla (citas, clave de la siguiente página o None)
+        """
+        condiciones = []
+        parametros = []
+        if despues:
+            condiciones.append("(c.fecha, c.hora, c.id) < (?, ?, ?)")
+            parametros.extend(despues)
+        for condicion, valor in (("c.fecha >= ?", fecha_desde), ("c.fecha <= ?", fecha_hasta),
+                                 ("c.estado = ?", estado), ("c.tipo = ?", tipo),
+                                 ("c.cliente_id = ?", cliente_id)):
+            if valor:
+                condiciones.append(condicion)
+                parametros.append(valor)
+        if buscar:
+            condiciones.append("(cl.nombre LIKE ? ESCAPE '\\' OR c.tema LIKE ? ESCAPE '\\')")
+            parametros.extend([_patron_like(buscar)] * 2)
+        where = "WHERE " + " AND ".join(condiciones) if condiciones else ""
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT c.id, c.tipo, c.fecha, c.hora, c.tema, c.estado, c.fecha_creacion,
+               cl.id, cl.nombre, cl.email, cl.telefono
+        FROM citas c
+        JOIN clientes cl ON c.cliente_id = cl.id
+        {where}
+        ORDER BY c.fecha DESC, c.hora DESC, c.id DESC
+        LIMIT ?
+        """, parametros + [limite + 1])
+        filas = cursor.fetchall()
+        conn.close()
+        
+        citas = [{
+            'id': c[0],
+            'tipo': c[1],
+            'fecha': c[2],
+            'hora': c[3],
+            'tema': c[4],
+            'estado': c[5],
+            'fecha_creacion': c[6],
+            'cliente_nombre': c[8],
+            'cliente': {
+                'id': c[7],
+                'nombre': c[8],
+                'email': c[9],
+                'telefono': c[10]
+            }
+        } for c in filas[:limite]]
+        
+        siguiente = None
+        if len(filas) > limite:
+            ultima = citas[-1]
+            siguiente = (ultima['fecha'], ultima['hora'], ultima['id'])
+        return citas, siguiente
+    
+    def get_clientes_pagina(self, limite=50, despues=None, buscar=None):
+        """
+        Obtiene una página de clientes ordenados por nombre e ID (mismo formato
+        que get_all_clientes).
+        
+        Args:
+            limite: Número máximo de clientes
+            despues: Clave (nombre, id) devuelta con la página anterior
+            buscar: Texto a buscar en nombre, email o teléfono
+            
+        Returns:
+            Tupla (clientes, clave de la siguiente página o None)
+        """
+        condiciones = []
+        parametros = []
+        if despues:
+            condiciones.append("(nombre, id) > (?, ?)")
+            parametros.extend(despues)
+        if buscar:
+            patron = _patron_like(buscar)
+            condiciones.append("(nombre LIKE ? ESCAPE '\\' OR email LIKE ? ESCAPE '\\' OR telefono LIKE ? ESCAPE '\\')")
+            parametros.extend([patron] * 3)
+        where = "WHERE " + " AND ".join(condiciones) if condiciones else ""
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT id, nombre, email, telefono, fecha_registro, notas
+        FROM clientes
+        {where}
+        ORDER BY nombre, id
+        LIMIT ?
+        """, parametros + [limite + 1])
+        filas = cursor.fetchall()
+        conn.close()
+        
+        clientes = [{
+            'id': c[0],
+            'nombre': c[1],
+            'email': c[2],
+            'telefono': c[3],
+            'fecha_registro': c[4],
+            'notas': c[5]
+        } for c in filas[:limite]]
+        
+        siguiente = (clientes[-1]['nombre'], clientes[-1]['id']) if len(filas) > limite else None
+        return clientes, siguiente
+    
+    def get_ultimos_clientes(self, limite=5):
+        """Obtiene los últimos clientes registrados."""
+        conn = self.conectar()
+        cursor = conn.cursor()
+        cursor.execute("""
+        SELECT id, nombre, email, telefono, fecha_registro, notas
+        FROM clientes
+        ORDER BY fecha_registro DESC, id DESC
+        LIMIT ?
+        """, (limite,))
+        filas = cursor.fetchall()
+        conn.close()
+        
+        return [{
+            'id': c[0],
+            'nombre': c[1],
+            'email': c[2],
+            'telefono': c[3],
+            'fecha_registro': c[4],
+            'notas': c[5]
+        } for c in filas]
+    
+    def get_documentos_pagina(self, limite=50, despues=None, cliente_id=None, buscar=None):
+        """
+        Obtiene una página de documentos, los más recientes primero, con los
+        nombres de los clientes, títulos de los proyectos y fechas de las citas a
+        los que están vinculados (solo se buscan para los documentos de la página).
+        
+        Args:
+            limite: Número máximo de documentos
+            despues: Clave (fecha_subida, id) devuelta con la página anterior
+            cliente_id: Solo los documentos vinculados a este cliente
+            buscar: Texto a buscar en el nombre o el tipo del documento
+            
+        Returns:
+            Tupla (documentos, clave de la siguiente página o None)
+        """
+        condiciones = []
+        parametros = []
+        if despues:
+            condiciones.append("(d.fecha_subida, d.id) < (?, ?)")
+            parametros.extend(despues)
+        if cliente_id:
+            condiciones.append("d.id IN (SELECT documento_id FROM documento_cliente WHERE cliente_id = ?)")
+            parametros.append(cliente_id)
+        if buscar:
+            condiciones.append("(d.nombre LIKE ? ESCAPE '\\' OR d.tipo LIKE ? ESCAPE '\\')")
+            parametros.extend([_patron_like(buscar)] * 2)
+        where = "WHERE " + " AND ".join(condiciones) if condiciones else ""
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT d.id, d.nombre, d.tipo, d.tamano, d.fecha_subida, d.ruta_archivo,
+               (SELECT GROUP_CONCAT(c.nombre, char(31)) FROM documento_cliente dc
+                JOIN clientes c ON dc.cliente_id = c.id WHERE dc.documento_id = d.id),
+               (SELECT GROUP_CONCAT(p.titulo, char(31)) FROM documento_proyecto dp
+                JOIN proyectos p ON dp.proyecto_id = p.id WHERE dp.documento_id = d.id),
+               (SELECT GROUP_CONCAT(ct.fecha || ' ' || ct.hora, char(31)) FROM documento_cita dct
+                JOIN citas ct ON dct.cita_id = ct.id WHERE dct.documento_id = d.id)
+        FROM documentos d
+        {where}
+        ORDER BY d.fecha_subida DESC, d.id DESC
+        LIMIT ?
+        """, parametros + [limite + 1])
+        filas = cursor.fetchall()
+        conn.close()
+        
+        documentos = [{
+            'id': d[0],
+            'nombre': d[1],
+            'tipo': d[2],
+            'tamano': round(d[3] / (1024 * 1024), 2) if d[3] else 0,
+            'fecha_subida': d[4],
+            'ruta_archivo': d[5],
+            'clientes': d[6].split(SEPARADOR_LISTAS) if d[6] else [],
+            'proyectos': d[7].split(SEPARADOR_LISTAS) if d[7] else [],
+            'citas': d[8].split(SEPARADOR_LISTAS) if d[8] else []
+        } for d in filas[:limite]]
+        
+        siguiente = None
+        if len(filas) > limite:
+            siguiente = (filas[limite - 1][4], filas[limite - 1][0])
+        return documentos, siguiente
+    
     def get_cita(self, cita_id):
         """
         Obtiene una cita por su ID.
@@ -1373,7 +2004,7 @@ class DatabaseManager:
         Returns:
             Diccionario con los datos de la cita o None si no se encuentra
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         cursor.execute("""
@@ -1414,7 +2045,7 @@ class DatabaseManager:
             cita_id: ID de la cita
             **kwargs: Campos a actualizar (tipo, fecha, hora, tema, estado)
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         # Actualizar solo los campos proporcionados
@@ -1427,6 +2058,10 @@ class DatabaseManager:
                 values.append(value)
     
         if set_clause:
+            # Fecha anterior, para invalidar la disponibilidad del día que queda libre
+            cursor.execute("SELECT fecha FROM citas WHERE id=?", (cita_id,))
+            fila = cursor.fetchone()
+            
             # Añadir ID de la cita
             values.append(cita_id)
         
@@ -1434,6 +2069,9 @@ class DatabaseManager:
             cursor.execute(query, values)
         
             conn.commit()
+            
+            if fila:
+                cache_disponibilidad.invalidar_fechas(fila[0], kwargs.get('fecha'))
     
         conn.close()
 
@@ -1444,14 +2082,20 @@ class DatabaseManager:
         Args:
             cita_id: ID de la cita a eliminar
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
+        cursor.execute("SELECT fecha FROM citas WHERE id=?", (cita_id,))
+        fila = cursor.fetchone()
+    
         # Eliminar la cita
         cursor.execute("DELETE FROM citas WHERE id=?", (cita_id,))
     
         conn.commit()
         conn.close()
+        
+        if fila:
+            cache_disponibilidad.invalidar_fechas(fila[0])
     
     def update_cliente(self, cliente_id, nombre, email, telefono, notas=""):
         """
@@ -1464,7 +2108,7 @@ class DatabaseManager:
            telefono: Teléfono del cliente
             notas: Notas adicionales sobre el cliente
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         try:
@@ -1483,44 +2127,36 @@ class DatabaseManager:
 
     # Añadir a db_manager.py
 
-    def get_consultas_sin_expediante(self):
+    def get_consultas_sin_expediante(self, limite=None):
         """
         Obtiene todas las citas completadas que aún no tienen expediente asociado.
         Útil para convertir consultas en expedientes.
     
+        Args:
+            limite: Número máximo de consultas (las más recientes); todas si es None
+    
         Returns:
             Lista de diccionarios con información de las consultas
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         try:
-            # Seleccionar citas completadas
             # Buscamos citas con estado 'completada' o 'confirmada' y fecha pasada
-            fecha_actual = datetime.now().strftime("%Y-%m-%d")
+            fecha_actual = datetime.datetime.now().strftime("%Y-%m-%d")
         
-            query = """
+            query = f"""
             SELECT c.id, c.tipo, c.fecha, c.hora, c.tema, c.estado, c.fecha_creacion,
                    cl.id as cliente_id, cl.nombre as cliente_nombre, cl.email as cliente_email, 
-                   cl.telefono as cliente_telefono, 
-                   CASE WHEN COUNT(p.id) > 0 THEN 1 ELSE 0 END as tiene_expediente
+                   cl.telefono as cliente_telefono
             FROM citas c
             JOIN clientes cl ON c.cliente_id = cl.id
-            LEFT JOIN proyectos p ON (
-                p.cliente_id = cl.id AND 
-                p.titulo LIKE '%' || c.tema || '%' AND
-                DATE(p.fecha_inicio) >= DATE(c.fecha)
-            )
-            WHERE (
-                (c.estado = 'completada' OR c.estado = 'confirmada') AND
-                (DATE(c.fecha) < ?)
-            )
-            GROUP BY c.id
-            HAVING tiene_expediente = 0
+            WHERE {_CONDICION_CONSULTA_SIN_EXPEDIENTE}
             ORDER BY c.fecha DESC
+            LIMIT ?
             """
         
-            cursor.execute(query, (fecha_actual,))
+            cursor.execute(query, (fecha_actual, -1 if limite is None else limite))
             citas_raw = cursor.fetchall()
         
             citas = []
@@ -1546,6 +2182,134 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    def get_dashboard_stats(self, usar_cache=True, dias_proximos=7):
+        """
+        Calcula los contadores del dashboard con una sola consulta de agregados.
+        
+        El resultado se reutiliza durante config.CACHE_DASHBOARD_TTL segundos, así
+        que un cambio puede tardar ese tiempo en reflejarse.
+        
+        Args:
+            usar_cache: Si es False, se recalcula aunque haya un resultado en caché
+            dias_proximos: Días (desde hoy, inclusive) de las citas y eventos próximos
+            
+        Returns:
+            Diccionario con total_clientes, citas_proximas, eventos_proximos,
+            proyectos_activos (no finalizados) y consultas_pendientes
+        """
+        hoy = datetime.date.today()
+        clave = (os.path.abspath(self.db_file), hoy, dias_proximos)
+        if usar_cache and _cache_dashboard is not None:
+            stats = _cache_dashboard.get(clave)
+            if stats is not None:
+                return dict(stats)
+        
+        desde = hoy.strftime("%Y-%m-%d")
+        hasta = (hoy + datetime.timedelta(days=dias_proximos)).strftime("%Y-%m-%d")
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+        SELECT
+            (SELECT COUNT(*) FROM clientes),
+            (SELECT COUNT(*) FROM citas WHERE fecha >= ? AND fecha <= ?),
+            (SELECT COUNT(*) FROM eventos_proyecto WHERE fecha >= ? AND fecha <= ?),
+            (SELECT COUNT(*) FROM proyectos WHERE estado IS NOT 'finalizado'),
+            (SELECT COUNT(*) FROM citas c WHERE {_CONDICION_CONSULTA_SIN_EXPEDIENTE})
+        """, (desde, hasta, desde, hasta, desde))
+        fila = cursor.fetchone()
+        conn.close()
+        
+        stats = {
+            'total_clientes': fila[0],
+            'citas_proximas': fila[1],
+            'eventos_proximos': fila[2],
+            'proyectos_activos': fila[3],
+            'consultas_pendientes': fila[4]
+        }
+        if _cache_dashboard is not None:
+            _cache_dashboard.set(clave, dict(stats))
+        return stats
+
+    def buscar(self, texto, limite=20, desplazamiento=0, tipos=None):
+        """
+        Busca en clientes (nombre, email y teléfono), expedientes (título y
+        descripción), notas de expedientes y documentos (nombre y notas), sin
+        distinguir mayúsculas ni acentos y por prefijo de cada palabra.
+        
+        Args:
+            texto: Texto a buscar
+            limite: Número máximo de resultados
+            desplazamiento: Resultados a saltar (los de las páginas anteriores)
+            tipos: Tipos de resultado (de TIPOS_BUSQUEDA) a incluir; todos si es None
+            
+        Returns:
+            Tupla (resultados de más a menos relevante, desplazamiento de la
+            siguiente página o None). Cada resultado tiene tipo, id, enlace_id
+            (expediente de una nota), titulo, fragmento (con los términos entre
+            MARCA_INICIO y MARCA_FIN) y puntuacion (menor es más relevante).
+            Solo se ordenan las MAX_CANDIDATOS_BUSQUEDA coincidencias más
+            recientes, así que no hay páginas más allá de ese número.
+        """
+        consulta = _consulta_fts(texto)
+        if consulta is None or (tipos is not None and not tipos):
+            return [], None
+        limite = min(limite, MAX_CANDIDATOS_BUSQUEDA - desplazamiento)
+        if limite <= 0:
+            return [], None
+        
+        parametros = [consulta]
+        filtro = ""
+        if tipos is not None:
+            filtro = f"AND tipo IN ({', '.join('?' * len(tipos))})"
+            parametros.extend(tipos)
+        
+        conn = self.conectar()
+        cursor = conn.cursor()
+        
+        # Rowid de la coincidencia número MAX_CANDIDATOS_BUSQUEDA, recorriendo el
+        # índice sin calcular la relevancia; si hay menos, se ordenan todas
+        cursor.execute(f"""
+        SELECT rowid FROM busqueda
+        WHERE busqueda MATCH ? {filtro}
+        ORDER BY rowid DESC
+        LIMIT 1 OFFSET ?
+        """, parametros + [MAX_CANDIDATOS_BUSQUEDA - 1])
+        fila = cursor.fetchone()
+        if fila:
+            filtro += " AND rowid >= ?"
+            parametros.append(fila[0])
+        
+        cursor.execute(f"""
+        SELECT b.tipo, b.rowid / 4, b.enlace_id, COALESCE(b.titulo, p.titulo), b.fragmento, b.puntuacion
+        FROM (
+            SELECT rowid, tipo, enlace_id, titulo, rank AS puntuacion,
+                   snippet(busqueda, -1, '{MARCA_INICIO}', '{MARCA_FIN}', '…', 12) AS fragmento
+            FROM busqueda
+            WHERE busqueda MATCH ? {filtro}
+            ORDER BY rank
+            LIMIT ? OFFSET ?
+        ) b
+        LEFT JOIN proyectos p ON b.tipo = 'nota' AND p.id = b.enlace_id
+        ORDER BY b.puntuacion
+        """, parametros + [limite + 1, desplazamiento])
+        filas = cursor.fetchall()
+        conn.close()
+        
+        resultados = [{
+            'tipo': r[0],
+            'id': r[1],
+            'enlace_id': r[2],
+            'titulo': r[3],
+            'fragmento': r[4],
+            'puntuacion': r[5]
+        } for r in filas[:limite]]
+        
+        siguiente = desplazamiento + limite
+        if len(filas) <= limite or siguiente >= MAX_CANDIDATOS_BUSQUEDA:
+            siguiente = None
+        return resultados, siguiente
+
     def crear_expediente_desde_consulta(self, cita_id, datos_adicionales=None):
         """
         Crea un nuevo expediente a partir de una consulta (cita) existente.
@@ -1561,7 +2325,7 @@ class DatabaseManager:
         Returns:
             ID del nuevo expediente o None si hay error
         """
-        conn = sqlite3.connect(self.db_file)
+        conn = self.conectar()
         cursor = conn.cursor()
     
         try:
@@ -1586,12 +2350,12 @@ class DatabaseManager:
             abogado = datos_adicionales.get('abogado', '') if datos_adicionales else ''
             estado = datos_adicionales.get('estado', 'nuevo') if datos_adicionales else 'nuevo'
         
-            fecha_inicio = datetime.now().strftime("%Y-%m-%d")
+            fecha_inicio = datetime.datetime.now().strftime("%Y-%m-%d")
             ultima_actualizacion = fecha_inicio
         
             cursor.execute(
-                "INSERT INTO proyectos (cliente_id, titulo, descripcion, estado, abogado, fecha_inicio, ultima_actualizacion) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (cliente_id, titulo, descripcion, estado, abogado, fecha_inicio, ultima_actualizacion)
+                "INSERT INTO proyectos (cliente_id, titulo, descripcion, estado, abogado, fecha_inicio, ultima_actualizacion, cita_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (cliente_id, titulo, descripcion, estado, abogado, fecha_inicio, ultima_actualizacion, cita_id)
             )
         
             # Obtener el ID del expediente creado
@@ -1635,3 +2399,204 @@ class DatabaseManager:
             return None
         finally:
             conn.close()
+
+    # Métodos de configuración y sincronización
+
+    def get_configuracion(self, clave, defecto=None):
+        """
+        Obtiene un valor de configuración persistente.
+    
+        Args:
+            clave: Nombre del valor
+            defecto: Valor a devolver si no existe
+        
+        Returns:
+            El valor guardado (texto) o el valor por defecto
+        """
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        cursor.execute("SELECT valor FROM configuracion WHERE clave = ?", (clave,))
+        fila = cursor.fetchone()
+    
+        conn.close()
+        return fila[0] if fila else defecto
+
+    def set_configuracion(self, clave, valor):
+        """
+        Guarda un valor de configuración persistente; si el valor es None, lo elimina.
+    
+        Args:
+            clave: Nombre del valor
+            valor: Valor a guardar (se almacena como texto)
+        """
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        if valor is None:
+            cursor.execute("DELETE FROM configuracion WHERE clave = ?", (clave,))
+        else:
+            cursor.execute(
+                "INSERT INTO configuracion (clave, valor) VALUES (?, ?) "
+                "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                (clave, str(valor))
+            )
+    
+        conn.commit()
+        conn.close()
+
+    def get_sincronizacion_citas(self):
+        """
+        Obtiene el evento de Google Calendar asociado a cada cita sincronizada.
+    
+        Returns:
+            Diccionario {cita_id: {'evento_id': ..., 'firma': ..., 'estado_evento': ...}}
+        """
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        cursor.execute("SELECT cita_id, evento_id, firma, estado_evento FROM sincronizacion_citas")
+        sincronizadas = {fila[0]: {'evento_id': fila[1], 'firma': fila[2], 'estado_evento': fila[3]}
+                         for fila in cursor.fetchall()}
+    
+        conn.close()
+        return sincronizadas
+
+    def get_citas_sincronizacion(self, fecha_desde, ids=()):
+        """
+        Obtiene las citas que intervienen en la sincronización con Google Calendar
+        (mismo formato que get_all_citas): las no canceladas desde fecha_desde, las
+        que ya tienen evento y las indicadas en ids. Las antiguas nunca enviadas no
+        se cargan.
+    
+        Args:
+            fecha_desde: Fecha "YYYY-MM-DD" a partir de la cual se envían citas nuevas
+            ids: IDs de citas adicionales (por ejemplo, las de eventos descargados)
+    
+        Returns:
+            Lista de diccionarios con información de las citas
+        """
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        # Los IDs van como un único parámetro JSON para no depender del límite de variables
+        cursor.execute("""
+        SELECT c.id, c.tipo, c.fecha, c.hora, c.tema, c.estado, c.fecha_creacion,
+               cl.id, cl.nombre, cl.email, cl.telefono
+        FROM citas c
+        JOIN clientes cl ON c.cliente_id = cl.id
+        WHERE (c.fecha >= ? AND c.estado != 'cancelada')
+           OR c.id IN (SELECT cita_id FROM sincronizacion_citas)
+           OR c.id IN (SELECT value FROM json_each(?))
+        """, (fecha_desde, json.dumps(sorted(ids))))
+        filas = cursor.fetchall()
+        conn.close()
+    
+        return [{
+            'id': c[0],
+            'tipo': c[1],
+            'fecha': c[2],
+            'hora': c[3],
+            'tema': c[4],
+            'estado': c[5],
+            'fecha_creacion': c[6],
+            'cliente_nombre': c[8],
+            'cliente': {
+                'id': c[7],
+                'nombre': c[8],
+                'email': c[9],
+                'telefono': c[10]
+            }
+        } for c in filas]
+
+    def guardar_sincronizacion_citas(self, registros):
+        """
+        Guarda en una sola transacción el evento de Google, la firma y el estado
+        del evento de varias citas.
+    
+        Args:
+            registros: Lista de tuplas (cita_id, evento_id, firma, estado_evento)
+        """
+        if not registros:
+            return
+    
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        fecha_sincronizacion = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cursor.executemany(
+            "INSERT INTO sincronizacion_citas (cita_id, evento_id, firma, estado_evento, fecha_sincronizacion) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(cita_id) DO UPDATE SET evento_id = excluded.evento_id, firma = excluded.firma, "
+            "estado_evento = excluded.estado_evento, fecha_sincronizacion = excluded.fecha_sincronizacion",
+            [registro + (fecha_sincronizacion,) for registro in registros]
+        )
+    
+        conn.commit()
+        conn.close()
+
+    def adquirir_bloqueo(self, nombre, propietario, duracion):
+        """
+        Intenta adquirir un bloqueo con nombre de forma atómica. Lo consigue si
+        nadie lo tiene, si el bloqueo anterior ha caducado o si ya es suyo (en
+        cuyo caso se renueva).
+    
+        Args:
+            nombre: Nombre del bloqueo
+            propietario: Identificador único de quien lo solicita (proceso/hilo)
+            duracion: Segundos tras los que caduca si no se libera
+        
+        Returns:
+            True si se ha adquirido el bloqueo
+        """
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        ahora = datetime.datetime.now().timestamp()
+        cursor.execute(
+            "INSERT INTO bloqueos (nombre, propietario, expira) VALUES (?, ?, ?) "
+            "ON CONFLICT(nombre) DO UPDATE SET propietario = excluded.propietario, expira = excluded.expira "
+            "WHERE bloqueos.expira < ? OR bloqueos.propietario = excluded.propietario",
+            (nombre, propietario, ahora + duracion, ahora)
+        )
+        adquirido = cursor.rowcount == 1
+    
+        conn.commit()
+        conn.close()
+        return adquirido
+
+    def liberar_bloqueo(self, nombre, propietario):
+        """Libera un bloqueo si pertenece al propietario indicado."""
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        cursor.execute("DELETE FROM bloqueos WHERE nombre = ? AND propietario = ?", (nombre, propietario))
+    
+        conn.commit()
+        conn.close()
+
+    def bloqueo_activo(self, nombre):
+        """Indica si alguien tiene el bloqueo indicado y aún no ha caducado."""
+        conn = self.conectar()
+        cursor = conn.cursor()
+    
+        cursor.execute("SELECT 1 FROM bloqueos WHERE nombre = ? AND expira >= ?",
+                       (nombre, datetime.datetime.now().timestamp()))
+        activo = cursor.fetchone() is not None
+    
+        conn.close()
+        return activo
+
+_instancias = {}
+_lock_instancias = threading.Lock()
+
+def get_db(db_file='botia.db'):
+    """
+    DatabaseManager compartido por todo el proceso para el fichero indicado
+    (cada hilo usa su propia conexión).
+    """
+    ruta = os.path.abspath(db_file)
+    with _lock_instancias:
+        if ruta not in _instancias or not os.path.exists(ruta):
+            _instancias[ruta] = DatabaseManager(db_file)
+        return _instancias[ruta]
@@ -1,11 +1,19 @@
 import os
+import re
+import time
 import datetime
+import hashlib
 import pickle
 import logging
+import threading
+from zoneinfo import ZoneInfo
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+import config
 from config import HORARIOS_POR_TIPO, TIPOS_REUNION
+from utils.disponibilidad import AvailabilityGrid
+from utils import cache_disponibilidad
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -13,310 +21,550 @@ logger = logging.getLogger(__name__)
 # Si modificas estos SCOPES, borra el archivo token.pickle.
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+RUTA_TOKEN = 'token.pickle'
+
+# La búsqueda de la próxima fecha disponible consulta el horizonte en bloques de
+# estos días (una consulta de rango a la BD y otra a Google por bloque)
+DIAS_BLOQUE_BUSQUEDA = 7
+
+# Las credenciales se refrescan si caducan dentro de este margen
+MARGEN_REFRESCO_CREDENCIALES = datetime.timedelta(minutes=5)
+
+# Caché del servicio de Google Calendar. Las credenciales se cargan una vez por
+# proceso y se comparten; el servicio (y con él su transporte HTTP, que no es
+# seguro entre hilos) se construye una vez por hilo. Cada invalidación incrementa
+# la versión, lo que obliga a recargar token.pickle y reconstruir los servicios.
+_lock_servicio = threading.Lock()
+_credenciales = None
+_mtime_token = None
+_version_servicio = 0
+_servicios_por_hilo = threading.local()
+
+def invalidar_servicio_google():
+    """
+    Descarta las credenciales y los servicios de Google Calendar en caché.
+    Debe llamarse cuando cambia o se elimina token.pickle (reconexión o
+    desconexión desde el panel de administración).
+    """
+    global _credenciales, _mtime_token, _version_servicio
+    with _lock_servicio:
+        _credenciales = None
+        _mtime_token = None
+        _version_servicio += 1
+    logger.info("Caché del servicio de Google Calendar invalidada")
+
+def _necesita_refresco(creds):
+    """Indica si las credenciales no son válidas o caducan dentro del margen."""
+    if not creds.valid:
+        return True
+    if creds.expiry is None:
+        return False
+    ahora_utc = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return creds.expiry - ahora_utc < MARGEN_REFRESCO_CREDENCIALES
+
+def _obtener_credenciales():
+    """
+    Devuelve (credenciales, versión) desde la caché, cargando token.pickle solo
+    la primera vez o si el fichero ha cambiado, y refrescando el token solo
+    cuando está a punto de caducar.
+    """
+    global _credenciales, _mtime_token, _version_servicio
+    with _lock_servicio:
+        # El archivo token.pickle almacena los tokens de acceso y actualización del usuario
+        try:
+            mtime = os.path.getmtime(RUTA_TOKEN)
+        except OSError:
+            mtime = None
+        
+        if _credenciales is None or mtime != _mtime_token:
+            if _credenciales is not None:
+                # token.pickle ha cambiado o se ha eliminado fuera de este proceso
+                _version_servicio += 1
+            _credenciales = None
+            if mtime is not None:
+                with open(RUTA_TOKEN, 'rb') as token:
+                    _credenciales = pickle.load(token)
+                _mtime_token = mtime
+        
+        creds = _credenciales
+        
+        # Si no hay credenciales disponibles o no son válidas, el usuario debe iniciar sesión
+        if not creds or _necesita_refresco(creds):
+            if creds and creds.refresh_token:
+                try:
+                    creds.refresh(Request())
+                    # Guardar las credenciales actualizadas
+                    with open(RUTA_TOKEN, 'wb') as token:
+                        pickle.dump(creds, token)
+                    _mtime_token = os.path.getmtime(RUTA_TOKEN)
+                except Exception as e:
+                    logger.error(f"Error al refrescar credenciales: {str(e)}")
+                    if creds.valid:
+                        # El token actual aún no ha caducado: se vuelve a intentar en la próxima llamada
+                        return creds, _version_servicio
+                    # En esta implementación web, no eliminamos el token automáticamente
+                    # En su lugar, notificamos al administrador para que se reautentique desde la web
+                    logger.error("Las credenciales de Google Calendar han expirado y no se pueden refrescar. Por favor, reconecte desde la configuración.")
+                    raise Exception("Las credenciales de Google Calendar han expirado. Por favor, reconecte desde la sección de configuración.")
+            elif not creds or not creds.valid:
+                # No hay credenciales válidas
+                logger.error("No se encontraron credenciales válidas de Google Calendar.")
+                raise Exception("No hay credenciales válidas de Google Calendar. Por favor, configure la integración desde el panel de administración.")
+        
+        return creds, _version_servicio
+
 def get_google_calendar_service():
     """
     Obtiene un servicio de Google Calendar autenticado.
     
+    El servicio se construye una sola vez por hilo (cada hilo tiene su propio
+    transporte HTTP) y se reutiliza mientras no se invaliden las credenciales.
+    
     Returns:
         Servicio de Google Calendar
     """
-    import os
-    import pickle
-    from google.oauth2.credentials import Credentials
-    from google.auth.transport.requests import Request
-    from googleapiclient.discovery import build
-    
-    creds = None
-    # El archivo token.pickle almacena los tokens de acceso y actualización del usuario
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    
-    # Si no hay credenciales disponibles o no son válidas, el usuario debe iniciar sesión
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                # Guardar las credenciales actualizadas
-                with open('token.pickle', 'wb') as token:
-                    pickle.dump(creds, token)
-            except Exception as e:
-                logger.error(f"Error al refrescar credenciales: {str(e)}")
-                # En esta implementación web, no eliminamos el token automáticamente
-                # En su lugar, notificamos al administrador para que se reautentique desde la web
-                logger.error("Las credenciales de Google Calendar han expirado y no se pueden refrescar. Por favor, reconecte desde la configuración.")
-                raise Exception("Las credenciales de Google Calendar han expirado. Por favor, reconecte desde la sección de configuración.")
-        else:
-            # No hay credenciales válidas
-            logger.error("No se encontraron credenciales válidas de Google Calendar.")
-            raise Exception("No hay credenciales válidas de Google Calendar. Por favor, configure la integración desde el panel de administración.")
+    creds, version = _obtener_credenciales()
+    
+    en_cache = getattr(_servicios_por_hilo, "servicio", None)
+    if en_cache is not None and en_cache[0] == version:
+        return en_cache[1]
     
     # Construir el servicio de calendario
     try:
         service = build('calendar', 'v3', credentials=creds)
-        return service
     except Exception as e:
         logger.error(f"Error al construir el servicio de Google Calendar: {str(e)}")
         raise Exception(f"Error al conectar con Google Calendar: {str(e)}")
     
+    _servicios_por_hilo.servicio = (version, service)
+    return service
+    
 
-# Modificación para handlers/calendar_service.py
-# Mejora en la función obtener_horarios_disponibles para evitar horas pasadas y solapadas
-# Corrección para handlers/calendar_service.py
+def _duracion_evento_bd(evento):
+    """Duración en minutos de un evento de la base de datos según su tipo de cita."""
+    if evento['type'] != 'appointment':
+        return 30  # Valor por defecto
+    
+    # Obtener el tipo de cita (presencial, videoconferencia, telefonica)
+    tipo_evento = None
+    
+    # Intentar extraer el tipo del título o descripción
+    if 'title' in evento:
+        titulo = evento['title'].lower()
+        if 'presencial' in titulo:
+            tipo_evento = 'presencial'
+        elif 'videoconferencia' in titulo:
+            tipo_evento = 'videoconferencia'
+        elif 'telefónica' in titulo or 'telefonica' in titulo:
+            tipo_evento = 'telefonica'
+    
+    # Si no se encontró en el título, buscar en otros campos
+    if not tipo_evento and 'tipo' in evento:
+        tipo_evento = evento['tipo']
+    
+    # Usar la duración correspondiente al tipo; si no se puede determinar, 30 minutos
+    if tipo_evento in TIPOS_REUNION:
+        return TIPOS_REUNION[tipo_evento]["duracion_real"]
+    return 30
 
-def obtener_horarios_disponibles(fecha, tipo_reunion):
+def _cargar_eventos_bd(fecha_inicio, fecha_fin):
     """
-    Obtiene los horarios disponibles para la fecha y tipo de reunión especificados.
-    Usa tanto la API de Google Calendar como la base de datos local para verificar disponibilidad.
+    Carga con una única consulta las citas y eventos de la base de datos entre
+    dos fechas (inclusive).
+    
+    Returns:
+        Diccionario {"YYYY-MM-DD": [(minuto de inicio, minuto de fin), ...]}
+    """
+    from db_manager import get_db
+    db = get_db()
+    
+    db_events = db.get_all_calendar_events(fecha_inicio.strftime("%Y-%m-%d"), fecha_fin.strftime("%Y-%m-%d"))
+    logger.debug(f"Eventos encontrados en base de datos: {len(db_events)}")
+    
+    ocupados = {}
+    for evento in db_events:
+        if 'start' not in evento:
+            continue
+        
+        # Extraer fecha y hora de inicio del evento (formato YYYY-MM-DDTHH:MM)
+        fecha_evento, _, hora_evento = evento['start'].partition('T')
+        try:
+            hora, minutos = map(int, hora_evento[:5].split(':'))
+        except ValueError:
+            logger.warning(f"Evento de BD con hora no válida, se ignora: {evento['start']}")
+            continue
+        if not (0 <= hora <= 23 and 0 <= minutos <= 59):
+            logger.warning(f"Evento de BD con hora no válida, se ignora: {evento['start']}")
+            continue
+        
+        duracion_evento = _duracion_evento_bd(evento)
+        logger.debug(f"Evento de BD: {fecha_evento} {hora_evento[:5]}, duración: {duracion_evento} min")
+        
+        inicio = hora * 60 + minutos
+        ocupados.setdefault(fecha_evento, []).append((inicio, inicio + duracion_evento))
+    
+    return ocupados
+
+def _cargar_eventos_google(fecha_inicio, fecha_fin):
+    """
+    Descarga con una única consulta (paginada) los eventos con hora de Google
+    Calendar desde las 00:00 UTC de fecha_inicio hasta las 00:00 UTC del día
+    siguiente a fecha_fin.
+    
+    Returns:
+        Lista de tuplas (inicio, fin, inicio_utc, fin_utc) con datetimes sin zona
+        horaria: inicio/fin con la hora tal como viene de Google e inicio_utc/fin_utc
+        convertidos a UTC para saber qué días abarca cada evento
+    """
+    service = get_google_calendar_service()
+    
+    time_min = fecha_inicio.isoformat() + 'Z'
+    time_max = (fecha_fin + datetime.timedelta(days=1)).isoformat() + 'Z'
+    
+    items = []
+    pagina = None
+    while True:
+        eventos = service.events().list(
+            calendarId='primary',
+            timeMin=time_min,
+            timeMax=time_max,
+            singleEvents=True,
+            orderBy='startTime',
+            pageToken=pagina
+        ).execute()
+        items.extend(eventos.get('items', []))
+        pagina = eventos.get('nextPageToken')
+        if not pagina:
+            break
+    
+    logger.debug(f"Eventos encontrados en Google Calendar: {len(items)}")
+    
+    resultado = []
+    for evento in items:
+        inicio = evento['start'].get('dateTime', evento['start'].get('date'))
+        fin = evento['end'].get('dateTime', evento['end'].get('date'))
+        
+        # Los eventos de día completo no ocupan horarios concretos
+        if 'T' not in inicio:
+            continue
+        
+        resultado.append(_intervalo_google(inicio, fin))
+    
+    return resultado
+
+def _intervalo_google(inicio, fin):
+    """
+    Convierte un intervalo con hora de Google Calendar (RFC 3339) en la tupla
+    (inicio, fin, inicio_utc, fin_utc) de datetimes sin zona horaria.
+    """
+    inicio_dt = datetime.datetime.fromisoformat(inicio.replace('Z', '+00:00'))
+    fin_dt = datetime.datetime.fromisoformat(fin.replace('Z', '+00:00'))
+    
+    inicio_utc = inicio_dt.astimezone(datetime.timezone.utc).replace(tzinfo=None) if inicio_dt.tzinfo else inicio_dt
+    fin_utc = fin_dt.astimezone(datetime.timezone.utc).replace(tzinfo=None) if fin_dt.tzinfo else fin_dt
+    
+    # Eliminar información de zona horaria
+    return inicio_dt.replace(tzinfo=None), fin_dt.replace(tzinfo=None), inicio_utc, fin_utc
+
+def consultar_freebusy(fecha_inicio, fecha_fin, calendarios=None):
+    """
+    Consulta en una única petición FreeBusy los intervalos ocupados de uno o
+    varios calendarios (por ejemplo, uno por abogado) desde las 00:00 UTC de
+    fecha_inicio hasta las 00:00 UTC del día siguiente a fecha_fin. Las horas se
+    piden en config.ZONA_HORARIA_CALENDARIO, la misma en que se ofrecen las citas.
     
     Args:
-        fecha: Fecha en formato datetime o string "YYYY-MM-DD"
+        fecha_inicio: Primer día (datetime a las 00:00)
+        fecha_fin: Último día (datetime a las 00:00)
+        calendarios: Identificadores de calendario (por defecto config.CALENDARIOS_DISPONIBILIDAD)
+        
+    Returns:
+        Diccionario {calendario: [(inicio, fin, inicio_utc, fin_utc), ...]}; los
+        calendarios que Google no puede consultar se omiten
+    """
+    if calendarios is None:
+        calendarios = config.CALENDARIOS_DISPONIBILIDAD
+    
+    service = get_google_calendar_service()
+    respuesta = service.freebusy().query(body={
+        'timeMin': fecha_inicio.isoformat() + 'Z',
+        'timeMax': (fecha_fin + datetime.timedelta(days=1)).isoformat() + 'Z',
+        'timeZone': config.ZONA_HORARIA_CALENDARIO,
+        'items': [{'id': calendario} for calendario in calendarios]
+    }).execute()
+    
+    ocupacion = {}
+    for calendario in calendarios:
+        datos = respuesta.get('calendars', {}).get(calendario, {})
+        if datos.get('errors'):
+            logger.warning(f"FreeBusy no puede consultar el calendario '{calendario}': {datos['errors']}")
+            continue
+        ocupacion[calendario] = [_intervalo_google(ocupado['start'], ocupado['end']) for ocupado in datos.get('busy', [])]
+        logger.debug(f"Intervalos ocupados en '{calendario}': {len(ocupacion[calendario])}")
+    
+    return ocupacion
+
+def _cargar_ocupacion_google(fecha_inicio, fecha_fin):
+    """
+    Intervalos ocupados de Google Calendar en el rango, con el origen indicado en
+    config.BACKEND_DISPONIBILIDAD: la unión de los calendarios configurados vía
+    FreeBusy ("freebusy") o los eventos del calendario principal ("eventos").
+    """
+    if config.BACKEND_DISPONIBILIDAD == "freebusy":
+        ocupacion = consultar_freebusy(fecha_inicio, fecha_fin)
+        return [intervalo for intervalos in ocupacion.values() for intervalo in intervalos]
+    return _cargar_eventos_google(fecha_inicio, fecha_fin)
+
+def horarios_libres(grid, tipo_reunion, ahora=None):
+    """
+    Horarios del tipo de reunión que están libres en el grid de un día, que
+    terminan dentro de la franja de mañana (13:00) o de tarde (19:00) y, si el
+    día es hoy, que empiezan al menos 30 minutos después de ahora.
+    
+    Args:
+        grid: AvailabilityGrid del día con los eventos ya marcados
         tipo_reunion: Tipo de reunión (presencial, videoconferencia, telefonica)
+        ahora: Fecha y hora actual (por defecto, datetime.now())
         
     Returns:
         Lista de horarios disponibles en formato "HH:MM"
     """
-    # Convertir fecha a datetime si es string
-    if isinstance(fecha, str):
-        fecha = datetime.datetime.strptime(fecha, "%Y-%m-%d")
+    if ahora is None:
+        ahora = datetime.datetime.now()
+    duracion = TIPOS_REUNION[tipo_reunion]["duracion_real"]
     
-    # Ajustar fecha para que sea solo la parte de la fecha
-    fecha_dt = fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+    # Si la fecha es hoy, filtrar horarios pasados (con 30 min de margen mínimo)
+    despues_de = None
+    if grid.fecha.date() == ahora.date():
+        despues_de = ahora.hour * 60 + ahora.minute + 30
     
-    # Obtener la fecha y hora actual
-    ahora = datetime.datetime.now()
+    return (grid.horarios_libres(HORARIOS_POR_TIPO[tipo_reunion]["manana"], duracion, 13 * 60, despues_de) +
+            grid.horarios_libres(HORARIOS_POR_TIPO[tipo_reunion]["tarde"], duracion, 19 * 60, despues_de))
+
+def obtener_grids_rango(fecha_inicio, fecha_fin, ahora=None):
+    """
+    Construye el AvailabilityGrid de cada día laborable no pasado entre dos fechas
+    (inclusive) con una sola consulta a la base de datos y una sola a Google
+    Calendar. Los grids no dependen del tipo de reunión, así que sirven para
+    calcular los horarios libres de cualquier tipo.
+    
+    Args:
+        fecha_inicio: Primer día, en formato datetime o string "YYYY-MM-DD"
+        fecha_fin: Último día, en formato datetime o string "YYYY-MM-DD"
+        ahora: Fecha y hora actual (por defecto, datetime.now())
+        
+    Returns:
+        Diccionario ordenado por fecha {"YYYY-MM-DD": AvailabilityGrid}
+    """
+    return _construir_grids_rango(fecha_inicio, fecha_fin, ahora)[0]
+
+def _construir_grids_rango(fecha_inicio, fecha_fin, ahora=None):
+    """
+    Igual que obtener_grids_rango, pero devuelve también si se pudo leer la
+    ocupación de la base de datos y de Google Calendar (solo entonces se guarda
+    el resultado en la caché de disponibilidad).
     
-    # Si es fin de semana, no hay horarios disponibles
-    if fecha_dt.weekday() >= 5:  # 5=Sábado, 6=Domingo
-        logger.debug(f"Día {fecha_dt.strftime('%Y-%m-%d')} es fin de semana, sin horarios disponibles")
-        return []
+    Returns:
+        Tupla (grids, completos)
+    """
+    if isinstance(fecha_inicio, str):
+        fecha_inicio = datetime.datetime.strptime(fecha_inicio, "%Y-%m-%d")
+    if isinstance(fecha_fin, str):
+        fecha_fin = datetime.datetime.strptime(fecha_fin, "%Y-%m-%d")
+    fecha_inicio = fecha_inicio.replace(hour=0, minute=0, second=0, microsecond=0)
+    fecha_fin = fecha_fin.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Si la fecha es anterior a hoy, no hay horarios disponibles
-    if fecha_dt.date() < ahora.date():
-        logger.debug(f"Fecha {fecha_dt.strftime('%Y-%m-%d')} es anterior a hoy, sin horarios disponibles")
-        return []
+    if ahora is None:
+        ahora = datetime.datetime.now()
     
-    # Obtener los horarios para el tipo de reunión específico
-    horarios_manana = HORARIOS_POR_TIPO[tipo_reunion]["manana"]
-    horarios_tarde = HORARIOS_POR_TIPO[tipo_reunion]["tarde"]
-    horarios_completos = horarios_manana + horarios_tarde
+    # Solo los días laborables no pasados del rango tienen horarios
+    grids = {}
+    fecha_dt = fecha_inicio
+    while fecha_dt <= fecha_fin:
+        if fecha_dt.weekday() < 5 and fecha_dt.date() >= ahora.date():  # 5=Sábado, 6=Domingo
+            grids[fecha_dt.strftime("%Y-%m-%d")] = AvailabilityGrid(fecha_dt)
+        fecha_dt += datetime.timedelta(days=1)
     
-    # Inicializar lista de horas ocupadas
-    horas_ocupadas = []
+    if not grids:
+        logger.debug(f"Sin días laborables futuros entre {fecha_inicio.strftime('%Y-%m-%d')} y {fecha_fin.strftime('%Y-%m-%d')}")
+        return grids, True
     
-    # PASO 1: Obtener eventos de la base de datos primero
+    primer_dia = next(iter(grids.values())).fecha
+    ultimo_dia = next(reversed(grids.values())).fecha
+    
+    completos = True
+    
+    # PASO 1: Marcar los eventos de la base de datos
     try:
-        from db_manager import DatabaseManager
-        db = DatabaseManager()
-        fecha_str = fecha_dt.strftime("%Y-%m-%d")
-        
-        # Obtener todos los eventos para el día de la base de datos
-        db_events = db.get_all_calendar_events(fecha_str, fecha_str)
-        logger.debug(f"Eventos encontrados en base de datos: {len(db_events)}")
-        
-        for evento in db_events:
-            if 'start' in evento:
-                # Extraer hora de inicio del evento
-                start_time = evento['start'].split('T')[1][:5]  # Formato HH:MM
-                
-                # Determinar duración del evento basada en el tipo de cita
-                duracion_evento = 30  # Valor por defecto
-                
-                if evento['type'] == 'appointment':
-                    # Obtener el tipo de cita (presencial, videoconferencia, telefonica)
-                    tipo_evento = None
-                    
-                    # Intentar extraer el tipo del título o descripción
-                    if 'title' in evento:
-                        titulo = evento['title'].lower()
-                        if 'presencial' in titulo:
-                            tipo_evento = 'presencial'
-                        elif 'videoconferencia' in titulo:
-                            tipo_evento = 'videoconferencia'
-                        elif 'telefónica' in titulo or 'telefonica' in titulo:
-                            tipo_evento = 'telefonica'
-                    
-                    # Si no se encontró en el título, buscar en otros campos
-                    if not tipo_evento and 'tipo' in evento:
-                        tipo_evento = evento['tipo']
-                    
-                    # Usar la duración correspondiente al tipo
-                    if tipo_evento in TIPOS_REUNION:
-                        duracion_evento = TIPOS_REUNION[tipo_evento]["duracion_real"]
-                    else:
-                        # Si no se puede determinar el tipo, asumir 30 minutos
-                        duracion_evento = 30
-                
-                logger.debug(f"Evento de BD: {start_time}, duración: {duracion_evento} min")
-                
-                # Para cada horario disponible, verificar solapamiento con este evento
-                for hora_str in horarios_completos:
-                    hora, minutos = map(int, hora_str.split(':'))
-                    cita_inicio = fecha_dt.replace(hour=hora, minute=minutos)
-                    cita_fin = cita_inicio + datetime.timedelta(minutes=TIPOS_REUNION[tipo_reunion]["duracion_real"])
-                    
-                    # Calcular inicio y fin del evento
-                    hora_evento, minutos_evento = map(int, start_time.split(':'))
-                    evento_inicio = fecha_dt.replace(hour=hora_evento, minute=minutos_evento)
-                    evento_fin = evento_inicio + datetime.timedelta(minutes=duracion_evento)
-                    
-                    # Verificar si hay solapamiento
-                    if max(cita_inicio, evento_inicio) < min(cita_fin, evento_fin):
-                        if hora_str not in horas_ocupadas:
-                            horas_ocupadas.append(hora_str)
-                            logger.debug(f"Hora ocupada por evento de BD: {hora_str}")
+        for fecha_str, ocupados in _cargar_eventos_bd(primer_dia, ultimo_dia).items():
+            grid = grids.get(fecha_str)
+            if grid is not None:
+                for inicio, fin in ocupados:
+                    grid.marcar_ocupado(inicio, fin)
     except Exception as e:
         logger.warning(f"Error al obtener eventos de BD: {str(e)}")
         import traceback
         logger.warning(traceback.format_exc())
+        completos = False
     
-    # PASO 2: Obtener eventos de Google Calendar si está disponible
+    # PASO 2: Marcar los eventos de Google Calendar si está disponible
     try:
-        # Obtener servicio de calendario
-        service = get_google_calendar_service()
-        
-        # Establecer rango de tiempo para consultar (todo el día especificado)
-        time_min = fecha_dt.isoformat() + 'Z'
-        time_max = (fecha_dt + datetime.timedelta(days=1)).isoformat() + 'Z'
-        
-        # Obtener eventos del calendario para el día
-        eventos = service.events().list(
-            calendarId='primary',
-            timeMin=time_min,
-            timeMax=time_max,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        logger.debug(f"Eventos encontrados en Google Calendar: {len(eventos.get('items', []))}")
-        
-        for evento in eventos.get('items', []):
-            inicio = evento['start'].get('dateTime', evento['start'].get('date'))
-            fin = evento['end'].get('dateTime', evento['end'].get('date'))
-            
-            # Convertir a datetime
-            if 'T' in inicio:  # Formato con hora
-                inicio_dt = datetime.datetime.fromisoformat(inicio.replace('Z', '+00:00'))
-                fin_dt = datetime.datetime.fromisoformat(fin.replace('Z', '+00:00'))
-                
-                # Eliminar información de zona horaria
-                inicio_dt = inicio_dt.replace(tzinfo=None)
-                fin_dt = fin_dt.replace(tzinfo=None)
-                
-                # Duración del evento en minutos
-                duracion_evento = int((fin_dt - inicio_dt).total_seconds() / 60)
-                
-                logger.debug(f"Evento de Google: {inicio_dt.strftime('%H:%M')} - {fin_dt.strftime('%H:%M')}, duración: {duracion_evento} min")
-                
-                # Verificar solape con cada horario disponible
-                for hora_str in horarios_completos:
-                    if hora_str in horas_ocupadas:
-                        continue  # Ya está marcado como ocupado, saltar
-                    
-                    hora, minutos = map(int, hora_str.split(':'))
-                    hora_dt = fecha_dt.replace(hour=hora, minute=minutos)
-                    duracion_minutos = TIPOS_REUNION[tipo_reunion]["duracion_real"]
-                    fin_hora_dt = hora_dt + datetime.timedelta(minutes=duracion_minutos)
-                    
-                    # Comprobar superposición
-                    if max(hora_dt, inicio_dt) < min(fin_hora_dt, fin_dt):
-                        horas_ocupadas.append(hora_str)
-                        logger.debug(f"Hora ocupada por evento de Google: {hora_str}")
+        eventos_google = _cargar_ocupacion_google(primer_dia, ultimo_dia)
     except Exception as e:
         logger.warning(f"Error al obtener eventos de Google Calendar: {str(e)}")
         # Continuamos con los eventos que ya obtuvimos de la BD
+        eventos_google = []
+        completos = False
     
-    # PASO 3: Filtrar horarios disponibles basado en horas ocupadas
-    horarios_disponibles = []
-    for hora in horarios_completos:
-        if hora not in horas_ocupadas:
-            # Verificar que no se extiende más allá del horario laboral
-            hora_dt = datetime.datetime.strptime(hora, "%H:%M")
-            duracion = TIPOS_REUNION[tipo_reunion]["duracion_real"]
-            hora_fin = hora_dt + datetime.timedelta(minutes=duracion)
-            hora_fin_str = hora_fin.strftime("%H:%M")
-            
-            # Verificar horario de mañana y tarde
-            if hora in horarios_manana and hora_fin_str <= "13:00":
-                horarios_disponibles.append(hora)
-            elif hora in horarios_tarde and hora_fin_str <= "19:00":
-                horarios_disponibles.append(hora)
-    
-    # PASO 4: Si la fecha es hoy, filtrar horarios pasados
-    es_hoy = fecha_dt.date() == ahora.date()
-    
-    if es_hoy:
-        horarios_disponibles_filtrados = []
-        for hora in horarios_disponibles:
-            # Convertir la hora a objeto time para comparar
-            hora_partes = hora.split(':')
-            hora_obj = int(hora_partes[0])
-            minutos_obj = int(hora_partes[1])
-            
-            # Convertir a minutos para comparación más sencilla
-            minutos_actuales = ahora.hour * 60 + ahora.minute + 30  # Añadir 30 min de margen mínimo
-            minutos_hora = hora_obj * 60 + minutos_obj
-            
-            # Si es hora futura con margen mínimo de 30 min, incluirla
-            if minutos_hora > minutos_actuales:
-                horarios_disponibles_filtrados.append(hora)
+    # Un evento de Google afecta a los días cuya ventana UTC de 24 horas toca,
+    # igual que si se hubiera consultado día a día
+    for inicio, fin, inicio_utc, fin_utc in eventos_google:
+        fecha_dt = max(primer_dia, inicio_utc.replace(hour=0, minute=0, second=0, microsecond=0))
+        while fecha_dt <= ultimo_dia and fecha_dt < fin_utc:
+            grid = grids.get(fecha_dt.strftime("%Y-%m-%d"))
+            if grid is not None and inicio_utc < fecha_dt + datetime.timedelta(days=1):
+                grid.marcar_evento(inicio, fin)
+            fecha_dt += datetime.timedelta(days=1)
+    
+    return grids, completos
+
+def _filtrar_pasados(horarios, fecha_dt, ahora):
+    """
+    Quita de los horarios de hoy los que empiezan antes de 30 minutos después de
+    ahora (los guardados en caché se calcularon con una hora anterior).
+    """
+    if fecha_dt.date() != ahora.date():
+        return horarios
+    despues_de = ahora.hour * 60 + ahora.minute + 30
+    return [hora for hora in horarios if int(hora[:2]) * 60 + int(hora[3:5]) > despues_de]
+
+def obtener_disponibilidad_rango(fecha_inicio, fecha_fin, tipo_reunion):
+    """
+    Obtiene los horarios disponibles de todos los días entre dos fechas (inclusive)
+    con una sola consulta a la base de datos y una sola a Google Calendar; la
+    ocupación de cada día se calcula después en memoria.
+    
+    Los días que están en la caché de disponibilidad no se vuelven a calcular;
+    solo se consulta el tramo entre el primer y el último día que faltan.
+    
+    Args:
+        fecha_inicio: Primer día, en formato datetime o string "YYYY-MM-DD"
+        fecha_fin: Último día, en formato datetime o string "YYYY-MM-DD"
+        tipo_reunion: Tipo de reunión (presencial, videoconferencia, telefonica)
         
-        logger.debug(f"Fecha es hoy, filtrando horarios pasados. Disponibles: {horarios_disponibles_filtrados}")
-        return horarios_disponibles_filtrados
-    else:
-        logger.debug(f"Horarios disponibles para {fecha_dt.strftime('%Y-%m-%d')}: {horarios_disponibles}")
-        return horarios_disponibles  
+    Returns:
+        Diccionario {"YYYY-MM-DD": [horarios "HH:MM"]} con una entrada por día del
+        rango; los fines de semana y los días pasados tienen la lista vacía
+    """
+    if isinstance(fecha_inicio, str):
+        fecha_inicio = datetime.datetime.strptime(fecha_inicio, "%Y-%m-%d")
+    if isinstance(fecha_fin, str):
+        fecha_fin = datetime.datetime.strptime(fecha_fin, "%Y-%m-%d")
+    fecha_inicio = fecha_inicio.replace(hour=0, minute=0, second=0, microsecond=0)
+    fecha_fin = fecha_fin.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    ahora = datetime.datetime.now()
+    
+    # Días servidos desde la caché y días que hay que calcular
+    disponibilidad = {}
+    pendientes = []
+    fecha_dt = fecha_inicio
+    while fecha_dt <= fecha_fin:
+        fecha_str = fecha_dt.strftime("%Y-%m-%d")
+        if fecha_dt.weekday() >= 5 or fecha_dt.date() < ahora.date():  # 5=Sábado, 6=Domingo
+            horarios = []
+        else:
+            horarios = cache_disponibilidad.obtener(fecha_str, tipo_reunion)
+            if horarios is not None:
+                horarios = _filtrar_pasados(horarios, fecha_dt, ahora)
+            else:
+                pendientes.append(fecha_dt)
+        disponibilidad[fecha_str] = horarios
+        fecha_dt += datetime.timedelta(days=1)
+    
+    if pendientes:
+        version = cache_disponibilidad.versiones(pendientes)
+        grids, completos = _construir_grids_rango(pendientes[0], pendientes[-1], ahora)
+        calculados = {}
+        for fecha_dt in pendientes:
+            fecha_str = fecha_dt.strftime("%Y-%m-%d")
+            calculados[fecha_str] = horarios_libres(grids[fecha_str], tipo_reunion, ahora)
+            logger.debug(f"Horarios disponibles para {fecha_str}: {calculados[fecha_str]}")
+        disponibilidad.update(calculados)
+        
+        # Si la BD o Google han fallado, el resultado no se guarda en la caché
+        if completos:
+            cache_disponibilidad.guardar(calculados, tipo_reunion, version)
+    
+    return disponibilidad
+
+def estadisticas_cache_disponibilidad():
+    """
+    Contadores de la caché de disponibilidad: aciertos, fallos, tasa de aciertos,
+    entradas caducadas, invalidaciones y cálculos descartados por obsoletos.
+    """
+    return cache_disponibilidad.estadisticas()
+
+def obtener_horarios_disponibles(fecha, tipo_reunion):
+    """
+    Obtiene los horarios disponibles para la fecha y tipo de reunión especificados.
+    Usa tanto la API de Google Calendar como la base de datos local para verificar disponibilidad.
+    
+    Args:
+        fecha: Fecha en formato datetime o string "YYYY-MM-DD"
+        tipo_reunion: Tipo de reunión (presencial, videoconferencia, telefonica)
+        
+    Returns:
+        Lista de horarios disponibles en formato "HH:MM"
+    """
+    # Convertir fecha a datetime si es string
+    if isinstance(fecha, str):
+        fecha = datetime.datetime.strptime(fecha, "%Y-%m-%d")
+    
+    # Ajustar fecha para que sea solo la parte de la fecha
+    fecha_dt = fecha.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    return obtener_disponibilidad_rango(fecha_dt, fecha_dt, tipo_reunion)[fecha_dt.strftime("%Y-%m-%d")]
     
       
-def encontrar_proxima_fecha_disponible(tipo_reunion):
+def encontrar_proxima_fecha_disponible(tipo_reunion, dias=None):
     """
     Encuentra la próxima fecha y hora disponible para el tipo de reunión especificado.
-    Usa la API real de Google Calendar.
+    
+    Recorre el horizonte de búsqueda en bloques de DIAS_BLOQUE_BUSQUEDA días con
+    obtener_disponibilidad_rango (una consulta a la BD y otra a Google Calendar
+    por bloque, o ninguna para los días en caché) y devuelve el primer horario
+    libre en cuanto aparece, sin consultar los bloques siguientes.
     
     Args:
         tipo_reunion: Tipo de reunión (presencial, videoconferencia, telefonica)
+        dias: Días a revisar desde hoy (por defecto config.DIAS_BUSQUEDA_DISPONIBILIDAD)
         
     Returns:
         Tupla (fecha, hora) de la próxima cita disponible o (None, None) si no hay disponibilidad
     """
-    logger.debug(f"ENTRADA encontrar_proxima_fecha_disponible: tipo_reunion={tipo_reunion}")
+    if dias is None:
+        dias = config.DIAS_BUSQUEDA_DISPONIBILIDAD
+    logger.debug(f"ENTRADA encontrar_proxima_fecha_disponible: tipo_reunion={tipo_reunion}, dias={dias}")
     
     try:
-        hoy = datetime.datetime.now()
-        logger.debug(f"Fecha y hora actual: {hoy}")
-        hora_actual = hoy.time()
-        logger.debug(f"Hora actual: {hora_actual}")
-        
-        # Buscar en los próximos 14 días
-        for i in range(14):
-            fecha_check = hoy + datetime.timedelta(days=i)
-            logger.debug(f"Comprobando fecha: {fecha_check}")
+        hoy = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        ultimo_dia = hoy + datetime.timedelta(days=dias - 1)
+        
+        inicio_bloque = hoy
+        while inicio_bloque <= ultimo_dia:
+            fin_bloque = min(inicio_bloque + datetime.timedelta(days=DIAS_BLOQUE_BUSQUEDA - 1), ultimo_dia)
+            logger.debug(f"Comprobando del {inicio_bloque:%Y-%m-%d} al {fin_bloque:%Y-%m-%d}")
             
-            # Saltar fines de semana
-            if fecha_check.weekday() >= 5:  # 5=Sábado, 6=Domingo
-                logger.debug(f"Fecha {fecha_check} es fin de semana, saltando")
-                continue
-                
-            # Obtener horarios disponibles para ese día (ya filtrados por la hora actual si es hoy)
-            horarios = obtener_horarios_disponibles(fecha_check, tipo_reunion)
-            logger.debug(f"Horarios disponibles para {fecha_check}: {horarios}")
+            # Los horarios de hoy ya vienen filtrados (al menos 30 min en el futuro)
+            disponibilidad = obtener_disponibilidad_rango(inicio_bloque, fin_bloque, tipo_reunion)
+            for fecha_str in sorted(disponibilidad):
+                if disponibilidad[fecha_str]:
+                    return fecha_str, disponibilidad[fecha_str][0]
             
-            if horarios:
-                 # Si es hoy, asegurarse de que el horario es futuro
-                if i == 0:  # Es hoy
-                    hora_actual = hoy.hour * 60 + hoy.minute
-                    horarios_futuros = []
-                    for hora in horarios:
-                        h, m = map(int, hora.split(':'))
-                        minutos_hora = h * 60 + m
-                        if minutos_hora > hora_actual + 30:  # Al menos 30 min en el futuro
-                            horarios_futuros.append(hora)
-                    if horarios_futuros:
-                        return fecha_check.strftime("%Y-%m-%d"), horarios_futuros[0]
-                else:
-                    return fecha_check.strftime("%Y-%m-%d"), horarios[0]
+            inicio_bloque = fin_bloque + datetime.timedelta(days=1)
         
-        logger.debug(f"No se encontraron horarios disponibles en los próximos 14 días")
+        logger.debug(f"No se encontraron horarios disponibles en los próximos {dias} días")
         return None, None
     except Exception as e:
         logger.error(f"ERROR al buscar fecha disponible: {str(e)}")
@@ -397,6 +645,7 @@ def agendar_en_calendario(fecha, hora, tipo_reunion, datos_cliente, tema_reunion
         
         # Crear el evento en el calendario
         evento = service.events().insert(calendarId='primary', body=evento, sendUpdates='all').execute()
+        cache_disponibilidad.invalidar_fechas(fecha)
         
         return evento
     except Exception as e:
@@ -542,31 +791,18 @@ def obtener_dias_disponibles(mes, anio, tipo_reunion):
     # Obtener el número de días en el mes
     _, num_dias = calendar.monthrange(anio, mes)
     
-    # Lista para almacenar los días disponibles
-    dias_disponibles = []
+    # Calcular la disponibilidad de todo el mes de una vez
+    try:
+        disponibilidad = obtener_disponibilidad_rango(
+            datetime.datetime(anio, mes, 1), datetime.datetime(anio, mes, num_dias), tipo_reunion
+        )
+    except Exception as e:
+        logger.error(f"Error al comprobar disponibilidad de {mes}/{anio}: {str(e)}")
+        disponibilidad = {}
     
-    # Comprobar cada día del mes
-    for dia in range(1, num_dias + 1):
-        try:
-            # Crear fecha para el día
-            fecha = datetime.datetime(anio, mes, dia)
-            logger.debug(f"Comprobando día {dia}/{mes}/{anio}")
-
-            # Saltar fines de semana
-            if fecha.weekday() >= 5:  # 5=Sábado, 6=Domingo
-                logger.debug(f"Día {dia}/{mes}/{anio} es fin de semana, saltando")
-                continue
-                
-            # Obtener horarios disponibles para ese día
-            logger.debug(f"Intentando obtener horarios para {dia}/{mes}/{anio}")
-            horarios = obtener_horarios_disponibles(fecha, tipo_reunion)
-            logger.debug(f"Horarios disponibles para {dia}/{mes}/{anio}: {horarios}")
-
-            # Si hay horarios disponibles, añadir el día a la lista
-            if horarios:
-                dias_disponibles.append(dia)
-        except Exception as e:
-            logger.error(f"Error al comprobar disponibilidad del día {dia}/{mes}/{anio}: {str(e)}")
+    # Días con algún horario disponible
+    dias_disponibles = [dia for dia in range(1, num_dias + 1)
+                        if disponibilidad.get(f"{anio:04d}-{mes:02d}-{dia:02d}")]
         
     # Al final de la función, antes de retornar:
     logger.debug(f"Días disponibles encontrados: {dias_disponibles}")
@@ -606,125 +842,397 @@ def _obtener_dias_disponibles_simulados(mes, anio, tipo_reunion):
     return dias_disponibles
 
 
-def sincronizar_calendario_bd():
+# Clave de configuración con el nextSyncToken de la última sincronización
+CLAVE_TOKEN_SINCRONIZACION = 'google_sync_token'
+
+# Días hacia atrás que cubre una sincronización completa
+DIAS_SINCRONIZACION_COMPLETA = 7
+
+# Días hacia delante que cubre una sincronización completa. Con singleEvents cada
+# repetición de un evento periódico es un evento, y sin límite los que no tienen
+# fin no acaban nunca; los cambios en eventos posteriores llegan en las
+# sincronizaciones incrementales siguientes
+DIAS_SINCRONIZACION_COMPLETA_FUTURO = 365
+
+# Peticiones por lote (Google admite hasta 1000, pero recomienda no pasar de 50)
+TAMANO_LOTE_SINCRONIZACION = 50
+
+# Reintentos de las peticiones de un lote que fallan por errores transitorios
+MAX_REINTENTOS_SINCRONIZACION = 2
+ESPERA_REINTENTO_SINCRONIZACION = 1.0
+
+CODIGOS_REINTENTABLES = (429, 500, 502, 503, 504)
+
+PATRON_ID_CITA = re.compile(r'ID: (\d+)')
+
+COLORES_TIPO_REUNION = {"presencial": "11", "videoconferencia": "6", "telefonica": "3"}
+
+def _firma_cita(cita):
+    """Resumen de los datos de una cita que se reflejan en su evento de Google."""
+    datos = "|".join(str(cita.get(campo) or "") for campo in ("tipo", "fecha", "hora", "tema", "estado"))
+    return hashlib.sha1(datos.encode("utf-8")).hexdigest()
+
+def _cuerpo_evento_cita(cita):
+    """Evento de Google Calendar que representa una cita de la base de datos."""
+    inicio = datetime.datetime.fromisoformat(f"{cita['fecha']}T{cita['hora']}:00")
+    fin = inicio + datetime.timedelta(minutes=TIPOS_REUNION[cita['tipo']]["duracion_real"])
+    
+    return {
+        'summary': f"Consulta Legal - {cita['cliente']['nombre']} - {cita['tipo']}",
+        'description': f"{cita['tema'] or ''}\n\nID: {cita['id']}",
+        'start': {
+            'dateTime': inicio.isoformat(),
+            'timeZone': config.ZONA_HORARIA_CALENDARIO,
+        },
+        'end': {
+            'dateTime': fin.isoformat(),
+            'timeZone': config.ZONA_HORARIA_CALENDARIO,
+        },
+        'attendees': [
+            {'email': cita['cliente']['email']},
+        ],
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 24 * 60},
+                {'method': 'popup', 'minutes': 30},
+            ],
+        },
+        'colorId': COLORES_TIPO_REUNION.get(cita['tipo'], "1"),
+        'extendedProperties': {'private': {'cita_id': str(cita['id'])}},
+        'status': 'confirmed'
+    }
+
+def _cita_id_evento(evento, citas_por_evento):
+    """
+    ID de la cita a la que corresponde un evento de Google, o None si no es una
+    cita. Los eventos borrados solo traen su ID, así que se buscan en las citas ya
+    sincronizadas.
+    """
+    propiedades = evento.get('extendedProperties', {}).get('private', {})
+    if propiedades.get('cita_id', '').isdigit():
+        return int(propiedades['cita_id'])
+    if evento.get('id') in citas_por_evento:
+        return citas_por_evento[evento['id']]
+    if "Consulta Legal" in evento.get('summary', ''):
+        coincidencia = PATRON_ID_CITA.search(evento.get('description', ''))
+        if coincidencia:
+            return int(coincidencia.group(1))
+    return None
+
+def _descargar_cambios_google(service, token):
     """
-    Sincroniza los eventos entre Google Calendar y la base de datos SQLite.
-    Garantiza que ambos sistemas tengan la misma información.
+    Descarga los eventos de Google Calendar que han cambiado desde el token de
+    sincronización. Sin token, o si Google lo ha invalidado (410), hace una
+    sincronización completa desde hace DIAS_SINCRONIZACION_COMPLETA días hasta
+    dentro de DIAS_SINCRONIZACION_COMPLETA_FUTURO.
     
     Returns:
-        Tuple (éxito, mensaje) con el estado de la operación
+        Tupla (eventos, nuevo token, completa)
     """
-    try:
-        from db_manager import DatabaseManager
-        db = DatabaseManager()
+    from googleapiclient.errors import HttpError
+    
+    parametros = {'calendarId': 'primary', 'singleEvents': True}
+    if token:
+        parametros['syncToken'] = token
+    else:
+        ahora = datetime.datetime.utcnow().replace(microsecond=0)
+        desde = ahora - datetime.timedelta(days=DIAS_SINCRONIZACION_COMPLETA)
+        hasta = ahora + datetime.timedelta(days=DIAS_SINCRONIZACION_COMPLETA_FUTURO)
+        parametros['timeMin'] = desde.isoformat() + 'Z'
+        parametros['timeMax'] = hasta.isoformat() + 'Z'
+    
+    eventos = []
+    pagina = None
+    while True:
+        try:
+            respuesta = service.events().list(pageToken=pagina, **parametros).execute()
+        except HttpError as e:
+            if token and e.resp.status == 410:
+                logger.warning("El token de sincronización de Google Calendar ha caducado, se hace una sincronización completa")
+                return _descargar_cambios_google(service, None)
+            raise
+        eventos.extend(respuesta.get('items', []))
+        pagina = respuesta.get('nextPageToken')
+        if not pagina:
+            return eventos, respuesta.get('nextSyncToken'), not token
+
+def _estado_evento(evento):
+    """
+    Estado de un evento de Google en lo que afecta a su cita: "cancelled" o la
+    fecha y hora de inicio ("YYYY-MM-DDTHH:MM") en la zona horaria del calendario.
+    None si es un evento de día completo.
+    """
+    if evento.get('status') == 'cancelled':
+        return 'cancelled'
+    fecha_hora = evento.get('start', {}).get('dateTime')
+    if not fecha_hora:
+        return None
+    fecha_hora_dt = datetime.datetime.fromisoformat(fecha_hora.replace('Z', '+00:00'))
+    if fecha_hora_dt.tzinfo:
+        fecha_hora_dt = fecha_hora_dt.astimezone(ZoneInfo(config.ZONA_HORARIA_CALENDARIO))
+    return fecha_hora_dt.strftime("%Y-%m-%dT%H:%M")
+
+def _estado_evento_cita(cita):
+    """Estado que tiene en Google el evento de una cita tras enviarla."""
+    return 'cancelled' if cita['estado'] == 'cancelada' else f"{cita['fecha']}T{cita['hora']}"
+
+def _fechas_evento(evento):
+    """
+    Días cuya disponibilidad puede cambiar por un evento de Google: los que toca
+    en hora local o en UTC (los grids de cada día usan ambas). Conjunto vacío
+    para los eventos de día completo y None si el evento no trae fechas (los
+    cancelados de una descarga incremental solo traen su ID y estado).
+    """
+    inicio = evento.get('start', {}).get('dateTime')
+    fin = evento.get('end', {}).get('dateTime')
+    if not inicio or not fin:
+        return set() if evento.get('start', {}).get('date') else None
+    
+    inicio, fin, inicio_utc, fin_utc = _intervalo_google(inicio, fin)
+    fecha_dt = min(inicio, inicio_utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    fechas = set()
+    while fecha_dt <= max(fin, fin_utc):
+        fechas.add(fecha_dt.strftime("%Y-%m-%d"))
+        fecha_dt += datetime.timedelta(days=1)
+    return fechas
+
+def _invalidar_disponibilidad_eventos(eventos_google, completa):
+    """
+    Invalida la disponibilidad de los días de los eventos que han cambiado en
+    Google Calendar, o toda si la descarga fue completa o algún evento no trae
+    fechas. Si un evento se ha movido de día, su día anterior no se conoce:
+    quedará como ocupado hasta que caduque su entrada de la caché.
+    """
+    fechas = set()
+    for evento in ([] if completa else eventos_google):
+        fechas_evento = _fechas_evento(evento)
+        if fechas_evento is None:
+            completa = True
+            break
+        fechas |= fechas_evento
+    
+    if completa:
+        cache_disponibilidad.invalidar_todo()
+    else:
+        cache_disponibilidad.invalidar_fechas(*fechas)
+
+def _aplicar_cambios_google(db, eventos_google, citas, sincronizadas, estadisticas):
+    """
+    Lleva a la base de datos las cancelaciones y cambios de fecha/hora hechos en
+    Google Calendar y registra el evento de cada cita encontrada. Los eventos cuyo
+    estado coincide con el de la última sincronización (por ejemplo, los que
+    acaba de enviar el propio bot) se omiten.
+    """
+    citas_por_evento = {datos['evento_id']: cita_id for cita_id, datos in sincronizadas.items()}
+    
+    # Si una cita tiene varios eventos, cuenta el modificado más recientemente
+    eventos_por_cita = {}
+    for evento in eventos_google:
+        cita_id = _cita_id_evento(evento, citas_por_evento)
+        if cita_id is None:
+            estadisticas['omitidos'] += 1
+            continue
+        anterior = eventos_por_cita.get(cita_id)
+        if anterior is None or evento.get('updated', '') >= anterior.get('updated', ''):
+            eventos_por_cita[cita_id] = evento
+    
+    registros = []
+    for cita_id, evento in eventos_por_cita.items():
+        cita = citas.get(cita_id)
+        estado_google = _estado_evento(evento)
+        anterior = sincronizadas.get(cita_id)
+        if cita is None or estado_google is None or (anterior and anterior['estado_evento'] == estado_google):
+            estadisticas['omitidos'] += 1
+            continue
         
-        # 1. Obtener eventos de Google Calendar
-        service = get_google_calendar_service()
+        # Si la cita también ha cambiado en la BD desde la última sincronización,
+        # se conserva la firma anterior para que esos cambios se envíen después
+        cambios_bd_pendientes = anterior is not None and anterior['firma'] != _firma_cita(cita)
         
-        # Establecer fechas desde hace una semana hasta un mes adelante
-        now = datetime.datetime.now()
-        time_min = (now - datetime.timedelta(days=7)).isoformat() + 'Z'
-        time_max = (now + datetime.timedelta(days=30)).isoformat() + 'Z'
+        cambios = {}
+        if estado_google == 'cancelled':
+            if cita['estado'] != 'cancelada':
+                cambios['estado'] = 'cancelada'
+        else:
+            fecha_google, hora_google = estado_google.split('T')
+            if cita['fecha'] != fecha_google or cita['hora'] != hora_google:
+                cambios.update(fecha=fecha_google, hora=hora_google)
         
-        # Obtener eventos del calendario
-        eventos_google = service.events().list(
-            calendarId='primary',
-            timeMin=time_min,
-            timeMax=time_max,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute().get('items', [])
+        if cambios:
+            db.update_cita(cita_id, **cambios)
+            cita.update(cambios)
+            estadisticas['procesados'] += 1
+            logger.info(f"Cita {cita_id} actualizada desde Google Calendar: {cambios}")
+        else:
+            estadisticas['omitidos'] += 1
         
-        # 2. Obtener eventos de la base de datos
-        eventos_bd = db.get_all_calendar_events()
+        firma = anterior['firma'] if cambios_bd_pendientes else _firma_cita(cita)
+        registros.append((cita_id, evento['id'], firma, estado_google))
+        sincronizadas[cita_id] = {'evento_id': evento['id'], 'firma': firma, 'estado_evento': estado_google}
+    
+    db.guardar_sincronizacion_citas(registros)
+
+def _es_error_reintentable(excepcion):
+    """Indica si un error de Google es transitorio (límite de peticiones o error del servidor)."""
+    from googleapiclient.errors import HttpError
+    if not isinstance(excepcion, HttpError):
+        return False
+    if excepcion.resp.status in CODIGOS_REINTENTABLES:
+        return True
+    # rateLimitExceeded y userRateLimitExceeded llegan como 403
+    return excepcion.resp.status == 403 and b'ratelimitexceeded' in (excepcion.content or b'').lower()
+
+def _enviar_lotes_google(service, db, peticiones, estadisticas):
+    """
+    Envía a Google Calendar las creaciones y modificaciones de citas mediante
+    peticiones por lotes, reintentando con espera exponencial las que fallan por
+    errores transitorios.
+    
+    Args:
+        peticiones: Diccionario {cita_id: (evento_id o None, cuerpo, firma, estado del evento)}
+    """
+    pendientes = dict(peticiones)
+    for intento in range(MAX_REINTENTOS_SINCRONIZACION + 1):
+        if intento:
+            estadisticas['reintentados'] += len(pendientes)
+            time.sleep(ESPERA_REINTENTO_SINCRONIZACION * 2 ** (intento - 1))
         
-        # 3. Sincronizar citas de BD a Google (crear las que faltan)
-        for evento_bd in eventos_bd:
-            if evento_bd['type'] == 'appointment':  # Solo sincronizamos citas
-                cita_id = evento_bd['id'].replace('cita_', '')
-                
-                # Verificar si ya existe en Google
-                existe_en_google = False
-                for evento_google in eventos_google:
-                    if evento_google.get('id') == evento_bd['id'] or evento_google.get('description', '').find(f"ID: {cita_id}") >= 0:
-                        existe_en_google = True
-                        break
-                
-                if not existe_en_google:
-                    # Obtener detalles completos de la cita desde la BD
-                    cita = db.get_cita(cita_id)
-                    if cita:
-                        # Construir fecha y hora en formato ISO
-                        fecha_hora = f"{cita['fecha']}T{cita['hora']}:00"
-                        fecha_hora_dt = datetime.datetime.fromisoformat(fecha_hora)
-                        
-                        # Calcular fin según duración
-                        duracion = TIPOS_REUNION[cita['tipo']]["duracion_real"]
-                        fecha_hora_fin = fecha_hora_dt + datetime.timedelta(minutes=duracion)
-                        
-                        # Crear evento en Google
-                        evento = {
-                            'summary': f"Consulta Legal - {cita['cliente']['nombre']} - {cita['tipo']}",
-                            'description': f"{cita['tema']}\n\nID: {cita_id}",
-                            'start': {
-                                'dateTime': fecha_hora_dt.isoformat(),
-                                'timeZone': 'Europe/Madrid',
-                            },
-                            'end': {
-                                'dateTime': fecha_hora_fin.isoformat(),
-                                'timeZone': 'Europe/Madrid',
-                            },
-                            'attendees': [
-                                {'email': cita['cliente']['email']},
-                            ],
-                            'reminders': {
-                                'useDefault': False,
-                                'overrides': [
-                                    {'method': 'email', 'minutes': 24 * 60},
-                                    {'method': 'popup', 'minutes': 30},
-                                ],
-                            },
-                            'colorId': "11" if cita['tipo'] == 'presencial' else "6" if cita['tipo'] == 'videoconferencia' else "3"
-                        }
-                        
-                        service.events().insert(calendarId='primary', body=evento).execute()
-                        logger.info(f"Cita {cita_id} creada en Google Calendar")
-        
-        # 4. Sincronizar citas de Google a BD (actualizar estado)
-        for evento_google in eventos_google:
-            # Verificar si es una cita legal (por el título)
-            if "Consulta Legal" in evento_google.get('summary', ''):
-                # Intentar extraer el ID de la cita desde la descripción
-                description = evento_google.get('description', '')
-                cita_id_match = re.search(r'ID: (\d+)', description)
-                
-                if cita_id_match:
-                    cita_id = cita_id_match.group(1)
-                    # Verificar estado en Google
-                    estado_google = evento_google.get('status', 'confirmed')
-                    
-                    if estado_google == 'cancelled':
-                        # Marcar como cancelada en BD
-                        db.update_cita(cita_id, estado="cancelada")
-                        logger.info(f"Cita {cita_id} marcada como cancelada en BD desde Google")
-                    elif estado_google == 'confirmed':
-                        # Verificar si la fecha/hora cambió
-                        fecha_hora_google = evento_google['start'].get('dateTime')
-                        if fecha_hora_google:
-                            fecha_hora_dt = datetime.datetime.fromisoformat(fecha_hora_google.replace('Z', '+00:00'))
-                            fecha_google = fecha_hora_dt.strftime("%Y-%m-%d")
-                            hora_google = fecha_hora_dt.strftime("%H:%M")
-                            
-                            # Actualizar en BD si cambió
-                            cita = db.get_cita(cita_id)
-                            if cita and (cita['fecha'] != fecha_google or cita['hora'] != hora_google):
-                                db.update_cita(cita_id, fecha=fecha_google, hora=hora_google)
-                                logger.info(f"Cita {cita_id} actualizada con nueva fecha/hora desde Google")
-        
-        return (True, "Sincronización completada correctamente")
+        reintentar = {}
+        claves = list(pendientes)
+        for i in range(0, len(claves), TAMANO_LOTE_SINCRONIZACION):
+            registros = []
+            
+            def respuesta_lote(request_id, respuesta, excepcion):
+                cita_id = int(request_id)
+                _, _, firma, estado_evento = pendientes[cita_id]
+                if excepcion is None:
+                    registros.append((cita_id, respuesta['id'], firma, estado_evento))
+                    estadisticas['procesados'] += 1
+                elif _es_error_reintentable(excepcion) and intento < MAX_REINTENTOS_SINCRONIZACION:
+                    reintentar[cita_id] = pendientes[cita_id]
+                else:
+                    estadisticas['fallidos'] += 1
+                    logger.error(f"No se pudo sincronizar la cita {cita_id} con Google Calendar: {excepcion}")
+            
+            lote = service.new_batch_http_request(callback=respuesta_lote)
+            for cita_id in claves[i:i + TAMANO_LOTE_SINCRONIZACION]:
+                evento_id, cuerpo, _, _ = pendientes[cita_id]
+                if evento_id:
+                    peticion = service.events().patch(calendarId='primary', eventId=evento_id, body=cuerpo)
+                else:
+                    peticion = service.events().insert(calendarId='primary', body=cuerpo)
+                lote.add(peticion, request_id=str(cita_id))
+            lote.execute()
+            db.guardar_sincronizacion_citas(registros)
+        
+        pendientes = reintentar
+        if not pendientes:
+            break
+
+def _enviar_citas_google(service, db, citas, sincronizadas, limite, estadisticas):
+    """
+    Crea en Google Calendar las citas que aún no tienen evento (desde la fecha
+    límite) y actualiza las que han cambiado en la base de datos desde la última
+    sincronización.
+    """
+    peticiones = {}
+    for cita_id, cita in citas.items():
+        sincronizada = sincronizadas.get(cita_id)
+        firma = _firma_cita(cita)
+        if sincronizada is None:
+            # Solo se crean eventos para citas vigentes y recientes
+            if cita['estado'] == 'cancelada' or cita['fecha'] < limite or cita['tipo'] not in TIPOS_REUNION:
+                estadisticas['omitidos'] += 1
+                continue
+            peticiones[cita_id] = (None, _cuerpo_evento_cita(cita), firma, _estado_evento_cita(cita))
+        elif sincronizada['firma'] != firma:
+            if cita['estado'] == 'cancelada':
+                cuerpo = {'status': 'cancelled'}
+            elif cita['tipo'] in TIPOS_REUNION:
+                cuerpo = _cuerpo_evento_cita(cita)
+            else:
+                estadisticas['omitidos'] += 1
+                continue
+            peticiones[cita_id] = (sincronizada['evento_id'], cuerpo, firma, _estado_evento_cita(cita))
+    
+    if peticiones:
+        _enviar_lotes_google(service, db, peticiones, estadisticas)
+
+def sincronizar_cambios_calendario(db=None):
+    """
+    Sincronización incremental entre Google Calendar y la base de datos:
+    
+    1. Descarga solo los eventos cambiados desde el último nextSyncToken guardado
+       y aplica en la BD las cancelaciones y cambios de fecha/hora de las citas.
+    2. Crea en Google las citas sin evento y actualiza las modificadas en la BD
+       (detectadas por la firma guardada en sincronizacion_citas), en lotes.
+    3. Guarda el nuevo nextSyncToken.
+    
+    Args:
+        db: DatabaseManager a usar (por defecto el de botia.db)
+        
+    Returns:
+        Diccionario con los contadores 'procesados', 'omitidos', 'reintentados'
+        y 'fallidos', y 'completa' (True si no se pudo hacer incremental)
+        
+    Raises:
+        Exception si falla la comunicación con Google Calendar
+    """
+    if db is None:
+        from db_manager import get_db
+        db = get_db()
+    
+    service = get_google_calendar_service()
+    estadisticas = {'procesados': 0, 'omitidos': 0, 'reintentados': 0, 'fallidos': 0}
+    
+    sincronizadas = db.get_sincronizacion_citas()
+    eventos_google, token, completa = _descargar_cambios_google(service, db.get_configuracion(CLAVE_TOKEN_SINCRONIZACION))
+    logger.debug(f"Eventos cambiados en Google Calendar: {len(eventos_google)} (completa={completa})")
+    
+    # Solo se cargan las citas que pueden cambiar en uno u otro lado: las
+    # recientes, las que ya tienen evento y las de los eventos descargados
+    limite = (datetime.date.today() - datetime.timedelta(days=DIAS_SINCRONIZACION_COMPLETA)).isoformat()
+    citas_por_evento = {datos['evento_id']: cita_id for cita_id, datos in sincronizadas.items()}
+    ids_eventos = {_cita_id_evento(evento, citas_por_evento) for evento in eventos_google} - {None}
+    citas = {cita['id']: cita for cita in db.get_citas_sincronizacion(limite, ids_eventos)}
+    
+    # Los cambios de las citas invalidan sus días desde la BD; los de otros
+    # eventos del calendario (reuniones del despacho, etc.) se invalidan aquí
+    _invalidar_disponibilidad_eventos(eventos_google, completa)
+    _aplicar_cambios_google(db, eventos_google, citas, sincronizadas, estadisticas)
+    _enviar_citas_google(service, db, citas, sincronizadas, limite, estadisticas)
+    
+    # Los eventos creados o modificados en este paso volverán en la próxima
+    # descarga incremental; coinciden con la BD y se omitirán
+    db.set_configuracion(CLAVE_TOKEN_SINCRONIZACION, token)
+    
+    estadisticas['completa'] = completa
+    return estadisticas
+
+def resumen_sincronizacion(estadisticas):
+    """Mensaje para el usuario con los contadores de una sincronización."""
+    mensaje = (f"Sincronización completada correctamente: {estadisticas['procesados']} procesados, "
+               f"{estadisticas['omitidos']} omitidos, {estadisticas['reintentados']} reintentados")
+    if estadisticas['fallidos']:
+        mensaje += f", {estadisticas['fallidos']} con error"
+    return mensaje
+
+def sincronizar_calendario_bd(db=None):
+    """
+    Sincroniza los eventos entre Google Calendar y la base de datos SQLite.
+    Garantiza que ambos sistemas tengan la misma información.
+    
+    Returns:
+        Tuple (éxito, mensaje) con el estado de la operación
+    """
+    try:
+        mensaje = resumen_sincronizacion(sincronizar_cambios_calendario(db))
+        logger.info(mensaje)
+        return (True, mensaje)
     
     except Exception as e:
         logger.error(f"Error al sincronizar calendario: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
-        return (False, f"Error de sincronización: {str(e)}")
\ No newline at end of file
+        return (False, f"Error de sincronización: {str(e)}")
@@ -2,8 +2,7 @@ import datetime
 import re
 from models.intent_model import identificar_intencion
 from models.data_extraction import (
-    identificar_fecha, identificar_hora,
-    identificar_tipo_reunion, identificar_datos_personales
+    extraer_entidades, identificar_datos_personales
 )
 from handlers.calendar_service import (
     obtener_horarios_disponibles, 
@@ -14,6 +13,8 @@ from handlers.email_service import enviar_correo_confirmacion, enviar_sms_confir
 
 # Añadir importación de casos_db y ESTADOS_CASO al inicio del archivo
 from config import HORARIOS_POR_TIPO, TIPOS_REUNION, INTENCIONES, MENSAJES_MENU, citas_db, clientes_db, casos_db, ESTADOS_CASO
+from config import PALABRAS_DESPEDIDA_CONVERSACION
+from utils.palabras_clave import AutomataPalabras
 
 from flask import url_for
 
@@ -21,6 +22,13 @@ from flask import url_for
 import logging
 logger = logging.getLogger(__name__)
 
+# Expresiones de despedida (y "cambiar", que en la confirmación no es despedida)
+# localizadas en una sola pasada sobre el mensaje
+AUTOMATA_DESPEDIDA = AutomataPalabras({
+    "despedida": PALABRAS_DESPEDIDA_CONVERSACION,
+    "cambiar": ["cambiar"]
+})
+
 
 
 # Modificar la función reset_conversacion para incluir el nuevo estado
@@ -136,15 +144,13 @@ def generar_respuesta(mensaje, user_id, user_states):
         return procesar_seleccion_cancelacion(mensaje, user_id, user_states)
     
     # Detectar despedida o finalización
-    palabras_despedida = ["no gracias", "adiós", "adios", "hasta luego", "terminar", 
-                         "finalizar", "cerrar", "no quiero", "no deseo", "eso es todo",
-                         "nada más", "no necesito", "gracias", "ya está", "ya terminé"]
+    coincidencias = AUTOMATA_DESPEDIDA.buscar(mensaje_lower)
     
-    if any(palabra in mensaje_lower for palabra in palabras_despedida) or mensaje_lower == "no":
+    if "despedida" in coincidencias or mensaje_lower == "no":
         # Si estamos en un estado donde "no" puede ser una respuesta normal, verificar contexto
         if estado_usuario["estado"] == "esperando_confirmacion":
             # Aquí "no" significa cambiar detalles, no despedida
-            if mensaje_lower == "no" or "cambiar" in mensaje_lower:
+            if mensaje_lower == "no" or "cambiar" in coincidencias:
                 pass  # Continuar con el flujo normal
             else:
                 # Es una despedida - borrado completo porque el usuario se está despidiendo
@@ -155,8 +161,11 @@ def generar_respuesta(mensaje, user_id, user_states):
             reset_conversacion(user_id, user_states, preserve_user_data=False) 
             return "Gracias por usar nuestro servicio de asistencia para citas legales. ¡Hasta pronto!"
     
+    # Extraer de una vez fecha, hora, tipo de reunión y datos personales del mensaje
+    entidades = extraer_entidades(mensaje)
+    
     # Buscar datos personales en cualquier mensaje
-    datos_identificados = identificar_datos_personales(mensaje)
+    datos_identificados = entidades.datos_personales()
     for campo, valor in datos_identificados.items():
         if valor and not estado_usuario["datos"][campo]:
             # Evitar que el tipo de reunión se confunda con el nombre
@@ -253,7 +262,7 @@ def generar_respuesta(mensaje, user_id, user_states):
             return MENSAJES_MENU["consulta_estado"]
         
         # Verificar si el mensaje es un tipo de reunión
-        tipo_reunion = identificar_tipo_reunion(mensaje)
+        tipo_reunion = entidades.tipo_reunion
         
         if tipo_reunion:
             estado_usuario["tipo_reunion"] = tipo_reunion
@@ -275,7 +284,7 @@ def generar_respuesta(mensaje, user_id, user_states):
 
     elif estado_usuario["estado"] == "esperando_tipo_reunion":
         # Identificar tipo de reunión
-        tipo_reunion = identificar_tipo_reunion(mensaje)
+        tipo_reunion = entidades.tipo_reunion
         
         if tipo_reunion:
             estado_usuario["tipo_reunion"] = tipo_reunion
@@ -355,7 +364,7 @@ def generar_respuesta(mensaje, user_id, user_states):
         if mensaje_lower == "ver calendario":
             return ("El calendario ya está visible abajo. Por favor, selecciona una fecha haciendo clic en uno de los días disponibles (en verde), o escribe una fecha específica como 'mañana' o 'próximo lunes'.")
         
-        fecha = identificar_fecha(mensaje)
+        fecha = entidades.fecha
         
         if fecha:
             fecha_dt = datetime.datetime.strptime(fecha, "%Y-%m-%d")
@@ -394,7 +403,7 @@ def generar_respuesta(mensaje, user_id, user_states):
             return _procesar_seleccion_hora(estado_usuario)
         
         # Intenta identificar la hora en el mensaje
-        hora_identificada = identificar_hora(mensaje)
+        hora_identificada = entidades.hora
         if hora_identificada in horarios:
             estado_usuario["hora"] = hora_identificada
             return _procesar_seleccion_hora(estado_usuario)
@@ -618,10 +627,10 @@ def generar_respuesta(mensaje, user_id, user_states):
 
             # Importar token_manager y guardar el token
             import token_manager
-            from db_manager import DatabaseManager
+            from db_manager import get_db
         
             # Obtener el gestor de base de datos para pasar su db_file
-            db_manager = DatabaseManager()
+            db_manager = get_db()
             token_manager.store_token(db_manager.db_file, upload_token, cita_id)
 
             # Intentar obtener la función get_base_url de app
@@ -854,8 +863,8 @@ def _buscar_cliente_por_email(email):
     
     # Si no está en memoria, intentar buscar en la base de datos SQLite
     try:
-        from db_manager import DatabaseManager
-        db = DatabaseManager()
+        from db_manager import get_db
+        db = get_db()
         cliente = db.get_cliente_by_email(email)
         if cliente:
             print(f"DEBUG - Cliente encontrado en SQLite por email: {email}")
@@ -907,8 +916,8 @@ def _buscar_cliente_por_telefono(telefono):
     
     # Si no está en memoria, intentar buscar en la base de datos SQLite
     try:
-        from db_manager import DatabaseManager
-        db = DatabaseManager()
+        from db_manager import get_db
+        db = get_db()
         cliente = db.get_cliente_by_telefono(telefono)
         if cliente:
             print(f"DEBUG - Cliente encontrado en SQLite por teléfono: {telefono}")
@@ -1210,8 +1219,8 @@ def procesar_seleccion_cancelacion(mensaje, user_id, user_states):
                         cita_id_num = int(cita_id)
                     
                     # Actualizar en SQLite
-                    from db_manager import DatabaseManager
-                    db = DatabaseManager()
+                    from db_manager import get_db
+                    db = get_db()
                     db.update_cita(cita_id_num, estado="cancelada")
                     logger.info(f"Cita {cita_id_num} actualizada en base de datos SQLite")
                 except Exception as e:
@@ -0,0 +1,250 @@
+"""
+Sincronización automática del calendario en segundo plano.
+
+La configuración (activa e intervalo) y el resultado de la última ejecución se
+guardan en la tabla configuracion, así que los comparten todos los procesos.
+Cada proceso que atiende peticiones arranca un hilo planificador (la
+aplicación lo hace en su primera petición, ya en el worker); para que dos
+hilos o dos workers no sincronicen a la vez, cada ejecución toma primero un
+bloqueo local y después un bloqueo con caducidad en la base de datos.
+"""
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+CLAVE_SYNC_ACTIVA = 'sync_auto'
+CLAVE_SYNC_INTERVALO = 'sync_interval'
+CLAVE_ULTIMA_SINCRONIZACION = 'sync_ultima_ejecucion'
+
+NOMBRE_BLOQUEO = 'sincronizacion_calendario'
+
+# Intervalos (minutos) que se pueden elegir en el panel
+INTERVALOS_SYNC = (5, 10, 15, 30, 60)
+INTERVALO_SYNC_DEFECTO = 15
+
+# Si un proceso muere sincronizando, otro puede tomar el bloqueo pasado este tiempo
+DURACION_BLOQUEO = 15 * 60
+
+# Segundos máximos entre comprobaciones del planificador (para ver a tiempo
+# los cambios de configuración hechos desde otro worker)
+ESPERA_MAXIMA_PLANIFICADOR = 60
+
+_lock_ejecucion = threading.Lock()
+_lock_planificador = threading.Lock()
+_planificador = None
+_id_proceso = None
+
+def id_proceso():
+    """
+    Identificador de este proceso como propietario del bloqueo. Se calcula en
+    cada proceso, no al importar, para que los workers creados con fork (p. ej.
+    gunicorn --preload) no compartan el del proceso padre.
+    """
+    global _id_proceso
+    if _id_proceso is None or _id_proceso[0] != os.getpid():
+        _id_proceso = (os.getpid(), f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}")
+    return _id_proceso[1]
+
+def _db_por_defecto(db):
+    if db is None:
+        from db_manager import get_db
+        db = get_db()
+    return db
+
+def obtener_configuracion_sync(db=None):
+    """
+    Devuelve la configuración de la sincronización automática.
+
+    Returns:
+        Diccionario con 'activa' (bool) e 'intervalo' (minutos)
+    """
+    db = _db_por_defecto(db)
+    intervalo = db.get_configuracion(CLAVE_SYNC_INTERVALO)
+    return {
+        'activa': db.get_configuracion(CLAVE_SYNC_ACTIVA) == '1',
+        'intervalo': int(intervalo) if intervalo else INTERVALO_SYNC_DEFECTO
+    }
+
+def guardar_configuracion_sync(activa, intervalo, db=None):
+    """
+    Guarda la configuración de la sincronización automática y despierta al
+    planificador de este proceso para que la aplique de inmediato.
+
+    Raises:
+        ValueError si el intervalo no es uno de INTERVALOS_SYNC
+    """
+    if intervalo not in INTERVALOS_SYNC:
+        raise ValueError(f"Intervalo de sincronización no válido: {intervalo}")
+    db = _db_por_defecto(db)
+    db.set_configuracion(CLAVE_SYNC_ACTIVA, '1' if activa else '0')
+    db.set_configuracion(CLAVE_SYNC_INTERVALO, intervalo)
+    if _planificador is not None:
+        _planificador.despertar()
+
+def obtener_ultima_sincronizacion(db=None):
+    """
+    Devuelve el resultado de la última sincronización (de cualquier proceso) o
+    None si no se ha ejecutado nunca. Incluye 'inicio', 'fin' (ISO), 'duracion'
+    (segundos), 'exito', 'mensaje', 'origen' y 'estadisticas'.
+    """
+    valor = _db_por_defecto(db).get_configuracion(CLAVE_ULTIMA_SINCRONIZACION)
+    return json.loads(valor) if valor else None
+
+def sincronizacion_en_curso(db=None):
+    """Indica si algún proceso está sincronizando ahora mismo."""
+    return _lock_ejecucion.locked() or _db_por_defecto(db).bloqueo_activo(NOMBRE_BLOQUEO)
+
+def _segundos_hasta_siguiente(ultima, intervalo, ahora=None):
+    """Segundos que faltan para la siguiente sincronización automática (<= 0 si ya toca)."""
+    if not ultima:
+        return 0
+    ahora = ahora or datetime.datetime.now()
+    siguiente = datetime.datetime.fromisoformat(ultima['fin']) + datetime.timedelta(minutes=intervalo)
+    return (siguiente - ahora).total_seconds()
+
+def ejecutar_sincronizacion(db=None, origen='manual', intervalo=None):
+    """
+    Ejecuta una sincronización incremental si no hay otra en curso en este ni en
+    otro proceso, y guarda su duración y resultado.
+
+    Args:
+        db: DatabaseManager a usar (por defecto el de botia.db)
+        origen: 'manual' o 'automatica', se guarda con el resultado
+        intervalo: Si se indica (minutos), solo se sincroniza si desde la última
+            ejecución ha pasado al menos ese tiempo; se comprueba ya con el
+            bloqueo tomado, por si otro worker acaba de sincronizar
+
+    Returns:
+        Diccionario con el resultado, o None si no se ha ejecutado
+    """
+    from handlers.calendar_service import sincronizar_cambios_calendario, resumen_sincronizacion
+
+    if not _lock_ejecucion.acquire(blocking=False):
+        logger.info("Ya hay una sincronización en curso en este proceso")
+        return None
+    try:
+        db = _db_por_defecto(db)
+        if not db.adquirir_bloqueo(NOMBRE_BLOQUEO, id_proceso(), DURACION_BLOQUEO):
+            logger.info("Otro proceso está sincronizando el calendario")
+            return None
+        try:
+            if intervalo is not None and _segundos_hasta_siguiente(obtener_ultima_sincronizacion(db), intervalo) > 0:
+                return None
+
+            inicio = datetime.datetime.now()
+            cronometro = time.perf_counter()
+            try:
+                estadisticas = sincronizar_cambios_calendario(db)
+                exito, mensaje = True, resumen_sincronizacion(estadisticas)
+            except Exception as e:
+                logger.exception(f"Error en la sincronización {origen} del calendario")
+                estadisticas, exito, mensaje = None, False, f"Error de sincronización: {str(e)}"
+
+            resultado = {
+                'inicio': inicio.isoformat(timespec='seconds'),
+                'fin': datetime.datetime.now().isoformat(timespec='seconds'),
+                'duracion': round(time.perf_counter() - cronometro, 2),
+                'exito': exito,
+                'mensaje': mensaje,
+                'origen': origen,
+                'estadisticas': estadisticas
+            }
+            db.set_configuracion(CLAVE_ULTIMA_SINCRONIZACION, json.dumps(resultado))
+            logger.info(f"Sincronización {origen} terminada en {resultado['duracion']} s: {mensaje}")
+            return resultado
+        finally:
+            db.liberar_bloqueo(NOMBRE_BLOQUEO, id_proceso())
+    finally:
+        _lock_ejecucion.release()
+
+def solicitar_sincronizacion(db=None):
+    """
+    Lanza una sincronización manual en un hilo en segundo plano, sin bloquear
+    la petición web.
+
+    Returns:
+        False si ya hay una sincronización en curso, True si se ha lanzado
+    """
+    db = _db_por_defecto(db)
+    if sincronizacion_en_curso(db):
+        return False
+    threading.Thread(target=ejecutar_sincronizacion, args=(db, 'manual'),
+                     name='sincronizacion-manual', daemon=True).start()
+    return True
+
+class PlanificadorSincronizacion(threading.Thread):
+    """
+    Hilo que comprueba periódicamente la configuración guardada y lanza la
+    sincronización automática cuando ha pasado el intervalo desde la última.
+    """
+
+    def __init__(self, db):
+        super().__init__(name='planificador-sincronizacion', daemon=True)
+        self.db = db
+        self._evento = threading.Event()
+        self._detenido = False
+
+    def comprobar(self):
+        """
+        Sincroniza si toca y devuelve los segundos hasta la siguiente comprobación.
+        """
+        configuracion = obtener_configuracion_sync(self.db)
+        if not configuracion['activa']:
+            return ESPERA_MAXIMA_PLANIFICADOR
+
+        restante = _segundos_hasta_siguiente(obtener_ultima_sincronizacion(self.db), configuracion['intervalo'])
+        if restante <= 0:
+            ejecutar_sincronizacion(self.db, 'automatica', intervalo=configuracion['intervalo'])
+            restante = _segundos_hasta_siguiente(obtener_ultima_sincronizacion(self.db), configuracion['intervalo'])
+        return min(max(restante, 1), ESPERA_MAXIMA_PLANIFICADOR)
+
+    def run(self):
+        logger.info(f"Planificador de sincronización iniciado ({id_proceso()})")
+        while not self._detenido:
+            try:
+                espera = self.comprobar()
+            except Exception as e:
+                logger.error(f"Error en el planificador de sincronización: {str(e)}")
+                espera = ESPERA_MAXIMA_PLANIFICADOR
+            self._evento.wait(espera)
+            self._evento.clear()
+
+    def despertar(self):
+        """Hace que el planificador vuelva a comprobar la configuración ya."""
+        self._evento.set()
+
+    def detener(self):
+        self._detenido = True
+        self._evento.set()
+
+def iniciar_planificador(db=None):
+    """
+    Arranca el planificador de este proceso (solo uno por proceso) y lo devuelve.
+    Se puede llamar en cada petición: si ya está en marcha no hace nada. Un
+    proceso hijo de un fork no hereda el hilo, así que arranca el suyo.
+    """
+    global _planificador
+    planificador = _planificador
+    if planificador is not None and planificador.is_alive():
+        return planificador
+    with _lock_planificador:
+        if _planificador is None or not _planificador.is_alive():
+            _planificador = PlanificadorSincronizacion(_db_por_defecto(db))
+            _planificador.start()
+        return _planificador
+
+def detener_planificador():
+    """Detiene el planificador de este proceso, si está en marcha."""
+    global _planificador
+    with _lock_planificador:
+        if _planificador is not None:
+            _planificador.detener()
+            _planificador = None
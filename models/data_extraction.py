@@ -1,22 +1,114 @@
 import re
 import datetime
+from utils.palabras_clave import AutomataPalabras
 
-def identificar_fecha(texto):
+# Días de la semana y meses que se reconocen en las fechas, con su número
+DIAS_SEMANA = {"lunes": 0, "martes": 1, "miércoles": 2, "miercoles": 2,
+               "jueves": 3, "viernes": 4, "sábado": 5, "sabado": 5, "domingo": 6}
+MESES = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4,
+    "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
+    "septiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12
+}
+
+# Palabras que no deben considerarse nombres
+PALABRAS_NO_NOMBRE = frozenset([
+    # Palabras comunes
+    "no", "si", "sí", "hola", "buenos", "buenas", "quiero", "quisiera", 
+    "necesito", "confirmar", "cancelar", "el", "la", "los", "las",
+    "le", "les", "un", "una", "unos", "unas", "por", "favor", "gracias",
+    "deseo", "prefiero", "mejor", "esta", "este", "ese", "esa", "mi", 
+    # Tipos de reunión y servicios
+    "presencial", "videoconferencia", "telefonica", "telefónica", 
+    "virtual", "online", "cita", "consulta", "reunion", "reunión", 
+    "agendar", "legal", "abogado", "despacho", "oficina", "cuanto",
+    # Términos relacionados con el servicio
+    "tema", "asunto", "motivo", "porque", "sobre", "para", "como", 
+    "servicio", "servicios", "día", "hora", 
+    "disponible", "horario", "fecha", "antes", "posible", "mañana", "hoy",
+    "semana", "mes", "lunes", "martes", "miércoles", "jueves", "viernes",
+    # Palabras relacionadas con el contexto legal
+    "caso", "expediente", "demanda", "contrato", "juicio", "derecho",
+    "ley", "legislación", "normativa",
+    # Términos temporales
+    "lo", "lo antes posible", "urgente", "pronto"
+])
+
+_NOMBRE = r'([A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+(?:\s+[A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+){0,3})'
+
+# Patrones precompilados de las entidades. Las fechas escritas con palabras
+# ("hoy", "mañana", "próxima semana", días de la semana y "15 de enero") se
+# reconocen con una única alternancia que recorre una vez el texto en minúsculas
+PATRON_FECHA_NUMERICA = re.compile(r'(\d{1,2})\/(\d{1,2})\/(\d{4})')
+PATRON_FECHA_TEXTO = re.compile(
+    r'(?P<hoy>hoy)|(?P<manana>mañana)|(?P<proxima_semana>próxima semana|proxima semana)'
+    r'|(?P<dia>' + "|".join(DIAS_SEMANA) + r')'
+    r'|(?P<dia_mes>\d{1,2})\s+de\s+(?P<mes>' + "|".join(MESES) + r')'
+)
+PATRON_HORA_24H = re.compile(r'(\d{1,2}):(\d{2})')
+PATRON_HORA_A_LAS = re.compile(r'(?:a\s+)?las\s+(\d{1,2})(?::(\d{2}))?(?:\s+(am|pm))?')
+PATRON_HORA_AMPM = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*(am|pm)')
+PATRON_EMAIL = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PATRON_TELEFONO = re.compile(r'\b(?:\+34\s?)?(?:6\d{8}|7[1-9]\d{7}|9\d{8})\b')
+# Patrones explícitos de nombre, en orden de prioridad
+PATRONES_NOMBRE = [
+    re.compile(r'me llamo\s+' + _NOMBRE, re.IGNORECASE),
+    re.compile(r'mi nombre es\s+' + _NOMBRE, re.IGNORECASE),
+    re.compile(r'soy\s+' + _NOMBRE, re.IGNORECASE),
+    re.compile(r'nombre[:\s]+' + _NOMBRE, re.IGNORECASE)
+]
+
+class EntidadesExtraidas:
     """
-    Identifica fechas en el texto proporcionado.
+    Resultado de extraer_entidades: fecha, hora, tipo de reunión y datos
+    personales de un mensaje. Cada atributo vale None si no se ha identificado.
+    """
+    
+    def __init__(self, fecha=None, hora=None, tipo_reunion=None, email=None, telefono=None, nombre=None):
+        self.fecha = fecha
+        self.hora = hora
+        self.tipo_reunion = tipo_reunion
+        self.email = email
+        self.telefono = telefono
+        self.nombre = nombre
+    
+    def datos_personales(self):
+        """Devuelve los datos personales en el formato de identificar_datos_personales."""
+        return {"nombre": self.nombre, "email": self.email, "telefono": self.telefono}
+    
+    def __repr__(self):
+        return (f"EntidadesExtraidas(fecha={self.fecha!r}, hora={self.hora!r}, tipo_reunion={self.tipo_reunion!r}, "
+                f"email={self.email!r}, telefono={self.telefono!r}, nombre={self.nombre!r})")
+
+def extraer_entidades(texto):
+    """
+    Extrae de una sola vez todas las entidades que reconocen las funciones
+    identificar_*, pasando el texto a minúsculas una única vez.
     
     Args:
         texto: Texto del usuario
         
     Returns:
-        Fecha identificada en formato "YYYY-MM-DD" o None si no se identifica
+        EntidadesExtraidas con los mismos valores que devolverían identificar_fecha,
+        identificar_hora, identificar_tipo_reunion e identificar_datos_personales
     """
-    hoy = datetime.datetime.now()
     texto_lower = texto.lower()
+    nombre, email, telefono = _datos_personales(texto)
+    return EntidadesExtraidas(
+        fecha=_fecha(texto, texto_lower),
+        hora=_hora(texto, texto_lower),
+        tipo_reunion=_detectar_tipo_reunion(texto_lower.strip()),
+        email=email,
+        telefono=telefono,
+        nombre=nombre
+    )
+
+def _fecha(texto, texto_lower):
+    """Busca la fecha con las mismas prioridades de siempre."""
+    hoy = datetime.datetime.now()
     
     # Buscar patrones de fecha como DD/MM/YYYY
-    fecha_pattern = r'(\d{1,2})\/(\d{1,2})\/(\d{4})'
-    fecha_match = re.search(fecha_pattern, texto)
+    fecha_match = PATRON_FECHA_NUMERICA.search(texto) if "/" in texto else None
     if fecha_match:
         dia = int(fecha_match.group(1))
         mes = int(fecha_match.group(2))
@@ -28,22 +120,31 @@ def identificar_fecha(texto):
         except ValueError:
             pass  # Fecha inválida, continuar con otros métodos
     
+    # Recorrer una vez las fechas escritas con palabras, guardando la primera
+    # coincidencia de cada mes
+    encontrados = set()
+    meses = {}
+    for coincidencia in PATRON_FECHA_TEXTO.finditer(texto_lower):
+        if coincidencia.lastgroup == "mes":
+            meses.setdefault(coincidencia.group("mes"), coincidencia.group("dia_mes"))
+        elif coincidencia.lastgroup == "dia":
+            encontrados.add(coincidencia.group("dia"))
+        else:
+            encontrados.add(coincidencia.lastgroup)
+    
     # Patrones para fechas en formato texto
-    if "hoy" in texto_lower:
+    if "hoy" in encontrados:
         return hoy.strftime("%Y-%m-%d")
-    elif "mañana" in texto_lower:
+    elif "manana" in encontrados:
         manana = hoy + datetime.timedelta(days=1)
         return manana.strftime("%Y-%m-%d")
-    elif "próxima semana" in texto_lower or "proxima semana" in texto_lower:
+    elif "proxima_semana" in encontrados:
         prox_semana = hoy + datetime.timedelta(days=7)
         return prox_semana.strftime("%Y-%m-%d")
     
     # Identificar días específicos
-    dias = {"lunes": 0, "martes": 1, "miércoles": 2, "miercoles": 2, 
-            "jueves": 3, "viernes": 4, "sábado": 5, "sabado": 5, "domingo": 6}
-    
-    for dia, num in dias.items():
-        if dia in texto_lower:
+    for dia, num in DIAS_SEMANA.items():
+        if dia in encontrados:
             # Calcular días hasta el próximo día de la semana mencionado
             dias_hasta = (num - hoy.weekday()) % 7
             if dias_hasta == 0:
@@ -51,20 +152,10 @@ def identificar_fecha(texto):
             fecha = hoy + datetime.timedelta(days=dias_hasta)
             return fecha.strftime("%Y-%m-%d")
     
-    # Buscar fechas con patrón "el XX de [mes]" o "XX de [mes]"
-    meses = {
-        "enero": 1, "febrero": 2, "marzo": 3, "abril": 4,
-        "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
-        "septiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12
-    }
-    
-    for mes_nombre, mes_num in meses.items():
-        # Patrones como "el 15 de enero" o "15 de enero"
-        patron = r'(?:el\s+)?(\d{1,2})\s+de\s+' + mes_nombre
-        match = re.search(patron, texto_lower)
-        
-        if match:
-            dia = int(match.group(1))
+    # Fechas con patrón "el XX de [mes]" o "XX de [mes]"
+    for mes_nombre, mes_num in MESES.items():
+        if mes_nombre in meses:
+            dia = int(meses[mes_nombre])
             try:
                 # Si el mes ya pasó este año, asumimos que se refiere al próximo año
                 año = hoy.year
@@ -81,19 +172,10 @@ def identificar_fecha(texto):
     
     return None
 
-def identificar_hora(texto):
-    """
-    Identifica horas en el texto proporcionado.
-    
-    Args:
-        texto: Texto del usuario
-        
-    Returns:
-        Hora identificada en formato "HH:MM" o None si no se identifica
-    """
-    # Buscar patrones de hora en el texto (formato 24h)
-    patron_24h = r'(\d{1,2}):(\d{2})'
-    match_24h = re.search(patron_24h, texto)
+def _hora(texto, texto_lower):
+    """Busca la hora con las mismas prioridades de siempre."""
+    # Formato 24h
+    match_24h = PATRON_HORA_24H.search(texto) if ":" in texto else None
     if match_24h:
         hora = int(match_24h.group(1))
         minutos = match_24h.group(2)
@@ -101,18 +183,17 @@ def identificar_hora(texto):
         if 0 <= hora <= 23:
             return f"{hora:02d}:{minutos}"
     
-    # Buscar patrones como "a las X" o "las X"
-    patron_a_las = r'(?:a\s+)?las\s+(\d{1,2})(?::(\d{2}))?(?:\s+(am|pm))?'
-    match_a_las = re.search(patron_a_las, texto.lower())
+    # Patrones como "a las X" o "las X"
+    match_a_las = PATRON_HORA_A_LAS.search(texto_lower) if "las" in texto_lower else None
     if match_a_las:
         hora = int(match_a_las.group(1))
         minutos = match_a_las.group(2) if match_a_las.group(2) else "00"
         ampm = match_a_las.group(3)
         
         if ampm:
-            if ampm.lower() == 'pm' and hora < 12:
+            if ampm == 'pm' and hora < 12:
                 hora += 12
-            elif ampm.lower() == 'am' and hora == 12:
+            elif ampm == 'am' and hora == 12:
                 hora = 0
         else:
             # Sin AM/PM, asumimos hora en formato 24h
@@ -123,17 +204,18 @@ def identificar_hora(texto):
         if 0 <= hora <= 23:
             return f"{hora:02d}:{minutos}"
     
-    # Buscar patrones como "X am/pm"
-    patron_ampm = r'(\d{1,2})(?::(\d{2}))?\s*(am|pm)'
-    match_ampm = re.search(patron_ampm, texto.lower())
+    # Patrones como "X am/pm"
+    match_ampm = None
+    if "am" in texto_lower or "pm" in texto_lower:
+        match_ampm = PATRON_HORA_AMPM.search(texto_lower)
     if match_ampm:
         hora = int(match_ampm.group(1))
         minutos = match_ampm.group(2) if match_ampm.group(2) else "00"
         ampm = match_ampm.group(3)
         
-        if ampm.lower() == 'pm' and hora < 12:
+        if ampm == 'pm' and hora < 12:
             hora += 12
-        elif ampm.lower() == 'am' and hora == 12:
+        elif ampm == 'am' and hora == 12:
             hora = 0
             
         # Asegurar que la hora es válida
@@ -142,6 +224,74 @@ def identificar_hora(texto):
     
     return None
 
+def _datos_personales(texto):
+    """Devuelve (nombre, email, teléfono) encontrados en el texto."""
+    email_match = PATRON_EMAIL.search(texto) if "@" in texto else None
+    email = email_match.group(0) if email_match else None
+    
+    # Teléfono (formatos comunes en España)
+    telefono = None
+    telefono_match = PATRON_TELEFONO.search(texto)
+    if telefono_match:
+        telefono = telefono_match.group(0)
+        if not telefono.startswith('+') and (telefono.startswith('9') or telefono.startswith('6') or telefono.startswith('7')):
+            if "+34" in texto and "+34" not in telefono:
+                telefono = "+34 " + telefono
+    
+    # Nombre: solo patrones explícitos, en orden de prioridad. No se buscan nombres
+    # sueltos para evitar confusiones con frases como "lo antes posible"
+    for patron in PATRONES_NOMBRE:
+        nombre_match = patron.search(texto)
+        if nombre_match:
+            nombre_candidato = nombre_match.group(1).strip()
+            
+            # Verificar que no es una palabra a ignorar y que parece un nombre válido
+            palabras_nombre = nombre_candidato.lower().split()
+            if not all(palabra in PALABRAS_NO_NOMBRE for palabra in palabras_nombre):
+                if any(palabra[0].isupper() for palabra in nombre_candidato.split()):
+                    return nombre_candidato, email, telefono
+    
+    return None, email, telefono
+
+def identificar_fecha(texto):
+    """
+    Identifica fechas en el texto proporcionado.
+    
+    Args:
+        texto: Texto del usuario
+        
+    Returns:
+        Fecha identificada en formato "YYYY-MM-DD" o None si no se identifica
+    """
+    return _fecha(texto, texto.lower())
+
+def identificar_hora(texto):
+    """
+    Identifica horas en el texto proporcionado.
+    
+    Args:
+        texto: Texto del usuario
+        
+    Returns:
+        Hora identificada en formato "HH:MM" o None si no se identifica
+    """
+    return _hora(texto, texto.lower())
+
+# Patrones para tipos de reunión específicos, en orden de prioridad
+PATRONES_TIPO_REUNION = {
+    "presencial": ["presencial", "en persona", "cara a cara", "oficina"],
+    "videoconferencia": ["video", "virtual", "online", "videollamada", "videoconferencia"],
+    "telefonica": ["telefónica", "teléfono", "telefonica", "telefono", "llamada"]
+}
+
+# Todos los patrones que consulta identificar_tipo_reunion, localizados en una sola
+# pasada sobre el texto rodeado de espacios (así " no " detecta también "no ..." al inicio)
+AUTOMATA_TIPO_REUNION = AutomataPalabras({
+    **PATRONES_TIPO_REUNION,
+    "telefono_explicito": ["por teléfono", "por telefono", "teléfono mejor", "telefono mejor"],
+    "negacion": [" no ", "pero no"]
+})
+
 def identificar_tipo_reunion(texto):
     """
     Identifica el tipo de reunión en el texto proporcionado.
@@ -161,58 +311,51 @@ def identificar_tipo_reunion(texto):
     
     print(f"DEBUG - Texto original: '{texto_original}'")
     print(f"DEBUG - Texto normalizado: '{texto}'")
+    return _detectar_tipo_reunion(texto, depurar=True)
+
+def _detectar_tipo_reunion(texto, depurar=False):
+    """Identifica el tipo de reunión en un texto ya normalizado (minúsculas y sin espacios en los extremos)."""
+    def debug(mensaje):
+        if depurar:
+            print(mensaje)
     
     # Verificar coincidencias exactas primero
     if texto == "presencial":
-        print("DEBUG - Coincidencia exacta: presencial")
+        debug("DEBUG - Coincidencia exacta: presencial")
         return "presencial"
     elif texto in ["videoconferencia", "video"]:
-        print("DEBUG - Coincidencia exacta: videoconferencia")
+        debug("DEBUG - Coincidencia exacta: videoconferencia")
         return "videoconferencia"
     elif texto in ["telefonica", "telefónica", "teléfono", "telefono", "por telefono"]:
-        print("DEBUG - Coincidencia exacta: telefonica")
+        debug("DEBUG - Coincidencia exacta: telefonica")
         return "telefonica"
-    print(f"DEBUG - No se encontraron coincidencias exactas para '{texto}'")
+    debug(f"DEBUG - No se encontraron coincidencias exactas para '{texto}'")
+    
+    coincidencias = AUTOMATA_TIPO_REUNION.buscar(" " + texto + " ")
     
     # Verificar explícitamente "por teléfono mejor" y similares
-    if "por teléfono" in texto or "por telefono" in texto or "teléfono mejor" in texto or "telefono mejor" in texto:
-        print(f"DEBUG - Detectada referencia a teléfono: '{texto}'")
+    if "telefono_explicito" in coincidencias:
+        debug(f"DEBUG - Detectada referencia a teléfono: '{texto}'")
         return "telefonica"
     
     # Si no es una palabra exacta, buscar en el texto completo
     # Comprobar si hay términos negativos que indiquen ambigüedad (mejorada para evitar falsos positivos)
-    if " no " in " "+texto+" " or "pero no" in texto or texto.startswith("no "):
-        print("DEBUG - Detectada negación, retornando None")
+    if "negacion" in coincidencias:
+        debug("DEBUG - Detectada negación, retornando None")
         # Si hay negación, es ambiguo y retornamos None
         return None
     
-    # Patrones para tipos de reunión específicos
-    patrones_presencial = ["presencial", "en persona", "cara a cara", "oficina"]
-    patrones_video = ["video", "virtual", "online", "videollamada", "videoconferencia"]
-    patrones_telefonica = ["telefónica", "teléfono", "telefonica", "telefono", "llamada"]
-    
-    # Verificar cada patrón en el texto
-    for patron in patrones_presencial:
-        if patron in texto:
-            print(f"DEBUG - Detectado patrón presencial: '{patron}'")
-            return "presencial"
-            
-    for patron in patrones_video:
-        if patron in texto:
-            print(f"DEBUG - Detectado patrón videoconferencia: '{patron}'")
-            return "videoconferencia"
-            
-    for patron in patrones_telefonica:
-        if patron in texto:
-            print(f"DEBUG - Detectado patrón telefonica: '{patron}'")
-            return "telefonica"
+    # Verificar cada tipo de reunión en orden de prioridad
+    for tipo in PATRONES_TIPO_REUNION:
+        patron = AUTOMATA_TIPO_REUNION.primer_patron(coincidencias, tipo)
+        if patron:
+            debug(f"DEBUG - Detectado patrón {tipo}: '{patron}'")
+            return tipo
             
     # No se encontró ningún patrón reconocible
-    print("DEBUG - No se detectó ningún patrón, retornando None")
+    debug("DEBUG - No se detectó ningún patrón, retornando None")
     return None
 
-# Modificaciones para mejorar la extracción de datos personales en models/data_extraction.py
-
 def identificar_datos_personales(texto):
     """
     Identifica datos personales en el texto proporcionado.
@@ -224,70 +367,5 @@ def identificar_datos_personales(texto):
     Returns:
         Diccionario con los datos personales identificados
     """
-    datos = {"nombre": None, "email": None, "telefono": None}
-    texto_lower = texto.lower()
-    
-    # Buscar email
-    email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-    email_match = re.search(email_pattern, texto)
-    if email_match:
-        datos["email"] = email_match.group(0)
-    
-    # Buscar teléfono (formatos comunes en España)
-    telefono_pattern = r'\b(?:\+34\s?)?(?:6\d{8}|7[1-9]\d{7}|9\d{8})\b'
-    telefono_match = re.search(telefono_pattern, texto)
-    if telefono_match:
-        num_telefono = telefono_match.group(0)
-        if not num_telefono.startswith('+') and (num_telefono.startswith('9') or num_telefono.startswith('6') or num_telefono.startswith('7')):
-            if "+34" in texto and "+34" not in num_telefono:
-                num_telefono = "+34 " + num_telefono
-        datos["telefono"] = num_telefono
-    
-    # Lista expandida de palabras que no deben considerarse nombres
-    palabras_a_ignorar = [
-        # Palabras comunes
-        "no", "si", "sí", "hola", "buenos", "buenas", "quiero", "quisiera", 
-        "necesito", "confirmar", "cancelar", "el", "la", "los", "las",
-        "le", "les", "un", "una", "unos", "unas", "por", "favor", "gracias",
-        "deseo", "prefiero", "mejor", "esta", "este", "ese", "esa", "mi", 
-        # Tipos de reunión y servicios
-        "presencial", "videoconferencia", "telefonica", "telefónica", 
-        "virtual", "online", "cita", "consulta", "reunion", "reunión", 
-        "agendar", "legal", "abogado", "despacho", "oficina", "cuanto",
-        # Términos relacionados con el servicio
-        "tema", "asunto", "motivo", "porque", "sobre", "para", "como", 
-        "sobre", "servicio", "servicios", "quiero", "quisiera", "día", "hora", 
-        "disponible", "horario", "fecha", "antes", "posible", "mañana", "hoy",
-        "semana", "mes", "lunes", "martes", "miércoles", "jueves", "viernes",
-        # Palabras relacionadas con el contexto legal
-        "caso", "expediente", "demanda", "contrato", "juicio", "derecho",
-        "ley", "legislación", "normativa",
-        # Términos temporales
-        "lo", "antes", "lo antes posible", "posible", "urgente", "pronto"
-    ]
-    
-    # Buscar nombre
-    # Primero buscamos patrones explícitos con mayor prioridad
-    nombre_patterns_explicitos = [
-        r'me llamo\s+([A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+(?:\s+[A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+){0,3})',
-        r'mi nombre es\s+([A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+(?:\s+[A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+){0,3})',
-        r'soy\s+([A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+(?:\s+[A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+){0,3})',
-        r'nombre[:\s]+([A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+(?:\s+[A-ZÁÉÍÓÚÜÑ][a-záéíóúüñ]+){0,3})'
-    ]
-    
-    for pattern in nombre_patterns_explicitos:
-        nombre_match = re.search(pattern, texto, re.IGNORECASE)
-        if nombre_match:
-            nombre_candidato = nombre_match.group(1).strip()
-            
-            # Verificar que no es una palabra a ignorar y que parece un nombre válido
-            palabras_nombre = nombre_candidato.lower().split()
-            if not all(palabra in palabras_a_ignorar for palabra in palabras_nombre):
-                if any(palabra[0].isupper() for palabra in nombre_candidato.split()):
-                    datos["nombre"] = nombre_candidato
-                    return datos  # Retornar inmediatamente si encontramos un nombre explícito
-    
-    # Si no encontramos un patrón explícito, NO buscar nombres sueltos
-    # para evitar confusiones con frases como "lo antes posible"
-    
-    return datos
\ No newline at end of file
+    nombre, email, telefono = _datos_personales(texto)
+    return {"nombre": nombre, "email": email, "telefono": telefono}
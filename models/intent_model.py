@@ -1,42 +1,237 @@
+import os
 import re
-import nltk
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-import spacy
-from config import INTENCIONES
-
-# Intentar descargar recursos de NLTK si no existen
-
-# Descargar recursos necesarios de NLTK 
-# Usamos download con quiet=True para evitar mensajes en consola
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-nltk.download('punkt_tab', quiet=True)  # Necesario para el tokenizador
-
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt', quiet=True)
-
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords', quiet=True)
-
-# Cargar modelo spaCy
-try:
-    nlp = spacy.load("es_core_news_md")
-except OSError:
-    print("ADVERTENCIA: Modelo spaCy 'es_core_news_md' no encontrado. Por favor, instálelo con:")
-    print("python -m spacy download es_core_news_md")
-    # Fallback básico para usar un modelo más ligero si está disponible
+import json
+import time
+import pickle
+import hashlib
+import logging
+import tempfile
+import threading
+import numpy as np
+import config
+from utils.cache import CacheLRU
+from utils.palabras_clave import AutomataPalabras
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
+# Modelo spaCy principal y alternativos, en orden de preferencia
+MODELO_SPACY = "es_core_news_md"
+MODELOS_SPACY_ALTERNATIVOS = ["es_core_news_sm"]
+
+# Componentes del pipeline que no intervienen en Doc.similarity. En modo
+# "vectores" (config.NLP_MODO) se excluyen al cargar el modelo, de modo que
+# nlp(texto) solo tokeniza y el vector del documento sale de los vectores del vocabulario
+COMPONENTES_NO_VECTORIALES = ["tok2vec", "morphologizer", "tagger", "parser", "senter",
+                              "attribute_ruler", "lemmatizer", "ner"]
+
+# Recursos de NLTK necesarios para preprocesar_texto. Para el tokenizador basta
+# con uno de los dos (punkt_tab en NLTK >= 3.8.2, punkt en versiones anteriores)
+RECURSOS_NLTK_TOKENIZADOR = ["tokenizers/punkt_tab", "tokenizers/punkt"]
+RECURSO_NLTK_STOPWORDS = "corpora/stopwords"
+
+# Fichero donde se guarda el clasificador rápido ya entrenado, para que los
+# workers no lo reentrenen al arrancar. Se reentrena si cambian los datos de
+# entrenamiento, la versión de scikit-learn o VERSION_CLASIFICADOR_RAPIDO
+RUTA_CLASIFICADOR_RAPIDO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "clasificador_intenciones.pkl")
+VERSION_CLASIFICADOR_RAPIDO = 1
+
+# Directorio donde se guardan las matrices de vectores de los ejemplos de
+# INTENCIONES (.npy), identificadas por el modelo spaCy y el conjunto de ejemplos.
+# Los workers las abren con mmap y comparten las páginas en lugar de recalcularlas.
+# None desactiva la caché en disco
+DIRECTORIO_CACHE_VECTORES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_vectores")
+
+class RecursoNoDisponibleError(LookupError):
+    """Se lanza cuando falta un modelo o un recurso de datos necesario para el NLP."""
+    pass
+
+class RegistroModelos:
+    """
+    Registro de carga perezosa de los recursos de NLP.
+    
+    Importar el módulo no carga ni descarga nada: el modelo spaCy y los datos
+    de NLTK se cargan la primera vez que se necesitan, o de forma explícita con
+    warmup() (por ejemplo, desde el servidor WSGI antes de hacer fork).
+    Nunca se descargan datos: si faltan, se informa con un error claro.
+    """
+    
+    def __init__(self, modo=None):
+        self._lock = threading.RLock()
+        self.modo = modo
+        self.nlp = None
+        self.stopwords = None
+        self.modelo_cargado = None
+        self.clasificador_rapido = None
+        self.tiempos_carga = {}
+    
+    def get_nlp(self):
+        """Devuelve el modelo spaCy, cargándolo la primera vez."""
+        if self.nlp is None:
+            with self._lock:
+                if self.nlp is None:
+                    self.nlp = self._cargar_spacy()
+        return self.nlp
+    
+    def get_stopwords(self):
+        """Devuelve el conjunto de stopwords en español, cargándolo la primera vez."""
+        if self.stopwords is None:
+            with self._lock:
+                if self.stopwords is None:
+                    self.stopwords = self._cargar_nltk()
+        return self.stopwords
+    
+    def get_clasificador_rapido(self):
+        """
+        Devuelve el clasificador rápido de intenciones, cargándolo del disco (o
+        entrenándolo) la primera vez y cada vez que cambia config.INTENCIONES.
+        Devuelve None si scikit-learn no está instalado.
+        """
+        huella = huella_intenciones(config.INTENCIONES)
+        clasificador = self.clasificador_rapido
+        if clasificador is None or (clasificador and clasificador.huella_intenciones != huella):
+            with self._lock:
+                clasificador = self.clasificador_rapido
+                if clasificador is None or (clasificador and clasificador.huella_intenciones != huella):
+                    clasificador = self.clasificador_rapido = self._cargar_clasificador_rapido()
+        return clasificador or None
+    
+    def _cargar_spacy(self):
+        """Carga el modelo spaCy configurado, o uno alternativo si no está instalado."""
+        inicio = time.perf_counter()
+        import spacy
+        
+        modo = self.modo or config.NLP_MODO
+        if modo not in ("vectores", "completo"):
+            raise ValueError(f"Modo de NLP no válido: '{modo}'. Use 'vectores' o 'completo'")
+        excluir = COMPONENTES_NO_VECTORIALES if modo == "vectores" else []
+        
+        nlp_modelo = None
+        for nombre in [MODELO_SPACY] + MODELOS_SPACY_ALTERNATIVOS:
+            try:
+                nlp_modelo = spacy.load(nombre, exclude=excluir)
+                self.modelo_cargado = nombre
+                break
+            except OSError:
+                logger.warning(f"Modelo spaCy '{nombre}' no encontrado. Instálelo con: python -m spacy download {nombre}")
+        
+        if nlp_modelo is None:
+            # Crear un modelo vacío como último recurso: sin vectores las similitudes son 0
+            logger.error("No se ha podido cargar ningún modelo de spaCy, usando un modelo vacío sin vectores")
+            nlp_modelo = spacy.blank("es")
+            self.modelo_cargado = "blank:es"
+        
+        self.modo = modo
+        self.tiempos_carga["spacy"] = time.perf_counter() - inicio
+        logger.info(f"Modelo spaCy '{self.modelo_cargado}' cargado en modo '{modo}' "
+                    f"(componentes: {nlp_modelo.pipe_names}) en {self.tiempos_carga['spacy']:.2f} s")
+        return nlp_modelo
+    
+    def _cargar_nltk(self):
+        """Comprueba que los datos de NLTK están instalados y carga las stopwords."""
+        inicio = time.perf_counter()
+        import nltk
+        
+        faltan = []
+        if not any(_recurso_nltk_instalado(nltk, recurso) for recurso in RECURSOS_NLTK_TOKENIZADOR):
+            faltan.append("punkt_tab")
+        if not _recurso_nltk_instalado(nltk, RECURSO_NLTK_STOPWORDS):
+            faltan.append("stopwords")
+        if faltan:
+            raise RecursoNoDisponibleError(
+                f"Faltan datos de NLTK: {', '.join(faltan)}. "
+                f"Instálelos con: python -m nltk.downloader {' '.join(faltan)}"
+            )
+        
+        from nltk.corpus import stopwords
+        stop_words = frozenset(stopwords.words('spanish'))
+        
+        self.tiempos_carga["nltk"] = time.perf_counter() - inicio
+        logger.info(f"Datos de NLTK cargados en {self.tiempos_carga['nltk']:.2f} s")
+        return stop_words
+
+    def _cargar_clasificador_rapido(self):
+        """
+        Carga el clasificador rápido guardado en RUTA_CLASIFICADOR_RAPIDO si
+        corresponde a los datos de entrenamiento actuales; si no, lo entrena y lo guarda.
+        Devuelve False si scikit-learn no está disponible.
+        """
+        inicio = time.perf_counter()
+        try:
+            import sklearn
+        except ImportError:
+            logger.warning("scikit-learn no está instalado: se desactiva el clasificador rápido de intenciones")
+            return False
+        
+        pares = datos_entrenamiento_rapido()
+        huella = huella_entrenamiento(pares, sklearn.__version__)
+        clasificador = ClasificadorRapido.cargar(RUTA_CLASIFICADOR_RAPIDO, huella)
+        if clasificador is None:
+            clasificador = ClasificadorRapido.entrenar(pares, huella)
+            clasificador.guardar(RUTA_CLASIFICADOR_RAPIDO)
+            origen = "entrenado"
+        else:
+            origen = "cargado de disco"
+        
+        self.tiempos_carga["clasificador_rapido"] = time.perf_counter() - inicio
+        logger.info(f"Clasificador rápido de intenciones {origen} en {self.tiempos_carga['clasificador_rapido']:.2f} s")
+        return clasificador
+
+def _recurso_nltk_instalado(nltk, recurso):
+    """Indica si un recurso de NLTK está disponible localmente, sin descargarlo."""
     try:
-        nlp = spacy.load("es_core_news_sm")
-        print("Usando modelo alternativo es_core_news_sm")
-    except OSError:
-        print("ERROR: No se ha podido cargar ningún modelo de spaCy")
-        # Crear un modelo vacío como último recurso
-        nlp = spacy.blank("es")
+        nltk.data.find(recurso)
+        return True
+    except LookupError:
+        return False
+
+registro_modelos = RegistroModelos()
+
+def get_nlp():
+    """Devuelve el modelo spaCy compartido, cargándolo la primera vez."""
+    return registro_modelos.get_nlp()
+
+def warmup(estricto=False):
+    """
+    Carga por adelantado todos los recursos de NLP y construye el índice de intenciones.
+    Pensado para llamarse desde el servidor WSGI antes de hacer fork de los workers.
+    
+    Args:
+        estricto: Si es True, lanza RecursoNoDisponibleError si no está instalado el
+            modelo spaCy principal o faltan datos de NLTK, en lugar de solo avisar
+    
+    Returns:
+        Diccionario con el modelo cargado y los tiempos de carga en segundos
+    """
+    inicio = time.perf_counter()
+    registro_modelos.get_nlp()
+    if estricto and registro_modelos.modelo_cargado != MODELO_SPACY:
+        raise RecursoNoDisponibleError(
+            f"Modelo spaCy '{MODELO_SPACY}' no instalado. Instálelo con: python -m spacy download {MODELO_SPACY}"
+        )
+    
+    obtener_indice_intenciones()
+    if config.CLASIFICADOR_RAPIDO_ACTIVO:
+        registro_modelos.get_clasificador_rapido()
+    
+    try:
+        registro_modelos.get_stopwords()
+    except RecursoNoDisponibleError as e:
+        if estricto:
+            raise
+        logger.warning(str(e))
+    
+    registro_modelos.tiempos_carga["warmup"] = time.perf_counter() - inicio
+    logger.info(f"Recursos de NLP precargados en {registro_modelos.tiempos_carga['warmup']:.2f} s")
+    return info_modelos()
+
+def info_modelos():
+    """Devuelve el modelo spaCy cargado y los tiempos de carga de cada recurso."""
+    return {
+        "modelo_spacy": registro_modelos.modelo_cargado,
+        "modo": registro_modelos.modo,
+        "tiempos_carga": dict(registro_modelos.tiempos_carga)
+    }
 
 # Control de nivel de depuración
 DEBUG_MODE = False  # Cambiar a True durante desarrollo, False en producción
@@ -51,116 +246,487 @@ def preprocesar_texto(texto):
     Preprocesa el texto eliminando puntuación, convirtiéndolo a minúsculas
     y eliminando stopwords.
     """
+    from nltk.tokenize import word_tokenize
+    
+    stop_words = registro_modelos.get_stopwords()
     texto = texto.lower()
     texto = re.sub(r'[^\w\s]', '', texto)
     tokens = word_tokenize(texto)
-    stop_words = set(stopwords.words('spanish'))
     tokens = [w for w in tokens if not w in stop_words]
     return " ".join(tokens)
 
-def identificar_intencion(texto):
+# Mapeo de palabras clave a intenciones específicas para evitar confusiones
+PALABRAS_CLAVES = {
+    "agendar": ["agendar", "cita", "programar", "reservar", "visita"],
+    "saludo": ["hola", "buenos", "saludos", "buenas", "qué tal"],
+    "dia_especifico": ["semana", "específico", "próxima", "mes"],
+    "reunion_presencial": ["presencial", "persona", "cara a cara", "oficina"],
+    "reunion_video": ["video", "videoconferencia", "virtual", "online"],
+    "reunion_telefonica": ["teléfono", "llamada", "telefonica"],
+    "consultar_estado": ["estado", "consultar", "caso", "expediente", "seguimiento"]
+}
+
+# Todas las expresiones que la clasificación busca como subcadena del mensaje
+# (despedidas, palabras clave y casos especiales) se localizan en una sola pasada
+AUTOMATA_INTENCIONES = AutomataPalabras({
+    **PALABRAS_CLAVES,
+    "despedida": config.PALABRAS_DESPEDIDA,
+    "agendar_explicito": ["necesito agendar", "quiero agendar"],
+    "saludo_horario": ["buenas tardes", "buenos días", "buenas noches"],
+    "menciona_tipo_reunion": ["presencial", "persona", "cara", "video", "telefonica"],
+    "semana_proxima": ["para la semana próxima", "para la próxima semana"]
+})
+
+def huella_intenciones(intenciones):
     """
-    Identifica la intención del usuario basándose en el texto proporcionado.
-    Utiliza spaCy para calcular similitud entre textos.
+    Calcula una huella del conjunto de ejemplos de intenciones.
+    Cambia en cuanto se añade, elimina o modifica cualquier ejemplo.
+    """
+    return hash(tuple((intencion, tuple(ejemplos)) for intencion, ejemplos in intenciones.items()))
+
+class IndiceIntenciones:
+    """
+    Índice vectorial de los ejemplos de INTENCIONES.
     
-    Args:
-        texto: Texto del usuario
+    Guarda el vector de documento de cada ejemplo normalizado en una matriz
+    NumPy, de forma que la similitud coseno de un mensaje con todos los
+    ejemplos se obtiene con un único producto matriz-vector.
+    
+    Si se indica directorio_cache, la matriz se lee (con mmap) de un .npy ya
+    calculado para el mismo modelo y los mismos ejemplos, o se calcula y se guarda.
+    """
+    
+    def __init__(self, intenciones, nlp_modelo, directorio_cache=None):
+        self.huella = huella_intenciones(intenciones)
+        self.ejemplos = []
+        self.etiquetas = []
+        self.tokens = []
+        self.filas_por_intencion = {}
         
-    Returns:
-        Intención identificada o "desconocido" si no se identifica ninguna
+        for intencion, ejemplos in intenciones.items():
+            filas = []
+            for ejemplo in ejemplos:
+                filas.append(len(self.ejemplos))
+                self.ejemplos.append(ejemplo)
+                self.etiquetas.append(intencion)
+                # Solo tokenizar: los vectores se calculan (o se leen de disco) después
+                self.tokens.append(tuple(token.text for token in nlp_modelo.make_doc(ejemplo)))
+            self.filas_por_intencion[intencion] = np.array(filas, dtype=np.intp)
+        self.longitudes = np.array([len(tokens) for tokens in self.tokens], dtype=np.intp)
+        
+        dimension = nlp_modelo.vocab.vectors_length
+        self.origen_matriz = "calculada"
+        if directorio_cache and dimension:
+            clave = clave_cache_vectores(nlp_modelo, self.ejemplos, self.tokens)
+            self.matriz = cargar_matriz_vectores(directorio_cache, clave, (len(self.ejemplos), dimension))
+            if self.matriz is not None:
+                self.origen_matriz = "disco"
+                return
+            self.matriz = self._calcular_matriz(nlp_modelo, dimension)
+            guardar_matriz_vectores(directorio_cache, clave, self.matriz)
+        else:
+            self.matriz = self._calcular_matriz(nlp_modelo, dimension)
+    
+    def _calcular_matriz(self, nlp_modelo, dimension):
+        """Calcula con spaCy el vector normalizado de cada ejemplo."""
+        vectores = [_vector_normalizado(nlp_modelo(ejemplo)) for ejemplo in self.ejemplos]
+        if vectores:
+            return np.vstack(vectores).astype(np.float32)
+        return np.zeros((0, dimension), dtype=np.float32)
+    
+    def similitudes(self, texto_doc):
+        """
+        Calcula la similitud del documento con todos los ejemplos.
+        Reproduce Doc.similarity de spaCy: 1.0 para secuencias de tokens
+        idénticas y 0.0 cuando alguno de los vectores es nulo.
+        """
+        vector = _vector_normalizado(texto_doc)
+        if vector.shape[0] == self.matriz.shape[1]:
+            similitudes = self.matriz @ vector
+        else:
+            similitudes = np.zeros(len(self.ejemplos), dtype=np.float32)
+        similitudes = similitudes.astype(np.float64)
+        
+        tokens_texto = tuple(token.text for token in texto_doc)
+        for fila, tokens_ejemplo in enumerate(self.tokens):
+            if tokens_ejemplo == tokens_texto:
+                similitudes[fila] = 1.0
+        return similitudes
+    
+    def puntuaciones(self, texto_lower, texto_doc, factor, valor_subcadena):
+        """
+        Devuelve la puntuación de cada ejemplo para el texto dado.
+        
+        Para textos muy cortos la similitud vectorial es imprecisa, así que
+        se usa valor_subcadena si uno contiene al otro y 0.0 en caso contrario.
+        """
+        puntuaciones = self.similitudes(texto_doc) * factor
+        cortos = (self.longitudes < 2) if len(texto_doc) >= 2 else np.ones(len(self.ejemplos), dtype=bool)
+        for fila in np.flatnonzero(cortos):
+            ejemplo = self.ejemplos[fila]
+            if texto_lower in ejemplo or ejemplo in texto_lower:
+                puntuaciones[fila] = valor_subcadena
+            else:
+                puntuaciones[fila] = 0.0
+        return puntuaciones
+
+def _vector_normalizado(doc):
+    """Devuelve el vector del documento con norma 1 (o ceros si es nulo)."""
+    vector = np.asarray(doc.vector, dtype=np.float32)
+    norma = doc.vector_norm
+    if not norma:
+        return np.zeros_like(vector)
+    return vector / norma
+
+def clave_cache_vectores(nlp_modelo, ejemplos, tokens):
     """
-    debug_print(f"DEBUG - spaCy identificando intención para: '{texto}'")
+    Clave (estable entre procesos) de la matriz de vectores de los ejemplos:
+    depende del nombre y versión del modelo spaCy, de sus componentes, de los
+    ejemplos y de los vectores de las palabras que aparecen en ellos.
+    """
+    import spacy
     
+    meta = nlp_modelo.meta
+    contenido = json.dumps({
+        "modelo": f"{meta.get('lang')}_{meta.get('name')}",
+        "version": meta.get("version"),
+        "spacy": spacy.__version__,
+        "componentes": nlp_modelo.pipe_names,
+        "vectores": list(nlp_modelo.vocab.vectors.shape),
+        "ejemplos": ejemplos
+    }, ensure_ascii=False)
+    
+    resumen = hashlib.sha256(contenido.encode("utf-8"))
+    for palabra in sorted({token for tokens_ejemplo in tokens for token in tokens_ejemplo}):
+        resumen.update(palabra.encode("utf-8"))
+        resumen.update(np.asarray(nlp_modelo.vocab.get_vector(palabra), dtype=np.float32).tobytes())
+    return resumen.hexdigest()
+
+def _rutas_cache_vectores(directorio, clave):
+    """Rutas del .npy con la matriz y del .json con sus metadatos."""
+    base = os.path.join(directorio, f"intenciones_{clave[:32]}")
+    return base + ".npy", base + ".json"
+
+def cargar_matriz_vectores(directorio, clave, forma):
+    """
+    Abre con mmap (solo lectura) la matriz guardada para la clave. Devuelve None
+    si no existe o si está dañada o no corresponde (clave, forma o suma de control).
+    """
+    ruta_matriz, ruta_meta = _rutas_cache_vectores(directorio, clave)
+    if not os.path.exists(ruta_matriz) or not os.path.exists(ruta_meta):
+        return None
+    try:
+        with open(ruta_meta, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(ruta_matriz, "rb") as f:
+            suma = hashlib.sha256(f.read()).hexdigest()
+        matriz = np.load(ruta_matriz, mmap_mode="r")
+        if (meta.get("clave") != clave or meta.get("sha256") != suma
+                or matriz.shape != tuple(forma) or matriz.dtype != np.float32):
+            logger.warning(f"Caché de vectores de intenciones no válida en {ruta_matriz}, se regenerará")
+            return None
+        return matriz
+    except Exception as e:
+        logger.warning(f"No se ha podido leer la caché de vectores {ruta_matriz}: {str(e)}")
+        return None
+
+def guardar_matriz_vectores(directorio, clave, matriz):
+    """
+    Guarda la matriz y sus metadatos de forma atómica: cada fichero se escribe
+    en un temporal y se renombra, y los metadatos (con la suma de control de la
+    matriz) se escriben al final, de modo que un lector nunca acepta un fichero a medias.
+    """
+    ruta_matriz, ruta_meta = _rutas_cache_vectores(directorio, clave)
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix=".npy.tmp")
+        with os.fdopen(descriptor, "wb") as f:
+            np.save(f, np.ascontiguousarray(matriz, dtype=np.float32))
+        with open(temporal, "rb") as f:
+            suma = hashlib.sha256(f.read()).hexdigest()
+        os.replace(temporal, ruta_matriz)
+        
+        descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix=".json.tmp")
+        with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+            json.dump({"clave": clave, "sha256": suma, "forma": list(matriz.shape)}, f)
+        os.replace(temporal, ruta_meta)
+    except OSError as e:
+        logger.warning(f"No se ha podido guardar la caché de vectores en {directorio}: {str(e)}")
+
+_indice = None
+_indice_lock = threading.Lock()
+
+def obtener_indice_intenciones():
+    """
+    Devuelve el índice de ejemplos de intenciones, construyéndolo la primera vez
+    y reconstruyéndolo automáticamente si config.INTENCIONES ha cambiado.
+    """
+    global _indice
+    huella = huella_intenciones(config.INTENCIONES)
+    indice = _indice
+    if indice is not None and indice.huella == huella:
+        return indice
+    
+    with _indice_lock:
+        if _indice is None or _indice.huella != huella:
+            inicio = time.perf_counter()
+            _indice = IndiceIntenciones(config.INTENCIONES, get_nlp(), DIRECTORIO_CACHE_VECTORES)
+            # Las intenciones cacheadas dependen del índice anterior
+            _cache_intenciones.limpiar()
+            registro_modelos.tiempos_carga["indice_intenciones"] = time.perf_counter() - inicio
+            logger.info(f"Índice de intenciones construido con {len(_indice.ejemplos)} ejemplos "
+                        f"(vectores: {_indice.origen_matriz}) en {registro_modelos.tiempos_carga['indice_intenciones']:.3f} s")
+        return _indice
+
+def _mejor_fila(puntuaciones, filas, mejor_similitud):
+    """
+    Devuelve (fila, puntuación) del primer máximo entre las filas candidatas
+    si supera estrictamente a mejor_similitud, o (None, mejor_similitud).
+    """
+    if len(filas) == 0:
+        return None, mejor_similitud
+    candidatas = puntuaciones[filas]
+    posicion = int(np.argmax(candidatas))
+    if candidatas[posicion] > mejor_similitud:
+        return int(filas[posicion]), float(candidatas[posicion])
+    return None, mejor_similitud
+
+def datos_entrenamiento_rapido():
+    """
+    Devuelve los pares (frase, intención) con los que se entrena el clasificador
+    rápido: FRASES_INTENCIONES/ETIQUETAS_INTENCIONES más los ejemplos de
+    INTENCIONES (que incluyen intenciones como consultar_estado), sin duplicados.
+    """
+    pares = list(zip(config.FRASES_INTENCIONES, config.ETIQUETAS_INTENCIONES))
+    pares += [(ejemplo, intencion) for intencion, ejemplos in config.INTENCIONES.items() for ejemplo in ejemplos]
+    return list(dict.fromkeys((frase.lower().strip(), intencion) for frase, intencion in pares))
+
+def huella_entrenamiento(pares, version_sklearn):
+    """Huella estable entre procesos de los datos de entrenamiento y la versión del modelo."""
+    contenido = json.dumps([VERSION_CLASIFICADOR_RAPIDO, version_sklearn, pares], ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+class ClasificadorRapido:
+    """
+    Primer nivel de la cascada de intenciones: TF-IDF de n-gramas de caracteres
+    y regresión logística. Solo responde cuando la probabilidad de la intención
+    más probable alcanza el umbral; el resto de mensajes pasan a spaCy.
+    
+    La predicción no usa predict_proba (cuyo coste fijo ronda el milisegundo),
+    sino el analizador, el vocabulario y los pesos del modelo ajustado, con el
+    mismo resultado numérico.
+    """
+    
+    def __init__(self, modelo, huella):
+        self.modelo = modelo
+        self.huella = huella
+        self.huella_intenciones = huella_intenciones(config.INTENCIONES)
+        
+        vectorizador, regresion = modelo.named_steps["tfidfvectorizer"], modelo.named_steps["logisticregression"]
+        self.clases = list(regresion.classes_)
+        self._analizador = vectorizador.build_analyzer()
+        self._vocabulario = vectorizador.vocabulary_
+        self._idf = vectorizador.idf_
+        self._pesos = np.ascontiguousarray(regresion.coef_.T)
+        self._sesgos = regresion.intercept_
+    
+    @classmethod
+    def entrenar(cls, pares, huella):
+        """Ajusta el modelo con los pares (frase, intención)."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import make_pipeline
+        
+        frases = [frase for frase, _ in pares]
+        etiquetas = [intencion for _, intencion in pares]
+        modelo = make_pipeline(
+            TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True),
+            LogisticRegression(C=100, max_iter=2000)
+        )
+        modelo.fit(frases, etiquetas)
+        return cls(modelo, huella)
+    
+    @classmethod
+    def cargar(cls, ruta, huella):
+        """Carga el clasificador guardado en ruta, o devuelve None si no existe, está dañado o es de otros datos."""
+        if not os.path.exists(ruta):
+            return None
+        try:
+            with open(ruta, "rb") as f:
+                datos = pickle.load(f)
+            if datos.get("huella") != huella:
+                logger.info("El clasificador rápido guardado no corresponde a los datos actuales, se reentrenará")
+                return None
+            return cls(datos["modelo"], huella)
+        except Exception as e:
+            logger.warning(f"No se ha podido cargar el clasificador rápido de {ruta}: {str(e)}")
+            return None
+    
+    def guardar(self, ruta):
+        """Guarda el clasificador de forma atómica (fichero temporal y renombrado)."""
+        try:
+            descriptor, ruta_temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+            with os.fdopen(descriptor, "wb") as f:
+                pickle.dump({"huella": self.huella, "modelo": self.modelo}, f)
+            os.replace(ruta_temporal, ruta)
+        except OSError as e:
+            logger.warning(f"No se ha podido guardar el clasificador rápido en {ruta}: {str(e)}")
+    
+    def probabilidades(self, texto):
+        """Probabilidad de cada intención (en el orden de self.clases) para un texto."""
+        cuentas = {}
+        for ngrama in self._analizador(texto):
+            columna = self._vocabulario.get(ngrama)
+            if columna is not None:
+                cuentas[columna] = cuentas.get(columna, 0) + 1
+        
+        puntuaciones = self._sesgos.copy()
+        if cuentas:
+            columnas = np.fromiter(cuentas.keys(), dtype=np.intp, count=len(cuentas))
+            valores = (1 + np.log(np.fromiter(cuentas.values(), dtype=np.float64, count=len(cuentas)))) * self._idf[columnas]
+            valores /= np.sqrt(valores @ valores)
+            puntuaciones += valores @ self._pesos[columnas]
+        
+        puntuaciones = np.exp(puntuaciones - puntuaciones.max())
+        return puntuaciones / puntuaciones.sum()
+    
+    def predecir(self, texto, umbral):
+        """Devuelve la intención más probable si su probabilidad alcanza el umbral, o None."""
+        probabilidades = self.probabilidades(texto)
+        mejor = int(np.argmax(probabilidades))
+        if probabilidades[mejor] >= umbral:
+            debug_print(f"DEBUG - Clasificador rápido: '{self.clases[mejor]}' ({probabilidades[mejor]:.2f})")
+            return self.clases[mejor]
+        return None
+
+def _intencion_rapida(texto_lower):
+    """Intención según el clasificador rápido, o None si está desactivado, no disponible o no tiene confianza suficiente."""
+    if not config.CLASIFICADOR_RAPIDO_ACTIVO:
+        return None
+    clasificador = registro_modelos.get_clasificador_rapido()
+    if clasificador is None:
+        return None
+    return clasificador.predecir(texto_lower, config.UMBRAL_CLASIFICADOR_RAPIDO)
+
+class MetricasNiveles:
+    """
+    Contadores de la cascada de clasificación: cuántos mensajes resuelve cada
+    nivel (caché, reglas directas, clasificador rápido, spaCy) y su latencia.
+    """
+    
+    NIVELES = ("cache", "directo", "rapido", "spacy")
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+    
+    def reiniciar(self):
+        """Pone a cero todos los contadores."""
+        with self._lock:
+            self._mensajes = dict.fromkeys(self.NIVELES, 0)
+            self._segundos = dict.fromkeys(self.NIVELES, 0.0)
+    
+    def registrar(self, nivel, segundos, mensajes=1):
+        """Anota que el nivel ha resuelto `mensajes` mensajes en `segundos` en total."""
+        with self._lock:
+            self._mensajes[nivel] += mensajes
+            self._segundos[nivel] += segundos
+    
+    def resumen(self):
+        """Devuelve, por nivel, los mensajes resueltos, la tasa sobre el total y la latencia media en ms."""
+        with self._lock:
+            total = sum(self._mensajes.values())
+            return {
+                "total": total,
+                "niveles": {
+                    nivel: {
+                        "mensajes": self._mensajes[nivel],
+                        "tasa": self._mensajes[nivel] / total if total else 0.0,
+                        "latencia_media_ms": self._segundos[nivel] / self._mensajes[nivel] * 1000 if self._mensajes[nivel] else 0.0
+                    }
+                    for nivel in self.NIVELES
+                }
+            }
+
+metricas_niveles = MetricasNiveles()
+
+def metricas_clasificacion():
+    """Devuelve la tasa de mensajes resueltos por cada nivel de la cascada y su latencia media."""
+    return metricas_niveles.resumen()
+
+def _intencion_directa(texto):
+    """
+    Resuelve los casos que no necesitan spaCy: texto vacío, coincidencia exacta
+    con un ejemplo, despedidas y los casos especiales (agendar explícito, saludo
+    con la hora del día y "la semana próxima").
+    
+    Returns:
+        Tupla (intención o None, texto normalizado, coincidencias de AUTOMATA_INTENCIONES)
+    """
     # Manejar caso especial: texto vacío
     if not texto or len(texto.strip()) == 0:
         debug_print(f"DEBUG - Texto vacío, retornando desconocido")
-        return "desconocido"
+        return "desconocido", "", {}
         
     texto_lower = texto.lower().strip()
     
     # Primero comprobar coincidencias exactas
-    for intencion, ejemplos in INTENCIONES.items():
+    for intencion, ejemplos in config.INTENCIONES.items():
         if texto_lower in ejemplos:
             debug_print(f"DEBUG - Coincidencia exacta: '{intencion}'")
-            return intencion
+            return intencion, texto_lower, {}
     
-    # NUEVA SECCIÓN: Detectar despedida o finalización
-    palabras_despedida = ["no gracias", "adiós", "adios", "hasta luego", "terminar", 
-                         "finalizar", "cerrar", "no quiero", "no deseo", "eso es todo"]
+    coincidencias = AUTOMATA_INTENCIONES.buscar(texto_lower)
     
-    if any(palabra in texto_lower for palabra in palabras_despedida):
+    # NUEVA SECCIÓN: Detectar despedida o finalización
+    if "despedida" in coincidencias:
         debug_print("DEBUG - Detectada despedida")
-        return "despedida"  # Nueva intención para manejar despedidas
+        return "despedida", texto_lower, coincidencias  # Nueva intención para manejar despedidas
+    
+    # Casos especiales: se resuelven aquí, antes del clasificador rápido y de
+    # spaCy, para que ninguno de los dos los cambie
+    if "agendar_explicito" in coincidencias:
+        return "agendar", texto_lower, coincidencias
     
-    # Si no hay coincidencia exacta, usar spaCy
-    texto_doc = nlp(texto_lower)
+    if "saludo_horario" in coincidencias:
+        if "menciona_tipo_reunion" not in coincidencias:
+            return "saludo", texto_lower, coincidencias
     
+    if "semana_proxima" in coincidencias:
+        return "dia_especifico", texto_lower, coincidencias
+    
+    return None, texto_lower, coincidencias
+
+def _intencion_por_similitud(texto_lower, texto_doc, indice, coincidencias):
+    """
+    Identifica la intención comparando el documento spaCy del mensaje con todos
+    los ejemplos precalculados del índice (un producto matriz-vector).
+    coincidencias es el resultado de AUTOMATA_INTENCIONES.buscar(texto_lower).
+    """
     mejor_similitud = 0
     mejor_intencion = None
     
-    # Mapeo de palabras clave a intenciones específicas para evitar confusiones
-    palabras_claves = {
-        "agendar": ["agendar", "cita", "programar", "reservar", "visita"],
-        "saludo": ["hola", "buenos", "saludos", "buenas", "qué tal"],
-        "dia_especifico": ["semana", "específico", "próxima", "mes"],
-        "reunion_presencial": ["presencial", "persona", "cara a cara", "oficina"],
-        "reunion_video": ["video", "videoconferencia", "virtual", "online"],
-        "reunion_telefonica": ["teléfono", "llamada", "telefonica"],
-        "consultar_estado": ["estado", "consultar", "caso", "expediente", "seguimiento"]
-    }
-    
-    # Verificar si el texto contiene palabras clave específicas
-    for intencion, palabras in palabras_claves.items():
-        for palabra in palabras:
-            if palabra in texto_lower:
-                # Aumentar la prioridad de esta intención
-                for ejemplo in INTENCIONES[intencion]:
-                    ejemplo_doc = nlp(ejemplo)
-                    # Para textos muy cortos, usar un método alternativo
-                    if len(texto_doc) < 2 or len(ejemplo_doc) < 2:
-                        if texto_lower in ejemplo or ejemplo in texto_lower:
-                            similitud = 0.95  # Alta similitud para subcadenas
-                        else:
-                            similitud = 0.0
-                    else:
-                        similitud = texto_doc.similarity(ejemplo_doc) * 1.2  # Aumentar la similitud en un 20%
-                    
-                    debug_print(f"DEBUG - Similitud entre '{texto_lower}' y '{ejemplo}': {similitud}")
-                    
-                    if similitud > mejor_similitud:
-                        mejor_similitud = similitud
-                        mejor_intencion = intencion
+    # Verificar si el texto contiene palabras clave específicas y, en ese caso,
+    # comparar solo con los ejemplos de esas intenciones aumentando la similitud un 20%
+    filas_claves = [
+        indice.filas_por_intencion[intencion]
+        for intencion in PALABRAS_CLAVES
+        if intencion in indice.filas_por_intencion and intencion in coincidencias
+    ]
+    if filas_claves:
+        puntuaciones = indice.puntuaciones(texto_lower, texto_doc, 1.2, 0.95)
+        fila, mejor_similitud = _mejor_fila(puntuaciones, np.concatenate(filas_claves), mejor_similitud)
+        if fila is not None:
+            mejor_intencion = indice.etiquetas[fila]
+            debug_print(f"DEBUG - Mejor similitud por palabra clave con '{indice.ejemplos[fila]}': {mejor_similitud}")
     
     # Ahora recorrer todas las intenciones sin aumento de prioridad
     if mejor_similitud < 0.6:  # Solo si no se ha encontrado una alta similitud con palabras clave
-        for intencion, ejemplos in INTENCIONES.items():
-            for ejemplo in ejemplos:
-                ejemplo_doc = nlp(ejemplo)
-                # Para textos muy cortos, la similitud puede ser imprecisa
-                if len(texto_doc) < 2 or len(ejemplo_doc) < 2:
-                    if texto_lower in ejemplo or ejemplo in texto_lower:
-                        similitud = 0.9  # Alta similitud para subcadenas
-                    else:
-                        similitud = 0.0
-                else:
-                    similitud = texto_doc.similarity(ejemplo_doc)
-                
-                debug_print(f"DEBUG - Similitud entre '{texto_lower}' y '{ejemplo}': {similitud}")
-                
-                if similitud > mejor_similitud:
-                    mejor_similitud = similitud
-                    mejor_intencion = intencion
-    
-    # Casos especiales
-    if "necesito agendar" in texto_lower or "quiero agendar" in texto_lower:
-        return "agendar"
-    
-    if "buenas tardes" in texto_lower or "buenos días" in texto_lower or "buenas noches" in texto_lower:
-        if not any(palabra in texto_lower for palabra in ["presencial", "persona", "cara", "video", "telefonica"]):
-            return "saludo"
-    
-    if "para la semana próxima" in texto_lower or "para la próxima semana" in texto_lower:
-        return "dia_especifico"
+        puntuaciones = indice.puntuaciones(texto_lower, texto_doc, 1.0, 0.9)
+        fila, mejor_similitud = _mejor_fila(puntuaciones, np.arange(len(indice.ejemplos)), mejor_similitud)
+        if fila is not None:
+            mejor_intencion = indice.etiquetas[fila]
+            debug_print(f"DEBUG - Mejor similitud con '{indice.ejemplos[fila]}': {mejor_similitud}")
     
     # Umbral de similitud
     if mejor_similitud > 0.6:
@@ -168,4 +734,138 @@ def identificar_intencion(texto):
         return mejor_intencion
     else:
         debug_print(f"DEBUG - No se encontró intención con suficiente similitud. Mejor: {mejor_intencion} ({mejor_similitud})")
-        return "desconocido"
\ No newline at end of file
+        return "desconocido"
+
+# Caché LRU de intenciones por texto normalizado: las respuestas de menú
+# ("Presencial", "Sí, confirmar", dígitos...) se repiten constantemente
+_cache_intenciones = CacheLRU(config.CACHE_INTENCIONES_TAMANO)
+_huella_cache = None
+
+def _normalizar(texto):
+    """Normaliza el texto tal y como lo usa la clasificación (clave de la caché)."""
+    return texto.lower().strip() if texto else ""
+
+def _consultar_cache(clave, huella):
+    """
+    Devuelve la intención cacheada para la clave o None. Si config.INTENCIONES ha
+    cambiado desde la última consulta se vacía la caché; además cada entrada guarda
+    la huella con la que se calculó, así que nunca se devuelve un resultado obsoleto.
+    """
+    global _huella_cache
+    if huella != _huella_cache:
+        _cache_intenciones.limpiar()
+        _huella_cache = huella
+    entrada = _cache_intenciones.get(clave)
+    if entrada and entrada[0] == huella:
+        return entrada[1]
+    return None
+
+def estadisticas_cache_intenciones():
+    """Devuelve los contadores de aciertos, fallos y expulsiones de la caché de intenciones."""
+    return _cache_intenciones.estadisticas()
+
+def limpiar_cache_intenciones():
+    """Vacía la caché de intenciones."""
+    _cache_intenciones.limpiar()
+
+def identificar_intencion(texto):
+    """
+    Identifica la intención del usuario basándose en el texto proporcionado.
+    Los mensajes pasan por una cascada: caché, reglas directas, clasificador
+    rápido (si su confianza alcanza el umbral) y, por último, similitud con spaCy.
+    
+    Args:
+        texto: Texto del usuario
+        
+    Returns:
+        Intención identificada o "desconocido" si no se identifica ninguna
+    """
+    debug_print(f"DEBUG - spaCy identificando intención para: '{texto}'")
+    inicio = time.perf_counter()
+    
+    clave = _normalizar(texto)
+    huella = huella_intenciones(config.INTENCIONES)
+    intencion = _consultar_cache(clave, huella)
+    if intencion:
+        debug_print(f"DEBUG - Intención en caché: '{intencion}'")
+        metricas_niveles.registrar("cache", time.perf_counter() - inicio)
+        return intencion
+    
+    intencion, texto_lower, coincidencias = _intencion_directa(texto)
+    nivel = "directo"
+    if not intencion:
+        intencion = _intencion_rapida(texto_lower)
+        nivel = "rapido"
+    if not intencion:
+        # Si no hay coincidencia exacta, usar spaCy: un único nlp() para el mensaje
+        # y un producto matriz-vector contra todos los ejemplos precalculados
+        indice = obtener_indice_intenciones()
+        texto_doc = get_nlp()(texto_lower)
+        intencion = _intencion_por_similitud(texto_lower, texto_doc, indice, coincidencias)
+        nivel = "spacy"
+    
+    _cache_intenciones.set(clave, (huella, intencion))
+    metricas_niveles.registrar(nivel, time.perf_counter() - inicio)
+    return intencion
+
+def identificar_intenciones(textos, batch_size=256, n_process=1):
+    """
+    Identifica la intención de muchos mensajes a la vez, procesándolos con nlp.pipe.
+    Devuelve exactamente lo mismo que llamar a identificar_intencion con cada texto.
+    
+    Args:
+        textos: Iterable de textos de usuario
+        batch_size: Número de textos que spaCy procesa en cada lote
+        n_process: Número de procesos que usa spaCy (1 = sin multiproceso)
+        
+    Returns:
+        Lista de intenciones en el mismo orden que los textos de entrada
+    """
+    huella = huella_intenciones(config.INTENCIONES)
+    resultados = []
+    pendientes = {}  # texto normalizado -> (coincidencias, posiciones de los mensajes sin resolver)
+    
+    for posicion, texto in enumerate(textos):
+        inicio = time.perf_counter()
+        clave = _normalizar(texto)
+        intencion = _consultar_cache(clave, huella)
+        nivel = "cache"
+        if not intencion:
+            intencion, texto_lower, coincidencias = _intencion_directa(texto)
+            nivel = "directo"
+            if intencion:
+                _cache_intenciones.set(clave, (huella, intencion))
+            elif clave in pendientes:
+                pendientes[clave][1].append(posicion)
+            else:
+                pendientes[clave] = (coincidencias, [posicion])
+        if intencion:
+            metricas_niveles.registrar(nivel, time.perf_counter() - inicio)
+        resultados.append(intencion)
+    
+    # Cada texto distinto se clasifica una sola vez aunque aparezca repetido
+    for nivel in ("rapido", "spacy"):
+        if not pendientes:
+            break
+        inicio = time.perf_counter()
+        if nivel == "rapido":
+            resueltos = {texto_lower: _intencion_rapida(texto_lower) for texto_lower in pendientes}
+        else:
+            indice = obtener_indice_intenciones()
+            docs = get_nlp().pipe(pendientes.keys(), batch_size=batch_size, n_process=n_process)
+            resueltos = {
+                texto_lower: _intencion_por_similitud(texto_lower, texto_doc, indice, coincidencias)
+                for (texto_lower, (coincidencias, _)), texto_doc in zip(pendientes.items(), docs)
+            }
+        
+        mensajes = 0
+        for texto_lower, intencion in resueltos.items():
+            if intencion:
+                _cache_intenciones.set(texto_lower, (huella, intencion))
+                for posicion in pendientes.pop(texto_lower)[1]:
+                    resultados[posicion] = intencion
+                    mensajes += 1
+        if mensajes:
+            metricas_niveles.registrar(nivel, time.perf_counter() - inicio, mensajes)
+    
+    return resultados
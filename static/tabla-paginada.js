@@ -0,0 +1,107 @@
+/**
+ * Tabla del panel de administración que carga sus filas por páginas desde las
+ * APIs /admin/api/... (respuesta {success, <elementos>, siguiente}).
+ *
+ * Cada página pide la siguiente con el cursor 'siguiente' de la anterior; las
+ * páginas se cargan al pulsar "Cargar más" o al llegar al final de la tabla.
+ */
+class TablaPaginada {
+    /**
+     * @param {Object} opciones
+     * @param {string} opciones.url - URL de la API
+     * @param {string} opciones.clave - Campo de la respuesta con los elementos
+     * @param {HTMLElement} opciones.cuerpo - tbody donde se añaden las filas
+     * @param {Function} opciones.fila - Devuelve el HTML de la fila de un elemento
+     * @param {number} opciones.columnas - Número de columnas de la tabla
+     * @param {string} opciones.vacio - Mensaje cuando no hay elementos
+     * @param {number} [opciones.limite=50] - Elementos por página
+     */
+    constructor(opciones) {
+        this.opciones = Object.assign({limite: 50}, opciones);
+        this.filtros = {};
+        this.siguiente = null;
+        this.cargando = false;
+        this.peticion = 0;
+
+        const pie = document.createElement('div');
+        pie.className = 'text-center my-3';
+        pie.innerHTML = '<button type="button" class="btn btn-sm btn-outline-secondary d-none">Cargar más</button>';
+        this.opciones.cuerpo.closest('table').after(pie);
+        this.boton = pie.querySelector('button');
+        this.boton.addEventListener('click', () => this.cargar());
+
+        if ('IntersectionObserver' in window) {
+            new IntersectionObserver(entradas => {
+                if (entradas.some(e => e.isIntersecting) && this.siguiente) {
+                    this.cargar();
+                }
+            }).observe(pie);
+        }
+    }
+
+    static escapar(valor) {
+        const div = document.createElement('div');
+        div.textContent = valor === null || valor === undefined ? '' : String(valor);
+        return div.innerHTML;
+    }
+
+    /** Vacía la tabla y carga la primera página con los filtros indicados. */
+    reiniciar(filtros) {
+        this.filtros = filtros || {};
+        this.siguiente = null;
+        this.peticion++;
+        this.cargando = false;
+        this.opciones.cuerpo.innerHTML = '';
+        return this.cargar(true);
+    }
+
+    /** Carga la siguiente página (o la primera si inicial es true). */
+    cargar(inicial = false) {
+        if (this.cargando || (!inicial && !this.siguiente)) {
+            return Promise.resolve();
+        }
+        this.cargando = true;
+        const peticion = this.peticion;
+
+        const parametros = new URLSearchParams({limite: this.opciones.limite});
+        for (const [nombre, valor] of Object.entries(this.filtros)) {
+            if (valor) {
+                parametros.set(nombre, valor);
+            }
+        }
+        if (this.siguiente) {
+            parametros.set('cursor', this.siguiente);
+        }
+
+        return fetch(`${this.opciones.url}?${parametros}`)
+            .then(response => response.json())
+            .then(data => {
+                if (peticion !== this.peticion) {
+                    return;  // Respuesta de una búsqueda anterior
+                }
+                if (!data.success) {
+                    throw new Error(data.error);
+                }
+                const elementos = data[this.opciones.clave];
+                if (inicial && elementos.length === 0) {
+                    this.opciones.cuerpo.innerHTML =
+                        `<tr><td colspan="${this.opciones.columnas}" class="text-center">${this.opciones.vacio}</td></tr>`;
+                } else {
+                    this.opciones.cuerpo.insertAdjacentHTML('beforeend', elementos.map(this.opciones.fila).join(''));
+                }
+                this.siguiente = data.siguiente;
+                this.boton.classList.toggle('d-none', !this.siguiente);
+            })
+            .catch(error => {
+                console.error('Error:', error);
+                this.boton.classList.add('d-none');
+                this.opciones.cuerpo.insertAdjacentHTML('beforeend',
+                    `<tr><td colspan="${this.opciones.columnas}" class="text-center text-danger">Error al cargar los datos</td></tr>`);
+            })
+            .finally(() => {
+                if (peticion === this.peticion) {
+                    this.cargando = false;
+                }
+            });
+    }
+}
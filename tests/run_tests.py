@@ -7,11 +7,17 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Importar todos los tests existentes
 from tests.test_data_extraction import TestDataExtraction
-from tests.test_intent_model import TestIntentModel
+from tests.test_intent_model import TestIntentModel, TestIndiceIntenciones, TestCacheIntenciones, TestClasificadorRapido, TestRegistroModelos
 from tests.test_helpers import TestHelpers
+from tests.test_palabras_clave import TestPalabrasClave
+from tests.test_cache import TestCacheLRU
+from tests.test_disponibilidad import TestDisponibilidad
+from tests.test_benchmarks import TestBenchIntenciones
 from tests.test_conversation import TestConversation
-from tests.test_calendar_service import TestCalendarService
+from tests.test_calendar_service import TestCalendarService, TestServicioGoogle, TestFreeBusy, TestCacheDisponibilidad, TestSincronizacion
 from tests.test_events import TestEventos
+from tests.test_sincronizacion_automatica import TestSincronizacionAutomatica
+from tests.test_db_manager import TestConexiones, TestMigraciones, TestListadoProyectos, TestListadosPaginados, TestEstadisticasDashboard, TestBusqueda
 
 # Importar los tests para las nuevas funcionalidades
 from tests.test_nuevas_funcionalidades import TestNuevasFuncionalidades
@@ -25,10 +31,29 @@ def run_tests():
     # Agregar todas las clases de test
     test_suite.addTest(unittest.makeSuite(TestDataExtraction))
     test_suite.addTest(unittest.makeSuite(TestIntentModel))
+    test_suite.addTest(unittest.makeSuite(TestIndiceIntenciones))
+    test_suite.addTest(unittest.makeSuite(TestCacheIntenciones))
+    test_suite.addTest(unittest.makeSuite(TestClasificadorRapido))
+    test_suite.addTest(unittest.makeSuite(TestRegistroModelos))
     test_suite.addTest(unittest.makeSuite(TestHelpers))
+    test_suite.addTest(unittest.makeSuite(TestPalabrasClave))
+    test_suite.addTest(unittest.makeSuite(TestCacheLRU))
+    test_suite.addTest(unittest.makeSuite(TestDisponibilidad))
+    test_suite.addTest(unittest.makeSuite(TestBenchIntenciones))
     test_suite.addTest(unittest.makeSuite(TestConversation))
     test_suite.addTest(unittest.makeSuite(TestCalendarService))
+    test_suite.addTest(unittest.makeSuite(TestServicioGoogle))
+    test_suite.addTest(unittest.makeSuite(TestFreeBusy))
+    test_suite.addTest(unittest.makeSuite(TestCacheDisponibilidad))
+    test_suite.addTest(unittest.makeSuite(TestSincronizacion))
     test_suite.addTest(unittest.makeSuite(TestEventos))
+    test_suite.addTest(unittest.makeSuite(TestSincronizacionAutomatica))
+    test_suite.addTest(unittest.makeSuite(TestConexiones))
+    test_suite.addTest(unittest.makeSuite(TestMigraciones))
+    test_suite.addTest(unittest.makeSuite(TestListadoProyectos))
+    test_suite.addTest(unittest.makeSuite(TestListadosPaginados))
+    test_suite.addTest(unittest.makeSuite(TestEstadisticasDashboard))
+    test_suite.addTest(unittest.makeSuite(TestBusqueda))
     
     # Agregar los tests para las nuevas funcionalidades
     test_suite.addTest(unittest.makeSuite(TestNuevasFuncionalidades))
@@ -0,0 +1,54 @@
+import unittest
+import sys
+import os
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import config
+from benchmarks.bench_intenciones import cargar_corpus, comparar
+
+def informe(p50, p95, exactitud):
+    """Crea un informe mínimo con una única variante."""
+    return {"variantes": {"cascada": {"p50_ms": p50, "p95_ms": p95, "exactitud": exactitud}}}
+
+class TestBenchIntenciones(unittest.TestCase):
+
+    def test_corpus_solo_usa_intenciones_conocidas(self):
+        """Todas las etiquetas del corpus son intenciones que puede devolver el clasificador."""
+        corpus = cargar_corpus()
+        validas = set(config.INTENCIONES) | {"despedida", "desconocido"}
+        self.assertGreater(len(corpus), sum(len(ejemplos) for ejemplos in config.INTENCIONES.values()))
+        self.assertTrue(all(intencion in validas for _, intencion, _ in corpus))
+
+    def test_corpus_separa_mensajes_de_entrenamiento(self):
+        """Los ejemplos de entrenamiento se marcan como vistos y las paráfrasis nuevas no."""
+        corpus = cargar_corpus()
+        entrenamiento = {texto.lower().strip() for ejemplos in config.INTENCIONES.values() for texto in ejemplos}
+        entrenamiento.update(frase.lower().strip() for frase in config.FRASES_INTENCIONES)
+        no_vistos = [texto for texto, _, visto in corpus if not visto]
+        self.assertTrue(no_vistos)
+        self.assertFalse(any(texto.lower().strip() in entrenamiento for texto in no_vistos))
+        self.assertTrue(all(visto for texto, _, visto in corpus if texto.lower().strip() in entrenamiento))
+
+    def test_comparar_detecta_regresiones(self):
+        """Se informa cuando la latencia o la exactitud empeoran más de lo tolerado."""
+        linea_base = informe(1.0, 2.0, 0.90)
+        linea_base["tolerancias"] = {"latencia": 0.25, "exactitud": 0.02, "margen_latencia_ms": 0.0}
+
+        self.assertEqual(comparar(informe(1.2, 2.4, 0.89), linea_base), [])
+
+        regresiones = comparar(informe(1.3, 2.0, 0.85), linea_base)
+        self.assertEqual(len(regresiones), 2)
+        self.assertTrue(any("p50_ms" in regresion for regresion in regresiones))
+        self.assertTrue(any("exactitud" in regresion for regresion in regresiones))
+
+    def test_tolerancia_explicita_sustituye_a_la_guardada(self):
+        """Las tolerancias pasadas como argumento prevalecen sobre las de la línea base."""
+        linea_base = informe(1.0, 2.0, 0.90)
+        linea_base["tolerancias"] = {"latencia": 0.25, "exactitud": 0.02, "margen_latencia_ms": 0.0}
+        self.assertEqual(comparar(informe(1.4, 2.0, 0.90), linea_base, tolerancia_latencia=0.5), [])
+        self.assertEqual(len(comparar(informe(1.0, 2.0, 0.89), linea_base, tolerancia_exactitud=0.0)), 1)
+
+if __name__ == '__main__':
+    unittest.main()
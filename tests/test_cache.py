@@ -0,0 +1,49 @@
+import unittest
+import sys
+import os
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.cache import CacheLRU
+
+class TestCacheLRU(unittest.TestCase):
+
+    def test_cuenta_aciertos_fallos_y_expulsiones(self):
+        """La caché LRU expulsa la entrada menos usada y lleva sus contadores."""
+        cache = CacheLRU(max_entradas=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)  # expulsa "b", la menos usada
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        
+        estadisticas = cache.estadisticas()
+        self.assertEqual(estadisticas["aciertos"], 2)
+        self.assertEqual(estadisticas["fallos"], 1)
+        self.assertEqual(estadisticas["expulsiones"], 1)
+        self.assertEqual(estadisticas["entradas"], 2)
+    
+    def test_ttl(self):
+        """Las entradas caducan pasado el TTL y se pueden eliminar una a una."""
+        instante = [0.0]
+        cache = CacheLRU(max_entradas=4, ttl=10, reloj=lambda: instante[0])
+        cache.set("a", 1)
+        cache.set("b", 2)
+        
+        instante[0] = 9.5
+        self.assertEqual(cache.get("a"), 1)
+        instante[0] = 10
+        self.assertIsNone(cache.get("a"))
+        
+        self.assertEqual(cache.eliminar("b", "c"), 1)
+        self.assertIsNone(cache.get("b"))
+        
+        estadisticas = cache.estadisticas()
+        self.assertEqual(estadisticas["caducadas"], 1)
+        self.assertEqual(estadisticas["invalidaciones"], 1)
+        self.assertEqual(estadisticas["entradas"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,17 +2,47 @@ import unittest
 import sys
 import os
 import datetime
+import pickle
+import sqlite3
+import tempfile
+import threading
 from unittest.mock import patch, MagicMock
 
 # Agregar el directorio raíz del proyecto al path para poder importar módulos
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+import handlers.calendar_service as calendar_service
 from handlers.calendar_service import (
     obtener_horarios_disponibles,
     encontrar_proxima_fecha_disponible,
     agendar_en_calendario,
-    obtener_dias_disponibles
+    obtener_dias_disponibles,
+    obtener_disponibilidad_rango,
+    consultar_freebusy,
+    get_google_calendar_service,
+    invalidar_servicio_google,
+    sincronizar_cambios_calendario,
+    sincronizar_calendario_bd
 )
+from db_manager import DatabaseManager
+from utils import cache_disponibilidad
+from utils.servidor_calendario_falso import ServidorCalendarioFalso
+
+class CredencialesFalsas:
+    """Credenciales mínimas con la interfaz de google.oauth2.credentials.Credentials."""
+    
+    def __init__(self, minutos_validez):
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=minutos_validez)
+        self.refresh_token = "refresh"
+        self.refrescos = 0
+    
+    @property
+    def valid(self):
+        return self.expiry > datetime.datetime.utcnow()
+    
+    def refresh(self, request):
+        self.refrescos += 1
+        self.expiry = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
 
 class TestCalendarService(unittest.TestCase):
     
@@ -33,7 +63,10 @@ class TestCalendarService(unittest.TestCase):
         
         # Fecha datetime fija para tests
         self.fecha_dt = datetime.datetime(2023, 6, 1, 0, 0, 0)
+        
+        cache_disponibilidad.invalidar_todo()
     
+    @patch('config.BACKEND_DISPONIBILIDAD', 'eventos')
     @patch('handlers.calendar_service._obtener_horarios_simulados')
     @patch('handlers.calendar_service.get_google_calendar_service')
     def test_obtener_horarios_disponibles(self, mock_get_service, mock_obtener_simulados):
@@ -57,7 +90,7 @@ class TestCalendarService(unittest.TestCase):
         self.assertEqual(horarios, ["09:00", "10:00", "11:00"])
     
     @patch('handlers.calendar_service._encontrar_proxima_fecha_simulada')
-    @patch('handlers.calendar_service.obtener_horarios_disponibles')
+    @patch('handlers.calendar_service.obtener_disponibilidad_rango')
     def test_encontrar_proxima_fecha_disponible(self, mock_obtener_horarios, mock_fecha_simulada):
         """Prueba la búsqueda de la próxima fecha disponible."""
         # Configurar el mock para que falle y use la versión simulada
@@ -137,6 +170,452 @@ class TestCalendarService(unittest.TestCase):
             self.assertEqual(dias, dias_simulados)
             print(f"DEBUG - Días disponibles obtenidos: {dias}")
             print(f"DEBUG - Mock llamado {mock_dias_simulados.call_count} veces")
+    
+    @patch('config.BACKEND_DISPONIBILIDAD', 'eventos')
+    @patch('handlers.calendar_service._cargar_eventos_bd')
+    @patch('handlers.calendar_service.get_google_calendar_service')
+    def test_obtener_disponibilidad_rango(self, mock_get_service, mock_eventos_bd):
+        """Prueba que la disponibilidad de varios días se calcula con una sola consulta a cada origen."""
+        mock_service = MagicMock()
+        mock_service.events().list().execute.return_value = {'items': [{
+            'start': {'dateTime': '2030-06-04T10:00:00+02:00'},
+            'end': {'dateTime': '2030-06-04T11:00:00+02:00'}
+        }]}
+        mock_service.events().list.reset_mock()
+        mock_get_service.return_value = mock_service
+        # Cita de 9:00 a 9:30 en la base de datos
+        mock_eventos_bd.return_value = {"2030-06-05": [(540, 570)]}
+        
+        disponibilidad = obtener_disponibilidad_rango("2030-06-03", "2030-06-09", "presencial")
+        
+        # Una única consulta a la base de datos y a Google Calendar para todo el rango
+        mock_eventos_bd.assert_called_once()
+        mock_service.events().list.assert_called_once()
+        
+        self.assertEqual(len(disponibilidad), 7)
+        self.assertEqual(len(disponibilidad["2030-06-03"]), 16)
+        self.assertNotIn("10:00", disponibilidad["2030-06-04"])
+        self.assertNotIn("10:30", disponibilidad["2030-06-04"])
+        self.assertIn("11:00", disponibilidad["2030-06-04"])
+        self.assertNotIn("09:00", disponibilidad["2030-06-05"])
+        self.assertIn("10:00", disponibilidad["2030-06-05"])
+        # Fin de semana sin horarios
+        self.assertEqual(disponibilidad["2030-06-08"], [])
+        self.assertEqual(disponibilidad["2030-06-09"], [])
+        
+        # El resultado de cada día coincide con el de obtener_horarios_disponibles
+        self.assertEqual(obtener_horarios_disponibles("2030-06-04", "presencial"), disponibilidad["2030-06-04"])
+
+class TestServicioGoogle(unittest.TestCase):
+    
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta_token = os.path.join(self.directorio.name, 'token.pickle')
+        patcher = patch.object(calendar_service, 'RUTA_TOKEN', self.ruta_token)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directorio.cleanup)
+        self.addCleanup(invalidar_servicio_google)
+        invalidar_servicio_google()
+    
+    def guardar_token(self, minutos_validez=60):
+        with open(self.ruta_token, 'wb') as token:
+            pickle.dump(CredencialesFalsas(minutos_validez), token)
+    
+    @patch('handlers.calendar_service.build')
+    def test_servicio_en_cache_por_hilo(self, mock_build):
+        """El servicio se construye una vez por hilo y se reutiliza."""
+        mock_build.side_effect = lambda *args, **kwargs: MagicMock()
+        self.guardar_token()
+        
+        servicio = get_google_calendar_service()
+        self.assertIs(get_google_calendar_service(), servicio)
+        self.assertEqual(mock_build.call_count, 1)
+        
+        # Otro hilo tiene su propio servicio (y su propio transporte HTTP)
+        otros = []
+        hilo = threading.Thread(target=lambda: otros.append(get_google_calendar_service()))
+        hilo.start()
+        hilo.join()
+        self.assertIsNot(otros[0], servicio)
+        self.assertEqual(mock_build.call_count, 2)
+        # Pero comparten las credenciales cargadas una sola vez
+        self.assertIs(mock_build.call_args_list[0].kwargs['credentials'],
+                      mock_build.call_args_list[1].kwargs['credentials'])
+    
+    @patch('handlers.calendar_service.build')
+    def test_invalidar_reconstruye_servicio(self, mock_build):
+        """Tras invalidar (reconexión o desconexión) se recarga el token y se reconstruye el servicio."""
+        mock_build.side_effect = lambda *args, **kwargs: MagicMock()
+        self.guardar_token()
+        servicio = get_google_calendar_service()
+        
+        invalidar_servicio_google()
+        self.assertIsNot(get_google_calendar_service(), servicio)
+        
+        # Sin token (desconectado) no hay servicio
+        os.remove(self.ruta_token)
+        invalidar_servicio_google()
+        with self.assertRaises(Exception):
+            get_google_calendar_service()
+    
+    @patch('handlers.calendar_service.build')
+    def test_refresco_solo_cerca_de_caducar(self, mock_build):
+        """Las credenciales solo se refrescan cuando les queda poco para caducar."""
+        self.guardar_token(minutos_validez=60)
+        get_google_calendar_service()
+        self.assertEqual(calendar_service._credenciales.refrescos, 0)
+        
+        calendar_service._credenciales.expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=2)
+        get_google_calendar_service()
+        self.assertEqual(calendar_service._credenciales.refrescos, 1)
+        self.assertEqual(mock_build.call_count, 1)
+        
+        # El token refrescado se guarda en disco sin invalidar la caché
+        with open(self.ruta_token, 'rb') as token:
+            self.assertEqual(pickle.load(token).refrescos, 1)
+        get_google_calendar_service()
+        self.assertEqual(mock_build.call_count, 1)
+
+class TestFreeBusy(unittest.TestCase):
+    """Disponibilidad contra el servidor local que imita la API de Google Calendar."""
+    
+    def setUp(self):
+        self.servidor = ServidorCalendarioFalso().iniciar()
+        self.addCleanup(self.servidor.detener)
+        servicio = self.servidor.servicio()
+        patcher = patch('handlers.calendar_service.get_google_calendar_service', return_value=servicio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('handlers.calendar_service._cargar_eventos_bd', return_value={})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cache_disponibilidad.invalidar_todo()
+    
+    def test_una_peticion_para_varios_calendarios(self):
+        """Una sola petición FreeBusy devuelve los intervalos de todos los calendarios."""
+        self.servidor.agregar_evento("primary", datetime.datetime(2030, 6, 4, 10), datetime.datetime(2030, 6, 4, 11))
+        self.servidor.agregar_evento("abogado2", datetime.datetime(2030, 6, 5, 16), datetime.datetime(2030, 6, 5, 17))
+        
+        ocupacion = consultar_freebusy(datetime.datetime(2030, 6, 3), datetime.datetime(2030, 6, 9),
+                                       ["primary", "abogado2", "desconocido"])
+        
+        self.assertEqual(self.servidor.peticiones, [("POST", "/freeBusy")])
+        # El calendario que no existe se omite
+        self.assertEqual(set(ocupacion), {"primary", "abogado2"})
+        inicio, fin, inicio_utc, fin_utc = ocupacion["abogado2"][0]
+        self.assertEqual((inicio, fin), (datetime.datetime(2030, 6, 5, 16), datetime.datetime(2030, 6, 5, 17)))
+        self.assertEqual(inicio_utc, datetime.datetime(2030, 6, 5, 14))
+    
+    def test_freebusy_y_eventos_coinciden(self):
+        """Los dos orígenes de ocupación dan la misma disponibilidad."""
+        self.servidor.agregar_evento("primary", datetime.datetime(2030, 6, 4, 10), datetime.datetime(2030, 6, 4, 11))
+        self.servidor.agregar_evento("primary", datetime.datetime(2030, 6, 4, 10, 30), datetime.datetime(2030, 6, 4, 12))
+        self.servidor.agregar_evento("primary", datetime.datetime(2030, 6, 6, 23), datetime.datetime(2030, 6, 7, 9, 45))
+        
+        with patch('config.BACKEND_DISPONIBILIDAD', 'freebusy'):
+            por_freebusy = obtener_disponibilidad_rango("2030-06-03", "2030-06-09", "presencial")
+        cache_disponibilidad.invalidar_todo()
+        with patch('config.BACKEND_DISPONIBILIDAD', 'eventos'):
+            por_eventos = obtener_disponibilidad_rango("2030-06-03", "2030-06-09", "presencial")
+        
+        self.assertEqual(por_freebusy, por_eventos)
+        self.assertNotIn("11:00", por_freebusy["2030-06-04"])
+        self.assertIn("12:00", por_freebusy["2030-06-04"])
+        self.assertNotIn("09:00", por_freebusy["2030-06-07"])
+        self.assertIn("10:00", por_freebusy["2030-06-07"])
+    
+    @patch('config.BACKEND_DISPONIBILIDAD', 'freebusy')
+    @patch('config.CALENDARIOS_DISPONIBILIDAD', ['primary', 'abogado2'])
+    def test_union_de_calendarios_sin_eventos_transparentes(self):
+        """Se ocupa lo que está ocupado en cualquier calendario, salvo los eventos transparentes."""
+        self.servidor.agregar_evento("primary", datetime.datetime(2030, 6, 4, 9), datetime.datetime(2030, 6, 4, 10))
+        self.servidor.agregar_evento("abogado2", datetime.datetime(2030, 6, 4, 16), datetime.datetime(2030, 6, 4, 17))
+        self.servidor.agregar_evento("primary", datetime.datetime(2030, 6, 4, 11), datetime.datetime(2030, 6, 4, 12),
+                                     transparente=True)
+        
+        disponibilidad = obtener_disponibilidad_rango("2030-06-04", "2030-06-04", "presencial")["2030-06-04"]
+        
+        self.assertNotIn("09:00", disponibilidad)
+        self.assertNotIn("16:00", disponibilidad)
+        self.assertIn("11:00", disponibilidad)
+
+    @patch('config.BACKEND_DISPONIBILIDAD', 'freebusy')
+    def test_proxima_fecha_consulta_el_horizonte_por_bloques(self):
+        """Con la primera semana llena, se hace una consulta FreeBusy por bloque de 7 días."""
+        hoy = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        for i in range(7):
+            dia = hoy + datetime.timedelta(days=i)
+            self.servidor.agregar_evento("primary", dia.replace(hour=8), dia.replace(hour=20))
+        
+        # Primer día laborable de la segunda semana
+        esperado = hoy + datetime.timedelta(days=7)
+        while esperado.weekday() >= 5:
+            esperado += datetime.timedelta(days=1)
+        
+        self.assertEqual(encontrar_proxima_fecha_disponible("presencial"),
+                         (esperado.strftime("%Y-%m-%d"), "09:00"))
+        self.assertEqual(self.servidor.peticiones, [("POST", "/freeBusy")] * 2)
+        
+        # Con un horizonte de 7 días no hay hueco; la primera semana sale de la caché
+        with patch('config.DIAS_BUSQUEDA_DISPONIBILIDAD', 7):
+            self.assertEqual(encontrar_proxima_fecha_disponible("presencial"), (None, None))
+        self.assertEqual(len(self.servidor.peticiones), 2)
+
+class TestCacheDisponibilidad(unittest.TestCase):
+    """Caché de horarios disponibles por día e invalidación al cambiar las citas."""
+    
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+        conn = sqlite3.connect(self.db.db_file)
+        conn.execute("INSERT INTO clientes (nombre, email, telefono) VALUES ('Ana', 'ana@example.com', '600000000')")
+        conn.commit()
+        conn.close()
+        
+        # Las citas se leen de la base de datos temporal; Google no tiene eventos
+        def eventos_bd(fecha_inicio, fecha_fin):
+            ocupados = {}
+            for cita in self.db.get_all_citas():
+                if cita['estado'] != 'cancelada':
+                    h, m = map(int, cita['hora'].split(':'))
+                    ocupados.setdefault(cita['fecha'], []).append((h * 60 + m, h * 60 + m + 30))
+            return ocupados
+        
+        patcher = patch.object(calendar_service, '_cargar_eventos_bd', side_effect=eventos_bd)
+        self.mock_eventos_bd = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(calendar_service, '_cargar_ocupacion_google', return_value=[])
+        self.mock_google = patcher.start()
+        self.addCleanup(patcher.stop)
+        cache_disponibilidad.invalidar_todo()
+        
+        # Dos días laborables consecutivos futuros
+        dia = datetime.date.today() + datetime.timedelta(days=7)
+        while dia.weekday() >= 4:
+            dia += datetime.timedelta(days=1)
+        self.dia1 = dia.isoformat()
+        self.dia2 = (dia + datetime.timedelta(days=1)).isoformat()
+    
+    def test_consultas_repetidas_usan_la_cache(self):
+        """Un día ya calculado no vuelve a consultar la base de datos ni Google."""
+        antes = calendar_service.estadisticas_cache_disponibilidad()
+        horarios = obtener_horarios_disponibles(self.dia1, "presencial")
+        self.assertEqual(obtener_horarios_disponibles(self.dia1, "presencial"), horarios)
+        self.assertEqual(obtener_disponibilidad_rango(self.dia1, self.dia1, "presencial")[self.dia1], horarios)
+        self.assertEqual(self.mock_eventos_bd.call_count, 1)
+        self.assertEqual(self.mock_google.call_count, 1)
+        
+        # En un rango solo se calculan los días que faltan
+        obtener_disponibilidad_rango(self.dia1, self.dia2, "presencial")
+        self.assertEqual(self.mock_eventos_bd.call_args[0][0].strftime("%Y-%m-%d"), self.dia2)
+        
+        despues = calendar_service.estadisticas_cache_disponibilidad()
+        self.assertEqual(despues["aciertos"] - antes["aciertos"], 3)
+    
+    def test_cambios_de_citas_invalidan_solo_sus_dias(self):
+        """Crear, mover y borrar una cita invalida los días afectados y no los demás."""
+        obtener_disponibilidad_rango(self.dia1, self.dia2, "presencial")
+        obtener_horarios_disponibles(self.dia2, "telefonica")
+        
+        cita_id = self.db.add_cita(1, "presencial", self.dia1, "10:00", "Herencia")
+        self.assertNotIn("10:00", obtener_horarios_disponibles(self.dia1, "presencial"))
+        self.assertIsNotNone(cache_disponibilidad.obtener(self.dia2, "presencial"))
+        
+        self.db.update_cita(cita_id, fecha=self.dia2)
+        self.assertIsNone(cache_disponibilidad.obtener(self.dia1, "presencial"))
+        self.assertIsNone(cache_disponibilidad.obtener(self.dia2, "telefonica"))
+        self.assertIn("10:00", obtener_horarios_disponibles(self.dia1, "presencial"))
+        self.assertNotIn("10:00", obtener_horarios_disponibles(self.dia2, "presencial"))
+        
+        self.db.delete_cita(cita_id)
+        self.assertIsNotNone(cache_disponibilidad.obtener(self.dia1, "presencial"))
+        self.assertIn("10:00", obtener_horarios_disponibles(self.dia2, "presencial"))
+    
+    def test_no_se_guarda_un_calculo_invalidado_mientras_se_hacia(self):
+        """Si se reserva una cita mientras se calcula un día, ese resultado no se guarda."""
+        cargar = self.mock_eventos_bd.side_effect
+        
+        def reserva_durante_el_calculo(fecha_inicio, fecha_fin):
+            ocupados = cargar(fecha_inicio, fecha_fin)
+            self.db.add_cita(1, "presencial", self.dia1, "10:00", "Herencia")
+            return ocupados
+        
+        self.mock_eventos_bd.side_effect = reserva_durante_el_calculo
+        antes = calendar_service.estadisticas_cache_disponibilidad()
+        self.assertIn("10:00", obtener_horarios_disponibles(self.dia1, "presencial"))
+        self.assertIsNone(cache_disponibilidad.obtener(self.dia1, "presencial"))
+        despues = calendar_service.estadisticas_cache_disponibilidad()
+        self.assertEqual(despues["descartadas_obsoletas"] - antes["descartadas_obsoletas"], 1)
+        
+        self.mock_eventos_bd.side_effect = cargar
+        self.assertNotIn("10:00", obtener_horarios_disponibles(self.dia1, "presencial"))
+    
+    def test_errores_de_google_no_se_guardan(self):
+        """Si Google Calendar falla, la disponibilidad calculada solo con la BD no se guarda."""
+        self.mock_google.side_effect = Exception("sin conexión")
+        obtener_horarios_disponibles(self.dia1, "presencial")
+        self.assertIsNone(cache_disponibilidad.obtener(self.dia1, "presencial"))
+    
+    def test_sincronizacion_invalida_dias_de_eventos_cambiados(self):
+        """Los eventos cambiados en Google invalidan sus días, o todos si no traen fecha."""
+        obtener_disponibilidad_rango(self.dia1, self.dia2, "presencial")
+        
+        calendar_service._invalidar_disponibilidad_eventos([{
+            'id': 'reunion', 'status': 'confirmed',
+            'start': {'dateTime': f'{self.dia2}T10:00:00+02:00'},
+            'end': {'dateTime': f'{self.dia2}T11:00:00+02:00'}
+        }], completa=False)
+        self.assertIsNotNone(cache_disponibilidad.obtener(self.dia1, "presencial"))
+        self.assertIsNone(cache_disponibilidad.obtener(self.dia2, "presencial"))
+        
+        calendar_service._invalidar_disponibilidad_eventos([{'id': 'reunion', 'status': 'cancelled'}], completa=False)
+        self.assertIsNone(cache_disponibilidad.obtener(self.dia1, "presencial"))
+
+class TestSincronizacion(unittest.TestCase):
+    """Sincronización incremental entre la base de datos y el servidor local de Calendar."""
+    
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+        
+        self.servidor = ServidorCalendarioFalso().iniciar()
+        self.addCleanup(self.servidor.detener)
+        servicio = self.servidor.servicio()
+        for objetivo, valor in (('get_google_calendar_service', MagicMock(return_value=servicio)),
+                                ('ESPERA_REINTENTO_SINCRONIZACION', 0)):
+            patcher = patch.object(calendar_service, objetivo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        
+        self.dia = (datetime.date.today() + datetime.timedelta(days=10)).isoformat()
+        conn = sqlite3.connect(self.db.db_file)
+        conn.execute("INSERT INTO clientes (nombre, email, telefono) VALUES ('Ana', 'ana@example.com', '600000000')")
+        conn.executemany("INSERT INTO citas (cliente_id, tipo, fecha, hora, tema) VALUES (1, ?, ?, ?, ?)", [
+            ('presencial', self.dia, '10:00', 'Herencia'),
+            ('telefonica', self.dia, '12:00', 'Alquiler'),
+            ('videoconferencia', '2020-01-10', '09:00', 'Cita antigua'),
+        ])
+        conn.commit()
+        conn.close()
+    
+    def eventos_google(self):
+        return {evento['extendedProperties']['private']['cita_id']: evento
+                for evento in self.servidor.calendarios['primary']}
+    
+    def test_primera_sincronizacion_crea_eventos_en_un_lote(self):
+        """La primera ejecución crea los eventos de las citas vigentes con una sola petición por lotes."""
+        estadisticas = sincronizar_cambios_calendario(self.db)
+        
+        self.assertTrue(estadisticas['completa'])
+        self.assertEqual(estadisticas['procesados'], 2)
+        self.assertEqual(estadisticas['omitidos'], 0)  # La cita antigua ni se carga
+        self.assertEqual(self.servidor.peticiones.count(('POST', '/batch/calendar/v3')), 1)
+        self.assertEqual(set(self.eventos_google()), {'1', '2'})
+        self.assertIsNotNone(self.db.get_configuracion(calendar_service.CLAVE_TOKEN_SINCRONIZACION))
+        
+        # La siguiente ejecución es incremental y no tiene nada que enviar
+        self.servidor.peticiones.clear()
+        estadisticas = sincronizar_cambios_calendario(self.db)
+        self.assertFalse(estadisticas['completa'])
+        self.assertEqual(estadisticas['procesados'], 0)
+        self.assertEqual(self.servidor.peticiones, [('GET', '/calendars/primary/events')])
+    
+    def test_citas_antiguas_solo_con_evento(self):
+        """Una cita antigua sin evento no se carga, salvo que llegue un evento suyo de Google."""
+        sincronizar_cambios_calendario(self.db)
+        inicio = datetime.datetime(2020, 1, 10, 11, 0)
+        self.servidor.agregar_evento('primary', inicio, inicio + datetime.timedelta(minutes=25),
+                                     extendedProperties={'private': {'cita_id': '3'}})
+        
+        estadisticas = sincronizar_cambios_calendario(self.db)
+        
+        self.assertEqual(estadisticas['procesados'], 1)
+        self.assertEqual(self.db.get_cita(3)['hora'], '11:00')
+        self.assertIn(3, self.db.get_sincronizacion_citas())
+    
+    def test_cambios_en_google_se_aplican_a_la_bd(self):
+        """Solo se descargan los eventos cambiados y se llevan a la BD sus cambios."""
+        sincronizar_cambios_calendario(self.db)
+        sincronizar_cambios_calendario(self.db)
+        eventos = self.eventos_google()
+        fecha = datetime.datetime.fromisoformat(self.dia)
+        self.servidor.modificar_evento('primary', eventos['1']['id'],
+                                       fecha.replace(hour=16, minute=30), fecha.replace(hour=17, minute=30))
+        self.servidor.cancelar_evento('primary', eventos['2']['id'])
+        
+        estadisticas = sincronizar_cambios_calendario(self.db)
+        
+        self.assertEqual(estadisticas['procesados'], 2)
+        self.assertEqual(estadisticas['omitidos'], 0)
+        self.assertEqual(self.db.get_cita(1)['hora'], '16:30')
+        self.assertEqual(self.db.get_cita(2)['estado'], 'cancelada')
+        # Nada que devolver a Google
+        self.assertEqual(self.servidor.peticiones.count(('POST', '/batch/calendar/v3')), 1)
+    
+    def test_cambios_en_bd_se_envian_a_google(self):
+        """Las citas modificadas en la BD se actualizan en Google, también las canceladas."""
+        sincronizar_cambios_calendario(self.db)
+        self.db.update_cita(1, hora='11:00')
+        self.db.update_cita(2, estado='cancelada')
+        
+        estadisticas = sincronizar_cambios_calendario(self.db)
+        
+        self.assertEqual(estadisticas['procesados'], 2)
+        self.assertEqual(self.servidor.peticiones_lote[-2:], [
+            ('PATCH', f"/calendars/primary/events/{self.eventos_google()['1']['id']}"),
+            ('PATCH', f"/calendars/primary/events/{self.eventos_google()['2']['id']}"),
+        ])
+        eventos = self.eventos_google()
+        self.assertTrue(eventos['1']['start']['dateTime'].startswith(f"{self.dia}T11:00"))
+        self.assertEqual(eventos['2']['status'], 'cancelled')
+        
+        # Los cambios enviados vuelven en la descarga incremental y se omiten
+        estadisticas = sincronizar_cambios_calendario(self.db)
+        self.assertEqual(estadisticas['procesados'], 0)
+        self.assertEqual(self.db.get_cita(1)['hora'], '11:00')
+    
+    def test_reintento_de_errores_transitorios(self):
+        """Las peticiones del lote que fallan con un error transitorio se reintentan."""
+        self.servidor.fallar_en_lote(1, codigo=503)
+        
+        exito, mensaje = sincronizar_calendario_bd(self.db)
+        
+        self.assertTrue(exito)
+        self.assertIn("2 procesados", mensaje)
+        self.assertIn("1 reintentados", mensaje)
+        self.assertEqual(len(self.eventos_google()), 2)
+        self.assertEqual(self.servidor.peticiones.count(('POST', '/batch/calendar/v3')), 2)
+    
+    def test_token_caducado_hace_sincronizacion_completa(self):
+        """Si Google invalida el token se hace una sincronización completa sin duplicar eventos."""
+        sincronizar_cambios_calendario(self.db)
+        self.servidor.caducar_tokens_sincronizacion()
+        
+        estadisticas = sincronizar_cambios_calendario(self.db)
+        
+        self.assertTrue(estadisticas['completa'])
+        self.assertEqual(estadisticas['procesados'], 0)
+        self.assertEqual(len(self.servidor.calendarios['primary']), 2)
+
+    def test_sincronizacion_completa_acotada(self):
+        """La descarga completa no pasa de DIAS_SINCRONIZACION_COMPLETA_FUTURO días."""
+        lejana = datetime.date.today() + datetime.timedelta(days=calendar_service.DIAS_SINCRONIZACION_COMPLETA_FUTURO + 30)
+        conn = sqlite3.connect(self.db.db_file)
+        conn.execute("INSERT INTO citas (cliente_id, tipo, fecha, hora, tema) VALUES (1, 'presencial', ?, '10:00', 'Lejana')",
+                     (lejana.isoformat(),))
+        conn.commit()
+        conn.close()
+        sincronizar_cambios_calendario(self.db)
+        self.assertEqual(set(self.eventos_google()), {'1', '2', '4'})
+
+        eventos, token, completa = calendar_service._descargar_cambios_google(self.servidor.servicio(), None)
+
+        self.assertTrue(completa)
+        self.assertIsNotNone(token)
+        self.assertEqual({e['extendedProperties']['private']['cita_id'] for e in eventos}, {'1', '2'})
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -2,6 +2,7 @@ import unittest
 import datetime
 import sys
 import os
+from unittest.mock import patch
 
 # Agregar el directorio raíz del proyecto al path para poder importar módulos
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -10,9 +11,16 @@ from models.data_extraction import (
     identificar_fecha, 
     identificar_hora, 
     identificar_tipo_reunion, 
-    identificar_datos_personales
+    identificar_datos_personales,
+    extraer_entidades
 )
 
+class FechaFija(datetime.datetime):
+    """datetime con now() fijo, para las fechas relativas."""
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 4, 30, 10, 0)
+
 class TestDataExtraction(unittest.TestCase):
     
     def test_identificar_fecha_formatos_especificos(self):
@@ -94,6 +102,40 @@ class TestDataExtraction(unittest.TestCase):
         self.assertIsNone(datos["nombre"])
         self.assertIsNone(datos["email"])
         self.assertIsNone(datos["telefono"])
+    
+    def test_extraer_entidades_valores_esperados(self):
+        """extraer_entidades devuelve, para cada mensaje, las mismas entidades que las funciones identificar_* originales."""
+        sin_datos = {"nombre": None, "email": None, "telefono": None}
+        casos = [
+            ("Me llamo Laura Gómez, quiero una cita presencial el 15 de mayo a las 10:30",
+             "2025-05-15", "10:30", "presencial", dict(sin_datos, nombre="Laura Gómez")),
+            ("mi email es ana@example.com y mi teléfono +34 612345678, mejor por video",
+             None, None, "videoconferencia", dict(sin_datos, email="ana@example.com", telefono="+34 612345678")),
+            ("el próximo lunes a las 5 pm por teléfono", "2025-05-05", "17:00", "telefonica", sin_datos),
+            ("quiero una cita el 12/3/2025 por la tarde", "2025-03-12", None, None, sin_datos),
+            ("no hay nada que extraer aquí", None, None, None, sin_datos),
+        ]
+        # Las fechas relativas se calculan desde el miércoles 30 de abril de 2025
+        with patch('datetime.datetime', FechaFija):
+            for mensaje, fecha, hora, tipo_reunion, datos in casos:
+                with self.subTest(mensaje=mensaje):
+                    entidades = extraer_entidades(mensaje)
+                    self.assertEqual((entidades.fecha, entidades.hora, entidades.tipo_reunion), (fecha, hora, tipo_reunion))
+                    self.assertEqual(entidades.datos_personales(), datos)
+    
+    def test_extraer_entidades_solapadas(self):
+        """Las entidades que comparten texto se identifican todas y con las prioridades de siempre."""
+        # "las 10" y "10 de junio" comparten el número
+        entidades = extraer_entidades("a las 10 de junio")
+        self.assertEqual(entidades.hora, "10:00")
+        self.assertTrue(entidades.fecha.endswith("-06-10"))
+        
+        # Un mes que aparece dos veces usa su primera mención
+        entidades = extraer_entidades("el 3 de marzo o el 20 de marzo")
+        self.assertTrue(entidades.fecha.endswith("-03-03"))
+        
+        # El formato 24h tiene prioridad sobre "a las X"
+        self.assertEqual(extraer_entidades("a las 9, o mejor 16:15").hora, "16:15")
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
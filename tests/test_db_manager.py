@@ -0,0 +1,546 @@
+import unittest
+import sys
+import os
+import sqlite3
+import tempfile
+import threading
+import datetime
+from unittest.mock import patch
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from db_manager import (DatabaseManager, get_db, MIGRACIONES, TABLAS_BUSQUEDA, MARCA_INICIO, MARCA_FIN,
+                        _CONDICION_CONSULTA_SIN_EXPEDIENTE)
+
+class TestConexiones(unittest.TestCase):
+    """Reutilización de conexiones y del esquema en DatabaseManager."""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+        self.addCleanup(self.db.cerrar_conexion)
+
+    def test_una_conexion_por_hilo(self):
+        """Cada hilo reutiliza su conexión, configurada en modo WAL."""
+        conn = self.db.conectar()
+        self.assertIs(self.db.conectar()._conn, conn._conn)
+        self.assertIs(DatabaseManager(self.db.db_file).conectar()._conn, conn._conn)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+
+        otras = []
+        hilo = threading.Thread(target=lambda: otras.append(self.db.conectar()._conn))
+        hilo.start()
+        hilo.join()
+        self.assertIsNot(otras[0], conn._conn)
+
+    def test_close_descarta_lo_no_confirmado(self):
+        """close() no cierra la conexión, pero descarta lo que no se ha confirmado."""
+        conn = self.db.conectar()
+        conn.execute("INSERT INTO configuracion (clave, valor) VALUES ('a', '1')")
+        conn.close()
+        self.assertIsNone(self.db.get_configuracion('a'))
+
+        self.db.set_configuracion('b', '2')
+        externa = sqlite3.connect(self.db.db_file)
+        self.assertEqual(externa.execute("SELECT valor FROM configuracion WHERE clave='b'").fetchone(), ('2',))
+        externa.close()
+
+    def test_llamada_anidada_conserva_la_transaccion(self):
+        """Otro método llamado antes de confirmar no descarta lo escrito por el primero."""
+        conn = self.db.conectar()
+        conn.execute("INSERT INTO configuracion (clave, valor) VALUES ('a', '1')")
+        self.assertEqual(self.db.get_configuracion('a'), '1')
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.db.get_configuracion('a'), '1')
+
+        # Un uso que se descarta sin close() (p. ej. por una excepción) también la libera
+        conn = self.db.conectar()
+        conn.execute("INSERT INTO configuracion (clave, valor) VALUES ('b', '2')")
+        del conn
+        self.assertIsNone(self.db.get_configuracion('b'))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requiere os.fork")
+    def test_proceso_hijo_abre_su_conexion(self):
+        """Tras un fork, el proceso hijo no usa la conexión heredada del padre."""
+        conn = self.db.conectar()
+        conexion_padre = conn._conn
+        conn.close()
+        lectura, escritura = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                hijo = self.db.conectar()
+                distinta = hijo._conn is not conexion_padre
+                self.db.set_configuracion('hijo', str(os.getpid()))
+                os.write(escritura, b'1' if distinta else b'0')
+            finally:
+                os._exit(0)
+        os.close(escritura)
+        resultado = os.read(lectura, 1)
+        os.close(lectura)
+        os.waitpid(pid, 0)
+        self.assertEqual(resultado, b'1')
+        self.assertEqual(self.db.get_configuracion('hijo'), str(pid))
+
+    def test_esquema_una_vez_por_proceso(self):
+        """El esquema solo se crea la primera vez, o si el fichero ha desaparecido."""
+        with patch.object(DatabaseManager, 'initialize_db') as mock_inicializar:
+            DatabaseManager(self.db.db_file)
+            mock_inicializar.assert_not_called()
+
+        self.db.cerrar_conexion()
+        os.remove(self.db.db_file)
+        db = DatabaseManager(self.db.db_file)
+        self.assertEqual(db.get_configuracion('a', 'defecto'), 'defecto')
+
+    def test_get_db_compartido(self):
+        """get_db() devuelve el mismo gestor para el mismo fichero."""
+        ruta = os.path.join(self.directorio.name, 'compartida.db')
+        db = get_db(ruta)
+        self.addCleanup(db.cerrar_conexion)
+        self.assertIs(get_db(ruta), db)
+        self.assertIsNot(get_db(self.db.db_file), db)
+
+class TestMigraciones(unittest.TestCase):
+    """Migraciones versionadas del esquema e índices de las consultas frecuentes."""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+        self.addCleanup(self.db.cerrar_conexion)
+
+    def plan(self, consulta, parametros=()):
+        filas = self.db.conectar().execute("EXPLAIN QUERY PLAN " + consulta, parametros).fetchall()
+        return " | ".join(fila[3] for fila in filas)
+
+    def test_migraciones_aplicadas_una_vez(self):
+        """Una base de datos nueva queda en la última versión y no se vuelve a migrar."""
+        self.assertEqual(self.db.version_esquema(), MIGRACIONES[-1][0])
+        self.assertEqual(self.db.aplicar_migraciones(), [])
+
+        nueva = (MIGRACIONES[-1][0] + 1, "Prueba", ["CREATE TABLE prueba (id INTEGER)"])
+        self.assertEqual(self.db.aplicar_migraciones(MIGRACIONES + [nueva]), [nueva[0]])
+        self.assertEqual(self.db.aplicar_migraciones(MIGRACIONES + [nueva]), [])
+        self.assertEqual(self.db.version_esquema(), nueva[0])
+
+    def test_migracion_fallida_no_deja_cambios(self):
+        """Si una sentencia falla, la migración entera se deshace."""
+        version = MIGRACIONES[-1][0] + 1
+        erronea = (version, "Errónea", ["CREATE TABLE a_medias (id INTEGER)", "SELECT * FROM no_existe"])
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.aplicar_migraciones(MIGRACIONES + [erronea])
+        self.assertEqual(self.db.version_esquema(), version - 1)
+        tablas = self.db.conectar().execute("SELECT name FROM sqlite_master WHERE name='a_medias'").fetchall()
+        self.assertEqual(tablas, [])
+
+    def test_base_de_datos_existente_sin_indices(self):
+        """Una base de datos anterior a las migraciones (con datos) recibe los índices."""
+        ruta = os.path.join(self.directorio.name, 'antigua.db')
+        conn = sqlite3.connect(ruta)
+        conn.execute("CREATE TABLE clientes (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL, "
+                     "email TEXT UNIQUE NOT NULL, telefono TEXT, fecha_registro TEXT, notas TEXT)")
+        conn.execute("INSERT INTO clientes (nombre, email, telefono) VALUES ('Ana', 'ana@example.com', '600000000')")
+        conn.commit()
+        conn.close()
+
+        db = DatabaseManager(ruta)
+        self.addCleanup(db.cerrar_conexion)
+        self.assertEqual(db.version_esquema(), MIGRACIONES[-1][0])
+        self.assertEqual(db.get_cliente_by_telefono('600000000')['nombre'], 'Ana')
+
+    def test_enlace_de_expedientes_existentes(self):
+        """Los expedientes anteriores al enlace con su consulta se enlazan con el criterio antiguo."""
+        db = DatabaseManager(os.path.join(self.directorio.name, 'antigua.db'))
+        db.cerrar_conexion()
+        conn = sqlite3.connect(db.db_file)
+        # Base de datos como era antes de la migración 5
+        conn.execute("DROP INDEX idx_proyectos_cita")
+        conn.execute("ALTER TABLE proyectos DROP COLUMN cita_id")
+        conn.execute("DELETE FROM schema_version WHERE version >= 5")
+        conn.execute("INSERT INTO clientes (nombre, email) VALUES ('Ana', 'ana@example.com')")
+        conn.execute("INSERT INTO clientes (nombre, email) VALUES ('Luis', 'luis@example.com')")
+        for cliente_id, fecha, tema in [(1, '2030-01-10', 'Divorcio'), (1, '2030-02-10', 'Divorcio'),
+                                        (1, '2030-03-10', 'Divorcio'), (2, '2030-01-10', 'Despido'),
+                                        (1, '2030-01-05', '')]:
+            conn.execute("INSERT INTO citas (cliente_id, tipo, fecha, hora, tema, estado) "
+                         "VALUES (?, 'presencial', ?, '10:00', ?, 'completada')", (cliente_id, fecha, tema))
+        for cliente_id, titulo in [(1, 'Expediente Divorcio'), (1, 'Expediente Despido'), (1, 'Reclamación')]:
+            conn.execute("INSERT INTO proyectos (cliente_id, titulo, fecha_inicio) VALUES (?, ?, '2030-02-15')",
+                         (cliente_id, titulo))
+        conn.commit()
+        conn.close()
+
+        self.addCleanup(db.cerrar_conexion)
+        self.assertEqual(db.aplicar_migraciones(), [m[0] for m in MIGRACIONES if m[0] >= 5])
+        enlaces = db.conectar().execute("SELECT id, cita_id FROM proyectos ORDER BY id").fetchall()
+        # La consulta más reciente anterior al expediente; no las de otro cliente ni las que no tienen tema
+        self.assertEqual(enlaces, [(1, 2), (2, None), (3, None)])
+
+    def test_consultas_frecuentes_usan_indices(self):
+        """Las consultas por fecha y por clave ajena no recorren la tabla entera."""
+        consultas = {
+            "idx_citas_fecha": "SELECT * FROM citas WHERE fecha >= ? AND fecha <= ? ORDER BY fecha, hora",
+            "idx_citas_cliente": "SELECT * FROM citas WHERE cliente_id=? ORDER BY fecha, hora",
+            "idx_clientes_telefono": "SELECT * FROM clientes WHERE telefono=?",
+            "idx_proyectos_cliente": "SELECT * FROM proyectos WHERE cliente_id=? ORDER BY ultima_actualizacion DESC",
+            "idx_notas_proyecto_proyecto": "SELECT * FROM notas_proyecto WHERE proyecto_id=? ORDER BY fecha DESC LIMIT 2",
+            "idx_eventos_proyecto_proyecto": "SELECT * FROM eventos_proyecto WHERE proyecto_id=? ORDER BY fecha",
+            "idx_eventos_proyecto_fecha": "SELECT * FROM eventos_proyecto WHERE fecha >= ? AND fecha <= ?",
+            "idx_documento_cliente_cliente": "SELECT documento_id FROM documento_cliente WHERE cliente_id=?",
+            "idx_documento_proyecto_proyecto": "SELECT documento_id FROM documento_proyecto WHERE proyecto_id=?",
+            "idx_documento_cita_cita": "SELECT documento_id FROM documento_cita WHERE cita_id=?",
+        }
+        for indice, consulta in consultas.items():
+            with self.subTest(indice=indice):
+                parametros = (1, 2) if consulta.count("?") == 2 else (1,)
+                plan = self.plan(consulta, parametros)
+                self.assertIn(indice, plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+class TestListadoProyectos(unittest.TestCase):
+    """Listado paginado de expedientes con sus últimas notas."""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+        self.addCleanup(self.db.cerrar_conexion)
+
+        conn = sqlite3.connect(self.db.db_file)
+        conn.execute("INSERT INTO clientes (nombre, email) VALUES ('Ana', 'ana@example.com')")
+        conn.execute("INSERT INTO clientes (nombre, email) VALUES ('Luis', 'luis@example.com')")
+        for i in range(1, 31):
+            conn.execute("INSERT INTO proyectos (cliente_id, titulo, estado, abogado, ultima_actualizacion) "
+                         "VALUES (?, ?, ?, 'Pérez', ?)",
+                         (1 + i % 2, f"Expediente {i:02d}", 'nuevo' if i % 3 else 'finalizado', f"2030-01-{i:02d}"))
+            for dia in range(1, 4):
+                conn.execute("INSERT INTO notas_proyecto (proyecto_id, fecha, texto) VALUES (?, ?, ?)",
+                             (i, f"2030-02-{dia:02d}", f"Nota {dia} del {i}"))
+        conn.commit()
+        conn.close()
+
+    def test_pagina_con_cliente_y_ultimas_notas(self):
+        """Cada expediente trae su cliente y sus dos últimas notas, igual que get_proyectos_by_cliente."""
+        proyectos, total = self.db.get_proyectos_pagina(pagina=1, por_pagina=10)
+
+        self.assertEqual(total, 30)
+        self.assertEqual([p['id'] for p in proyectos], list(range(30, 20, -1)))
+        por_cliente = {p['id']: p for p in self.db.get_proyectos_by_cliente(2)}
+        self.assertEqual(proyectos[1], por_cliente[29])
+        self.assertEqual([n['texto'] for n in proyectos[0]['notas']], ["Nota 3 del 30", "Nota 2 del 30"])
+
+        ultima, _ = self.db.get_proyectos_pagina(pagina=3, por_pagina=10)
+        self.assertEqual([p['id'] for p in ultima], list(range(10, 0, -1)))
+
+    def test_orden_y_busqueda(self):
+        """Se ordena por cualquier columna permitida y se filtra por texto."""
+        proyectos, _ = self.db.get_proyectos_pagina(por_pagina=5, orden='cliente_nombre', descendente=False)
+        self.assertEqual({p['cliente_nombre'] for p in proyectos}, {'Ana'})
+        self.assertEqual([p['id'] for p in proyectos], [2, 4, 6, 8, 10])
+
+        proyectos, total = self.db.get_proyectos_pagina(buscar='finaliz')
+        self.assertEqual(total, 10)
+        self.assertTrue(all(p['estado'] == 'finalizado' for p in proyectos))
+        self.assertEqual(self.db.get_proyectos_pagina(buscar='100%')[1], 0)
+
+        with self.assertRaises(ValueError):
+            self.db.get_proyectos_pagina(orden='titulo; DROP TABLE proyectos')
+
+    def test_consultas_constantes(self):
+        """La página se obtiene con dos consultas, sea cual sea el número de expedientes."""
+        sentencias = []
+        self.db.conectar().set_trace_callback(sentencias.append)
+        self.addCleanup(self.db.conectar().set_trace_callback, None)
+        self.db.get_proyectos_pagina(por_pagina=25)
+        self.assertEqual(len([s for s in sentencias if s.lstrip().startswith(('SELECT', 'WITH'))]), 2)
+
+    def test_borrar_nota_y_evento(self):
+        """Borrar una nota o un evento lo elimina y marca el expediente como actualizado."""
+        evento_id = self.db.add_evento_proyecto(30, 'Vista', '2030-03-01')
+        self.db.delete_nota_proyecto(90)
+        self.db.delete_evento_proyecto(evento_id)
+
+        proyecto = self.db.get_proyecto(30)
+        self.assertEqual([n['texto'] for n in proyecto['notas']], ["Nota 2 del 30", "Nota 1 del 30"])
+        self.assertEqual(proyecto['eventos'], [])
+        self.assertEqual(proyecto['ultima_actualizacion'], datetime.datetime.now().strftime("%Y-%m-%d"))
+
+class TestListadosPaginados(unittest.TestCase):
+    """Listados de citas, clientes y documentos paginados por clave (keyset)."""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+        self.addCleanup(self.db.cerrar_conexion)
+
+        conn = sqlite3.connect(self.db.db_file)
+        for i in range(1, 8):
+            conn.execute("INSERT INTO clientes (nombre, email, telefono, fecha_registro) VALUES (?, ?, ?, ?)",
+                         (f"Cliente {i % 3}", f"c{i}@example.com", f"60000000{i}", f"2030-01-{i:02d}"))
+        for i in range(1, 21):
+            conn.execute("INSERT INTO citas (cliente_id, tipo, fecha, hora, tema, estado) VALUES (?, ?, ?, ?, 'Consulta', ?)",
+                         (1 + i % 2, 'presencial' if i % 2 else 'telefonica', f"2030-03-{1 + i // 4:02d}",
+                          f"{9 + i % 4:02d}:00", 'cancelada' if i % 5 == 0 else 'pendiente'))
+        for i in range(1, 6):
+            conn.execute("INSERT INTO documentos (nombre, tipo, tamano, fecha_subida, ruta_archivo) VALUES (?, 'pdf', ?, ?, ?)",
+                         (f"doc{i}.pdf", 1024 * 1024 * i, "2030-04-01" if i < 4 else "2030-04-02", f"/tmp/doc{i}.pdf"))
+        conn.execute("INSERT INTO documento_cliente (documento_id, cliente_id) VALUES (1, 1), (1, 2), (2, 3)")
+        conn.commit()
+        conn.close()
+
+    def recorrer(self, metodo, limite, **filtros):
+        """Recorre todas las páginas y devuelve los elementos y el número de páginas."""
+        elementos, paginas, despues = [], 0, None
+        while True:
+            pagina, despues = metodo(limite, despues, **filtros)
+            elementos.extend(pagina)
+            paginas += 1
+            if despues is None:
+                return elementos, paginas
+
+    def test_citas_todas_las_paginas_en_orden(self):
+        """Las páginas enlazadas devuelven todas las citas, sin repetir, de la más reciente a la más antigua."""
+        citas, paginas = self.recorrer(self.db.get_citas_pagina, 6)
+        self.assertEqual(paginas, 4)
+        self.assertEqual(len({c['id'] for c in citas}), 20)
+        claves = [(c['fecha'], c['hora'], c['id']) for c in citas]
+        self.assertEqual(claves, sorted(claves, reverse=True))
+        self.assertEqual(citas[0]['cliente']['nombre'], citas[0]['cliente_nombre'])
+
+        # Una página exacta no deja un cursor a una página vacía
+        self.assertIsNone(self.db.get_citas_pagina(20)[1])
+
+    def test_citas_filtros(self):
+        """Los filtros de rango de fechas, estado, tipo y cliente se combinan con el cursor."""
+        citas, _ = self.recorrer(self.db.get_citas_pagina, 2, fecha_desde="2030-03-02", fecha_hasta="2030-03-04",
+                                 estado='pendiente', tipo='presencial', cliente_id=2)
+        self.assertTrue(citas)
+        for cita in citas:
+            self.assertTrue("2030-03-02" <= cita['fecha'] <= "2030-03-04")
+            self.assertEqual((cita['estado'], cita['tipo'], cita['cliente']['id']), ('pendiente', 'presencial', 2))
+
+    def test_citas_busqueda(self):
+        """La búsqueda de texto filtra por nombre del cliente o tema de la cita."""
+        citas, _ = self.recorrer(self.db.get_citas_pagina, 3, buscar='Cliente 2')
+        self.assertEqual(len(citas), 10)
+        self.assertTrue(all(c['cliente']['id'] == 2 for c in citas))
+        self.assertEqual(len(self.recorrer(self.db.get_citas_pagina, 6, buscar='consul')[0]), 20)
+        self.assertEqual(self.db.get_citas_pagina(buscar='%')[0], [])
+
+    def test_clientes_y_documentos(self):
+        """Clientes por nombre (con búsqueda) y documentos de más reciente a más antiguo."""
+        clientes, paginas = self.recorrer(self.db.get_clientes_pagina, 3)
+        self.assertEqual(paginas, 3)
+        self.assertEqual([(c['nombre'], c['id']) for c in clientes],
+                         sorted((c['nombre'], c['id']) for c in clientes))
+        self.assertEqual([c['id'] for c in self.recorrer(self.db.get_clientes_pagina, 1, buscar='Cliente 1')[0]], [1, 4, 7])
+        self.assertEqual([c['id'] for c in self.db.get_ultimos_clientes(2)], [7, 6])
+
+        documentos, _ = self.recorrer(self.db.get_documentos_pagina, 2)
+        self.assertEqual([d['id'] for d in documentos], [5, 4, 3, 2, 1])
+        self.assertEqual(documentos[-1]['clientes'], ['Cliente 1', 'Cliente 2'])
+        self.assertEqual(documentos[-1]['tamano'], 1)
+        self.assertEqual([d['id'] for d in self.db.get_documentos_pagina(cliente_id=2)[0]], [1])
+        self.assertEqual([d['id'] for d in self.db.get_documentos_pagina(buscar='doc4')[0]], [4])
+
+    def test_paginas_usan_indices(self):
+        """Las páginas se leen por índice, sin ordenar la tabla entera."""
+        consultas = {
+            "idx_citas_fecha": "SELECT id FROM citas WHERE (fecha, hora, id) < (?, ?, ?) "
+                               "ORDER BY fecha DESC, hora DESC, id DESC LIMIT 50",
+            "idx_clientes_nombre": "SELECT id FROM clientes WHERE (nombre, id) > (?, ?) ORDER BY nombre, id LIMIT 50",
+            "idx_clientes_registro": "SELECT id FROM clientes ORDER BY fecha_registro DESC, id DESC LIMIT 5",
+            "idx_documentos_subida": "SELECT id FROM documentos WHERE (fecha_subida, id) < (?, ?) "
+                                     "ORDER BY fecha_subida DESC, id DESC LIMIT 50",
+        }
+        conn = self.db.conectar()
+        for indice, consulta in consultas.items():
+            with self.subTest(indice=indice):
+                parametros = ("2030-01-01", "10:00", 1)[:consulta.count("?")]
+                plan = " | ".join(f[3] for f in conn.execute("EXPLAIN QUERY PLAN " + consulta, parametros))
+                self.assertIn(indice, plan)
+                self.assertNotIn("TEMP B-TREE", plan)
+
+class TestEstadisticasDashboard(unittest.TestCase):
+    """Contadores del dashboard calculados en SQL."""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+        self.addCleanup(self.db.cerrar_conexion)
+
+        hoy = datetime.date.today()
+        dia = lambda n: (hoy + datetime.timedelta(days=n)).isoformat()
+        conn = sqlite3.connect(self.db.db_file)
+        conn.execute("INSERT INTO clientes (nombre, email) VALUES ('Ana', 'ana@example.com')")
+        conn.execute("INSERT INTO clientes (nombre, email) VALUES ('Luis', 'luis@example.com')")
+        citas = [
+            (1, dia(-10), 'Divorcio', 'completada'),   # Con expediente
+            (1, dia(-5), 'Herencia', 'confirmada'),    # Pendiente
+            (2, dia(-3), 'Despido', 'completada'),     # Pendiente
+            (2, dia(-2), 'Alquiler', 'cancelada'),
+            (1, dia(0), 'Divorcio', 'confirmada'),     # Hoy: próxima, aún no celebrada
+            (2, dia(7), 'Despido', 'pendiente'),
+            (2, dia(8), 'Despido', 'pendiente'),
+        ]
+        for cliente_id, fecha, tema, estado in citas:
+            conn.execute("INSERT INTO citas (cliente_id, tipo, fecha, hora, tema, estado) VALUES (?, 'presencial', ?, '10:00', ?, ?)",
+                         (cliente_id, fecha, tema, estado))
+        for cliente_id, titulo, estado, inicio, cita_id in [(1, 'Expediente Divorcio', 'en_proceso', dia(-9), 1),
+                                                            (1, 'Expediente Despido', 'finalizado', dia(-9), None)]:
+            conn.execute("INSERT INTO proyectos (cliente_id, titulo, estado, fecha_inicio, cita_id) VALUES (?, ?, ?, ?, ?)",
+                         (cliente_id, titulo, estado, inicio, cita_id))
+        conn.execute("INSERT INTO eventos_proyecto (proyecto_id, fecha, titulo) VALUES (1, ?, 'Vista')", (dia(3),))
+        conn.execute("INSERT INTO eventos_proyecto (proyecto_id, fecha, titulo) VALUES (1, ?, 'Plazo')", (dia(-1),))
+        conn.commit()
+        conn.close()
+
+    def test_contadores(self):
+        """Los contadores coinciden con los que se obtenían contando los listados."""
+        stats = self.db.get_dashboard_stats(usar_cache=False)
+        self.assertEqual(stats, {
+            'total_clientes': 2,
+            'citas_proximas': 2,
+            'eventos_proximos': 1,
+            'proyectos_activos': 1,
+            'consultas_pendientes': 2
+        })
+
+        hoy = datetime.date.today()
+        eventos = self.db.get_all_calendar_events(hoy.isoformat(), (hoy + datetime.timedelta(days=7)).isoformat())
+        self.assertEqual(stats['citas_proximas'], sum(1 for e in eventos if e['type'] == 'appointment'))
+        self.assertEqual(stats['eventos_proximos'], sum(1 for e in eventos if e['type'] == 'critical'))
+
+        consultas = self.db.get_consultas_sin_expediante()
+        self.assertEqual([c['tema'] for c in consultas], ['Despido', 'Herencia'])
+        self.assertEqual(self.db.get_consultas_sin_expediante(limite=1), consultas[:1])
+
+    def test_una_consulta_y_cache(self):
+        """Se calculan con una sola consulta y se reutilizan hasta que caduca la caché."""
+        sentencias = []
+        self.db.conectar().set_trace_callback(sentencias.append)
+        self.addCleanup(self.db.conectar().set_trace_callback, None)
+        stats = self.db.get_dashboard_stats()
+        self.assertEqual(len([s for s in sentencias if s.lstrip().startswith('SELECT')]), 1)
+
+        self.db.add_cliente('Eva', 'eva@example.com', '600000003')
+        self.assertEqual(self.db.get_dashboard_stats(), stats)
+        self.assertEqual(self.db.get_dashboard_stats(usar_cache=False)['total_clientes'], 3)
+
+    def test_expediente_desde_consulta(self):
+        """El expediente creado desde una consulta queda enlazado y la consulta deja de estar pendiente."""
+        proyecto_id = self.db.crear_expediente_desde_consulta(3)
+        self.assertEqual(self.db.get_proyecto(proyecto_id)['cita_id'], 3)
+        self.assertEqual([c['tema'] for c in self.db.get_consultas_sin_expediante()], ['Herencia'])
+        self.assertEqual(self.db.get_dashboard_stats(usar_cache=False)['consultas_pendientes'], 1)
+
+    def test_anti_join_por_indice(self):
+        """Cada consulta se comprueba por idx_proyectos_cita, sin recorrer los expedientes."""
+        conn = self.db.conectar()
+        consulta = "SELECT COUNT(*) FROM citas c WHERE " + _CONDICION_CONSULTA_SIN_EXPEDIENTE
+        plan = " | ".join(f[3] for f in conn.execute("EXPLAIN QUERY PLAN " + consulta, ("2030-01-01",)))
+        self.assertIn("idx_proyectos_cita", plan)
+        self.assertNotIn("SCAN p", plan)
+
+    def test_proximos_eventos_limitados(self):
+        """Con limite solo se devuelven los primeros eventos por fecha."""
+        eventos = self.db.get_all_calendar_events(limite=3)
+        self.assertEqual(eventos, sorted(self.db.get_all_calendar_events(), key=lambda e: e['start'])[:3])
+
+class TestBusqueda(unittest.TestCase):
+    """Búsqueda de texto completo en clientes, expedientes, notas y documentos."""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+        self.addCleanup(self.db.cerrar_conexion)
+
+        self.cliente_id = self.db.add_cliente('José García Núñez', 'jose@example.com', '600 123 456')
+        self.proyecto_id = self.db.add_proyecto(self.cliente_id, 'Divorcio de mutuo acuerdo', 'Custodia compartida')
+        self.db.add_nota_proyecto(self.proyecto_id, 'Aporta la sentencia de divorcio de García')
+        self.documento_id = self.db.add_documento('sentencia.pdf', 'pdf', 1024, '/tmp/sentencia.pdf', notas='Copia de Núñez')
+
+    def encontrados(self, texto, **kwargs):
+        return [(r['tipo'], r['id']) for r in self.db.buscar(texto, **kwargs)[0]]
+
+    def test_prefijo_sin_acentos_ni_mayusculas(self):
+        """Se encuentra por el principio de cada palabra, sin importar acentos ni mayúsculas."""
+        self.assertEqual(self.encontrados('garc'), [('cliente', self.cliente_id), ('nota', 1)])
+        self.assertEqual(self.encontrados('JOSE nunez', tipos=['cliente']), [('cliente', self.cliente_id)])
+        self.assertEqual(self.encontrados('600123456'), [('cliente', self.cliente_id)])
+        self.assertEqual(self.encontrados('custod'), [('proyecto', self.proyecto_id)])
+        self.assertIn(('documento', self.documento_id), self.encontrados('sentencia'))
+
+    def test_resultado_y_relevancia(self):
+        """Las coincidencias en el título van primero; las notas llevan el título de su expediente."""
+        resultados, _ = self.db.buscar('divorcio')
+        self.assertEqual([r['tipo'] for r in resultados], ['proyecto', 'nota'])
+        self.assertEqual(resultados[1]['titulo'], 'Divorcio de mutuo acuerdo')
+        self.assertEqual(resultados[1]['enlace_id'], self.proyecto_id)
+        self.assertIn(f"{MARCA_INICIO}divorcio{MARCA_FIN}", resultados[1]['fragmento'])
+
+    def test_triggers_mantienen_el_indice(self):
+        """Altas, cambios y bajas en las tablas se reflejan en el índice."""
+        self.db.update_cliente(self.cliente_id, 'José Pérez', 'jose@example.com', '600 123 456')
+        self.assertEqual(self.encontrados('garcia', tipos=['cliente']), [])
+        self.assertEqual(self.encontrados('perez'), [('cliente', self.cliente_id)])
+
+        self.db.delete_proyecto(self.proyecto_id)
+        self.assertEqual(self.encontrados('custodia'), [])
+        self.assertEqual(self.db.conectar().execute("SELECT COUNT(*) FROM busqueda").fetchone()[0],
+                         len(self.db.conectar().execute(
+                             "SELECT id FROM clientes UNION ALL SELECT id FROM proyectos UNION ALL "
+                             "SELECT id FROM notas_proyecto UNION ALL SELECT id FROM documentos").fetchall()))
+
+    def test_paginas_y_consultas_raras(self):
+        """Se pagina por desplazamiento y el texto nunca se interpreta como sintaxis FTS5."""
+        for i in range(5):
+            self.db.add_cliente(f'Divorcista {i}', f'd{i}@example.com', '')
+        primera, siguiente = self.db.buscar('divorc', limite=4)
+        segunda, final = self.db.buscar('divorc', limite=4, desplazamiento=siguiente)
+        self.assertEqual(siguiente, 4)
+        self.assertIsNone(final)
+        self.assertEqual(len({(r['tipo'], r['id']) for r in primera + segunda}), 7)
+
+        for texto in ['', '   ', '"', 'garcia OR', 'NEAR(a b)', '*', 'a:b', "'); DROP TABLE clientes; --"]:
+            with self.subTest(texto=texto):
+                self.db.buscar(texto)
+        self.assertEqual(self.db.buscar('garcia', tipos=[]), ([], None))
+
+    def test_maximo_de_candidatos(self):
+        """Solo se ordenan y paginan las coincidencias más recientes."""
+        for i in range(5):
+            self.db.add_cliente(f'Divorcista {i}', f'd{i}@example.com', '')
+        with patch('db_manager.MAX_CANDIDATOS_BUSQUEDA', 4):
+            primera, siguiente = self.db.buscar('divorc', limite=3)
+            segunda, final = self.db.buscar('divorc', limite=3, desplazamiento=siguiente)
+        self.assertEqual(len(primera), 3)
+        self.assertEqual(len(segunda), 1)
+        self.assertIsNone(final)
+        ultimos = {('cliente', i) for i in range(self.cliente_id + 2, self.cliente_id + 6)}
+        self.assertEqual({(r['tipo'], r['id']) for r in primera + segunda}, ultimos)
+
+    def test_indice_de_datos_existentes(self):
+        """La migración indexa los datos que ya había en la base de datos."""
+        conn = self.db.conectar()
+        conn.execute("DROP TABLE busqueda")
+        for tabla in TABLAS_BUSQUEDA:
+            for sufijo in ('ai', 'au', 'ad'):
+                conn.execute(f"DROP TRIGGER busqueda_{tabla[0]}_{sufijo}")
+        conn.execute("DELETE FROM schema_version WHERE version >= 6")
+        conn.commit()
+        conn.close()
+
+        self.assertEqual(self.db.aplicar_migraciones(), [m[0] for m in MIGRACIONES if m[0] >= 6])
+        self.assertEqual(self.encontrados('nunez'), [('cliente', self.cliente_id), ('documento', self.documento_id)])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import random
+import datetime
+import sys
+import os
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.disponibilidad import AvailabilityGrid
+from handlers.calendar_service import horarios_libres
+
+class TestDisponibilidad(unittest.TestCase):
+
+    def setUp(self):
+        self.fecha = datetime.datetime(2030, 6, 4)
+
+    def test_marcar_y_consultar(self):
+        """Un horario está libre solo si no se solapa con ningún tramo ocupado."""
+        grid = AvailabilityGrid(self.fecha)
+        grid.marcar_ocupado(600, 630)  # 10:00 - 10:30
+        self.assertTrue(grid.esta_libre(570, 600))
+        self.assertFalse(grid.esta_libre(590, 620))
+        self.assertFalse(grid.esta_libre(629, 640))
+        self.assertTrue(grid.esta_libre(630, 660))
+        self.assertEqual(grid.minutos_ocupados(), 30)
+
+    def test_equivale_a_comprobar_solapes(self):
+        """El resultado coincide con comparar cada horario con cada evento, incluidos minutos no enteros."""
+        rng = random.Random(0)
+        for _ in range(200):
+            grid = AvailabilityGrid(self.fecha)
+            eventos = []
+            for _ in range(rng.randint(0, 6)):
+                inicio = rng.uniform(-120, 24 * 60 + 60)
+                fin = inicio + rng.choice([0, 0.5, 15, 30, 90, rng.uniform(-10, 200)])
+                eventos.append((inicio, fin))
+                grid.marcar_ocupado(inicio, fin)
+            for inicio in range(0, 24 * 60 - 30 + 1, 15):
+                esperado = not any(max(inicio, a) < min(inicio + 30, b) for a, b in eventos)
+                self.assertEqual(grid.esta_libre(inicio, inicio + 30), esperado)
+
+    def test_marcar_evento_con_datetimes(self):
+        """Los eventos que empiezan el día anterior o acaban el siguiente se recortan al día."""
+        grid = AvailabilityGrid(self.fecha)
+        grid.marcar_evento(self.fecha - datetime.timedelta(hours=2), self.fecha + datetime.timedelta(hours=9, minutes=15))
+        self.assertFalse(grid.esta_libre(540, 570))
+        self.assertTrue(grid.esta_libre(555, 585))
+        grid.marcar_evento(self.fecha + datetime.timedelta(hours=23), self.fecha + datetime.timedelta(days=1, hours=3))
+        self.assertEqual(grid.minutos_ocupados(), 9 * 60 + 15 + 60)
+
+    def test_horarios_libres_por_tipo(self):
+        """El mismo grid da los horarios libres de cada tipo de reunión dentro de las franjas."""
+        grid = AvailabilityGrid(self.fecha)
+        grid.marcar_ocupado(9 * 60, 9 * 60 + 20)  # 09:00 - 09:20
+        ahora = datetime.datetime(2030, 6, 1, 12, 0)
+
+        presencial = horarios_libres(grid, "presencial", ahora)
+        self.assertNotIn("09:00", presencial)
+        self.assertEqual(presencial[0], "09:30")
+        self.assertEqual(presencial[-1], "18:30")
+
+        telefonica = horarios_libres(grid, "telefonica", ahora)
+        self.assertEqual(telefonica[:2], ["09:30", "09:45"])
+        self.assertIn("12:45", telefonica)
+
+    def test_horarios_libres_hoy_con_margen(self):
+        """Si el día es hoy, solo se ofrecen horarios al menos 30 minutos después de ahora."""
+        grid = AvailabilityGrid(self.fecha)
+        ahora = self.fecha.replace(hour=10, minute=5)
+        libres = horarios_libres(grid, "presencial", ahora)
+        self.assertEqual(libres[0], "11:00")
+
+if __name__ == '__main__':
+    unittest.main()
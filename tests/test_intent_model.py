@@ -1,11 +1,33 @@
 import unittest
 import sys
 import os
+import subprocess
+import tempfile
+import io
+import json
+import numpy as np
+import spacy
+from unittest.mock import patch
 
 # Agregar el directorio raíz del proyecto al path para poder importar módulos
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from models.intent_model import identificar_intencion, preprocesar_texto
+import config
+import models.intent_model as intent_model
+from models.intent_model import identificar_intencion, identificar_intenciones, preprocesar_texto, IndiceIntenciones
+
+def crear_nlp_con_vectores(dimension=16, semilla=0):
+    """Crea un modelo spaCy vacío con vectores aleatorios para los ejemplos de INTENCIONES."""
+    nlp = spacy.blank("es")
+    rng = np.random.default_rng(semilla)
+    palabras = set()
+    for ejemplos in config.INTENCIONES.values():
+        for ejemplo in ejemplos:
+            palabras.update(token.text for token in nlp.make_doc(ejemplo))
+    palabras.update(["quiero", "una", "cita", "prefiero", "que", "sea", "otra", "fecha"])
+    for palabra in sorted(palabras):
+        nlp.vocab.set_vector(palabra, rng.normal(size=dimension).astype("float32"))
+    return nlp
 
 class TestIntentModel(unittest.TestCase):
     
@@ -70,5 +92,273 @@ class TestIntentModel(unittest.TestCase):
         self.assertEqual(identificar_intencion("xyz abc 123"), "desconocido")
         self.assertEqual(identificar_intencion(""), "desconocido")
 
+class TestIndiceIntenciones(unittest.TestCase):
+    
+    def setUp(self):
+        self.nlp = crear_nlp_con_vectores()
+        intent_model.limpiar_cache_intenciones()
+    
+    def test_similitudes_coinciden_con_spacy(self):
+        """La similitud vectorizada reproduce Doc.similarity para cada ejemplo."""
+        indice = IndiceIntenciones(config.INTENCIONES, self.nlp)
+        for texto in ["quiero una cita", "prefiero que sea otra fecha", "hola"]:
+            texto_doc = self.nlp(texto)
+            similitudes = indice.similitudes(texto_doc)
+            for fila, ejemplo in enumerate(indice.ejemplos):
+                esperada = texto_doc.similarity(self.nlp(ejemplo))
+                self.assertAlmostEqual(similitudes[fila], esperada, places=5)
+    
+    def test_indice_se_reconstruye_al_cambiar_intenciones(self):
+        """El índice se reutiliza entre llamadas y se reconstruye si INTENCIONES cambia."""
+        with patch.object(intent_model.registro_modelos, 'nlp', self.nlp), patch.object(intent_model, '_indice', None):
+            indice = intent_model.obtener_indice_intenciones()
+            self.assertIs(intent_model.obtener_indice_intenciones(), indice)
+            
+            config.INTENCIONES["saludo"].append("muy buenas")
+            try:
+                nuevo_indice = intent_model.obtener_indice_intenciones()
+                self.assertIsNot(nuevo_indice, indice)
+                self.assertIn("muy buenas", nuevo_indice.ejemplos)
+            finally:
+                config.INTENCIONES["saludo"].remove("muy buenas")
+    
+    def test_matriz_se_guarda_y_se_comparte_con_mmap(self):
+        """La matriz de ejemplos se guarda en disco y los siguientes índices la abren con mmap."""
+        with tempfile.TemporaryDirectory() as directorio:
+            primero = IndiceIntenciones(config.INTENCIONES, self.nlp, directorio)
+            segundo = IndiceIntenciones(config.INTENCIONES, self.nlp, directorio)
+            self.assertEqual(primero.origen_matriz, "calculada")
+            self.assertEqual(segundo.origen_matriz, "disco")
+            self.assertIsInstance(segundo.matriz, np.memmap)
+            np.testing.assert_array_equal(primero.matriz, segundo.matriz)
+            
+            # Otro modelo (otros vectores) no reutiliza la matriz
+            otro = IndiceIntenciones(config.INTENCIONES, crear_nlp_con_vectores(semilla=1), directorio)
+            self.assertEqual(otro.origen_matriz, "calculada")
+    
+    def test_cache_de_vectores_danada_se_regenera(self):
+        """Un .npy dañado se detecta y se vuelve a generar."""
+        with tempfile.TemporaryDirectory() as directorio:
+            esperado = IndiceIntenciones(config.INTENCIONES, self.nlp, directorio).matriz
+            ruta_matriz = next(os.path.join(directorio, nombre) for nombre in os.listdir(directorio)
+                               if nombre.endswith(".npy"))
+            with open(ruta_matriz, "r+b") as f:
+                f.seek(-8, os.SEEK_END)
+                f.write(b"\xff" * 8)
+            
+            regenerado = IndiceIntenciones(config.INTENCIONES, self.nlp, directorio)
+            self.assertEqual(regenerado.origen_matriz, "calculada")
+            np.testing.assert_array_equal(regenerado.matriz, esperado)
+            self.assertEqual(IndiceIntenciones(config.INTENCIONES, self.nlp, directorio).origen_matriz, "disco")
+    
+    def test_identificar_intenciones_en_lote(self):
+        """La clasificación en lote coincide con la individual y respeta el orden."""
+        textos = ["hola", "", "quiero una cita", "adiós", "prefiero que sea otra fecha",
+                  "xyz abc 123", "para la semana próxima", "quiero una cita"]
+        with patch.object(intent_model.registro_modelos, 'nlp', self.nlp), patch.object(intent_model, '_indice', None):
+            esperadas = [identificar_intencion(texto) for texto in textos]
+            self.assertEqual(identificar_intenciones(textos, batch_size=3), esperadas)
+            self.assertEqual(identificar_intenciones([]), [])
+    
+    def test_clasificar_jsonl(self):
+        """El CLI etiqueta cada línea JSONL e ignora las líneas no válidas."""
+        from clasificar_mensajes import clasificar_jsonl
+        entrada = io.StringIO('{"mensaje": "hola", "user_id": "u1"}\n'
+                              'no es json\n'
+                              '"quiero una cita"\n'
+                              '{"otro": "sin texto"}\n')
+        salida = io.StringIO()
+        with patch.object(intent_model.registro_modelos, 'nlp', self.nlp), patch.object(intent_model, '_indice', None):
+            total = clasificar_jsonl(entrada, salida)
+        
+        lineas = [json.loads(linea) for linea in salida.getvalue().splitlines()]
+        self.assertEqual(total, 2)
+        self.assertEqual(lineas[0], {"mensaje": "hola", "user_id": "u1", "intencion": "saludo"})
+        self.assertEqual(lineas[1]["mensaje"], "quiero una cita")
+        self.assertIn("intencion", lineas[1])
+
+class TestCacheIntenciones(unittest.TestCase):
+    
+    def setUp(self):
+        self.nlp = crear_nlp_con_vectores()
+        intent_model.limpiar_cache_intenciones()
+    
+    def test_mensajes_repetidos_usan_la_cache(self):
+        """Un mensaje repetido (con otra capitalización o espacios) no vuelve a pasar por spaCy."""
+        antes = intent_model.estadisticas_cache_intenciones()
+        with patch.object(intent_model.registro_modelos, 'nlp', self.nlp), patch.object(intent_model, '_indice', None):
+            intencion = identificar_intencion("Quiero una cita")
+            with patch.object(intent_model, '_intencion_por_similitud') as mock_similitud:
+                self.assertEqual(identificar_intencion("  quiero una CITA "), intencion)
+                self.assertEqual(identificar_intenciones(["quiero una cita"]), [intencion])
+                mock_similitud.assert_not_called()
+        
+        despues = intent_model.estadisticas_cache_intenciones()
+        self.assertEqual(despues["aciertos"] - antes["aciertos"], 2)
+        self.assertEqual(despues["fallos"] - antes["fallos"], 1)
+    
+    def test_cache_se_invalida_al_cambiar_intenciones(self):
+        """Modificar config.INTENCIONES descarta las intenciones cacheadas."""
+        with patch.object(intent_model.registro_modelos, 'nlp', self.nlp), patch.object(intent_model, '_indice', None):
+            self.assertNotEqual(identificar_intencion("xyz abc 123"), "saludo")
+            invalidaciones = intent_model.estadisticas_cache_intenciones()["invalidaciones"]
+            
+            config.INTENCIONES["saludo"].append("xyz abc 123")
+            try:
+                self.assertEqual(identificar_intencion("xyz abc 123"), "saludo")
+            finally:
+                config.INTENCIONES["saludo"].remove("xyz abc 123")
+        self.assertGreater(intent_model.estadisticas_cache_intenciones()["invalidaciones"], invalidaciones)
+
+class TestClasificadorRapido(unittest.TestCase):
+    
+    def setUp(self):
+        self.nlp = crear_nlp_con_vectores()
+        intent_model.limpiar_cache_intenciones()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ruta = os.path.join(self.directorio.name, "clasificador.pkl")
+    
+    def tearDown(self):
+        self.directorio.cleanup()
+    
+    def test_probabilidades_coinciden_con_predict_proba(self):
+        """La predicción optimizada da las mismas probabilidades que el pipeline de scikit-learn."""
+        pares = intent_model.datos_entrenamiento_rapido()
+        clasificador = intent_model.ClasificadorRapido.entrenar(pares, "huella")
+        for texto in ["quiero una cita", "mejor por video", "xyz abc 123", ""]:
+            np.testing.assert_allclose(clasificador.probabilidades(texto),
+                                       clasificador.modelo.predict_proba([texto])[0], atol=1e-9)
+    
+    def test_se_guarda_y_se_carga_sin_reentrenar(self):
+        """El clasificador entrenado se guarda en disco y otro proceso lo reutiliza."""
+        with patch.object(intent_model, 'RUTA_CLASIFICADOR_RAPIDO', self.ruta):
+            primero = intent_model.RegistroModelos().get_clasificador_rapido()
+            self.assertTrue(os.path.exists(self.ruta))
+            
+            with patch.object(intent_model.ClasificadorRapido, 'entrenar', side_effect=AssertionError("reentrenado")):
+                segundo = intent_model.RegistroModelos().get_clasificador_rapido()
+        self.assertEqual(segundo.huella, primero.huella)
+        self.assertEqual(segundo.clases, primero.clases)
+    
+    def test_fichero_danado_se_reentrena(self):
+        """Si el fichero guardado está dañado se reentrena y se sobrescribe."""
+        with open(self.ruta, "wb") as f:
+            f.write(b"no es un pickle")
+        with patch.object(intent_model, 'RUTA_CLASIFICADOR_RAPIDO', self.ruta):
+            clasificador = intent_model.RegistroModelos().get_clasificador_rapido()
+            self.assertIsNotNone(intent_model.ClasificadorRapido.cargar(self.ruta, clasificador.huella))
+    
+    def test_cascada_y_metricas_por_nivel(self):
+        """Los mensajes con confianza alta no pasan por spaCy; el resto sí, y se cuentan por nivel."""
+        registro = intent_model.RegistroModelos()
+        registro.nlp = self.nlp
+        intent_model.metricas_niveles.reiniciar()
+        with patch.object(intent_model, 'RUTA_CLASIFICADOR_RAPIDO', self.ruta), \
+             patch.object(intent_model, 'registro_modelos', registro), \
+             patch.object(intent_model, '_indice', None), \
+             patch.object(config, 'UMBRAL_CLASIFICADOR_RAPIDO', 0.9):
+            intent_model.obtener_indice_intenciones()
+            registro.get_clasificador_rapido()
+            with patch.object(intent_model, '_intencion_por_similitud') as mock_similitud:
+                self.assertEqual(identificar_intencion("quiero una cita"), "agendar")
+                mock_similitud.assert_not_called()
+            identificar_intencion("xyz abc 123")
+            identificar_intencion("hola")
+            identificar_intencion("quiero una cita")
+        
+        metricas = intent_model.metricas_clasificacion()
+        self.assertEqual(metricas["total"], 4)
+        for nivel in ["rapido", "spacy", "directo", "cache"]:
+            self.assertEqual(metricas["niveles"][nivel]["mensajes"], 1)
+            self.assertAlmostEqual(metricas["niveles"][nivel]["tasa"], 0.25)
+        self.assertGreater(metricas["niveles"]["spacy"]["latencia_media_ms"], 0)
+    
+    def test_casos_especiales_antes_del_clasificador(self):
+        """Los casos especiales se respetan aunque el clasificador rápido esté seguro de otra cosa."""
+        casos = {
+            "quiero agendar lo antes posible": "agendar",
+            "necesito agendar una consulta urgente": "agendar",
+            "buenas tardes, tengo una duda": "saludo",
+            "buenos días, quería información": "saludo",
+            "lo quiero para la semana próxima": "dia_especifico",
+            "mejor para la próxima semana": "dia_especifico",
+        }
+        with patch.object(intent_model, '_intencion_rapida', return_value="antes_posible") as mock_rapida, \
+             patch.object(intent_model, '_intencion_por_similitud') as mock_similitud:
+            for texto, esperada in casos.items():
+                with self.subTest(texto=texto):
+                    self.assertEqual(identificar_intencion(texto), esperada)
+            intent_model.limpiar_cache_intenciones()
+            self.assertEqual(identificar_intenciones(list(casos)), list(casos.values()))
+        mock_rapida.assert_not_called()
+        mock_similitud.assert_not_called()
+
+        # Si menciona el tipo de reunión, el saludo no decide la intención
+        with patch.object(intent_model, '_intencion_rapida', return_value="reunion_presencial"):
+            self.assertEqual(identificar_intencion("buenas tardes, mejor presencial"), "reunion_presencial")
+
+    def test_desactivado_no_carga_el_clasificador(self):
+        """Con CLASIFICADOR_RAPIDO_ACTIVO = False todos los mensajes van a spaCy."""
+        with patch.object(config, 'CLASIFICADOR_RAPIDO_ACTIVO', False), \
+             patch.object(intent_model.registro_modelos, 'get_clasificador_rapido') as mock_clasificador, \
+             patch.object(intent_model.registro_modelos, 'nlp', self.nlp), \
+             patch.object(intent_model, '_indice', None):
+            identificar_intenciones(["quiero una cita", "mejor por video"])
+        mock_clasificador.assert_not_called()
+
+class TestRegistroModelos(unittest.TestCase):
+    
+    def test_importar_no_carga_modelos(self):
+        """Importar el módulo no carga spaCy ni NLTK (ni intenta descargar nada)."""
+        raiz = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        codigo = ("import sys, models.intent_model; "
+                  "print('spacy' in sys.modules, 'nltk' in sys.modules)")
+        salida = subprocess.run([sys.executable, "-c", codigo], cwd=raiz,
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(salida.strip(), "False False")
+    
+    def test_error_claro_si_faltan_datos_nltk(self):
+        """Si faltan datos de NLTK se lanza RecursoNoDisponibleError con instrucciones."""
+        import nltk
+        registro = intent_model.RegistroModelos()
+        with patch.object(nltk.data, 'find', side_effect=LookupError("no encontrado")):
+            with self.assertRaises(intent_model.RecursoNoDisponibleError) as contexto:
+                registro.get_stopwords()
+        self.assertIn("nltk.downloader", str(contexto.exception))
+    
+    def test_warmup_informa_tiempos_de_carga(self):
+        """warmup() construye el índice e informa de los tiempos de carga."""
+        registro = intent_model.RegistroModelos()
+        registro.nlp = crear_nlp_con_vectores()
+        registro.modelo_cargado = "prueba"
+        with patch.object(intent_model, 'registro_modelos', registro), \
+             patch.object(intent_model, '_indice', None), \
+             patch.object(registro, 'get_stopwords', return_value=frozenset()):
+            info = intent_model.warmup()
+        self.assertEqual(info["modelo_spacy"], "prueba")
+        self.assertIn("indice_intenciones", info["tiempos_carga"])
+        self.assertIn("warmup", info["tiempos_carga"])
+    
+    def test_modo_vectores_excluye_componentes(self):
+        """En modo vectores el modelo se carga sin pipeline y las similitudes no cambian."""
+        nlp_guardado = crear_nlp_con_vectores()
+        tagger = nlp_guardado.add_pipe("tagger")
+        tagger.add_label("NOUN")
+        nlp_guardado.initialize()
+        
+        with tempfile.TemporaryDirectory() as directorio:
+            nlp_guardado.to_disk(directorio)
+            with patch.object(intent_model, 'MODELO_SPACY', directorio):
+                completo = intent_model.RegistroModelos(modo="completo").get_nlp()
+                vectores = intent_model.RegistroModelos(modo="vectores").get_nlp()
+        
+        self.assertEqual(completo.pipe_names, ["tagger"])
+        self.assertEqual(vectores.pipe_names, [])
+        self.assertAlmostEqual(
+            completo("quiero una cita").similarity(completo("necesito una cita")),
+            vectores("quiero una cita").similarity(vectores("necesito una cita")),
+            places=6
+        )
+
 if __name__ == '__main__':
     unittest.main()
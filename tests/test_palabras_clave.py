@@ -0,0 +1,60 @@
+import unittest
+import random
+import sys
+import os
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.palabras_clave import AutomataPalabras
+from config import PALABRAS_DESPEDIDA
+
+class TestPalabrasClave(unittest.TestCase):
+
+    def test_encuentra_patrones_solapados(self):
+        """Se detectan todos los patrones, aunque se solapen o uno contenga a otro."""
+        automata = AutomataPalabras({
+            "video": ["video", "videoconferencia", "conferencia"],
+            "telefono": ["teléfono", "por teléfono", "teléfono mejor"]
+        })
+        self.assertEqual(automata.buscar("una videoconferencia"),
+                         {"video": {"video", "videoconferencia", "conferencia"}})
+        self.assertEqual(automata.buscar("por teléfono mejor"),
+                         {"telefono": {"teléfono", "por teléfono", "teléfono mejor"}})
+        self.assertEqual(automata.buscar("en persona"), {})
+        self.assertEqual(automata.buscar(""), {})
+
+    def test_equivale_a_buscar_cada_patron(self):
+        """El resultado coincide con comprobar `patron in texto` para cada patrón."""
+        rng = random.Random(0)
+        alfabeto = "abcnoñé "
+        for _ in range(200):
+            grupos = {
+                f"grupo{i}": ["".join(rng.choice(alfabeto) for _ in range(rng.randint(1, 4)))
+                              for _ in range(rng.randint(1, 5))]
+                for i in range(3)
+            }
+            automata = AutomataPalabras(grupos)
+            for _ in range(20):
+                texto = "".join(rng.choice(alfabeto + "xyz") for _ in range(rng.randint(0, 25)))
+                esperado = {}
+                for grupo, patrones in grupos.items():
+                    presentes = {patron for patron in patrones if patron in texto}
+                    if presentes:
+                        esperado[grupo] = presentes
+                self.assertEqual(automata.buscar(texto), esperado)
+
+    def test_primer_patron_respeta_el_orden_del_grupo(self):
+        """primer_patron devuelve el primer patrón presente según el orden definido."""
+        automata = AutomataPalabras({"despedida": PALABRAS_DESPEDIDA})
+        encontrados = automata.buscar("no quiero nada, adiós")
+        self.assertEqual(automata.primer_patron(encontrados, "despedida"), "adiós")
+        self.assertIsNone(automata.primer_patron(encontrados, "otro"))
+
+    def test_patron_vacio_no_permitido(self):
+        """Un patrón vacío coincidiría con cualquier texto, así que se rechaza."""
+        with self.assertRaises(ValueError):
+            AutomataPalabras({"grupo": ["hola", ""]})
+
+if __name__ == '__main__':
+    unittest.main()
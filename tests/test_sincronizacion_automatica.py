@@ -0,0 +1,148 @@
+import unittest
+import sys
+import os
+import datetime
+import json
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+# Agregar el directorio raíz del proyecto al path para poder importar módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import handlers.sincronizacion_automatica as sincronizacion_automatica
+from handlers.sincronizacion_automatica import (
+    obtener_configuracion_sync,
+    guardar_configuracion_sync,
+    obtener_ultima_sincronizacion,
+    ejecutar_sincronizacion,
+    PlanificadorSincronizacion,
+    NOMBRE_BLOQUEO
+)
+from db_manager import DatabaseManager
+
+ESTADISTICAS = {'procesados': 1, 'omitidos': 2, 'reintentados': 0, 'fallidos': 0, 'completa': False}
+
+class TestSincronizacionAutomatica(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+        self.db = DatabaseManager(os.path.join(self.directorio.name, 'botia.db'))
+
+        patcher = patch('handlers.calendar_service.sincronizar_cambios_calendario', return_value=ESTADISTICAS)
+        self.mock_sincronizar = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_configuracion_persistente(self):
+        """La configuración se guarda en la base de datos y tiene valores por defecto."""
+        self.assertEqual(obtener_configuracion_sync(self.db), {'activa': False, 'intervalo': 15})
+
+        guardar_configuracion_sync(True, 30, self.db)
+        self.assertEqual(obtener_configuracion_sync(DatabaseManager(self.db.db_file)), {'activa': True, 'intervalo': 30})
+
+        with self.assertRaises(ValueError):
+            guardar_configuracion_sync(True, 7, self.db)
+
+    def test_ejecucion_guarda_resultado(self):
+        """Cada ejecución guarda su duración, origen y resultado, también si falla."""
+        resultado = ejecutar_sincronizacion(self.db, 'manual')
+
+        self.assertTrue(resultado['exito'])
+        self.assertEqual(obtener_ultima_sincronizacion(self.db), resultado)
+        self.assertEqual(resultado['estadisticas'], ESTADISTICAS)
+        self.assertIn("1 procesados", resultado['mensaje'])
+        self.assertGreaterEqual(resultado['duracion'], 0)
+        self.assertFalse(self.db.bloqueo_activo(NOMBRE_BLOQUEO))
+
+        self.mock_sincronizar.side_effect = Exception("invalid_grant")
+        resultado = ejecutar_sincronizacion(self.db, 'automatica')
+        self.assertFalse(resultado['exito'])
+        self.assertIn("invalid_grant", obtener_ultima_sincronizacion(self.db)['mensaje'])
+        self.assertFalse(self.db.bloqueo_activo(NOMBRE_BLOQUEO))
+
+    def test_una_sola_ejecucion_a_la_vez(self):
+        """Las ejecuciones simultáneas del mismo proceso o de otro worker no se solapan."""
+        empezada = threading.Event()
+
+        def sincronizacion_lenta(db):
+            empezada.set()
+            time.sleep(0.2)
+            return ESTADISTICAS
+
+        self.mock_sincronizar.side_effect = sincronizacion_lenta
+        hilo = threading.Thread(target=ejecutar_sincronizacion, args=(self.db,))
+        hilo.start()
+        empezada.wait(5)
+        self.assertIsNone(ejecutar_sincronizacion(self.db))
+        hilo.join()
+        self.assertEqual(self.mock_sincronizar.call_count, 1)
+
+        # Otro proceso tiene el bloqueo de la base de datos
+        self.db.adquirir_bloqueo(NOMBRE_BLOQUEO, "otro-worker", 60)
+        self.assertIsNone(ejecutar_sincronizacion(self.db))
+        self.assertEqual(self.mock_sincronizar.call_count, 1)
+
+        # Si su bloqueo caduca (el worker murió), se puede volver a sincronizar
+        self.db.adquirir_bloqueo(NOMBRE_BLOQUEO, "otro-worker", -1)
+        self.assertIsNotNone(ejecutar_sincronizacion(self.db))
+
+    def test_planificador_respeta_configuracion_e_intervalo(self):
+        """El planificador solo sincroniza si está activado y ha pasado el intervalo."""
+        planificador = PlanificadorSincronizacion(self.db)
+
+        planificador.comprobar()
+        self.mock_sincronizar.assert_not_called()
+
+        guardar_configuracion_sync(True, 15, self.db)
+        planificador.comprobar()
+        self.assertEqual(self.mock_sincronizar.call_count, 1)
+
+        # Recién sincronizado: espera hasta la siguiente comprobación sin sincronizar
+        espera = planificador.comprobar()
+        self.assertEqual(self.mock_sincronizar.call_count, 1)
+        self.assertLessEqual(espera, sincronizacion_automatica.ESPERA_MAXIMA_PLANIFICADOR)
+
+        # Pasado el intervalo vuelve a sincronizar
+        ultima = obtener_ultima_sincronizacion(self.db)
+        ultima['fin'] = (datetime.datetime.now() - datetime.timedelta(minutes=16)).isoformat()
+        self.db.set_configuracion(sincronizacion_automatica.CLAVE_ULTIMA_SINCRONIZACION,
+                                  json.dumps(ultima))
+        planificador.comprobar()
+        self.assertEqual(self.mock_sincronizar.call_count, 2)
+
+    def test_un_planificador_por_proceso(self):
+        """iniciar_planificador() se puede llamar en cada petición: arranca un solo hilo."""
+        self.addCleanup(sincronizacion_automatica.detener_planificador)
+        planificador = sincronizacion_automatica.iniciar_planificador(self.db)
+        self.assertIs(sincronizacion_automatica.iniciar_planificador(self.db), planificador)
+        self.assertTrue(planificador.is_alive())
+
+        sincronizacion_automatica.detener_planificador()
+        planificador.join(5)
+        otro = sincronizacion_automatica.iniciar_planificador(self.db)
+        self.assertIsNot(otro, planificador)
+        self.assertTrue(otro.is_alive())
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Requiere os.fork")
+    def test_id_proceso_distinto_tras_fork(self):
+        """Un worker creado con fork no comparte el propietario del bloqueo con el padre."""
+        propio = sincronizacion_automatica.id_proceso()
+        self.assertEqual(sincronizacion_automatica.id_proceso(), propio)
+        lectura, escritura = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.write(escritura, sincronizacion_automatica.id_proceso().encode())
+            finally:
+                os._exit(0)
+        os.close(escritura)
+        hijo = os.read(lectura, 200).decode()
+        os.close(lectura)
+        os.waitpid(pid, 0)
+        self.assertNotEqual(hijo, propio)
+        self.assertIn(f":{pid}:", hijo)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+
+class CacheLRU:
+    """
+    Caché en memoria de tamaño acotado con política LRU (se expulsa la entrada
+    usada hace más tiempo). Es segura entre hilos y lleva contadores de
+    aciertos, fallos y expulsiones.
+    
+    Con `ttl` (segundos) cada entrada caduca ese tiempo después de guardarse;
+    leer una entrada caducada cuenta como fallo y como lectura caducada.
+    """
+    
+    def __init__(self, max_entradas=1024, ttl=None, reloj=time.monotonic):
+        if max_entradas < 1:
+            raise ValueError("max_entradas debe ser al menos 1")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl debe ser positivo")
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._reloj = reloj
+        # clave -> (valor, instante en que caduca o None)
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+        self.caducadas = 0
+    
+    def get(self, clave, defecto=None):
+        """Devuelve el valor asociado a la clave, o defecto si no está en caché o ha caducado."""
+        with self._lock:
+            if clave in self._datos:
+                valor, caduca = self._datos[clave]
+                if caduca is None or self._reloj() < caduca:
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+                self.caducadas += 1
+            self.fallos += 1
+            return defecto
+    
+    def set(self, clave, valor):
+        """Guarda un valor, expulsando la entrada menos usada si se supera el tamaño."""
+        with self._lock:
+            caduca = self._reloj() + self.ttl if self.ttl is not None else None
+            self._datos[clave] = (valor, caduca)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+    
+    def eliminar(self, *claves):
+        """Elimina las claves indicadas que estén en caché y devuelve cuántas había."""
+        with self._lock:
+            eliminadas = 0
+            for clave in claves:
+                if self._datos.pop(clave, None) is not None:
+                    eliminadas += 1
+            self.invalidaciones += eliminadas
+            return eliminadas
+    
+    def limpiar(self):
+        """Elimina todas las entradas (los contadores se conservan)."""
+        with self._lock:
+            if self._datos:
+                self.invalidaciones += 1
+            self._datos.clear()
+    
+    def __len__(self):
+        return len(self._datos)
+    
+    def estadisticas(self):
+        """Devuelve un diccionario con el tamaño actual y los contadores de la caché."""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+                "invalidaciones": self.invalidaciones,
+                "caducadas": self.caducadas,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0
+            }
@@ -0,0 +1,82 @@
+"""
+Caché de horarios disponibles por (día, tipo de reunión).
+
+Las entradas caducan a los config.CACHE_DISPONIBILIDAD_TTL segundos, lo que
+acota cuánto tarda en verse un cambio hecho directamente en Google Calendar o
+desde otro proceso. Los cambios hechos por este proceso (citas creadas,
+modificadas o borradas y la sincronización con Google) invalidan al momento
+los días afectados.
+
+Cada día tiene una versión que aumenta con cada invalidación. Quien calcula la
+disponibilidad toma las versiones antes de consultar la base de datos y Google,
+y al guardar se descartan los días cuya versión ha cambiado entretanto: así una
+cita reservada durante el cálculo no deja en caché horarios ya ocupados.
+"""
+import threading
+
+import config
+from utils.cache import CacheLRU
+
+_cache = CacheLRU(config.CACHE_DISPONIBILIDAD_TAMANO, ttl=config.CACHE_DISPONIBILIDAD_TTL)
+_lock = threading.Lock()
+_versiones = {}
+_version_global = 0
+_descartadas = 0
+
+def _normalizar_fecha(fecha):
+    return fecha if isinstance(fecha, str) else fecha.strftime("%Y-%m-%d")
+
+def obtener(fecha, tipo_reunion):
+    """Horarios en caché para el día y tipo de reunión, o None si no están o han caducado."""
+    horarios = _cache.get((_normalizar_fecha(fecha), tipo_reunion))
+    return list(horarios) if horarios is not None else None
+
+def versiones(fechas):
+    """Versiones actuales de los días indicados, para pasarlas después a guardar()."""
+    with _lock:
+        return _version_global, {fecha: _versiones.get(fecha, 0) for fecha in map(_normalizar_fecha, fechas)}
+
+def guardar(disponibilidad, tipo_reunion, version):
+    """
+    Guarda los horarios calculados de varios días salvo los que se han
+    invalidado desde que se tomó la versión.
+
+    Args:
+        disponibilidad: Diccionario {"YYYY-MM-DD": [horarios]}
+        tipo_reunion: Tipo de reunión de los horarios
+        version: Valor devuelto por versiones() antes de calcularlos
+    """
+    global _descartadas
+    version_global, versiones_dias = version
+    with _lock:
+        for fecha, horarios in disponibilidad.items():
+            if version_global != _version_global or versiones_dias.get(fecha) != _versiones.get(fecha, 0):
+                _descartadas += 1
+                continue
+            _cache.set((fecha, tipo_reunion), tuple(horarios))
+
+def invalidar_fechas(*fechas):
+    """Invalida la disponibilidad de los días indicados (todos los tipos de reunión)."""
+    with _lock:
+        for fecha in map(_normalizar_fecha, filter(None, fechas)):
+            _versiones[fecha] = _versiones.get(fecha, 0) + 1
+            _cache.eliminar(*[(fecha, tipo) for tipo in config.TIPOS_REUNION])
+
+def invalidar_todo():
+    """Invalida la disponibilidad de todos los días."""
+    global _version_global
+    with _lock:
+        _version_global += 1
+        _versiones.clear()
+        _cache.limpiar()
+
+def estadisticas():
+    """
+    Contadores de la caché: aciertos, fallos, tasa de aciertos, lecturas de
+    entradas caducadas, invalidaciones y cálculos descartados por haberse
+    invalidado su día mientras se hacían (lecturas obsoletas evitadas).
+    """
+    datos = _cache.estadisticas()
+    datos["descartadas_obsoletas"] = _descartadas
+    datos["ttl"] = _cache.ttl
+    return datos
@@ -0,0 +1,77 @@
+import math
+
+MINUTOS_DIA = 24 * 60
+
+# Bytes a 1 para marcar tramos ocupados con una sola asignación
+_OCUPADO = b"\x01" * MINUTOS_DIA
+
+class AvailabilityGrid:
+    """
+    Ocupación de un día con resolución de un minuto. Cada minuto es un byte de
+    un bytearray: marcar un evento y comprobar si un horario está libre son
+    operaciones sobre un tramo del array, sin recorrer la lista de eventos.
+
+    Un mismo grid sirve para cualquier tipo de reunión: se marcan una vez los
+    eventos del día y después se consultan los horarios libres de cada tipo.
+    """
+
+    def __init__(self, fecha):
+        """
+        Args:
+            fecha: Día que representa el grid (datetime a las 00:00)
+        """
+        self.fecha = fecha
+        self._ocupacion = bytearray(MINUTOS_DIA)
+
+    def marcar_ocupado(self, inicio, fin):
+        """
+        Marca como ocupado el intervalo [inicio, fin) en minutos desde las 00:00.
+        Admite minutos no enteros y tramos que empiezan el día anterior o terminan
+        el siguiente; los intervalos vacíos no ocupan nada.
+        """
+        if fin <= inicio:
+            return
+        desde = max(0, math.floor(inicio))
+        hasta = min(MINUTOS_DIA, math.ceil(fin))
+        if desde < hasta:
+            self._ocupacion[desde:hasta] = _OCUPADO[:hasta - desde]
+
+    def marcar_evento(self, inicio, fin):
+        """Marca como ocupado un evento dado por datetimes sin zona horaria."""
+        self.marcar_ocupado((inicio - self.fecha).total_seconds() / 60, (fin - self.fecha).total_seconds() / 60)
+
+    def esta_libre(self, inicio, fin):
+        """Indica si no hay ningún minuto ocupado en [inicio, fin) (minutos enteros)."""
+        return self._ocupacion.find(1, max(0, inicio), fin) == -1
+
+    def horarios_libres(self, horarios, duracion, limite=MINUTOS_DIA, despues_de=None):
+        """
+        Filtra los horarios "HH:MM" en los que cabe una reunión de la duración dada.
+
+        Args:
+            horarios: Lista de horarios candidatos en formato "HH:MM"
+            duracion: Duración de la reunión en minutos
+            limite: Minuto del día que la reunión no puede sobrepasar
+            despues_de: Si se indica, solo se devuelven horarios que empiezan
+                estrictamente después de este minuto del día
+
+        Returns:
+            Lista de horarios libres, en el mismo orden que los candidatos
+        """
+        libres = []
+        for hora_str in horarios:
+            hora, minutos = map(int, hora_str.split(':'))
+            inicio = hora * 60 + minutos
+            fin = inicio + duracion
+            if fin > limite or (despues_de is not None and inicio <= despues_de):
+                continue
+            if self.esta_libre(inicio, fin):
+                libres.append(hora_str)
+        return libres
+
+    def minutos_ocupados(self, desde=0, hasta=MINUTOS_DIA):
+        """Número de minutos ocupados en [desde, hasta)."""
+        return self._ocupacion.count(1, desde, hasta)
+
+    def __repr__(self):
+        return f"AvailabilityGrid({self.fecha.strftime('%Y-%m-%d')}, ocupados={self.minutos_ocupados()} min)"
@@ -0,0 +1,99 @@
+from collections import deque
+
+class AutomataPalabras:
+    """
+    Buscador de múltiples palabras clave (autómata de Aho–Corasick).
+
+    Se compila una vez a partir de grupos de patrones ({grupo: [patrones]}) y
+    encuentra en una sola pasada sobre el texto todos los patrones que aparecen
+    como subcadena, incluidos los solapados ("video" y "videoconferencia").
+    Equivale a evaluar `patron in texto` para cada patrón, pero sin recorrer el
+    texto una vez por patrón.
+    """
+
+    def __init__(self, grupos):
+        self.grupos = {grupo: list(patrones) for grupo, patrones in grupos.items()}
+        self._transiciones = [{}]
+        self._fallos = [0]
+        self._salidas = [()]
+
+        for grupo, patrones in self.grupos.items():
+            for patron in patrones:
+                self._insertar(grupo, patron)
+        self._construir_fallos()
+
+    def _insertar(self, grupo, patron):
+        """Añade un patrón al trie del autómata."""
+        if not patron:
+            raise ValueError(f"El grupo '{grupo}' contiene un patrón vacío")
+        estado = 0
+        for caracter in patron:
+            siguiente = self._transiciones[estado].get(caracter)
+            if siguiente is None:
+                siguiente = len(self._transiciones)
+                self._transiciones[estado][caracter] = siguiente
+                self._transiciones.append({})
+                self._fallos.append(0)
+                self._salidas.append(())
+            estado = siguiente
+        self._salidas[estado] += ((grupo, patron),)
+
+    def _construir_fallos(self):
+        """
+        Calcula los enlaces de fallo en anchura y completa las transiciones de
+        cada estado, de modo que la búsqueda es un único acceso a diccionario
+        por carácter (los caracteres que no aparecen en ningún patrón vuelven
+        al estado inicial).
+        """
+        cola = deque()
+        for siguiente in self._transiciones[0].values():
+            cola.append(siguiente)
+
+        while cola:
+            estado = cola.popleft()
+            fallo = self._fallos[estado]
+            # Las salidas del estado de fallo (más superficial) ya están completas
+            self._salidas[estado] += self._salidas[fallo]
+
+            for caracter, siguiente in list(self._transiciones[estado].items()):
+                self._fallos[siguiente] = self._transiciones[fallo].get(caracter, 0)
+                cola.append(siguiente)
+
+            # Heredar las transiciones que faltan del estado de fallo
+            for caracter, destino in self._transiciones[fallo].items():
+                self._transiciones[estado].setdefault(caracter, destino)
+
+    def buscar(self, texto):
+        """
+        Recorre el texto una vez y devuelve los patrones encontrados.
+
+        Args:
+            texto: Texto en el que buscar (se compara tal cual, sin normalizar)
+
+        Returns:
+            Diccionario {grupo: conjunto de patrones encontrados}; los grupos
+            sin ninguna coincidencia no aparecen
+        """
+        encontrados = {}
+        transiciones = self._transiciones
+        salidas = self._salidas
+        estado = 0
+        for caracter in texto:
+            estado = transiciones[estado].get(caracter, 0)
+            if salidas[estado]:
+                for grupo, patron in salidas[estado]:
+                    if grupo in encontrados:
+                        encontrados[grupo].add(patron)
+                    else:
+                        encontrados[grupo] = {patron}
+        return encontrados
+
+    def primer_patron(self, encontrados, grupo):
+        """
+        Devuelve el primer patrón del grupo (en el orden en que se definió) que
+        aparece en el resultado de buscar(), o None si no aparece ninguno.
+        """
+        patrones = encontrados.get(grupo)
+        if not patrones:
+            return None
+        return next(patron for patron in self.grupos[grupo] if patron in patrones)
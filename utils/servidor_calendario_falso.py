@@ -0,0 +1,401 @@
+"""
+Servidor HTTP local que imita la parte de la API de Google Calendar v3 que usa
+el bot: listado de eventos (events.list, con paginación y tokens de
+sincronización), creación y modificación de eventos (events.insert,
+events.patch), peticiones por lotes y consulta de ocupación (freeBusy.query).
+Permite probar y medir la disponibilidad y la sincronización sin conexión, con
+el cliente real de googleapiclient.
+
+Uso:
+    with ServidorCalendarioFalso(latencia=0.02) as servidor:
+        servidor.agregar_evento("primary", inicio, fin)
+        servicio = servidor.servicio()   # sustituto de get_google_calendar_service()
+
+    python -m utils.servidor_calendario_falso --puerto 8765   # servidor independiente
+"""
+import argparse
+import datetime
+import json
+import threading
+import time
+import uuid
+from email.parser import BytesParser, Parser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+from zoneinfo import ZoneInfo
+
+ZONA_HORARIA_DEFECTO = "Europe/Madrid"
+MAX_RESULTADOS_DEFECTO = 250
+RUTA_LOTES = "/batch/calendar/v3"
+
+def _parsear_fecha(valor):
+    """Convierte una fecha RFC 3339 en datetime con zona horaria (UTC si no la indica)."""
+    fecha = datetime.datetime.fromisoformat(valor.replace('Z', '+00:00'))
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=datetime.timezone.utc)
+    return fecha
+
+def _formatear_fecha(fecha, zona_horaria):
+    """Formatea una fecha en RFC 3339 en la zona horaria indicada, como hace Google."""
+    if zona_horaria in (None, "UTC"):
+        return fecha.astimezone(datetime.timezone.utc).isoformat().replace('+00:00', 'Z')
+    return fecha.astimezone(ZoneInfo(zona_horaria)).isoformat()
+
+def _error(codigo, mensaje, motivo=None):
+    """Cuerpo de error con el formato de la API de Google."""
+    error = {"code": codigo, "message": mensaje}
+    if motivo:
+        error["errors"] = [{"domain": "calendar", "reason": motivo, "message": mensaje}]
+    return codigo, {"error": error}
+
+class ServidorCalendarioFalso:
+    """
+    Calendarios en memoria servidos por HTTP en 127.0.0.1 (puerto libre por
+    defecto). Cuenta las peticiones HTTP recibidas (una petición por lotes cuenta
+    como una, y sus partes se anotan en `peticiones_lote`) y puede añadir una
+    latencia fija a cada respuesta para simular la red.
+    """
+
+    def __init__(self, latencia=0.0, zona_horaria=ZONA_HORARIA_DEFECTO, puerto=0):
+        self.latencia = latencia
+        self.zona_horaria = zona_horaria
+        self.calendarios = {"primary": []}
+        self.peticiones = []
+        self.peticiones_lote = []
+        self._lock = threading.RLock()
+        # Cada cambio en un evento recibe un número de secuencia; un token de
+        # sincronización es "generación-secuencia" y caduca al cambiar la generación
+        self._secuencia = 0
+        self._generacion = 1
+        self._cambios = {}
+        self._fallos_lote = []
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", puerto), _crear_manejador(self))
+        self._servidor.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+        if self._hilo is not None:
+            self._hilo.join()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
+
+    def agregar_evento(self, calendario, inicio, fin, transparente=False, **campos):
+        """
+        Añade un evento con hora a un calendario (que se crea si no existe).
+
+        Args:
+            calendario: Identificador del calendario (por ejemplo "primary")
+            inicio, fin: datetimes; si no tienen zona horaria se interpretan en
+                la zona horaria del servidor
+            transparente: Si es True el evento no ocupa (transparency "transparent")
+            **campos: Otros campos del evento (summary, description, status...)
+
+        Returns:
+            Diccionario del evento tal como lo devuelve la API
+        """
+        evento = {
+            "id": uuid.uuid4().hex,
+            "status": "confirmed",
+            "summary": "",
+            "start": {"dateTime": self._localizar(inicio).isoformat()},
+            "end": {"dateTime": self._localizar(fin).isoformat()},
+        }
+        if transparente:
+            evento["transparency"] = "transparent"
+        evento.update(campos)
+        with self._lock:
+            self.calendarios.setdefault(calendario, []).append(evento)
+            self._marcar_cambio(calendario, evento)
+        return evento
+
+    def modificar_evento(self, calendario, evento_id, inicio=None, fin=None, **campos):
+        """Cambia la hora u otros campos de un evento, como si se editara en Google Calendar."""
+        with self._lock:
+            evento = self._buscar_evento(calendario, evento_id)
+            if inicio is not None:
+                evento["start"] = {"dateTime": self._localizar(inicio).isoformat()}
+            if fin is not None:
+                evento["end"] = {"dateTime": self._localizar(fin).isoformat()}
+            evento.update(campos)
+            self._marcar_cambio(calendario, evento)
+        return evento
+
+    def cancelar_evento(self, calendario, evento_id):
+        """Cancela (borra) un evento: solo aparece en las sincronizaciones incrementales."""
+        return self.modificar_evento(calendario, evento_id, status="cancelled")
+
+    def caducar_tokens_sincronizacion(self):
+        """Invalida los tokens de sincronización emitidos: el siguiente uso recibe un 410."""
+        with self._lock:
+            self._generacion += 1
+
+    def fallar_en_lote(self, veces, codigo=503):
+        """Las próximas `veces` partes de peticiones por lotes responden con el código de error."""
+        with self._lock:
+            self._fallos_lote.extend([codigo] * veces)
+
+    def servicio(self):
+        """Devuelve un servicio de googleapiclient que habla con este servidor."""
+        import httplib2
+        from googleapiclient.discovery import build
+        from googleapiclient.http import BatchHttpRequest
+        servicio = build('calendar', 'v3', http=httplib2.Http(), client_options={"api_endpoint": self.url + "/"})
+        # La URL de lotes sale del documento de descubrimiento y no sigue a api_endpoint
+        servicio.new_batch_http_request = lambda callback=None: BatchHttpRequest(
+            callback=callback, batch_uri=self.url + RUTA_LOTES)
+        return servicio
+
+    # Implementación de los métodos de la API
+
+    def _registrar(self, metodo, ruta):
+        with self._lock:
+            self.peticiones.append((metodo, ruta))
+
+    def _localizar(self, fecha):
+        """Añade la zona horaria del servidor a un datetime sin zona."""
+        return fecha if fecha.tzinfo else fecha.replace(tzinfo=ZoneInfo(self.zona_horaria))
+
+    def _marcar_cambio(self, calendario, evento):
+        self._secuencia += 1
+        evento["updated"] = _formatear_fecha(datetime.datetime.now(datetime.timezone.utc), "UTC")
+        self._cambios.setdefault(calendario, {})[evento["id"]] = self._secuencia
+
+    def _buscar_evento(self, calendario, evento_id):
+        for evento in self.calendarios.get(calendario, []):
+            if evento["id"] == evento_id:
+                return evento
+        raise KeyError(evento_id)
+
+    def _hora_desde_api(self, valor):
+        """Convierte un start/end recibido de la API ({dateTime, timeZone}) al formato almacenado."""
+        fecha = datetime.datetime.fromisoformat(valor["dateTime"].replace('Z', '+00:00'))
+        if fecha.tzinfo is None:
+            fecha = fecha.replace(tzinfo=ZoneInfo(valor.get("timeZone", self.zona_horaria)))
+        return {"dateTime": fecha.isoformat()}
+
+    def _formatear_evento(self, evento, zona):
+        item = dict(evento)
+        if evento.get("status") == "cancelled":
+            # Google solo devuelve el identificador de los eventos borrados
+            return {"kind": "calendar#event", "id": evento["id"], "status": "cancelled"}
+        item["start"] = {"dateTime": _formatear_fecha(_parsear_fecha(evento["start"]["dateTime"]), zona)}
+        item["end"] = {"dateTime": _formatear_fecha(_parsear_fecha(evento["end"]["dateTime"]), zona)}
+        return item
+
+    def _eventos_en_rango(self, calendario, time_min, time_max):
+        """Eventos no cancelados que se solapan con [time_min, time_max), ordenados por inicio."""
+        eventos = []
+        for evento in self.calendarios.get(calendario, []):
+            if evento.get("status") == "cancelled":
+                continue
+            inicio = _parsear_fecha(evento["start"]["dateTime"])
+            fin = _parsear_fecha(evento["end"]["dateTime"])
+            if (time_min is None or fin > time_min) and (time_max is None or inicio < time_max):
+                eventos.append((inicio, fin, evento))
+        eventos.sort(key=lambda e: e[0])
+        return eventos
+
+    def _eventos_cambiados(self, calendario, secuencia):
+        """Eventos (incluidos los cancelados) cambiados después de la secuencia, en orden de cambio."""
+        cambios = self._cambios.get(calendario, {})
+        eventos = [evento for evento in self.calendarios.get(calendario, [])
+                   if cambios.get(evento["id"], 0) > secuencia]
+        eventos.sort(key=lambda evento: cambios[evento["id"]])
+        return eventos
+
+    def listar_eventos(self, calendario, parametros):
+        """GET calendars/{calendarId}/events"""
+        if calendario not in self.calendarios:
+            return _error(404, "Not Found", "notFound")
+        zona = parametros.get("timeZone", self.zona_horaria)
+        max_resultados = int(parametros.get("maxResults", MAX_RESULTADOS_DEFECTO))
+        desde = int(parametros.get("pageToken", 0))
+
+        if "syncToken" in parametros:
+            generacion, secuencia = map(int, parametros["syncToken"].split("-"))
+            if generacion != self._generacion:
+                return _error(410, "Sync token is no longer valid, a full sync is required.", "fullSyncRequired")
+            eventos = self._eventos_cambiados(calendario, secuencia)
+        else:
+            time_min = _parsear_fecha(parametros["timeMin"]) if "timeMin" in parametros else None
+            time_max = _parsear_fecha(parametros["timeMax"]) if "timeMax" in parametros else None
+            eventos = [evento for _, _, evento in self._eventos_en_rango(calendario, time_min, time_max)]
+
+        pagina = eventos[desde:desde + max_resultados]
+        respuesta = {"kind": "calendar#events", "timeZone": zona,
+                     "items": [self._formatear_evento(evento, zona) for evento in pagina]}
+        if desde + max_resultados < len(eventos):
+            respuesta["nextPageToken"] = str(desde + max_resultados)
+        else:
+            respuesta["nextSyncToken"] = f"{self._generacion}-{self._secuencia}"
+        return 200, respuesta
+
+    def insertar_evento(self, calendario, cuerpo):
+        """POST calendars/{calendarId}/events"""
+        if calendario not in self.calendarios:
+            return _error(404, "Not Found", "notFound")
+        evento = dict(cuerpo)
+        evento.setdefault("id", uuid.uuid4().hex)
+        evento.setdefault("status", "confirmed")
+        evento["start"] = self._hora_desde_api(cuerpo["start"])
+        evento["end"] = self._hora_desde_api(cuerpo["end"])
+        self.calendarios[calendario].append(evento)
+        self._marcar_cambio(calendario, evento)
+        return 200, self._formatear_evento(evento, self.zona_horaria)
+
+    def actualizar_evento(self, calendario, evento_id, cuerpo):
+        """PATCH calendars/{calendarId}/events/{eventId}"""
+        try:
+            evento = self._buscar_evento(calendario, evento_id)
+        except KeyError:
+            return _error(404, "Not Found", "notFound")
+        for campo, valor in cuerpo.items():
+            evento[campo] = self._hora_desde_api(valor) if campo in ("start", "end") else valor
+        self._marcar_cambio(calendario, evento)
+        return 200, self._formatear_evento(evento, self.zona_horaria)
+
+    def consultar_ocupacion(self, cuerpo):
+        """POST freeBusy: intervalos ocupados (fusionados y recortados al rango) por calendario."""
+        time_min = _parsear_fecha(cuerpo["timeMin"])
+        time_max = _parsear_fecha(cuerpo["timeMax"])
+        zona = cuerpo.get("timeZone", "UTC")
+
+        calendarios = {}
+        for item in cuerpo.get("items", []):
+            calendario = item["id"]
+            if calendario not in self.calendarios:
+                calendarios[calendario] = {"errors": [{"domain": "global", "reason": "notFound"}], "busy": []}
+                continue
+            ocupados = []
+            for inicio, fin, evento in self._eventos_en_rango(calendario, time_min, time_max):
+                if evento.get("transparency") == "transparent":
+                    continue
+                inicio, fin = max(inicio, time_min), min(fin, time_max)
+                if ocupados and inicio <= ocupados[-1][1]:
+                    ocupados[-1][1] = max(ocupados[-1][1], fin)
+                else:
+                    ocupados.append([inicio, fin])
+            calendarios[calendario] = {"busy": [
+                {"start": _formatear_fecha(inicio, zona), "end": _formatear_fecha(fin, zona)}
+                for inicio, fin in ocupados
+            ]}
+        return 200, {
+            "kind": "calendar#freeBusy",
+            "timeMin": cuerpo["timeMin"],
+            "timeMax": cuerpo["timeMax"],
+            "calendars": calendarios
+        }
+
+    def despachar(self, metodo, ruta, parametros, cuerpo):
+        """Ejecuta la operación de la API correspondiente a una petición."""
+        partes = [unquote(parte) for parte in ruta.strip("/").split("/")]
+        with self._lock:
+            if len(partes) >= 3 and partes[0] == "calendars" and partes[2] == "events":
+                if len(partes) == 3 and metodo == "GET":
+                    return self.listar_eventos(partes[1], parametros)
+                if len(partes) == 3 and metodo == "POST":
+                    return self.insertar_evento(partes[1], cuerpo)
+                if len(partes) == 4 and metodo in ("PATCH", "PUT"):
+                    return self.actualizar_evento(partes[1], partes[3], cuerpo)
+            if partes == ["freeBusy"] and metodo == "POST":
+                return self.consultar_ocupacion(cuerpo)
+        return _error(404, "Not Found")
+
+    def procesar_lote(self, tipo_contenido, datos):
+        """
+        POST batch/calendar/v3: ejecuta cada parte de un multipart/mixed como una
+        petición independiente y devuelve (tipo de contenido, cuerpo) de la respuesta.
+        """
+        mensaje = BytesParser().parsebytes(b"Content-Type: " + tipo_contenido.encode() + b"\r\n\r\n" + datos)
+        frontera = "batch_" + uuid.uuid4().hex
+        respuesta = []
+        for parte in mensaje.get_payload():
+            linea, resto = parte.get_payload().split("\n", 1)
+            metodo, ruta = linea.split(" ")[:2]
+            peticion = Parser().parsestr(resto)
+            url = urlparse(ruta)
+            with self._lock:
+                self.peticiones_lote.append((metodo, url.path))
+                codigo_fallo = self._fallos_lote.pop(0) if self._fallos_lote else None
+            if codigo_fallo:
+                codigo, cuerpo = _error(codigo_fallo, HTTPStatus(codigo_fallo).phrase, "backendError")
+            else:
+                parametros = {clave: valores[-1] for clave, valores in parse_qs(url.query).items()}
+                contenido = peticion.get_payload().strip()
+                codigo, cuerpo = self.despachar(metodo, url.path, parametros, json.loads(contenido) if contenido else {})
+            respuesta.append(
+                f"--{frontera}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-{parte['Content-ID'][1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {codigo} {HTTPStatus(codigo).phrase}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(cuerpo)}\r\n"
+            )
+        respuesta.append(f"--{frontera}--\r\n")
+        return f"multipart/mixed; boundary={frontera}", "".join(respuesta).encode("utf-8")
+
+def _crear_manejador(servidor):
+    """Crea la clase de manejador HTTP ligada a un ServidorCalendarioFalso."""
+
+    class Manejador(BaseHTTPRequestHandler):
+
+        def _enviar(self, codigo, tipo_contenido, datos):
+            self.send_response(codigo)
+            self.send_header("Content-Type", tipo_contenido)
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def _atender(self):
+            url = urlparse(self.path)
+            servidor._registrar(self.command, url.path)
+            if servidor.latencia:
+                time.sleep(servidor.latencia)
+            datos = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if url.path == RUTA_LOTES and self.command == "POST":
+                self._enviar(200, *servidor.procesar_lote(self.headers["Content-Type"], datos))
+                return
+            parametros = {clave: valores[-1] for clave, valores in parse_qs(url.query).items()}
+            codigo, cuerpo = servidor.despachar(self.command, url.path, parametros, json.loads(datos or b"{}"))
+            self._enviar(codigo, "application/json; charset=UTF-8", json.dumps(cuerpo).encode("utf-8"))
+
+        do_GET = do_POST = do_PATCH = do_PUT = _atender
+
+        def log_message(self, formato, *args):
+            pass  # Sin registro de cada petición
+
+    return Manejador
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Google Calendar")
+    parser.add_argument("--puerto", type=int, default=8765, help="Puerto en el que escuchar")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latencia añadida a cada respuesta")
+    args = parser.parse_args()
+
+    with ServidorCalendarioFalso(latencia=args.latencia_ms / 1000, puerto=args.puerto) as servidor:
+        print(f"Servidor de Calendar falso escuchando en {servidor.url} (Ctrl+C para terminar)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()